@@ -0,0 +1,94 @@
+"""
+列プロファイリングエンジンのベンチマーク
+従来の analyze_data_structure 実装と ColumnProfiler を比較します
+
+使い方:
+    python benchmarks/profiler_benchmark.py --rows 1000000 --numeric 20 --categorical 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトルートをPythonパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.profiler import ColumnProfiler
+
+
+def legacy_analyze_data_structure(df: pd.DataFrame) -> dict:
+    """従来の analyze_data_structure 実装 (比較用)"""
+    analysis = {
+        'basic_info': {
+            'shape': df.shape,
+            'columns': list(df.columns),
+            'data_types': df.dtypes.to_dict(),
+            'missing_values': df.isnull().sum().to_dict(),
+            'duplicate_rows': df.duplicated().sum()
+        },
+        'numeric_summary': {},
+        'categorical_summary': {}
+    }
+    numeric_cols = df.select_dtypes(include=[np.number]).columns
+    if len(numeric_cols) > 0:
+        analysis['numeric_summary'] = df[numeric_cols].describe().to_dict()
+    categorical_cols = df.select_dtypes(include=['object']).columns
+    for col in categorical_cols:
+        analysis['categorical_summary'][col] = {
+            'unique_values': df[col].nunique(),
+            'top_values': df[col].value_counts().head(5).to_dict()
+        }
+    return analysis
+
+
+def make_frame(rows: int, numeric: int, categorical: int, missing_rate: float, seed: int = 0) -> pd.DataFrame:
+    """ベンチマーク用の合成データを作成"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(numeric):
+        values = rng.normal(1000, 250, rows)
+        if missing_rate > 0:
+            values[rng.random(rows) < missing_rate] = np.nan
+        data[f'metric_{i}'] = values
+    labels = np.array([f'segment_{k}' for k in range(200)], dtype=object)
+    for i in range(categorical):
+        data[f'category_{i}'] = labels[rng.integers(0, len(labels), rows)]
+    return pd.DataFrame(data)
+
+
+def timed(func, repeat: int) -> float:
+    """最短実行時間 (秒) を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='列プロファイリングのベンチマーク')
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--numeric', type=int, default=20)
+    parser.add_argument('--categorical', type=int, default=5)
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.numeric, args.categorical, args.missing_rate)
+    print(f"データ: {df.shape[0]:,}行 x {df.shape[1]}列 (欠損率 {args.missing_rate:.1%})")
+
+    legacy_time = timed(lambda: legacy_analyze_data_structure(df), args.repeat)
+    fused_time = timed(lambda: ColumnProfiler(df).profile(), args.repeat)
+
+    print(f"従来実装:        {legacy_time:8.3f} 秒")
+    print(f"ColumnProfiler:  {fused_time:8.3f} 秒")
+    print(f"速度比:          {legacy_time / fused_time:8.2f} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,11 @@
 """
 
 import pandas as pd
+import numpy as np
+import hashlib
 import os
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, Callable, Iterator
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -14,6 +17,29 @@ from src.core.config import Config
 from src.core.data_analyzer import DataAnalyzer
 from src.core.visualizer import DataVisualizer
 from src.core.ai_analyzer import AIAnalyzer
+from src.core.row_processor import factorize_prompts
+from src.core.cascade import pattern_validator
+from src.core.job_journal import JobJournal, prompt_key
+from src.core.result_cache import ResultCache, dataframe_fingerprint
+from src.core.pipeline import Pipeline, Stage, STAGE_SKIPPED, STATUS_LABELS
+from src.core.streaming import StreamingAnalyzer, should_stream
+
+# 一括分析パイプラインの段階名 (analysis_results のキーと同じ) と表示名
+PIPELINE_STAGE_LABELS = {
+    'data_structure': 'データ構造分析',
+    'visualizations': 'データ可視化',
+    'ai_analysis': 'AI分析',
+    'visualization_insights': '可視化インサイト分析',
+    'business_strategy': 'ビジネス戦略提案'
+}
+
+# カスケードで上位モデルに切り替えた理由の表示名
+CASCADE_REASON_LABELS = {
+    'error': 'エラー',
+    'truncated': '途中切れ',
+    'invalid': '形式不一致',
+    'low_confidence': '低信頼度'
+}
 
 class BusinessDataAnalyzer:
     """企業データ分析・可視化・戦略提案システム"""
@@ -34,7 +60,20 @@ class BusinessDataAnalyzer:
         self.data_analyzer = None
         self.visualizer = None
         
+        # 分析結果キャッシュ (データの再読み込み後も共有)
+        self.result_cache = ResultCache()
+        
+        # 個別行処理の途中結果の記録 (中断したジョブの再開用)
+        self.job_journal = JobJournal()
+        self.current_job_id = None
+        
+        # 全分析の一括実行 (前回の入力の署名を保持し、変わらない段階は省く)
+        self.pipeline = Pipeline(self._pipeline_stages())
+        self.pipeline_chart_type = 'auto'
+        self.pipeline_report = None
+        
         # データ保存用
+        self.source_path = None
         self.df = None
         self.text_data = None
         self.analysis_results = {}
@@ -42,25 +81,32 @@ class BusinessDataAnalyzer:
         # 設定を表示
         Config.display_config()
     
-    def read_csv(self, file_path: str) -> Optional[pd.DataFrame]:
+    def read_csv(self, file_path: str, streaming: Optional[bool] = None) -> Optional[pd.DataFrame]:
         """
         企業データCSVファイルを読み込む
         
         Args:
             file_path: CSVファイルパス
+            streaming: ストリーミング分析を使うかどうか (Noneの場合はファイルサイズで判定)
             
         Returns:
-            読み込んだDataFrame
+            読み込んだDataFrame (ストリーミング時は先頭行のサンプル)
         """
+        if streaming is None:
+            streaming = should_stream(file_path)
+        if streaming:
+            return self._read_csv_streaming(file_path)
+        
         try:
             self.df = pd.read_csv(file_path)
+            self.source_path = os.path.abspath(file_path)
             print(f"CSVファイルを読み込みました: {file_path}")
             print(f"データの形状: {self.df.shape}")
             print(f"列名: {list(self.df.columns)}")
             print(f"データ型: {self.df.dtypes.to_dict()}")
             
             # 分析器と可視化器を初期化
-            self.data_analyzer = DataAnalyzer(self.df, self.text_data)
+            self.data_analyzer = DataAnalyzer(self.df, self.text_data, cache=self.result_cache)
             self.visualizer = DataVisualizer(self.df)
             
             return self.df
@@ -68,6 +114,42 @@ class BusinessDataAnalyzer:
             print(f"CSVファイルの読み込みエラー: {e}")
             return None
     
+    def _read_csv_streaming(self, file_path: str) -> Optional[pd.DataFrame]:
+        """
+        メモリに載らないCSVをストリーミング分析用に開く
+        
+        全体は読み込まず、分析はチャンク単位で行う。可視化と個別行処理は利用できない。
+        
+        Args:
+            file_path: CSVファイルパス
+            
+        Returns:
+            先頭行のサンプルDataFrame
+        """
+        try:
+            self.data_analyzer = StreamingAnalyzer(file_path)
+            self.data_analyzer.text_data = self.text_data
+            self.df = None
+            self.visualizer = None
+            # 全分析の一括実行はファイルパスと更新時刻でデータの変更を判定する
+            self.source_path = os.path.abspath(file_path)
+            
+            sample = self.data_analyzer.sample
+            print(f"CSVファイルをストリーミングモードで開きました: {file_path}")
+            print(f"チャンク行数: {self.data_analyzer.chunk_rows} (メモリ予算 {self.data_analyzer.memory_budget_mb}MB)")
+            print(f"列名: {list(sample.columns)}")
+            
+            return sample
+        except Exception as e:
+            print(f"CSVファイルの読み込みエラー: {e}")
+            return None
+    
+    def _data_sample(self, rows: int = 10) -> str:
+        """AIプロンプト用のデータサンプル文字列"""
+        if self.df is not None:
+            return self.df.head(rows).to_string()
+        return self.data_analyzer.sample.head(rows).to_string()
+    
     def read_text_file(self, file_path: str) -> Optional[str]:
         """
         テキストファイルを読み込む
@@ -88,6 +170,12 @@ class BusinessDataAnalyzer:
             if self.data_analyzer:
                 self.data_analyzer.text_data = self.text_data
             
+            # プロンプトには関連する段落だけを入れるため、検索インデックスを作成
+            started = time.perf_counter()
+            index = self.ai_analyzer.set_context(self.text_data)
+            if index is not None:
+                print(f"検索インデックス: {index.size} 段落 ({time.perf_counter() - started:.2f}秒)")
+            
             return self.text_data
         except Exception as e:
             print(f"テキストファイルの読み込みエラー: {e}")
@@ -108,12 +196,39 @@ class BusinessDataAnalyzer:
         self.analysis_results['data_structure'] = analysis
         return analysis
     
-    def ai_analyze_data(self, custom_prompt: Optional[str] = None) -> Optional[str]:
+    def _consume_stream(self, stream: Iterator[str], on_token: Callable[[str], None]) -> Optional[str]:
+        """
+        ストリーミング応答を on_token に渡しながら全文を組み立てる
+        
+        途中で失敗した応答は不完全なため、結果として使わずにNoneを返す。
+        """
+        parts = []
+        try:
+            for chunk in stream:
+                on_token(chunk)
+                parts.append(chunk)
+        except Exception:
+            if parts:
+                print("\n応答の受信が途中で失敗したため、この結果は使用しません。")
+            return None
+        return ''.join(parts) or None
+    
+    def _print_call_metrics(self, previous: Dict[str, Any]):
+        """直近のAI呼び出しの応答時間を表示"""
+        metrics = self.ai_analyzer.last_call_metrics
+        if metrics and metrics is not previous:
+            print(f"\n応答時間: 最初のトークンまで {metrics['time_to_first_token']:.2f}秒, "
+                  f"合計 {metrics['duration']:.2f}秒, {metrics['tokens_per_second']:.1f} トークン/秒"
+                  + (" (キャッシュ)" if metrics['cached'] else ""))
+    
+    def ai_analyze_data(self, custom_prompt: Optional[str] = None,
+                        on_token: Optional[Callable[[str], None]] = None) -> Optional[str]:
         """
         AIによるデータ分析
         
         Args:
             custom_prompt: カスタムプロンプト
+            on_token: 指定すると応答をストリーミングし、生成されたテキストの断片を渡す
             
         Returns:
             分析結果テキスト
@@ -124,15 +239,33 @@ class BusinessDataAnalyzer:
         
         # データの基本情報を取得
         data_info = self.data_analyzer.analyze_data_structure()
-        data_sample = self.df.head(10).to_string()
+        data_sample = self._data_sample()
         
         # AI分析を実行
-        analysis_result = self.ai_analyzer.analyze_data_with_ai(
+        previous = self.ai_analyzer.last_call_metrics
+        request = dict(
             data_info=data_info,
             data_sample=data_sample,
             text_context=self.text_data,
             custom_prompt=custom_prompt
         )
+        if on_token is None:
+            analysis_result = self.ai_analyzer.analyze_data_with_ai(**request)
+        else:
+            analysis_result = self._consume_stream(self.ai_analyzer.stream_data_analysis(**request), on_token)
+        self._print_call_metrics(previous)
+        
+        report = self.ai_analyzer.last_prompt_report
+        if report:
+            print(f"プロンプト: {report['tokens']} トークン "
+                  f"(圧縮前 {report['baseline_tokens']}, 削減 {report['saved_tokens']})")
+        context_report = self.ai_analyzer.context_summarizer.last_report
+        if self.text_data and not custom_prompt and self.ai_analyzer.context_index is not None:
+            print(f"追加テキスト: 関連する {len(self.ai_analyzer.last_retrieval)} 段落を使用")
+        elif self.text_data and not custom_prompt and context_report.get('chunks'):
+            print(f"追加テキスト: {context_report['chunks']} 部分を要約 "
+                  f"({context_report['input_tokens']} → {context_report['output_tokens']} トークン, "
+                  f"要約 {context_report['calls']} 回, 再利用 {context_report['reused']} 回)")
         
         if analysis_result:
             self.analysis_results['ai_analysis'] = analysis_result
@@ -160,12 +293,14 @@ class BusinessDataAnalyzer:
         
         return visualizations
     
-    def analyze_visualization_insights(self, visualization_paths: Dict[str, str]) -> Optional[str]:
+    def analyze_visualization_insights(self, visualization_paths: Dict[str, str],
+                                       on_token: Optional[Callable[[str], None]] = None) -> Optional[str]:
         """
         可視化結果を分析してインサイトを生成
         
         Args:
             visualization_paths: 可視化ファイルパス辞書
+            on_token: 指定すると応答をストリーミングし、生成されたテキストの断片を渡す
             
         Returns:
             インサイト分析結果
@@ -178,20 +313,30 @@ class BusinessDataAnalyzer:
         stats_info = self.data_analyzer.analyze_data_structure()
         
         # AI分析を実行
-        insights = self.ai_analyzer.analyze_visualization_insights(
-            data_info=stats_info,
-            visualization_paths=visualization_paths
-        )
+        previous = self.ai_analyzer.last_call_metrics
+        if on_token is None:
+            insights = self.ai_analyzer.analyze_visualization_insights(
+                data_info=stats_info,
+                visualization_paths=visualization_paths
+            )
+        else:
+            insights = self._consume_stream(
+                self.ai_analyzer.stream_visualization_insights(stats_info, visualization_paths), on_token
+            )
+        self._print_call_metrics(previous)
         
         if insights:
             self.analysis_results['visualization_insights'] = insights
         
         return insights
     
-    def generate_business_strategy(self) -> Optional[str]:
+    def generate_business_strategy(self, on_token: Optional[Callable[[str], None]] = None) -> Optional[str]:
         """
         ビジネス戦略を生成
         
+        Args:
+            on_token: 指定すると応答をストリーミングし、生成されたテキストの断片を渡す
+        
         Returns:
             戦略提案テキスト
         """
@@ -205,20 +350,111 @@ class BusinessDataAnalyzer:
             all_analysis += f"\n{key}: {value}\n"
         
         # AI戦略生成を実行
-        strategy = self.ai_analyzer.generate_business_strategy(all_analysis)
+        previous = self.ai_analyzer.last_call_metrics
+        if on_token is None:
+            strategy = self.ai_analyzer.generate_business_strategy(all_analysis)
+        else:
+            strategy = self._consume_stream(self.ai_analyzer.stream_business_strategy(all_analysis), on_token)
+        self._print_call_metrics(previous)
         
         if strategy:
             self.analysis_results['business_strategy'] = strategy
         
         return strategy
     
-    def process_rows(self, column_name: str, prompt_template: str) -> Optional[pd.DataFrame]:
+    def _data_key(self) -> str:
+        """読み込んだデータの署名 (ストリーミング時はファイルパスと更新時刻)"""
+        if self.df is not None:
+            return dataframe_fingerprint(self.df)
+        if self.source_path and os.path.exists(self.source_path):
+            return f"{self.source_path}:{os.path.getmtime(self.source_path)}"
+        return str(self.source_path)
+    
+    def _text_key(self) -> str:
+        """追加のテキストデータの署名"""
+        return hashlib.sha256((self.text_data or '').encode('utf-8')).hexdigest()
+    
+    def _context_index_key(self) -> Optional[str]:
+        """検索インデックスの署名 (インサイト分析と戦略提案のプロンプトに段落が入るため)"""
+        index = self.ai_analyzer.context_index
+        return index.source_hash if index is not None else None
+    
+    def _pipeline_insights(self, inputs: Dict[str, Any]) -> Optional[str]:
+        """可視化インサイト分析の段階 (グラフがなければ実行しない)"""
+        if not inputs['visualizations']:
+            return None
+        return self.analyze_visualization_insights(inputs['visualizations'])
+    
+    def _pipeline_stages(self) -> list:
+        """全分析の段階と依存関係"""
+        return [
+            Stage('data_structure', lambda inputs: self.analyze_data_structure(), key=self._data_key),
+            # matplotlib (pyplot) の描画はメインスレッドで行う
+            Stage('visualizations', lambda inputs: self.create_visualizations(self.pipeline_chart_type),
+                  key=lambda: (self._data_key(), self.pipeline_chart_type), main_thread=True),
+            # AIAnalyzer は直近のプロンプトの報告や検索結果を保持するため、AI の段階は1つずつ実行する
+            Stage('ai_analysis', lambda inputs: self.ai_analyze_data(), depends_on=['data_structure'],
+                  key=lambda: (self._text_key(), Config.ANALYSIS_MODEL, Config.PROMPT_TOKEN_BUDGET),
+                  exclusive='ai_analyzer'),
+            Stage('visualization_insights', self._pipeline_insights,
+                  depends_on=['data_structure', 'visualizations'],
+                  key=lambda: (Config.ANALYSIS_MODEL, self._context_index_key()), exclusive='ai_analyzer'),
+            Stage('business_strategy', lambda inputs: self.generate_business_strategy(),
+                  depends_on=['ai_analysis', 'visualization_insights'],
+                  key=lambda: (Config.STRATEGY_MODEL, self._context_index_key()), exclusive='ai_analyzer')
+        ]
+    
+    def run_full_pipeline(self, chart_type: str = 'auto', force: bool = False,
+                          on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Optional[Dict[str, Any]]:
+        """
+        全分析を一括実行
+        
+        構造分析・可視化・AI分析・インサイト分析・戦略提案を依存関係に従って並行実行する
+        (グラフ描画はメインスレッドで、AI の段階は1つずつ実行する)。
+        前回から入力 (データ・テキスト・モデル設定など) が変わっていない段階は前回の結果を使う。
+        
+        Args:
+            chart_type: 可視化のグラフタイプ
+            force: 入力が変わっていない段階も再実行する
+            on_stage: 段階が終わるごとに段階名と実行情報を受け取る関数
+            
+        Returns:
+            Pipeline.run の報告 (クリティカルパスの時間を含む)
+        """
+        if not self.data_analyzer:
+            print("データが読み込まれていません。")
+            return None
+        
+        self.pipeline_chart_type = chart_type
+        report = self.pipeline.run(force=force, on_stage=on_stage)
+        for name, info in report['stages'].items():
+            if info['status'] == STAGE_SKIPPED:
+                self.analysis_results[name] = report['outputs'][name]
+        self.pipeline_report = report
+        
+        skipped = sum(1 for info in report['stages'].values() if info['status'] == STAGE_SKIPPED)
+        path = ' → '.join(PIPELINE_STAGE_LABELS.get(name, name) for name in report['critical_path'])
+        print(f"全分析完了: {report['wall_seconds']:.1f}秒 (各段階の合計 {report['serial_seconds']:.1f}秒, "
+              f"省略 {skipped} 段階)")
+        print(f"クリティカルパス: {path} ({report['critical_path_seconds']:.1f}秒)")
+        return report
+    
+    def process_rows(self, column_name: str, prompt_template: str,
+                     mode: str = 'async', job_id: Optional[str] = None,
+                     answer_pattern: Optional[str] = None) -> Optional[pd.DataFrame]:
         """
         CSVの各行に対してAI処理を実行
         
+        結果は1件完了するごとにジョブのジャーナルに記録する。中断した場合は
+        表示されたジョブIDを指定して再実行すると、未完了の分だけを処理する。
+        
         Args:
             column_name: 処理対象の列名
             prompt_template: プロンプトテンプレート
+            mode: 'async' (並行処理)、'packed' (複数行をまとめて処理)、'batch' (バッチ API で処理)、
+                'cascade' (安いモデルから順に処理) または 'sync' (1行ずつ処理)
+            job_id: 再開するジョブID (省略時は新しいジョブ)
+            answer_pattern: 回答の形式の正規表現 ('cascade' で一致しない回答を上位モデルで再処理する)
             
         Returns:
             処理結果が追加されたDataFrame
@@ -231,24 +467,196 @@ class BusinessDataAnalyzer:
             print(f"列 '{column_name}' が見つかりません。")
             return None
         
+        if job_id is None:
+            job_id = self.job_journal.create_job(column_name, prompt_template, mode,
+                                                 len(self.df), self.source_path)
+            print(f"ジョブID: {job_id} (中断した場合はこのIDで再開できます)")
+        else:
+            job = self.job_journal.get_job(job_id)
+            if job is None:
+                print(f"ジョブ '{job_id}' が見つかりません。")
+                return None
+            if job['column_name'] != column_name or job['prompt_template'] != prompt_template:
+                print(f"ジョブ '{job_id}' は列 '{job['column_name']}' とプロンプト "
+                      f"'{job['prompt_template']}' で作成されています。")
+                return None
+        self.current_job_id = job_id
+        
+        # 同じプロンプトになる行はまとめて1回だけ処理し、結果を全行に展開する
+        codes, values = factorize_prompts(self.df[column_name].tolist(), prompt_template)
+        keys = [prompt_key(prompt_template.format(data=value)) for value in values]
+        
+        # 記録済みの結果を使い、未処理とエラーになった分だけを処理する
+        recorded = self.job_journal.results(job_id)
+        outcomes = [None] * len(values)
+        for position, key in enumerate(keys):
+            if key in recorded and recorded[key][1] is None:
+                outcomes[position] = {'output': recorded[key][0], 'error': None, 'resumed': True}
+        pending = [position for position, outcome in enumerate(outcomes) if outcome is None]
+        print(f"{len(self.df)} 行中 ユニークなプロンプト {len(values)} 件 "
+              f"(記録済み {len(values) - len(pending)} 件) のうち {len(pending)} 件を処理します。")
+        
+        pending_values = [values[position] for position in pending]
+        
+        def on_result(index: int, outcome: Dict[str, Any]):
+            self.job_journal.record(job_id, keys[pending[index]], outcome['output'], outcome['error'])
+        
+        progress = self._row_progress(len(pending_values))
+        if mode == 'async':
+            processed = self.ai_analyzer.process_rows_concurrently(pending_values, prompt_template, progress, on_result)
+        elif mode == 'packed':
+            processed = self.ai_analyzer.process_rows_packed(pending_values, prompt_template, progress,
+                                                             on_result=on_result)
+        elif mode == 'batch':
+            processed = self._process_rows_batch(job_id, pending_values, [keys[p] for p in pending],
+                                                 prompt_template, progress, on_result)
+            if processed is None:
+                return None
+        elif mode == 'cascade':
+            validator = pattern_validator(answer_pattern) if answer_pattern else None
+            processed = self.ai_analyzer.process_rows_cascade(pending_values, prompt_template, progress,
+                                                              on_result, validator=validator)
+            self._print_cascade_report(self.ai_analyzer.last_cascade_report)
+        else:
+            processed = self._process_rows_sync(pending_values, prompt_template, on_result)
+        for position, outcome in zip(pending, processed):
+            outcomes[position] = outcome
+        self.job_journal.finish(job_id)
+        
+        results = np.asarray(self._collect_outcomes(values, outcomes), dtype=object)
+        
+        # 結果を新しい列として追加
+        self.df['AI_Result'] = results.take(codes)
+        return self.df
+    
+    def export_job_results(self, job_id: str, output_path: str) -> bool:
+        """
+        ジョブの記録済みの結果をCSVファイルとして保存 (処理中・中断後でも可)
+        
+        未処理の行の AI_Result は空になる。
+        
+        Args:
+            job_id: ジョブID
+            output_path: 出力ファイルパス
+            
+        Returns:
+            保存成功フラグ
+        """
+        job = self.job_journal.get_job(job_id)
+        if job is None:
+            print(f"ジョブ '{job_id}' が見つかりません。")
+            return False
+        if self.df is None or job['column_name'] not in self.df.columns:
+            print(f"列 '{job['column_name']}' を含むデータが読み込まれていません。")
+            return False
+        
+        codes, values = factorize_prompts(self.df[job['column_name']].tolist(), job['prompt_template'])
+        recorded = self.job_journal.results(job_id)
         results = []
+        for value in values:
+            output, error = recorded.get(prompt_key(job['prompt_template'].format(data=value)), (None, None))
+            results.append(f"処理エラー: {error}" if error is not None else output)
+        
+        partial = self.df.copy()
+        partial['AI_Result'] = np.asarray(results, dtype=object).take(codes)
+        done = sum(1 for result in results if result is not None)
+        try:
+            partial.to_csv(output_path, index=False, encoding='utf-8-sig')
+            print(f"ジョブ {job_id} の結果を保存しました: {output_path} ({done}/{len(values)} 件処理済み)")
+            return True
+        except Exception as e:
+            print(f"保存エラー: {e}")
+            return False
+    
+    def _process_rows_batch(self, job_id: str, values: list, keys: list, prompt_template: str,
+                            progress: Callable[[int, int], None],
+                            on_result: Callable[[int, Dict[str, Any]], None]) -> Optional[list]:
+        """バッチ API で処理 (送信済みのバッチがあれば結果を待つ。時間切れならNone)"""
+        batch_ids = self.job_journal.get_batches(job_id)
+        if batch_ids:
+            print(f"送信済みのバッチ {len(batch_ids)} 件 ({', '.join(batch_ids)}) の結果を待ちます。")
+        
+        def on_submit(submitted: str):
+            self.job_journal.add_batch(job_id, submitted)
+            print(f"バッチ {submitted} を送信しました。")
         
-        for index, row in self.df.iterrows():
+        try:
+            processed = self.ai_analyzer.process_rows_batch(values, prompt_template, progress, on_result,
+                                                            ids=keys, batch_ids=batch_ids, on_submit=on_submit)
+        except TimeoutError as e:
+            print(f"{e}\nジョブID {job_id} で再実行すると、完了したバッチの結果を取り込めます。")
+            return None
+        self.job_journal.clear_batches(job_id)
+        return processed
+    
+    def _process_rows_sync(self, values: list, prompt_template: str,
+                           on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> list:
+        """1件ずつ順番に処理"""
+        outcomes = []
+        
+        for position, value in enumerate(values):
             try:
-                result = self.ai_analyzer.process_individual_rows(
-                    data_series=row[column_name],
+                result = self.ai_analyzer.process_row(
+                    data_series=value,
                     prompt_template=prompt_template
                 )
-                results.append(result)
-                print(f"行 {index+1} 処理完了")
+                outcomes.append({'output': result, 'error': None})
+                print(f"{position+1}/{len(values)} 件 処理完了")
                 
             except Exception as e:
-                print(f"行 {index+1} でエラー: {e}")
-                results.append(f"エラー: {e}")
+                outcomes.append({'output': None, 'error': str(e)})
+            if on_result:
+                on_result(position, outcomes[-1])
         
-        # 結果を新しい列として追加
-        self.df['AI_Result'] = results
-        return self.df
+        return outcomes
+    
+    def _print_cascade_report(self, report: Dict[str, Any]):
+        """カスケードの切り替え率と料金・応答時間を表示"""
+        if not report.get('rows'):
+            return
+        for stage in report['stages']:
+            reasons = ', '.join(f"{CASCADE_REASON_LABELS[reason]} {count}"
+                                for reason, count in stage['reasons'].items() if count)
+            print(f"{stage['model']}: {stage['rows']} 件中 採用 {stage['accepted']} 件, "
+                  f"上位モデルへ {stage['escalated']} 件" + (f" ({reasons})" if reasons else ""))
+        print(f"上位モデルへの切り替え率: {report['escalation_rate']:.1%}")
+        summary = (f"推定料金: ${report['cost']:.4f} (1件あたり ${report['cost_per_row']:.6f}), "
+                   f"1件あたりの応答時間: {report['mean_latency']:.2f}秒")
+        if report['baseline_cost'] is not None:
+            summary += f", 全件 {report['baseline_model']} の場合の推定料金: ${report['baseline_cost']:.4f}"
+        print(summary)
+    
+    def _row_progress(self, total: int):
+        """5%ごとに進捗 (API呼び出しの件数) を表示する関数を作成"""
+        step = max(1, total // 20)
+        
+        def progress(completed: int, total: int):
+            if completed % step == 0 or completed == total:
+                print(f"{completed}/{total} 件 処理完了")
+        
+        return progress
+    
+    def _collect_outcomes(self, values: list, outcomes: list) -> list:
+        """ユニーク値ごとの処理結果を出力列の値に変換 (エラーと使用量は表示)"""
+        results = []
+        errors = 0
+        for value, outcome in zip(values, outcomes):
+            if outcome['error'] is not None:
+                errors += 1
+                print(f"値 '{value}' でエラー: {outcome['error']}")
+                results.append(f"処理エラー: {outcome['error']}")
+            else:
+                results.append(outcome['output'])
+        
+        cached = sum(1 for outcome in outcomes if outcome.get('cached'))
+        resumed = sum(1 for outcome in outcomes if outcome.get('resumed'))
+        summary = f"処理件数: {len(outcomes) - resumed} 件 (キャッシュ {cached} 件, 記録済み {resumed} 件)"
+        if any('tokens' in outcome for outcome in outcomes):
+            summary += f", 使用トークン: {sum(outcome.get('tokens', 0) for outcome in outcomes)}"
+        print(summary)
+        if errors:
+            print(f"{errors} 件でエラーが発生しました。")
+        return results
     
     def save_results(self, output_path: str) -> bool:
         """
@@ -307,6 +715,62 @@ class BusinessDataAnalyzer:
         except Exception as e:
             print(f"保存エラー: {e}")
             return False
+    
+    def print_usage_summary(self):
+        """API 呼び出しのトークン数・応答時間・推定料金を段階とモデルごとに表示"""
+        summary = self.ai_analyzer.get_telemetry_summary()
+        if not summary['calls']:
+            print("API 呼び出しの記録はありません。")
+            return
+        print("=== API 利用状況 ===")
+        for group in summary['groups']:
+            latency = f"{group['mean_latency']:.2f}秒" if group['mean_latency'] is not None else "-"
+            print(f"{group['stage']} / {group['model']}: {group['calls']} 回 "
+                  f"(キャッシュ {group['cached']}, エラー {group['errors']}, 再試行 {group['retries']}), "
+                  f"入力 {group['prompt_tokens']} / 出力 {group['completion_tokens']} トークン, "
+                  f"平均応答 {latency}, 推定 ${group['cost']:.4f}")
+        print(f"合計: {summary['calls']} 回, "
+              f"{summary['prompt_tokens'] + summary['completion_tokens']} トークン, 推定 ${summary['cost']:.4f}")
+    
+    def export_telemetry(self, output_path: str) -> bool:
+        """
+        API 呼び出しの記録を出力
+        
+        拡張子が .prom なら集計を Prometheus のテキスト形式で、
+        それ以外は呼び出しごとの記録を JSON Lines で出力する。
+        
+        Args:
+            output_path: 出力ファイルパス
+            
+        Returns:
+            保存成功フラグ
+        """
+        telemetry = self.ai_analyzer.telemetry
+        try:
+            if output_path.endswith('.prom'):
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write(telemetry.prometheus())
+                print(f"API 利用状況の集計を保存しました: {output_path}")
+            else:
+                count = telemetry.export_jsonl(output_path)
+                print(f"API 呼び出しの記録を保存しました ({count} 件): {output_path}")
+            return True
+        except Exception as e:
+            print(f"保存エラー: {e}")
+            return False
+def print_token(chunk: str):
+    """ストリーミング応答の断片を改行せずに表示"""
+    print(chunk, end='', flush=True)
+
+def print_stage(name: str, info: Dict[str, Any]):
+    """一括分析の段階の終了を表示"""
+    message = f"  {PIPELINE_STAGE_LABELS.get(name, name)}: {STATUS_LABELS[info['status']]}"
+    if info['duration']:
+        message += f" ({info['duration']:.1f}秒)"
+    if info['error']:
+        message += f" - {info['error']}"
+    print(message)
+
 def main():
     """
     企業データ分析システムのメイン関数
@@ -356,8 +820,9 @@ def main():
         print("7. 個別行処理")
         print("8. 設定表示")
         print("9. 終了")
+        print("10. 全分析を一括実行")
         
-        choice = input("選択してください (1-9): ")
+        choice = input("選択してください (1-10): ")
         
         if choice == "1":
             print("\n=== データ構造分析中... ===")
@@ -367,11 +832,8 @@ def main():
                 print(f"基本情報: {structure_analysis['basic_info']}")
         
         elif choice == "2":
-            print("\n=== AI分析中... ===")
-            ai_analysis = analyzer.ai_analyze_data()
-            if ai_analysis:
-                print("\n=== AI分析結果 ===")
-                print(ai_analysis)
+            print("\n=== AI分析結果 ===")
+            analyzer.ai_analyze_data(on_token=print_token)
         
         elif choice == "3":
             print("\n=== データ可視化 ===")
@@ -399,23 +861,17 @@ def main():
                     print(f"  - {name}: {path}")
         
         elif choice == "4":
-            print("\n=== 可視化インサイト分析中... ===")
             if 'visualizations' in analyzer.analysis_results:
-                insights = analyzer.analyze_visualization_insights(
-                    analyzer.analysis_results['visualizations']
+                print("\n=== 可視化インサイト ===")
+                analyzer.analyze_visualization_insights(
+                    analyzer.analysis_results['visualizations'], on_token=print_token
                 )
-                if insights:
-                    print("\n=== 可視化インサイト ===")
-                    print(insights)
             else:
                 print("まず可視化を実行してください。")
         
         elif choice == "5":
-            print("\n=== ビジネス戦略提案中... ===")
-            strategy = analyzer.generate_business_strategy()
-            if strategy:
-                print("\n=== ビジネス戦略提案 ===")
-                print(strategy)
+            print("\n=== ビジネス戦略提案 ===")
+            analyzer.generate_business_strategy(on_token=print_token)
         
         elif choice == "6":
             output_path = input("レポートファイル名を入力してください (.txt): ")
@@ -432,9 +888,27 @@ def main():
                 column_name = df.columns[col_index]
                 
                 prompt_template = input("プロンプトテンプレートを入力 (データは{data}で参照): ")
+                mode_choice = input("処理方式を選択 (1: 並行処理, 2: 複数行をまとめて処理, 3: 1行ずつ, "
+                                    "4: バッチAPI (低コスト・完了まで待つ), "
+                                    "5: カスケード (安いモデルから順に処理)) [1]: ")
+                mode = {'2': 'packed', '3': 'sync', '4': 'batch', '5': 'cascade'}.get(mode_choice.strip(), 'async')
+                answer_pattern = None
+                if mode == 'cascade':
+                    answer_pattern = input("回答の形式を正規表現で入力 (一致しない回答は上位モデルで再処理。"
+                                           "省略はEnter): ").strip() or None
+                job_id = input("中断したジョブを再開する場合はジョブIDを入力 (新規はEnter): ").strip() or None
                 
                 print(f"\n=== 列 '{column_name}' を処理中... ===")
-                result_df = analyzer.process_rows(column_name, prompt_template)
+                try:
+                    result_df = analyzer.process_rows(column_name, prompt_template, mode=mode, job_id=job_id,
+                                                      answer_pattern=answer_pattern)
+                except KeyboardInterrupt:
+                    print(f"\n処理を中断しました。ジョブID {analyzer.current_job_id} で再開できます。")
+                    save_choice = input("ここまでの結果を保存しますか? (y/n): ")
+                    if save_choice.lower() == 'y':
+                        output_path = input("出力ファイル名を入力: ")
+                        analyzer.export_job_results(analyzer.current_job_id, output_path)
+                    continue
                 
                 if result_df is not None:
                     save_choice = input("結果を保存しますか? (y/n): ")
@@ -447,13 +921,22 @@ def main():
         
         elif choice == "8":
             Config.display_config()
+            analyzer.print_usage_summary()
+            export_choice = input("API 呼び出しの記録をファイルに出力しますか？ (y/n): ")
+            if export_choice.lower() == 'y':
+                output_path = input("出力ファイルパス (.jsonl または .prom): ")
+                analyzer.export_telemetry(output_path)
         
         elif choice == "9":
             print("システムを終了します。")
             break
         
+        elif choice == "10":
+            print("\n=== 全分析を一括実行中... ===")
+            analyzer.run_full_pipeline(on_stage=print_stage)
+        
         else:
-            print("無効な選択です。1-9の数字を入力してください。")
+            print("無効な選択です。1-10の数字を入力してください。")
 
 if __name__ == "__main__":
     main()
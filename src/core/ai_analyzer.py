@@ -2,26 +2,443 @@
 AI分析機能モジュール
 """
 
-import openai
+import hashlib
 import json
-from typing import Dict, Any, Optional
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Sequence, Callable, Iterator, Tuple
 from .config import Config
+from .tokens import estimate_tokens, estimate_message_tokens
+from .row_processor import AsyncRowProcessor
+from .llm_cache import LLMCache
+from .row_packing import RowPacker, parse_packed_response
+from .prompt_builder import AnalysisPromptBuilder
+from .transport import LLMTransport
+from .batch_runner import BatchRunner, OpenAIBatchBackend
+from .client_pool import ClientPool, default_pool
+from .telemetry import Telemetry
+from .context_summarizer import ContextSummarizer, truncate_tokens
+from .retrieval import BM25Index
+from .cascade import ModelCascade
+
+# 保持する呼び出しの計測結果の件数
+CALL_METRICS_HISTORY = 1000
+
+# 呼び出し名と計測の段階の対応 (ないものは 'processing')
+CALL_STAGES = {
+    'analysis': 'analysis',
+    'visualization_insights': 'analysis',
+    'business_strategy': 'strategy',
+    'context_summary': 'analysis'
+}
+
+# 追加テキストの検索で列名に加える、分析の目的ごとの語
+RETRIEVAL_TASK_QUERIES = {
+    'analysis': 'データ 傾向 市場 品質 異常 要因',
+    'visualization': '推移 分布 比較 相関 地域 傾向',
+    'strategy': '戦略 施策 競合 顧客 市場 課題 目標'
+}
 
 class AIAnalyzer:
     """AI分析クラス"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[LLMCache] = None,
+                 transport: Optional[LLMTransport] = None, pool: Optional[ClientPool] = None,
+                 telemetry: Optional[Telemetry] = None):
         """
         初期化
         
         Args:
             api_key: OpenAI API キー
+            cache: 応答キャッシュ (省略時は設定が有効なら既定のキャッシュ)
+            transport: 再試行・遮断・ヘッジを行う呼び出し層 (省略時は設定値)
+            pool: クライアントのレジストリ (省略時はプロセス全体で共有するもの)
+            telemetry: 呼び出しの計測 (省略時は設定値)
         """
         self.api_key = api_key or Config.OPENAI_API_KEY
         if not self.api_key:
             raise ValueError("OpenAI API keyが設定されていません")
         
-        self.client = openai.OpenAI(api_key=self.api_key)
+        # 接続プールはセッションや分析クラスをまたいで共有する
+        self.pool = pool or default_pool()
+        self.client = self.pool.client(self.api_key)
+        self.transport = transport or LLMTransport()
+        self.telemetry = telemetry or Telemetry()
+        if cache is None and Config.LLM_CACHE_ENABLED:
+            cache = LLMCache()
+        self.cache = cache
+        self.last_prompt_report = {}
+        self.context_summarizer = ContextSummarizer(self._chat)
+        # 追加テキストの検索インデックスと、検索に使う列名 (直近の分析のもの)
+        self.context_index: Optional[BM25Index] = None
+        self.context_columns: List[str] = []
+        self.last_retrieval: List[Dict[str, Any]] = []
+        self.last_cascade_report: Dict[str, Any] = {}
+        # 呼び出しごとの計測結果 (新しいものから CALL_METRICS_HISTORY 件)
+        self.call_metrics = deque(maxlen=CALL_METRICS_HISTORY)
+    
+    def _record_call(self, call: Optional[str], model: str, started: float, first_token: Optional[float],
+                     text: str, usage=None, messages: Optional[List[Dict[str, str]]] = None,
+                     cached: bool = False, retries: int = 0, streamed: bool = False) -> Dict[str, Any]:
+        """1回の呼び出しの応答時間とトークン速度を記録 (トークン数は usage がなければ推定)"""
+        finished = time.perf_counter()
+        tokens = getattr(usage, 'completion_tokens', None)
+        if tokens is None:
+            tokens = estimate_tokens(text, model)
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        if prompt_tokens is None:
+            prompt_tokens = estimate_message_tokens(messages, model) if messages else 0
+        first_token = finished if first_token is None else first_token
+        # 最初のトークン以降の生成速度 (一度に返る場合は全体の時間で割る)
+        generation = finished - first_token if finished - first_token > 0 else finished - started
+        metrics = {
+            'call': call,
+            'stage': CALL_STAGES.get(call, 'processing'),
+            'model': model,
+            'time_to_first_token': first_token - started,
+            'duration': finished - started,
+            'prompt_tokens': prompt_tokens,
+            'tokens': tokens,
+            'tokens_per_second': tokens / generation if generation > 0 else 0.0,
+            'retries': retries,
+            'cached': cached
+        }
+        self.call_metrics.append(metrics)
+        # キャッシュから返した呼び出しは API のトークンを使っていない
+        self.telemetry.record(
+            metrics['stage'], model, call=call,
+            prompt_tokens=0 if cached else prompt_tokens,
+            completion_tokens=0 if cached else tokens,
+            latency=metrics['duration'],
+            time_to_first_token=metrics['time_to_first_token'] if streamed else None,
+            retries=retries, cached=cached
+        )
+        return metrics
+    
+    def _record_error(self, call: Optional[str], model: str, started: float, retries: int, error: Exception):
+        """失敗した呼び出しを記録 (計測にだけ記録し、call_metrics には残さない)"""
+        self.telemetry.record(CALL_STAGES.get(call, 'processing'), model, call=call,
+                              latency=time.perf_counter() - started, retries=retries, error=str(error))
+    
+    def _chat(self, model_config: Dict[str, Any], messages: List[Dict[str, str]],
+              call: Optional[str] = None, hedge: bool = False) -> str:
+        """
+        チャット補完を実行 (同じリクエストはキャッシュから返す)
+        
+        Args:
+            model_config: Config.get_model_config の戻り値
+            messages: チャットメッセージ
+            call: 計測結果に記録する呼び出し名
+            hedge: 応答が遅いときにヘッジを送るかどうか (対話的な呼び出し用)
+            
+        Returns:
+            応答テキスト
+        """
+        started = time.perf_counter()
+        request = (model_config['model'], messages, model_config['max_tokens'], model_config['temperature'])
+        if self.cache is not None:
+            cached = self.cache.get(*request)
+            if cached is not None:
+                self._record_call(call, model_config['model'], started, None, cached, cached=True)
+                return cached
+        
+        info = {}
+        try:
+            response = self.transport.call(model_config['model'], lambda: self.client.chat.completions.create(
+                model=model_config['model'],
+                messages=messages,
+                max_tokens=model_config['max_tokens'],
+                temperature=model_config['temperature']
+            ), hedge=hedge, info=info)
+        except Exception as e:
+            self._record_error(call, model_config['model'], started, info.get('retries', 0), e)
+            raise
+        content = response.choices[0].message.content
+        self._record_call(call, model_config['model'], started, None, content or '',
+                          getattr(response, 'usage', None), messages, retries=info.get('retries', 0))
+        if self.cache is not None and content is not None:
+            self.cache.put(*request, content)
+        return content
+    
+    def _chat_stream(self, model_config: Dict[str, Any], messages: List[Dict[str, str]],
+                     call: Optional[str] = None) -> Iterator[str]:
+        """
+        チャット補完をストリーミングで実行 (キャッシュ済みなら全文を1回で返す)
+        
+        最初のトークンまでの時間と生成速度を call_metrics に記録し、
+        最後まで受信できた応答だけをキャッシュに保存する。
+        受信の途中で失敗した場合はエラーとして計測に記録し、例外をそのまま送出する。
+        
+        Args:
+            model_config: Config.get_model_config の戻り値
+            messages: チャットメッセージ
+            call: 計測結果に記録する呼び出し名
+            
+        Yields:
+            応答テキストの断片
+            
+        Raises:
+            Exception: 接続または受信に失敗した場合
+        """
+        started = time.perf_counter()
+        request = (model_config['model'], messages, model_config['max_tokens'], model_config['temperature'])
+        if self.cache is not None:
+            cached = self.cache.get(*request)
+            if cached is not None:
+                self._record_call(call, model_config['model'], started, time.perf_counter(), cached,
+                                  cached=True, streamed=True)
+                yield cached
+                return
+        
+        # 接続の確立までは再試行する (受信を始めた後の失敗は再試行しない)
+        info = {}
+        try:
+            stream = self.transport.call(model_config['model'], lambda: self.client.chat.completions.create(
+                model=model_config['model'],
+                messages=messages,
+                max_tokens=model_config['max_tokens'],
+                temperature=model_config['temperature'],
+                stream=True,
+                stream_options={"include_usage": True}
+            ), info=info)
+        except Exception as e:
+            self._record_error(call, model_config['model'], started, info.get('retries', 0), e)
+            raise
+        parts = []
+        first_token = None
+        usage = None
+        try:
+            for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            self._record_error(call, model_config['model'], started, info.get('retries', 0), e)
+            raise
+        
+        content = ''.join(parts)
+        self._record_call(call, model_config['model'], started, first_token, content, usage, messages,
+                          retries=info.get('retries', 0), streamed=True)
+        if self.cache is not None and content:
+            self.cache.put(*request, content)
+    
+    @property
+    def last_call_metrics(self) -> Dict[str, Any]:
+        """直近の呼び出しの計測結果 (time_to_first_token, tokens_per_second など)"""
+        return self.call_metrics[-1] if self.call_metrics else {}
+    
+    def process_rows_batch(self, values: Sequence, prompt_template: str,
+                           progress: Optional[Callable[[int, int], None]] = None,
+                           on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                           ids: Optional[Sequence[str]] = None, batch_ids: Optional[Sequence[str]] = None,
+                           on_submit: Optional[Callable[[str], None]] = None,
+                           runner: Optional[BatchRunner] = None) -> List[Dict[str, Any]]:
+        """
+        複数行をバッチ API で処理 (完了まで待つ)
+        
+        キャッシュにある行は送信せず、バッチの結果はキャッシュに保存する。
+        
+        Args:
+            values: 行ごとの処理対象データ
+            prompt_template: プロンプトテンプレート
+            progress: 終了件数と全件数を受け取る関数
+            on_result: 1件完了するごとに行位置と結果を受け取る関数
+            ids: 行ID (省略時は並び順の番号)
+            batch_ids: 送信済みのバッチID (指定すると送信せずに結果を待つ)
+            on_submit: 送信したバッチIDを1件ずつ受け取る関数
+            runner: バッチの実行方法 (省略時は OpenAI のバッチ API)
+            
+        Returns:
+            入力と同じ順番の結果リスト (output, error, tokens, cached)
+        """
+        runner = runner or BatchRunner(OpenAIBatchBackend(self.client), transport=self.transport)
+        model_config = Config.get_model_config(runner.model_type)
+        ids = list(ids) if ids is not None else [f"row-{position}" for position in range(len(values))]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(values)
+        
+        def request(position: int):
+            return (model_config['model'], runner.build_messages(values[position], prompt_template),
+                    model_config['max_tokens'], model_config['temperature'])
+        
+        pending = []
+        for position in range(len(values)):
+            cached = self.cache.get(*request(position)) if self.cache is not None else None
+            if cached is None:
+                pending.append(position)
+                continue
+            results[position] = {'output': cached, 'error': None, 'tokens': 0, 'cached': True}
+            self.telemetry.record(runner.model_type, model_config['model'], call='batch_row', cached=True)
+            if on_result:
+                on_result(position, results[position])
+        
+        processed = runner.run([values[p] for p in pending], prompt_template, [ids[p] for p in pending],
+                               batch_ids=batch_ids, on_submit=on_submit, progress=progress)
+        for position, outcome in zip(pending, processed):
+            outcome['cached'] = False
+            # バッチは送信から完了までの時間しか分からないので、応答時間は記録しない
+            self.telemetry.record(
+                runner.model_type, model_config['model'], call='batch_row',
+                prompt_tokens=outcome.get('prompt_tokens', 0),
+                completion_tokens=outcome.get('completion_tokens', 0),
+                error=outcome['error'], batch=True
+            )
+            if self.cache is not None and outcome['output'] is not None:
+                self.cache.put(*request(position), outcome['output'])
+            results[position] = outcome
+            if on_result:
+                on_result(position, outcome)
+        return results
+    
+    def get_transport_stats(self) -> Dict[str, Any]:
+        """
+        API 呼び出しの再試行・ヘッジの回数とサーキットブレーカーの状態を取得
+        
+        Returns:
+            LLMTransport.stats の戻り値
+        """
+        return self.transport.stats()
+    
+    def get_telemetry_summary(self) -> Dict[str, Any]:
+        """
+        API 呼び出しのトークン数・応答時間・推定料金の集計を取得
+        
+        Returns:
+            Telemetry.summary の戻り値
+        """
+        return self.telemetry.summary()
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        共有の HTTP 接続プールの利用状況を取得
+        
+        Returns:
+            ClientPool.stats の戻り値
+        """
+        return self.pool.stats()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        応答キャッシュの統計を取得
+        
+        Returns:
+            キャッシュ統計辞書 (キャッシュ無効時は空)
+        """
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def summarize_context(self, text_context: str) -> str:
+        """
+        追加テキストをプロンプトに入れる大きさに要約
+        
+        長いテキストは部分ごとに並行して要約し、統合する (同じテキストの要約は再利用する)。
+        要約に失敗した場合は上限のトークン数で切り詰める。
+        
+        Args:
+            text_context: 追加のテキストコンテキスト
+            
+        Returns:
+            Config.CONTEXT_MAX_TOKENS 以下の文脈
+        """
+        summarizer = self.context_summarizer
+        try:
+            return summarizer.summarize(text_context)
+        
+        except Exception as e:
+            print(f"テキスト要約エラー: {e}")
+            model = Config.get_model_config(summarizer.model_type)['model']
+            return truncate_tokens(text_context, summarizer.max_tokens, model)
+    
+    def set_context(self, text_context: Optional[str]) -> Optional[BM25Index]:
+        """
+        追加テキストの検索インデックスを設定 (保存済みなら読み込み、なければ作成)
+        
+        Args:
+            text_context: 追加のテキストコンテキスト
+            
+        Returns:
+            BM25Index (テキストがない・検索が無効・作成に失敗した場合はNone)
+        """
+        self.context_index = None
+        if not text_context or not Config.RETRIEVAL_ENABLED:
+            return None
+        
+        try:
+            self.context_index = BM25Index.load_or_build(text_context)
+        
+        except Exception as e:
+            print(f"検索インデックス作成エラー: {e}")
+        return self.context_index
+    
+    def retrieve_context(self, task: str, columns: Optional[Sequence[str]] = None) -> Optional[str]:
+        """
+        検索インデックスから、列名と分析の目的に関連する段落を取得
+        
+        Args:
+            task: 'analysis', 'visualization', 'strategy'
+            columns: データの列名 (省略時は直近の分析の列名)
+            
+        Returns:
+            関連する段落 (Config.CONTEXT_MAX_TOKENS 以下。インデックスがない・該当がない場合はNone)
+        """
+        self.last_retrieval = []
+        if self.context_index is None:
+            return None
+        columns = self.context_columns if columns is None else columns
+        query = ' '.join([str(column) for column in columns] + [RETRIEVAL_TASK_QUERIES.get(task, '')])
+        hits = self.context_index.search(query)
+        self.last_retrieval = [{'index': hit['index'], 'score': hit['score']} for hit in hits]
+        if not hits:
+            return None
+        model = Config.get_model_config('analysis')['model']
+        return truncate_tokens('\n\n'.join(hit['text'] for hit in hits), Config.CONTEXT_MAX_TOKENS, model)
+    
+    def _context_for(self, task: str, columns: Sequence[str], text_context: str) -> Optional[str]:
+        """プロンプトに入れる追加テキスト (検索インデックスがあれば関連する段落、なければ要約)"""
+        index = self.context_index
+        if index is not None and index.source_hash == hashlib.sha256(text_context.encode('utf-8')).hexdigest():
+            return self.retrieve_context(task, columns)
+        return self.summarize_context(text_context)
+    
+    def _retrieved_section(self, task: str, columns: Optional[Sequence[str]] = None) -> str:
+        """検索インデックスから取得した段落のプロンプトの節 (なければ空)"""
+        retrieved = self.retrieve_context(task, columns)
+        return f"\n関連するテキスト情報:\n{retrieved}\n" if retrieved else ""
+    
+    def _analysis_request(self, data_info: Dict[str, Any], data_sample: str,
+                          text_context: Optional[str] = None,
+                          custom_prompt: Optional[str] = None) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """データ分析のモデル設定とメッセージ"""
+        model_config = Config.get_model_config('analysis')
+        self.context_columns = list(data_info['basic_info'].get('columns', []))
+        if text_context and not custom_prompt:
+            text_context = self._context_for('analysis', self.context_columns, text_context)
+        if custom_prompt:
+            prompt = custom_prompt
+            tokens = AnalysisPromptBuilder(model_config['model']).count_tokens(prompt)
+            self.last_prompt_report = {'tokens': tokens, 'baseline_tokens': tokens, 'saved_tokens': 0}
+        else:
+            # 統計情報をトークン予算に収めたプロンプト
+            prompt, self.last_prompt_report = AnalysisPromptBuilder(model_config['model']).build(
+                data_info, data_sample, text_context
+            )
+        
+        return model_config, [
+            {
+                "role": "system",
+                "content": "あなたは企業データ分析の専門家です。データを詳しく分析し、ビジネス価値のある洞察を提供してください。"
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
     
     def analyze_data_with_ai(self, data_info: Dict[str, Any], 
                            data_sample: str,
@@ -39,88 +456,56 @@ class AIAnalyzer:
         Returns:
             分析結果テキスト
         """
-        # テキストデータがある場合は含める
-        context_text = ""
-        if text_context:
-            context_text = f"\n\n追加のテキスト情報:\n{text_context[:1000]}..."
-        
-        default_prompt = f"""
-以下は企業データの分析結果です。このデータを詳しく分析し、ビジネス観点から重要な洞察を提供してください。
-
-データの基本情報:
-- 行数: {data_info['basic_info']['shape'][0]}
-- 列数: {data_info['basic_info']['shape'][1]}
-- 列名: {data_info['basic_info']['columns']}
-- データ型: {data_info['basic_info']['data_types']}
-- 欠損値: {data_info['basic_info']['missing_values']}
-
-データサンプル:
-{data_sample}
-
-数値データの統計:
-{json.dumps(data_info['numeric_summary'], indent=2, ensure_ascii=False)}
-
-カテゴリデータの統計:
-{json.dumps(data_info['categorical_summary'], indent=2, ensure_ascii=False)}
-
-{context_text}
-
-以下の観点から分析してください:
-1. データの特徴と品質
-2. 主要な傾向とパターン
-3. 異常値や注目すべき点
-4. ビジネス上の意味と示唆
-5. 推奨される可視化方法
-6. データドリブンな意思決定のための提言
-"""
-        
-        prompt = custom_prompt or default_prompt
-        model_config = Config.get_model_config('analysis')
+        model_config, messages = self._analysis_request(data_info, data_sample, text_context, custom_prompt)
         
         try:
-            response = self.client.chat.completions.create(
-                model=model_config['model'],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "あなたは企業データ分析の専門家です。データを詳しく分析し、ビジネス価値のある洞察を提供してください。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=model_config['max_tokens'],
-                temperature=model_config['temperature']
-            )
-            
-            return response.choices[0].message.content
+            return self._chat(model_config, messages, call='analysis', hedge=True)
             
         except Exception as e:
             print(f"AI分析エラー: {e}")
             return None
     
-    def analyze_visualization_insights(self, data_info: Dict[str, Any], 
-                                     visualization_paths: Dict[str, str]) -> Optional[str]:
+    def stream_data_analysis(self, data_info: Dict[str, Any], 
+                             data_sample: str,
+                             text_context: Optional[str] = None,
+                             custom_prompt: Optional[str] = None) -> Iterator[str]:
         """
-        可視化結果からインサイトを分析
+        AIを使用したデータ分析 (生成されたテキストを順次返す)
         
         Args:
             data_info: データの基本情報
-            visualization_paths: 可視化ファイルパス
+            data_sample: データサンプル
+            text_context: 追加のテキストコンテキスト
+            custom_prompt: カスタムプロンプト
             
-        Returns:
-            分析結果テキスト
+        Yields:
+            分析結果テキストの断片
+            
+        Raises:
+            Exception: 応答の生成に失敗した場合 (途中まで返した断片は不完全な結果)
         """
+        model_config, messages = self._analysis_request(data_info, data_sample, text_context, custom_prompt)
+        
+        try:
+            yield from self._chat_stream(model_config, messages, call='analysis')
+            
+        except Exception as e:
+            print(f"AI分析エラー: {e}")
+            raise
+    
+    def _visualization_request(self, data_info: Dict[str, Any],
+                               visualization_paths: Dict[str, str]) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """可視化インサイト分析のモデル設定とメッセージ"""
+        self.context_columns = list(data_info.get('basic_info', {}).get('columns', []))
         prompt = f"""
 以下のデータを分析して、可視化グラフから読み取れる重要なビジネスインサイトを提供してください：
 
 データの基本情報:
-{json.dumps(data_info, indent=2, ensure_ascii=False)}
+{json.dumps(data_info, indent=2, ensure_ascii=False, default=str)}
 
 作成された可視化:
 {list(visualization_paths.keys())}
-
+{self._retrieved_section('visualization')}
 以下の観点から分析してください:
 1. グラフから読み取れる主要なトレンドやパターン
 2. 異常値や注目すべきデータポイント
@@ -130,46 +515,69 @@ class AIAnalyzer:
 6. 可視化から導かれる具体的なアクション
 """
         
-        model_config = Config.get_model_config('analysis')
+        return Config.get_model_config('analysis'), [
+            {
+                "role": "system",
+                "content": "あなたは企業データ分析の専門家です。可視化されたデータから重要なビジネスインサイトを抽出してください。"
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    def analyze_visualization_insights(self, data_info: Dict[str, Any], 
+                                     visualization_paths: Dict[str, str]) -> Optional[str]:
+        """
+        可視化結果からインサイトを分析
         
-        try:
-            response = self.client.chat.completions.create(
-                model=model_config['model'],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "あなたは企業データ分析の専門家です。可視化されたデータから重要なビジネスインサイトを抽出してください。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=model_config['max_tokens'],
-                temperature=model_config['temperature']
-            )
+        Args:
+            data_info: データの基本情報
+            visualization_paths: 可視化ファイルパス
             
-            return response.choices[0].message.content
+        Returns:
+            分析結果テキスト
+        """
+        model_config, messages = self._visualization_request(data_info, visualization_paths)
+        
+        try:
+            return self._chat(model_config, messages, call='visualization_insights', hedge=True)
             
         except Exception as e:
             print(f"可視化インサイト分析エラー: {e}")
             return None
     
-    def generate_business_strategy(self, all_analysis: str) -> Optional[str]:
+    def stream_visualization_insights(self, data_info: Dict[str, Any], 
+                                      visualization_paths: Dict[str, str]) -> Iterator[str]:
         """
-        ビジネス戦略を生成
+        可視化結果からインサイトを分析 (生成されたテキストを順次返す)
         
         Args:
-            all_analysis: 全分析結果
+            data_info: データの基本情報
+            visualization_paths: 可視化ファイルパス
             
-        Returns:
-            戦略提案テキスト
+        Yields:
+            分析結果テキストの断片
+            
+        Raises:
+            Exception: 応答の生成に失敗した場合 (途中まで返した断片は不完全な結果)
         """
+        model_config, messages = self._visualization_request(data_info, visualization_paths)
+        
+        try:
+            yield from self._chat_stream(model_config, messages, call='visualization_insights')
+            
+        except Exception as e:
+            print(f"可視化インサイト分析エラー: {e}")
+            raise
+    
+    def _strategy_request(self, all_analysis: str) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """ビジネス戦略生成のモデル設定とメッセージ"""
         prompt = f"""
 以下の企業データ分析結果を基に、具体的なビジネス戦略と次に取るべき行動を提案してください：
 
 {all_analysis}
-
+{self._retrieved_section('strategy')}
 以下の項目で詳細な提案を作成してください:
 
 1. 現状の課題・機会の特定
@@ -185,34 +593,61 @@ class AIAnalyzer:
 また、各提案項目に対して実装の優先度（高・中・低）を明記してください。
 """
         
-        model_config = Config.get_model_config('strategy')
+        return Config.get_model_config('strategy'), [
+            {
+                "role": "system",
+                "content": "あなたは企業戦略コンサルタントです。データ分析結果から実践的で具体的なビジネス戦略を提案してください。"
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    def generate_business_strategy(self, all_analysis: str) -> Optional[str]:
+        """
+        ビジネス戦略を生成
         
-        try:
-            response = self.client.chat.completions.create(
-                model=model_config['model'],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "あなたは企業戦略コンサルタントです。データ分析結果から実践的で具体的なビジネス戦略を提案してください。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=model_config['max_tokens'],
-                temperature=model_config['temperature']
-            )
+        Args:
+            all_analysis: 全分析結果
             
-            return response.choices[0].message.content
+        Returns:
+            戦略提案テキスト
+        """
+        model_config, messages = self._strategy_request(all_analysis)
+        
+        try:
+            return self._chat(model_config, messages, call='business_strategy', hedge=True)
             
         except Exception as e:
             print(f"戦略生成エラー: {e}")
             return None
     
-    def process_individual_rows(self, data_series, prompt_template: str) -> str:
+    def stream_business_strategy(self, all_analysis: str) -> Iterator[str]:
         """
-        個別行の処理
+        ビジネス戦略を生成 (生成されたテキストを順次返す)
+        
+        Args:
+            all_analysis: 全分析結果
+            
+        Yields:
+            戦略提案テキストの断片
+            
+        Raises:
+            Exception: 応答の生成に失敗した場合 (途中まで返した断片は不完全な結果)
+        """
+        model_config, messages = self._strategy_request(all_analysis)
+        
+        try:
+            yield from self._chat_stream(model_config, messages, call='business_strategy')
+            
+        except Exception as e:
+            print(f"戦略生成エラー: {e}")
+            raise
+    
+    def process_row(self, data_series, prompt_template: str) -> str:
+        """
+        個別行の処理 (失敗した場合は例外を送出)
         
         Args:
             data_series: 処理対象のデータ
@@ -220,24 +655,158 @@ class AIAnalyzer:
             
         Returns:
             処理結果テキスト
+            
+        Raises:
+            Exception: API 呼び出しに失敗した場合
         """
         prompt = prompt_template.format(data=data_series)
         model_config = Config.get_model_config('processing')
+        return self._chat(model_config, [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ], call='row')
+    
+    def process_individual_rows(self, data_series, prompt_template: str) -> str:
+        """
+        個別行の処理
         
-        try:
-            response = self.client.chat.completions.create(
-                model=model_config['model'],
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=model_config['max_tokens'],
-                temperature=model_config['temperature']
-            )
+        Args:
+            data_series: 処理対象のデータ
+            prompt_template: プロンプトテンプレート
             
-            return response.choices[0].message.content
+        Returns:
+            処理結果テキスト (失敗した場合は「処理エラー: ...」)
+        """
+        try:
+            return self.process_row(data_series, prompt_template)
             
         except Exception as e:
             return f"処理エラー: {e}"
+    
+    def process_rows_concurrently(self, values: Sequence, prompt_template: str,
+                                  progress: Optional[Callable[[int, int], None]] = None,
+                                  on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        複数行を並行処理 (同時実行数と RPM/TPM の上限は設定値)
+        
+        Args:
+            values: 行ごとの処理対象データ
+            prompt_template: プロンプトテンプレート
+            progress: 完了件数と全件数を受け取る関数
+            on_result: 1件完了するごとに行位置と結果を受け取る関数
+            
+        Returns:
+            入力と同じ順番の結果リスト (output, error, tokens, latency, cached)
+        """
+        processor = AsyncRowProcessor(api_key=self.api_key, cache=self.cache, transport=self.transport,
+                                      client_factory=lambda: self.pool.async_client(self.api_key),
+                                      telemetry=self.telemetry)
+        return processor.run(values, prompt_template, progress, on_result)
+    
+    def process_rows_cascade(self, values: Sequence, prompt_template: str,
+                             progress: Optional[Callable[[int, int], None]] = None,
+                             on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                             cascade: Optional[ModelCascade] = None,
+                             validator: Optional[Callable[[str], bool]] = None) -> List[Dict[str, Any]]:
+        """
+        複数行を安いモデルから順に並行処理 (処理の内容は last_cascade_report)
+        
+        Args:
+            values: 行ごとの処理対象データ
+            prompt_template: プロンプトテンプレート
+            progress: 確定件数と全件数を受け取る関数
+            on_result: 1件確定するごとに行位置と結果を受け取る関数
+            cascade: モデルの順番と切り替えの条件 (省略時は設定値)
+            validator: 回答を受け取って採用できるかを返す関数 (cascade を省略した場合に使う)
+            
+        Returns:
+            入力と同じ順番の結果リスト (output, error, tokens, latency, model, stage, cost)
+        """
+        if cascade is None:
+            cascade = ModelCascade(validator=validator, processor_factory=lambda model: AsyncRowProcessor(
+                api_key=self.api_key, transport=self.transport, model=model, logprobs=True,
+                client_factory=lambda: self.pool.async_client(self.api_key), telemetry=self.telemetry))
+        results = cascade.run(values, prompt_template, progress, on_result)
+        self.last_cascade_report = cascade.last_report
+        return results
+    
+    def process_rows_packed(self, values: Sequence, prompt_template: str,
+                            progress: Optional[Callable[[int, int], None]] = None,
+                            packer: Optional[RowPacker] = None,
+                            on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        複数行を1つのプロンプトにまとめて処理
+        
+        回答が壊れている・途中で切れている場合は、回答できた行だけを採用し、
+        残りの行をまとめ直して再送する。1行も対応付けられなかったまとまりは
+        半分に分けて再送し、1行になったものは通常の行処理で実行する。
+        
+        Args:
+            values: 行ごとの処理対象データ
+            prompt_template: プロンプトテンプレート
+            progress: 完了件数と全件数を受け取る関数
+            packer: まとめ方の設定 (省略時は設定値)
+            on_result: 1件完了するごとに行位置と結果を受け取る関数
+            
+        Returns:
+            入力と同じ順番の結果リスト (output, error, batch_size)
+        """
+        packer = packer or RowPacker()
+        total = len(values)
+        results: List[Optional[Dict[str, Any]]] = [None] * total
+        pending = packer.plan(values, prompt_template)
+        completed = 0
+        
+        def finish(position: int, output: Optional[str], error: Optional[str], batch_size: int):
+            nonlocal completed
+            results[position] = {'output': output, 'error': error, 'batch_size': batch_size}
+            completed += 1
+            if on_result:
+                on_result(position, results[position])
+            if progress:
+                progress(completed, total)
+        
+        while pending:
+            batch = pending.pop(0)
+            if len(batch) == 1:
+                position = batch[0]
+                try:
+                    output = self._chat(packer.model_config, [
+                        {
+                            "role": "user",
+                            "content": prompt_template.format(data=values[position])
+                        }
+                    ], call='row')
+                    finish(position, output, None, 1)
+                except Exception as e:
+                    finish(position, None, str(e), 1)
+                continue
+            
+            try:
+                content = self._chat(
+                    packer.model_config_for(len(batch)),
+                    packer.build_messages([values[p] for p in batch], prompt_template),
+                    call='packed_rows'
+                )
+            except Exception as e:
+                # API エラーは分割しても解消しないので、まとめてエラーにする
+                for position in batch:
+                    finish(position, None, str(e), len(batch))
+                continue
+            
+            answers = parse_packed_response(content, len(batch))
+            for key, output in answers.items():
+                finish(batch[key], output, None, len(batch))
+            missing = [position for key, position in enumerate(batch) if key not in answers]
+            if not missing:
+                continue
+            if answers:
+                retry = [missing]
+            else:
+                half = len(batch) // 2
+                retry = [batch[:half], batch[half:]]
+            pending[:0] = retry
+        
+        return results
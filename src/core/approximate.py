@@ -0,0 +1,566 @@
+"""
+近似分析モジュール
+
+無作為に並べた行順の先頭 (単純無作為抽出)、または層 (例: Industry × Region)
+ごとに無作為に並べた行順の先頭 (比例配分の層別抽出) を標本とし、
+analyze_data_structure / get_correlation_analysis に相当する統計量を
+信頼区間付きで推定する。標本が小さすぎる統計量には sufficient=False を付ける。
+
+抽出率を上げても標本は入れ子になるため、ProgressiveAnalysis は
+バックグラウンドで抽出率を段階的に上げて全行 (厳密解) まで精緻化できる。
+抽出率1では有限母集団修正により区間幅が0になり、厳密解と一致する。
+
+区間の計算方法:
+- 平均: 層別推定量の分散による正規近似
+- 標準偏差: 尖度で補正した分散の対数のデルタ法 (正規分布を仮定しない)
+- 分位点: Woodruff 法 (分布関数の区間を分位点に逆変換)
+- 件数・割合: 設計効果で補正した有効標本数による Wilson 区間 (推定量の分散が0なら幅0)
+- 相関係数: Fisher の z 変換
+- 最小値・最大値・ユニーク数: 標本値は片側の限界としてのみ報告
+"""
+
+import threading
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Callable
+from .config import Config
+from .profiler import QUANTILES, QUANTILE_LABELS, TOP_VALUES
+from .correlation import _pairwise_block, extract_strong_pairs
+
+
+def _float(value) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else float(value)
+
+
+def _interval(estimate, lower, upper, n: int, sufficient: bool) -> Dict[str, Any]:
+    """統計量1つ分の推定値と区間"""
+    return {
+        'estimate': _float(estimate),
+        'lower': _float(lower),
+        'upper': _float(upper),
+        'n': int(n),
+        'sufficient': bool(sufficient)
+    }
+
+
+def weighted_quantile(values: np.ndarray, weights: np.ndarray, qs) -> np.ndarray:
+    """
+    重み付き分位点 (昇順に並んだ値が前提)
+
+    各値の位置を (累積重み - 自身の重み) / (総重み - 末尾の重み) とする線形補間で、
+    重みが等しい場合は numpy.quantile(method='linear') と一致する。
+
+    Args:
+        values: 昇順の値
+        weights: 各値の重み
+        qs: 分位 (0-1)
+
+    Returns:
+        分位点の配列
+    """
+    qs = np.asarray(qs, dtype=np.float64)
+    if len(values) == 0:
+        return np.full(qs.shape, np.nan)
+    cumulative = np.cumsum(weights)
+    denominator = cumulative[-1] - weights[-1]
+    if denominator <= 0:
+        return np.full(qs.shape, values[0], dtype=np.float64)
+    return np.interp(qs, (cumulative - weights) / denominator, values)
+
+
+def wilson_interval(p: np.ndarray, n: np.ndarray, z: float):
+    """
+    割合の Wilson 区間
+
+    Args:
+        p: 割合
+        n: (有効) 標本数
+        z: 正規分位点
+
+    Returns:
+        (下限, 上限)
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denominator = 1 + z * z / n
+        center = (p + z * z / (2 * n)) / denominator
+        half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return np.clip(center - half, 0.0, 1.0), np.clip(center + half, 0.0, 1.0)
+
+
+class SamplePlan:
+    """入れ子になる抽出計画 (層ごとに無作為に並べた行順)"""
+
+    def __init__(self, df: pd.DataFrame, strata: Optional[List[str]] = None, seed: int = 0):
+        """
+        初期化
+
+        Args:
+            df: 母集団のDataFrame
+            strata: 層を決める列 (省略時は単純無作為抽出)
+            seed: 乱数シード
+        """
+        n_rows = len(df)
+        self.strata = list(strata) if strata else []
+        permutation = np.random.default_rng(seed).permutation(n_rows)
+        if self.strata:
+            codes = df.groupby(self.strata, sort=False, dropna=False).ngroup().to_numpy()
+        else:
+            codes = np.zeros(n_rows, dtype=np.int64)
+        codes = codes[permutation]
+        # 層の中では無作為順のまま層ごとに並べる
+        order = np.argsort(codes, kind='stable')
+        self.rows = permutation[order]
+        self.stratum = codes[order]
+        self.population = np.bincount(codes, minlength=1 if n_rows == 0 else 0)
+        offsets = np.concatenate([[0], np.cumsum(self.population)[:-1]])
+        self.rank = np.arange(n_rows) - offsets[self.stratum]
+
+    def allocate(self, sample_rows: int) -> np.ndarray:
+        """
+        層ごとの標本数 (比例配分、分散推定のため各層2行以上)
+
+        Args:
+            sample_rows: 全体の標本行数の目安
+
+        Returns:
+            層ごとの標本数
+        """
+        total = len(self.rows)
+        fraction = min(1.0, sample_rows / total) if total else 1.0
+        allocation = np.ceil(fraction * self.population).astype(np.int64)
+        return np.minimum(self.population, np.maximum(allocation, 2))
+
+    def select(self, sample_rows: int):
+        """
+        標本を選ぶ
+
+        Args:
+            sample_rows: 全体の標本行数の目安
+
+        Returns:
+            (行位置, 各行の層番号, 層ごとの標本数) (行位置は層順)
+        """
+        allocation = self.allocate(sample_rows)
+        take = self.rank < allocation[self.stratum]
+        return self.rows[take], self.stratum[take], allocation
+
+
+class _Design:
+    """標本の層構造と推定量の計算"""
+
+    def __init__(self, stratum: np.ndarray, sample_sizes: np.ndarray, population: np.ndarray):
+        self.stratum = stratum
+        self.sample_sizes = sample_sizes.astype(np.float64)
+        self.population = population.astype(np.float64)
+        self.total = float(population.sum())
+        self.starts = np.concatenate([[0], np.cumsum(sample_sizes)[:-1]]).astype(np.int64)
+        self.weights = (self.population / self.sample_sizes)[stratum]
+        self.fpc = 1.0 - self.sample_sizes / self.population
+        self.exact = bool((self.fpc == 0).all())
+
+    def strata_sums(self, values: np.ndarray) -> np.ndarray:
+        """(標本行 x 列) の値を層ごとに合計 (層 x 列)"""
+        return np.add.reduceat(values, self.starts, axis=0)
+
+    def proportion(self, indicator: np.ndarray):
+        """
+        指示変数 (標本行 x 列) の母集団割合と分散
+
+        Returns:
+            (割合, 割合の分散)
+        """
+        n_h = self.sample_sizes[:, None]
+        p_h = self.strata_sums(indicator.astype(np.float64)) / n_h
+        share = (self.population / self.total)[:, None]
+        p = (share * p_h).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            within = np.where(n_h > 1, self.fpc[:, None] * p_h * (1 - p_h) / (n_h - 1), 0.0)
+        return p, (share ** 2 * within).sum(axis=0)
+
+    def proportion_interval(self, p: np.ndarray, variance: np.ndarray, n: int, z: float):
+        """設計効果で補正した有効標本数による Wilson 区間"""
+        if self.exact:
+            return p, p
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n_eff = np.where(variance > 0, p * (1 - p) / variance, n)
+        lower, upper = wilson_interval(p, n_eff, z)
+        # 層内の値がすべて同じ (全数の層を含む) なら推定量は変わらないので幅0
+        constant = variance <= 0
+        return np.where(constant, p, lower), np.where(constant, p, upper)
+
+    def means(self, block: np.ndarray):
+        """
+        数値ブロックの層別平均
+
+        Returns:
+            (平均, 平均の分散, 層ごとの有効件数 (層 x 列))
+        """
+        valid = ~np.isnan(block)
+        counts = self.strata_sums(valid.astype(np.float64))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            strata_means = self.strata_sums(np.where(valid, block, 0.0)) / counts
+            deviation = np.where(valid, block - strata_means[self.stratum], 0.0)
+            variances = np.where(counts > 1, self.strata_sums(deviation ** 2) / (counts - 1), 0.0)
+            # 欠損は層内で無作為とみなし、層の有効値の母集団件数を推定する
+            sizes = self.population[:, None] * counts / self.sample_sizes[:, None]
+            shares = sizes / sizes.sum(axis=0)
+            mean = np.nansum(shares * strata_means, axis=0)
+            variance = np.nansum(shares ** 2 * self.fpc[:, None] * variances / counts, axis=0)
+        mean[counts.sum(axis=0) == 0] = np.nan
+        return mean, variance, counts
+
+
+class ApproximateAnalyzer:
+    """標本による近似分析クラス"""
+
+    def __init__(self, df: pd.DataFrame, strata: Optional[List[str]] = None,
+                 confidence: Optional[float] = None, min_sample: Optional[int] = None,
+                 seed: int = 0):
+        """
+        初期化
+
+        Args:
+            df: 分析対象のDataFrame
+            strata: 層別抽出に使う列 (例: ['Industry', 'Region'])
+            confidence: 信頼係数
+            min_sample: これ未満の標本数の統計量を標本不足とする
+            seed: 乱数シード
+        """
+        self.df = df
+        self.confidence = confidence or Config.APPROX_CONFIDENCE
+        self.min_sample = Config.APPROX_MIN_SAMPLE if min_sample is None else min_sample
+        self.z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        self.plan = SamplePlan(df, strata, seed)
+        self.numeric_columns = list(df.select_dtypes(include=[np.number]).columns)
+        self.categorical_columns = list(df.select_dtypes(include=['object', 'string']).columns)
+
+    def analyze(self, sample_rows: Optional[int] = None, include_correlation: bool = True,
+                threshold: Optional[float] = None) -> Dict[str, Any]:
+        """
+        標本から近似分析を実行
+
+        Args:
+            sample_rows: 標本行数の目安
+            include_correlation: 強い相関の推定を含めるかどうか
+            threshold: 強い相関とみなす絶対値の閾値
+
+        Returns:
+            sampling, basic_info, numeric_summary, categorical_summary,
+            correlation, insufficient を含む辞書 (各統計量は estimate/lower/upper/n/sufficient)
+        """
+        if len(self.df) == 0:
+            return {}
+        sample_rows = sample_rows or Config.APPROX_SAMPLE_ROWS
+        positions, stratum, allocation = self.plan.select(sample_rows)
+        sample = self.df.iloc[positions]
+        design = _Design(stratum, allocation, self.plan.population)
+        population = len(self.df)
+
+        missing = self._missing_values(sample, design)
+        numeric_summary = self._numeric_summary(sample, design)
+        categorical_summary = self._categorical_summary(sample, design)
+        result = {
+            'sampling': {
+                'method': 'stratified' if self.plan.strata else 'random',
+                'strata': list(self.plan.strata),
+                'population_rows': population,
+                'sample_rows': len(positions),
+                'fraction': len(positions) / population,
+                'confidence': self.confidence,
+                'exact': design.exact
+            },
+            'basic_info': {
+                'shape': self.df.shape,
+                'columns': list(self.df.columns),
+                'data_types': self.df.dtypes.to_dict(),
+                'missing_values': missing
+            },
+            'numeric_summary': numeric_summary,
+            'categorical_summary': categorical_summary
+        }
+        if include_correlation:
+            result['correlation'] = self._correlation(sample, design, threshold)
+        result['insufficient'] = insufficient_statistics(result)
+        result['sampling']['max_relative_width'] = max_relative_width(result)
+        return result
+
+    def _missing_values(self, sample: pd.DataFrame, design: _Design) -> Dict[str, Dict[str, Any]]:
+        n = len(sample)
+        p, variance = design.proportion(sample.isna().to_numpy())
+        lower, upper = design.proportion_interval(p, variance, n, self.z)
+        total = design.total
+        sufficient = n >= self.min_sample
+        return {
+            col: _interval(p[j] * total, lower[j] * total, upper[j] * total, n, sufficient)
+            for j, col in enumerate(self.df.columns)
+        }
+
+    def _numeric_summary(self, sample: pd.DataFrame, design: _Design) -> Dict[str, Dict[str, Any]]:
+        if not self.numeric_columns:
+            return {}
+        block = sample[self.numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(block)
+        n_valid = valid.sum(axis=0)
+        mean, mean_variance, counts = design.means(block)
+        mean_se = np.sqrt(mean_variance)
+        p_valid, p_variance = design.proportion(valid)
+        count_lower, count_upper = design.proportion_interval(p_valid, p_variance, len(sample), self.z)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sizes = design.population[:, None] * counts / design.sample_sizes[:, None]
+            shares = sizes / sizes.sum(axis=0)
+            # 分布関数の推定値の分散係数 (Woodruff 法で q(1-q) に掛ける)
+            cdf_factor = np.nansum(shares ** 2 * design.fpc[:, None] / counts, axis=0)
+
+        summary = {}
+        for j, col in enumerate(self.numeric_columns):
+            n = int(n_valid[j])
+            sufficient = n >= self.min_sample
+            values = block[valid[:, j], j]
+            weights = design.weights[valid[:, j]]
+            order = np.argsort(values, kind='stable')
+            values, weights = values[order], weights[order]
+            entry = {
+                'count': _interval(p_valid[j] * design.total, count_lower[j] * design.total,
+                                   count_upper[j] * design.total, len(sample), sufficient),
+                'mean': _interval(mean[j], mean[j] - self.z * mean_se[j],
+                                  mean[j] + self.z * mean_se[j], n, sufficient),
+                'std': self._std_interval(values, weights, mean[j], n),
+                'min': _interval(values[0] if n else np.nan, values[0] if design.exact and n else None,
+                                 values[0] if n else np.nan, n, sufficient)
+            }
+            point = weighted_quantile(values, weights, QUANTILES)
+            qs = np.asarray(QUANTILES)
+            se = np.sqrt(qs * (1 - qs) * cdf_factor[j])
+            lower = weighted_quantile(values, weights, np.clip(qs - self.z * se, 0, 1))
+            upper = weighted_quantile(values, weights, np.clip(qs + self.z * se, 0, 1))
+            for k, label in enumerate(QUANTILE_LABELS):
+                entry[label] = _interval(point[k], lower[k], upper[k], n, sufficient)
+            entry['max'] = _interval(values[-1] if n else np.nan, values[-1] if n else np.nan,
+                                     values[-1] if design.exact and n else None, n, sufficient)
+            summary[col] = entry
+        return summary
+
+    def _std_interval(self, values: np.ndarray, weights: np.ndarray, mean: float,
+                      n: int) -> Dict[str, Any]:
+        """
+        重み付き標準偏差と区間
+
+        標本分散の分散 (μ4 - σ⁴(n-3)/(n-1)) / n を標本の尖度で推定し、分散の対数の
+        正規近似の区間を標準偏差に戻す。カイ二乗近似と違い、歪んだ・裾の重い分布でも
+        区間が狭くなりすぎない。
+        """
+        total_weight = weights.sum()
+        if n < 2 or total_weight <= 1:
+            return _interval(np.nan, None, None, n, False)
+        deviation = (values - mean) ** 2
+        m2 = (weights * deviation).sum() / total_weight
+        std = np.sqrt(m2 * total_weight / (total_weight - 1))
+        if m2 <= 0:
+            return _interval(std, std, std, n, n >= self.min_sample)
+        kurtosis = (weights * deviation ** 2).sum() / total_weight / (m2 * m2)
+        log_se = np.sqrt(max(kurtosis - (n - 3) / (n - 1), 0.0) / n)
+        # 抽出率に応じて区間を縮める (全数では幅0)
+        half = self.z * log_se * np.sqrt(max(0.0, 1 - n / total_weight)) / 2
+        return _interval(std, std * np.exp(-half), std * np.exp(half), n, n >= self.min_sample)
+
+    def _categorical_summary(self, sample: pd.DataFrame, design: _Design) -> Dict[str, Dict[str, Any]]:
+        summary = {}
+        n = len(sample)
+        n_strata = len(design.sample_sizes)
+        for col in self.categorical_columns:
+            codes, uniques = pd.factorize(sample[col])
+            k = len(uniques)
+            present = codes >= 0
+            table = np.bincount(design.stratum[present] * k + codes[present],
+                                minlength=n_strata * k).reshape(n_strata, k).astype(np.float64)
+            share = design.population / design.total
+            n_h = design.sample_sizes[:, None]
+            p_h = table / n_h
+            p = (share[:, None] * p_h).sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                within = np.where(n_h > 1, design.fpc[:, None] * p_h * (1 - p_h) / (n_h - 1), 0.0)
+            variance = (share[:, None] ** 2 * within).sum(axis=0)
+            order = np.argsort(-p, kind='stable')[:TOP_VALUES]
+            lower, upper = design.proportion_interval(p[order], variance[order], n, self.z)
+            sufficient = n >= self.min_sample
+            summary[col] = {
+                'unique_values': _interval(k, k, k if design.exact else None, n, sufficient),
+                'top_values': {
+                    uniques[i]: _interval(p[i] * design.total, lower[r] * design.total,
+                                          upper[r] * design.total, n, sufficient)
+                    for r, i in enumerate(order)
+                }
+            }
+        return summary
+
+    def _correlation(self, sample: pd.DataFrame, design: _Design,
+                     threshold: Optional[float]) -> Dict[str, Any]:
+        """
+        強い相関の推定 (Fisher の z 変換による区間)
+
+        比例配分の標本はほぼ自己加重になるため、相関は標本から直接計算する。
+        certain は区間全体が閾値を超えている場合に True。
+        """
+        if len(self.numeric_columns) < 2:
+            return {}
+        if threshold is None:
+            threshold = Config.CORRELATION_THRESHOLD
+        block = sample[self.numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(block)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centered = block - np.nanmean(block, axis=0)
+        matrix = np.clip(_pairwise_block(centered, centered), -1.0, 1.0)
+        pair_counts = valid.T.astype(np.float64) @ valid.astype(np.float64)
+        i, j, values = extract_strong_pairs(matrix, threshold)
+        order = np.lexsort((j, i))
+        shrink = np.sqrt(max(0.0, 1 - len(sample) / design.total))
+
+        strong = []
+        for a, b, r in zip(i[order], j[order], values[order]):
+            n = int(pair_counts[a, b])
+            if n > 3:
+                z = np.arctanh(np.clip(r, -0.9999999, 0.9999999))
+                half = self.z / np.sqrt(n - 3) * shrink
+                lower, upper = np.tanh(z - half), np.tanh(z + half)
+            else:
+                lower, upper = -1.0, 1.0
+            strong.append({
+                'variable1': self.numeric_columns[a],
+                'variable2': self.numeric_columns[b],
+                'correlation': _interval(r, lower, upper, n, n >= self.min_sample),
+                'certain': bool(lower > threshold or upper < -threshold)
+            })
+        return {'strong_correlations': strong}
+
+
+def insufficient_statistics(result: Dict[str, Any]) -> List[str]:
+    """
+    標本不足の統計量の一覧
+
+    Args:
+        result: ApproximateAnalyzer.analyze の戻り値
+
+    Returns:
+        '列名.統計量' 形式の名前のリスト
+    """
+    names = []
+    for col, entry in result.get('numeric_summary', {}).items():
+        names.extend(f"{col}.{stat}" for stat, value in entry.items() if not value['sufficient'])
+    for col, entry in result.get('categorical_summary', {}).items():
+        if not entry['unique_values']['sufficient']:
+            names.append(f"{col}.top_values")
+    for pair in result.get('correlation', {}).get('strong_correlations', []):
+        if not pair['correlation']['sufficient']:
+            names.append(f"{pair['variable1']}~{pair['variable2']}.correlation")
+    return names
+
+
+def max_relative_width(result: Dict[str, Any]) -> float:
+    """
+    区間の相対的な半幅の最大値 (収束判定用)
+
+    平均・分位点は標準偏差で、件数は母集団行数で割った半幅を使う。
+    """
+    population = result['sampling']['population_rows']
+    widths = [0.0]
+    for entry in result.get('numeric_summary', {}).values():
+        scale = entry['std']['estimate']
+        for stat in ('mean',) + QUANTILE_LABELS:
+            value = entry[stat]
+            if scale and value['lower'] is not None and value['upper'] is not None:
+                widths.append((value['upper'] - value['lower']) / 2 / scale)
+    for entry in result.get('categorical_summary', {}).values():
+        for value in entry['top_values'].values():
+            widths.append((value['upper'] - value['lower']) / 2 / population)
+    for value in result['basic_info']['missing_values'].values():
+        widths.append((value['upper'] - value['lower']) / 2 / population)
+    return float(max(widths))
+
+
+class ProgressiveAnalysis:
+    """抽出率を段階的に上げて近似分析を精緻化するバックグラウンド処理"""
+
+    def __init__(self, analyzer: ApproximateAnalyzer, initial_rows: Optional[int] = None,
+                 growth: int = 4, tolerance: Optional[float] = None,
+                 include_correlation: bool = True,
+                 callback: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        初期化
+
+        Args:
+            analyzer: 近似分析器
+            initial_rows: 最初の標本行数
+            growth: 段階ごとの標本行数の倍率
+            tolerance: 区間の相対半幅がこれ以下で停止 (省略時は厳密解まで続ける)
+            include_correlation: 強い相関の推定を含めるかどうか
+            callback: 各段階の結果を受け取る関数
+        """
+        self.analyzer = analyzer
+        self.initial_rows = initial_rows or Config.APPROX_SAMPLE_ROWS
+        self.growth = max(2, growth)
+        self.tolerance = tolerance
+        self.include_correlation = include_correlation
+        self.callback = callback
+        self.steps = 0
+        self.error = None
+        self._result = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'ProgressiveAnalysis':
+        """バックグラウンドで精緻化を開始"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        rows = self.initial_rows
+        try:
+            while not self._cancelled.is_set():
+                result = self.analyzer.analyze(rows, self.include_correlation)
+                if not result:
+                    break
+                converged = (self.tolerance is not None
+                             and result['sampling']['max_relative_width'] <= self.tolerance)
+                result['sampling']['converged'] = converged or result['sampling']['exact']
+                with self._lock:
+                    self._result = result
+                    self.steps += 1
+                if self.callback:
+                    self.callback(result)
+                if result['sampling']['converged']:
+                    break
+                rows *= self.growth
+        except Exception as e:
+            self.error = e
+        finally:
+            self._finished.set()
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """最新の結果 (まだなければNone)"""
+        with self._lock:
+            return self._result
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        終了を待つ
+
+        Args:
+            timeout: 最大待ち時間 (秒)
+
+        Returns:
+            終了したかどうか
+        """
+        return self._finished.wait(timeout)
+
+    def cancel(self):
+        """現在の段階の終了後に停止"""
+        self._cancelled.set()
+
+    @property
+    def done(self) -> bool:
+        """終了したかどうか"""
+        return self._finished.is_set()
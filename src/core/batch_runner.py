@@ -0,0 +1,450 @@
+"""
+バッチ API による行処理モジュール
+
+対話的な応答速度が不要な大きな行処理ジョブでは、行ごとのリクエストを
+JSONL のバッチファイルに書き出してプロバイダーのバッチエンドポイントに送る。
+1バッチのリクエスト数とファイルサイズには上限があるため、上限ごとにファイルを分けて
+複数のバッチとして送る。すべてのバッチが終了するまでポーリングし、結果は
+custom_id (行ID) で元の行に対応付ける。
+バッチ API は通常の呼び出しより安価で、対話的な呼び出しのレート制限も消費しない。
+LocalBatchBackend は同じ JSONL 形式を読み書きするローカルの代替で、
+テストやバッチ API のない環境での確認に使う。
+"""
+
+import json
+import os
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Sequence, Callable, Iterator, Tuple
+from .config import Config
+from .transport import LLMTransport
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_COMPLETION_WINDOW = '24h'
+
+# これ以上状態が変わらないバッチの状態
+BATCH_FINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def parse_batch_output(text: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    バッチの出力ファイル (またはエラーファイル) を解析
+
+    Args:
+        text: JSONL の内容
+
+    Returns:
+        {custom_id: {'output', 'error', 'tokens', 'prompt_tokens', 'completion_tokens'}}
+    """
+    results = {}
+    for line in (text or '').splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record.get('custom_id')
+        if custom_id is None:
+            continue
+        response = record.get('response') or {}
+        body = response.get('body') or {}
+        error = record.get('error')
+        if error:
+            message = error.get('message') if isinstance(error, dict) else str(error)
+            results[custom_id] = {'output': None, 'error': message or str(error), 'tokens': 0,
+                                  'prompt_tokens': 0, 'completion_tokens': 0}
+        elif response.get('status_code') != 200:
+            message = (body.get('error') or {}).get('message') or f"status {response.get('status_code')}"
+            results[custom_id] = {'output': None, 'error': message, 'tokens': 0,
+                                  'prompt_tokens': 0, 'completion_tokens': 0}
+        else:
+            usage = body.get('usage') or {}
+            results[custom_id] = {
+                'output': body['choices'][0]['message']['content'],
+                'error': None,
+                'tokens': usage.get('total_tokens') or 0,
+                'prompt_tokens': usage.get('prompt_tokens') or 0,
+                'completion_tokens': usage.get('completion_tokens') or 0
+            }
+    return results
+
+
+class OpenAIBatchBackend:
+    """OpenAI のバッチ API"""
+
+    def __init__(self, client):
+        """
+        初期化
+
+        Args:
+            client: openai.OpenAI クライアント
+        """
+        self.client = client
+
+    def submit(self, path: str) -> str:
+        """
+        バッチファイルをアップロードしてバッチを作成
+
+        Args:
+            path: JSONL ファイル
+
+        Returns:
+            バッチID
+        """
+        with open(path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> Dict[str, Any]:
+        """
+        バッチの状態
+
+        Args:
+            batch_id: バッチID
+
+        Returns:
+            status, output_file_id, error_file_id, completed, failed, total を含む辞書
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            'status': batch.status,
+            'output_file_id': batch.output_file_id,
+            'error_file_id': batch.error_file_id,
+            'completed': counts.completed if counts else 0,
+            'failed': counts.failed if counts else 0,
+            'total': counts.total if counts else 0
+        }
+
+    def download(self, file_id: str) -> str:
+        """結果ファイルの内容"""
+        return self.client.files.content(file_id).text
+
+
+class LocalBatchBackend:
+    """バッチ API と同じ JSONL 形式を読み書きするローカルの代替"""
+
+    def __init__(self, client, directory: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            client: 同期のチャットクライアント (chat.completions.create を持つもの)
+            directory: 出力ファイルの保存先
+        """
+        self.client = client
+        self.directory = directory or Config.BATCH_DIR
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def submit(self, path: str) -> str:
+        """バッチを登録 (実行は最初の状態確認時)"""
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        self.batches[batch_id] = {'input': path, 'status': 'validating'}
+        return batch_id
+
+    def _respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """1件のリクエストを実行して出力ファイルの1行を作る"""
+        line = {'id': f"batch_req_{uuid.uuid4().hex[:12]}", 'custom_id': request['custom_id']}
+        try:
+            response = self.client.chat.completions.create(**request['body'])
+        except Exception as e:
+            line['response'] = None
+            line['error'] = {'code': type(e).__name__, 'message': str(e)}
+            return line
+        usage = getattr(response, 'usage', None)
+        line['response'] = {
+            'status_code': 200,
+            'request_id': line['id'],
+            'body': {
+                'object': 'chat.completion',
+                'model': request['body'].get('model'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': response.choices[0].message.content},
+                    'finish_reason': getattr(response.choices[0], 'finish_reason', 'stop')
+                }],
+                'usage': {name: getattr(usage, name, None)
+                          for name in ('prompt_tokens', 'completion_tokens', 'total_tokens')}
+            }
+        }
+        line['error'] = None
+        return line
+
+    def _run(self, batch_id: str):
+        batch = self.batches[batch_id]
+        with open(batch['input'], encoding='utf-8') as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        lines = [self._respond(request) for request in requests]
+        outputs = [line for line in lines if line['error'] is None]
+        errors = [line for line in lines if line['error'] is not None]
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name, records in (('output_file_id', outputs), ('error_file_id', errors)):
+            if not records:
+                batch[name] = None
+                continue
+            path = os.path.join(self.directory, f"{batch_id}_{name.split('_')[0]}.jsonl")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+            batch[name] = path
+        batch.update(status='completed', completed=len(outputs), failed=len(errors), total=len(lines))
+
+    def status(self, batch_id: str) -> Dict[str, Any]:
+        """バッチの状態 (未実行なら実行する)"""
+        if batch_id not in self.batches:
+            raise KeyError(f"バッチ '{batch_id}' が見つかりません")
+        if self.batches[batch_id]['status'] == 'validating':
+            self._run(batch_id)
+        batch = self.batches[batch_id]
+        return {name: batch.get(name) for name in
+                ('status', 'output_file_id', 'error_file_id', 'completed', 'failed', 'total')}
+
+    def download(self, file_id: str) -> str:
+        """結果ファイルの内容 (ファイルIDはパス)"""
+        with open(file_id, encoding='utf-8') as f:
+            return f.read()
+
+
+class BatchRunner:
+    """行ごとのリクエストをバッチ API で処理するクラス"""
+
+    def __init__(self, backend, model_type: str = 'processing', directory: Optional[str] = None,
+                 poll_interval: Optional[float] = None, timeout: Optional[float] = None,
+                 transport: Optional[LLMTransport] = None, max_requests: Optional[int] = None,
+                 max_file_mb: Optional[float] = None,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        """
+        初期化
+
+        Args:
+            backend: OpenAIBatchBackend または LocalBatchBackend
+            model_type: 使用するモデル設定
+            directory: バッチファイルの保存先
+            poll_interval: 状態を確認する間隔 (秒)
+            timeout: 完了を待つ最大秒数 (0 は完了まで待つ)
+            transport: 再試行・遮断を行う呼び出し層 (省略時は設定値)
+            max_requests: 1バッチのリクエスト数の上限
+            max_file_mb: 1バッチのファイルサイズの上限 (MB)
+            sleep: 待機関数
+            clock: 時刻関数
+        """
+        self.backend = backend
+        self.model_type = model_type
+        self.directory = directory or Config.BATCH_DIR
+        self.poll_interval = Config.BATCH_POLL_SECONDS if poll_interval is None else poll_interval
+        self.timeout = Config.BATCH_TIMEOUT_SECONDS if timeout is None else timeout
+        self.transport = transport or LLMTransport()
+        self.max_requests = Config.BATCH_MAX_REQUESTS if max_requests is None else max_requests
+        max_file_mb = Config.BATCH_MAX_FILE_MB if max_file_mb is None else max_file_mb
+        self.max_bytes = int(max_file_mb * 1024 * 1024)
+        self.sleep = sleep
+        self.clock = clock
+
+    def _call(self, fn: Callable[[], Any]) -> Any:
+        # バッチの操作は対話的な呼び出しとは別のサーキットブレーカーで扱う
+        return self.transport.call('batch', fn)
+
+    def build_messages(self, value, prompt_template: str) -> List[Dict[str, str]]:
+        """1行分のメッセージ (行処理の他の方式と同じ)"""
+        return [{"role": "user", "content": prompt_template.format(data=value)}]
+
+    def _request_lines(self, ids: Sequence[str], values: Sequence,
+                       prompt_template: str) -> Iterator[Tuple[str, str]]:
+        """行ごとのバッチファイルの1行 (custom_id と JSON)"""
+        model_config = Config.get_model_config(self.model_type)
+        for custom_id, value in zip(ids, values):
+            request = {
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': BATCH_ENDPOINT,
+                'body': {
+                    'model': model_config['model'],
+                    'messages': self.build_messages(value, prompt_template),
+                    'max_tokens': model_config['max_tokens'],
+                    'temperature': model_config['temperature']
+                }
+            }
+            yield custom_id, json.dumps(request, ensure_ascii=False, default=str) + '\n'
+
+    def write_requests(self, path: str, ids: Sequence[str], values: Sequence, prompt_template: str) -> int:
+        """
+        バッチファイルを書き出す (上限では分割しない)
+
+        Args:
+            path: 出力先の JSONL ファイル
+            ids: 行ID (custom_id)
+            values: 行ごとの値
+            prompt_template: プロンプトテンプレート
+
+        Returns:
+            リクエスト数
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(line for _, line in self._request_lines(ids, values, prompt_template))
+        return len(ids)
+
+    def write_request_files(self, ids: Sequence[str], values: Sequence, prompt_template: str) -> List[str]:
+        """
+        リクエスト数・ファイルサイズの上限ごとに分けてバッチファイルを書き出す
+
+        Args:
+            ids: 行ID (custom_id)
+            values: 行ごとの値
+            prompt_template: プロンプトテンプレート
+
+        Returns:
+            書き出したファイルのパス (送信する順)
+
+        Raises:
+            ValueError: 1件だけでファイルサイズの上限を超えるリクエストがある場合
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, f"requests_{uuid.uuid4().hex[:12]}")
+        paths: List[str] = []
+        f = None
+        count = size = 0
+        try:
+            for custom_id, line in self._request_lines(ids, values, prompt_template):
+                length = len(line.encode('utf-8'))
+                if self.max_bytes and length > self.max_bytes:
+                    raise ValueError(f"行 {custom_id} のリクエストがバッチのファイルサイズの上限を超えています")
+                if f is None or (self.max_requests and count >= self.max_requests) \
+                        or (self.max_bytes and size + length > self.max_bytes):
+                    if f is not None:
+                        f.close()
+                    paths.append(f"{prefix}_{len(paths):04d}.jsonl")
+                    f = open(paths[-1], 'w', encoding='utf-8')
+                    count = size = 0
+                f.write(line)
+                count += 1
+                size += length
+        finally:
+            if f is not None:
+                f.close()
+        return paths
+
+    def submit(self, ids: Sequence[str], values: Sequence, prompt_template: str,
+               on_submit: Optional[Callable[[str], None]] = None) -> List[str]:
+        """
+        バッチファイルを上限ごとに書き出して送信
+
+        Args:
+            ids: 行ID (custom_id)
+            values: 行ごとの値
+            prompt_template: プロンプトテンプレート
+            on_submit: 送信したバッチIDを1件ずつ受け取る関数 (送信の途中で落ちても記録できる)
+
+        Returns:
+            バッチIDのリスト
+        """
+        batch_ids = []
+        for path in self.write_request_files(ids, values, prompt_template):
+            batch_id = self._call(lambda: self.backend.submit(path))
+            batch_ids.append(batch_id)
+            if on_submit:
+                on_submit(batch_id)
+        return batch_ids
+
+    def wait(self, batch_id: str, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        バッチが終了するまでポーリング
+
+        Args:
+            batch_id: バッチID
+            progress: 終了件数と全件数を受け取る関数
+
+        Returns:
+            終了時の状態
+
+        Raises:
+            TimeoutError: timeout 秒以内に終了しなかった場合 (バッチは処理を続ける)
+        """
+        return self.wait_all([batch_id], progress)[batch_id]
+
+    def wait_all(self, batch_ids: Sequence[str],
+                 progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        すべてのバッチが終了するまでポーリング
+
+        Args:
+            batch_ids: バッチID
+            progress: 全バッチ合計の終了件数と全件数を受け取る関数
+
+        Returns:
+            {バッチID: 終了時の状態}
+
+        Raises:
+            TimeoutError: timeout 秒以内にすべて終了しなかった場合 (バッチは処理を続ける)
+        """
+        started = self.clock()
+        statuses: Dict[str, Dict[str, Any]] = {}
+        while True:
+            for batch_id in batch_ids:
+                if batch_id not in statuses or statuses[batch_id]['status'] not in BATCH_FINAL_STATUSES:
+                    statuses[batch_id] = self._call(lambda: self.backend.status(batch_id))
+            total = sum(status.get('total') or 0 for status in statuses.values())
+            if progress and total:
+                progress(sum((status.get('completed') or 0) + (status.get('failed') or 0)
+                             for status in statuses.values()), total)
+            running = [batch_id for batch_id in batch_ids
+                       if statuses[batch_id]['status'] not in BATCH_FINAL_STATUSES]
+            if not running:
+                return statuses
+            if self.timeout and self.clock() - started >= self.timeout:
+                states = ', '.join(f"{batch_id}: {statuses[batch_id]['status']}" for batch_id in running)
+                raise TimeoutError(f"バッチが {self.timeout:.0f} 秒以内に完了しませんでした ({states})")
+            self.sleep(self.poll_interval)
+
+    def collect(self, status: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        終了したバッチの結果を取得
+
+        期限切れ・取り消しのバッチでも、完了した分の結果は返す。
+
+        Returns:
+            {custom_id: {'output', 'error', 'tokens', 'prompt_tokens', 'completion_tokens'}}
+        """
+        results = {}
+        for name in ('error_file_id', 'output_file_id'):
+            file_id = status.get(name)
+            if file_id:
+                results.update(parse_batch_output(self._call(lambda: self.backend.download(file_id))))
+        return results
+
+    def run(self, values: Sequence, prompt_template: str, ids: Optional[Sequence[str]] = None,
+            batch_ids: Optional[Sequence[str]] = None, on_submit: Optional[Callable[[str], None]] = None,
+            progress: Optional[Callable[[int, int], None]] = None) -> List[Dict[str, Any]]:
+        """
+        全行をバッチで処理
+
+        Args:
+            values: 行ごとの値
+            prompt_template: プロンプトテンプレート
+            ids: 行ID (省略時は並び順の番号)
+            batch_ids: 送信済みのバッチID (指定すると送信せずに結果を待つ)
+            on_submit: 送信したバッチIDを1件ずつ受け取る関数
+            progress: 終了件数と全件数を受け取る関数
+
+        Returns:
+            入力と同じ順番の結果リスト (output, error, tokens, batch_id)
+        """
+        ids = list(ids) if ids is not None else [f"row-{position}" for position in range(len(values))]
+        if len(set(ids)) != len(ids):
+            raise ValueError("行IDが重複しています")
+        if not ids:
+            return []
+        if not batch_ids:
+            batch_ids = self.submit(ids, values, prompt_template, on_submit)
+
+        statuses = self.wait_all(batch_ids, progress)
+        collected = {}
+        for batch_id in batch_ids:
+            for custom_id, result in self.collect(statuses[batch_id]).items():
+                collected[custom_id] = dict(result, batch_id=batch_id)
+        states = ', '.join(sorted({status['status'] for status in statuses.values()}))
+        missing = f"バッチに結果がありません (状態: {states})"
+        return [collected.get(custom_id, {'output': None, 'error': missing, 'tokens': 0, 'batch_id': None})
+                for custom_id in ids]
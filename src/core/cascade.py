@@ -0,0 +1,212 @@
+"""
+行処理のモデルカスケードモジュール
+
+すべての行を1つのモデルで処理する代わりに、安いモデルで全行を処理し、
+エラー・出力の途中切れ・回答形式の検証失敗・信頼度 (出力トークンの確率) の不足に
+当たる行だけを次の上位モデルで再処理する。各段階は AsyncRowProcessor で並行処理する。
+既定のモデルの順番は Config.get_available_models のコストと速度の表示から決める。
+信頼度は呼び出しごとに異なるため、カスケードでは応答キャッシュを使わない
+(再実行時の重複はジョブのジャーナルで省く)。
+"""
+
+import re
+from typing import Dict, Any, List, Optional, Sequence, Callable
+from .config import Config
+from .row_processor import AsyncRowProcessor
+from .telemetry import estimate_cost
+
+# コスト・速度・品質の表示の順位 (小さいほど安い・速い・品質が低い)
+COST_RANKS = {'低': 0, '低-中': 1, '中': 2, '中-高': 3, '高': 4}
+SPEED_RANKS = {'最高': 0, '高': 1, '中': 2, '低': 3}
+QUALITY_RANKS = {'中': 0, '中-高': 1, '高': 2, '最高': 3}
+
+# 上位モデルに切り替えた理由
+ESCALATION_REASONS = ('error', 'truncated', 'invalid', 'low_confidence')
+
+
+def default_cascade(max_stages: Optional[int] = None) -> List[str]:
+    """
+    既定のカスケードのモデルの順番
+
+    利用可能なモデルをコストの安い順 (同じコストは速い順) に並べ、
+    前の段階より品質の表示が高いモデルだけを残す。
+
+    Args:
+        max_stages: 段階数の上限 (省略時は設定値)
+
+    Returns:
+        モデル名のリスト (先頭が最初に使うモデル)
+    """
+    max_stages = max_stages or Config.ROW_CASCADE_MAX_STAGES
+    models = Config.get_available_models()
+    ordered = sorted(
+        (name for name in Config.AVAILABLE_MODELS if name in models),
+        key=lambda name: (COST_RANKS.get(models[name]['cost'], len(COST_RANKS)),
+                          SPEED_RANKS.get(models[name]['speed'], len(SPEED_RANKS)),
+                          -QUALITY_RANKS.get(models[name]['quality'], -1))
+    )
+    cascade: List[str] = []
+    best = -1
+    for name in ordered:
+        quality = QUALITY_RANKS.get(models[name]['quality'], -1)
+        if quality > best:
+            cascade.append(name)
+            best = quality
+    return cascade[:max_stages]
+
+
+def pattern_validator(pattern: str) -> Callable[[str], bool]:
+    """
+    回答全体が正規表現に一致するかを調べる関数を作成
+
+    Args:
+        pattern: 正規表現 (前後の空白は無視する)
+
+    Returns:
+        回答を受け取って一致するかを返す関数
+    """
+    compiled = re.compile(pattern, re.DOTALL)
+    return lambda output: compiled.fullmatch(output.strip()) is not None
+
+
+class ModelCascade:
+    """安いモデルから順に行を処理し、必要な行だけ上位モデルに切り替えるクラス"""
+
+    def __init__(self, models: Optional[List[str]] = None, min_confidence: Optional[float] = None,
+                 validator: Optional[Callable[[str], bool]] = None,
+                 processor_factory: Optional[Callable[[str], AsyncRowProcessor]] = None):
+        """
+        初期化
+
+        Args:
+            models: 使うモデルの順番 (省略時は設定値、設定がなければ default_cascade)
+            min_confidence: 採用する信頼度の下限 (0 は信頼度では切り替えない)
+            validator: 回答を受け取って採用できるかを返す関数 (省略時は空でない回答を採用)
+            processor_factory: モデル名から AsyncRowProcessor を作る関数
+        """
+        self.models = list(models or Config.ROW_CASCADE_MODELS or default_cascade())
+        if not self.models:
+            raise ValueError("カスケードに使うモデルがありません")
+        self.min_confidence = Config.ROW_CASCADE_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.validator = validator
+        self.processor_factory = processor_factory or (
+            lambda model: AsyncRowProcessor(model=model, logprobs=True))
+        self.last_report: Dict[str, Any] = {}
+
+    def escalation_reason(self, outcome: Dict[str, Any]) -> Optional[str]:
+        """
+        上位モデルに切り替える理由
+
+        Args:
+            outcome: AsyncRowProcessor の1行分の結果
+
+        Returns:
+            ESCALATION_REASONS のいずれか (採用する場合はNone)
+        """
+        if outcome['error'] is not None or outcome['output'] is None:
+            return 'error'
+        if outcome.get('finish_reason') == 'length':
+            return 'truncated'
+        if not outcome['output'].strip():
+            return 'invalid'
+        if self.validator is not None:
+            try:
+                if not self.validator(outcome['output']):
+                    return 'invalid'
+            except Exception:
+                return 'invalid'
+        confidence = outcome.get('confidence')
+        if self.min_confidence > 0 and confidence is not None and confidence < self.min_confidence:
+            return 'low_confidence'
+        return None
+
+    def run(self, values: Sequence, prompt_template: str,
+            progress: Optional[Callable[[int, int], None]] = None,
+            on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        全行をカスケードで処理
+
+        最後のモデルの回答は検証に関係なく採用する。ただし最後のモデルがエラーになった行は、
+        前の段階の回答があればそれを使う。処理の内容は last_report に記録する。
+
+        Args:
+            values: 行ごとの値
+            prompt_template: プロンプトテンプレート ({data} に値が入る)
+            progress: 確定した件数と全件数を受け取る関数
+            on_result: 1件確定するごとに行位置と結果を受け取る関数
+
+        Returns:
+            入力と同じ順番の結果リスト (output, error, tokens, latency, model, stage, cost, confidence)
+        """
+        total = len(values)
+        results: List[Optional[Dict[str, Any]]] = [None] * total
+        previous: Dict[int, Dict[str, Any]] = {}
+        spent = [{'cost': 0.0, 'latency': 0.0, 'tokens': 0} for _ in range(total)]
+        baseline = 0.0
+        baseline_known = True
+        stages = []
+        pending = list(range(total))
+        completed = 0
+
+        def finish(position: int, outcome: Dict[str, Any]):
+            nonlocal completed
+            results[position] = dict(outcome, **spent[position])
+            completed += 1
+            if on_result:
+                on_result(position, results[position])
+            if progress:
+                progress(completed, total)
+
+        for stage, model in enumerate(self.models):
+            if not pending:
+                break
+            last = stage == len(self.models) - 1
+            outcomes = self.processor_factory(model).run([values[p] for p in pending], prompt_template)
+            report = {'model': model, 'rows': len(pending), 'accepted': 0, 'escalated': 0,
+                      'reasons': dict.fromkeys(ESCALATION_REASONS, 0), 'cost': 0.0, 'latency': 0.0}
+            escalated = []
+            for position, outcome in zip(pending, outcomes):
+                cost = estimate_cost(model, outcome.get('prompt_tokens', 0), outcome.get('completion_tokens', 0))
+                if stage == 0:
+                    # 全行を最後のモデルで処理した場合の料金 (最初の段階の使用量で推定)
+                    strongest = estimate_cost(self.models[-1], outcome.get('prompt_tokens', 0),
+                                              outcome.get('completion_tokens', 0))
+                    baseline_known = baseline_known and strongest is not None
+                    baseline += strongest or 0.0
+                spent[position]['cost'] += cost or 0.0
+                spent[position]['latency'] += outcome.get('latency', 0.0)
+                spent[position]['tokens'] += outcome.get('tokens', 0)
+                report['cost'] += cost or 0.0
+                report['latency'] += outcome.get('latency', 0.0)
+                outcome = dict(outcome, model=model, stage=stage)
+                reason = self.escalation_reason(outcome)
+                if reason is not None:
+                    report['reasons'][reason] += 1
+                if reason is None or last:
+                    if reason == 'error' and position in previous:
+                        outcome = previous[position]
+                    report['accepted'] += 1
+                    finish(position, outcome)
+                else:
+                    if reason != 'error':
+                        previous[position] = outcome
+                    report['escalated'] += 1
+                    escalated.append(position)
+            stages.append(report)
+            pending = escalated
+
+        escalated_rows = stages[0]['escalated'] if stages else 0
+        cost = sum(report['cost'] for report in stages)
+        self.last_report = {
+            'models': self.models[:len(stages)],
+            'rows': total,
+            'stages': stages,
+            'escalated': escalated_rows,
+            'escalation_rate': escalated_rows / total if total else 0.0,
+            'cost': cost,
+            'cost_per_row': cost / total if total else 0.0,
+            'mean_latency': sum(item['latency'] for item in spent) / total if total else 0.0,
+            'baseline_model': self.models[-1],
+            'baseline_cost': baseline if baseline_known else None
+        }
+        return results
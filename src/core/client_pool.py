@@ -0,0 +1,174 @@
+"""
+OpenAI クライアントの共有モジュール
+
+AIAnalyzer ごとに openai.OpenAI を作ると、Streamlit ではセッションごとに
+接続プールができ、TLS ハンドシェイクが繰り返されて keep-alive の接続も共有されない。
+ここでは HTTP クライアント (接続プール) をプロセスに1つだけ作り、API キーごとの
+OpenAI クライアントをその上に作って、セッションや分析クラスをまたいで使い回す。
+接続数の上限・keep-alive・タイムアウトは設定値で指定し、利用状況は stats で確認できる。
+"""
+
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+import openai
+from .config import Config
+
+try:
+    import httpx
+except ImportError:
+    # openai 3 系は httpx2 を使う
+    import httpx2 as httpx
+
+
+class ClientPool:
+    """HTTP 接続プールを共有する OpenAI クライアントのレジストリ"""
+
+    def __init__(self, max_connections: Optional[int] = None, max_keepalive_connections: Optional[int] = None,
+                 keepalive_expiry: Optional[float] = None, connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            max_connections: 同時接続数の上限
+            max_keepalive_connections: keep-alive で保持する接続数の上限
+            keepalive_expiry: 使われていない接続を保持する秒数
+            connect_timeout: 接続のタイムアウト秒数
+            read_timeout: 応答の読み取り・送信のタイムアウト秒数
+        """
+        self.max_connections = max_connections or Config.HTTP_MAX_CONNECTIONS
+        self.max_keepalive_connections = max_keepalive_connections or Config.HTTP_MAX_KEEPALIVE_CONNECTIONS
+        self.keepalive_expiry = Config.HTTP_KEEPALIVE_EXPIRY_SECONDS if keepalive_expiry is None \
+            else keepalive_expiry
+        self.connect_timeout = connect_timeout or Config.HTTP_CONNECT_TIMEOUT_SECONDS
+        self.read_timeout = read_timeout or Config.HTTP_READ_TIMEOUT_SECONDS
+        self.requests = 0
+        self._http_client = None
+        self._pid = None
+        self._clients: Dict[Tuple[str, Optional[str]], openai.OpenAI] = {}
+        self._lock = threading.Lock()
+
+    def limits(self) -> httpx.Limits:
+        """接続数と keep-alive の設定"""
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections,
+                            keepalive_expiry=self.keepalive_expiry)
+
+    def timeout(self) -> httpx.Timeout:
+        """タイムアウトの設定"""
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    def _count_request(self, request):
+        with self._lock:
+            self.requests += 1
+
+    def http_client(self):
+        """
+        共有の HTTP クライアント
+
+        fork した子プロセスでは親の接続を使わずに作り直す (親の接続は閉じない)。
+        """
+        with self._lock:
+            if self._http_client is None or self._pid != os.getpid():
+                self._http_client = openai.DefaultHttpxClient(
+                    limits=self.limits(),
+                    timeout=self.timeout(),
+                    event_hooks={'request': [self._count_request]}
+                )
+                self._pid = os.getpid()
+                self._clients = {}
+            return self._http_client
+
+    def client(self, api_key: str, base_url: Optional[str] = None) -> openai.OpenAI:
+        """
+        共有の接続プールを使う OpenAI クライアント (同じ API キーには同じクライアントを返す)
+
+        再試行は LLMTransport で行うため、クライアント側の再試行は無効にする。
+
+        Args:
+            api_key: OpenAI API キー
+            base_url: API の URL (省略時は既定)
+
+        Returns:
+            openai.OpenAI
+        """
+        http_client = self.http_client()
+        with self._lock:
+            key = (api_key, base_url)
+            if key not in self._clients:
+                self._clients[key] = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                                   timeout=self.timeout(), http_client=http_client)
+            return self._clients[key]
+
+    def async_client(self, api_key: str, base_url: Optional[str] = None) -> openai.AsyncOpenAI:
+        """
+        同じ上限・タイムアウトの非同期クライアント
+
+        非同期クライアントの接続は実行中のイベントループに結び付くため共有せず、
+        呼び出すたびに作成する。
+
+        Args:
+            api_key: OpenAI API キー
+            base_url: API の URL (省略時は既定)
+
+        Returns:
+            openai.AsyncOpenAI
+        """
+        http_client = openai.DefaultAsyncHttpxClient(limits=self.limits(), timeout=self.timeout())
+        return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                  timeout=self.timeout(), http_client=http_client)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        接続プールの利用状況
+
+        Returns:
+            clients, requests, connections, active_connections, idle_connections,
+            max_connections, utilization (使用中の接続数 / 上限) を含む辞書
+        """
+        with self._lock:
+            http_client = self._http_client if self._pid == os.getpid() else None
+            clients = len(self._clients) if http_client is not None else 0
+            requests = self.requests
+        pool = getattr(getattr(http_client, '_transport', None), '_pool', None)
+        connections = list(getattr(pool, 'connections', []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        active = len(connections) - idle
+        return {
+            'clients': clients,
+            'requests': requests,
+            'connections': len(connections),
+            'active_connections': active,
+            'idle_connections': idle,
+            'max_connections': self.max_connections,
+            'utilization': active / self.max_connections if self.max_connections else 0.0
+        }
+
+    def close(self):
+        """接続をすべて閉じる (以降の呼び出しでは作り直す)"""
+        with self._lock:
+            http_client = self._http_client if self._pid == os.getpid() else None
+            self._http_client = None
+            self._pid = None
+            self._clients = {}
+        if http_client is not None:
+            http_client.close()
+
+
+_default_pool: Optional[ClientPool] = None
+_default_lock = threading.Lock()
+
+
+def default_pool() -> ClientPool:
+    """
+    プロセス全体で共有する ClientPool
+
+    Returns:
+        設定値で作成した ClientPool
+    """
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ClientPool()
+        return _default_pool
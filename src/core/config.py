@@ -27,6 +27,25 @@ class Config:
     MAX_TOKENS_PROCESSING = int(os.getenv('MAX_TOKENS_PROCESSING', '500'))
     TEMPERATURE = float(os.getenv('TEMPERATURE', '0.7'))
     
+    # プロンプト設定 (AI分析の統計情報をトークン予算に収める)
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '6000'))  # 0 = 圧縮しない
+    PROMPT_SAMPLE_SHARE = float(os.getenv('PROMPT_SAMPLE_SHARE', '0.2'))
+    PROMPT_SIGNIFICANT_DIGITS = int(os.getenv('PROMPT_SIGNIFICANT_DIGITS', '4'))
+    
+    # 追加テキストの要約設定 (長い資料を分割して要約し、統合する)
+    CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', '1500'))
+    CONTEXT_CHUNK_TOKENS = int(os.getenv('CONTEXT_CHUNK_TOKENS', '2000'))
+    CONTEXT_SUMMARY_TOKENS = int(os.getenv('CONTEXT_SUMMARY_TOKENS', '300'))
+    CONTEXT_SUMMARY_WORKERS = int(os.getenv('CONTEXT_SUMMARY_WORKERS', '8'))
+    
+    # 追加テキストの検索設定 (BM25 で関連する段落だけをプロンプトに入れる)
+    RETRIEVAL_ENABLED = os.getenv('RETRIEVAL_ENABLED', 'true').lower() == 'true'
+    RETRIEVAL_INDEX_DIR = os.getenv('RETRIEVAL_INDEX_DIR', os.path.join('.cache', 'context_index'))
+    RETRIEVAL_PASSAGE_CHARS = int(os.getenv('RETRIEVAL_PASSAGE_CHARS', '600'))
+    RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '5'))
+    RETRIEVAL_BM25_K1 = float(os.getenv('RETRIEVAL_BM25_K1', '1.2'))
+    RETRIEVAL_BM25_B = float(os.getenv('RETRIEVAL_BM25_B', '0.75'))
+    
     # 利用可能なモデル一覧
     AVAILABLE_MODELS = [
         'gpt-4.1',
@@ -39,6 +58,98 @@ class Config:
         'gpt-3.5-turbo-16k'
     ]
     
+    # モデルの料金 (USD / 100万トークン: 入力, 出力)。モデル名は前方一致で引く
+    MODEL_PRICING = {
+        'gpt-4.1': (2.0, 8.0),
+        'gpt-4.1-turbo': (2.0, 8.0),
+        'gpt-4-turbo': (10.0, 30.0),
+        'gpt-4o-mini': (0.15, 0.6),
+        'gpt-4o': (2.5, 10.0),
+        'gpt-4': (30.0, 60.0),
+        'gpt-3.5-turbo': (0.5, 1.5),
+        'gpt-3.5-turbo-16k': (3.0, 4.0)
+    }
+    BATCH_PRICE_FACTOR = float(os.getenv('BATCH_PRICE_FACTOR', '0.5'))  # バッチ API の割引率
+    
+    # API 呼び出しの計測設定
+    TELEMETRY_ENABLED = os.getenv('TELEMETRY_ENABLED', 'true').lower() == 'true'
+    TELEMETRY_MAX_RECORDS = int(os.getenv('TELEMETRY_MAX_RECORDS', '10000'))
+    
+    # 分析エンジン設定
+    PROFILE_BLOCK_COLUMNS = int(os.getenv('PROFILE_BLOCK_COLUMNS', '64'))
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '32'))
+    FINGERPRINT_SAMPLE_ROWS = int(os.getenv('FINGERPRINT_SAMPLE_ROWS', '100000'))
+    CORRELATION_THRESHOLD = float(os.getenv('CORRELATION_THRESHOLD', '0.7'))
+    CORRELATION_TOP_K = int(os.getenv('CORRELATION_TOP_K', '0'))  # 0 = 上限なし
+    CORRELATION_BLOCK_SIZE = int(os.getenv('CORRELATION_BLOCK_SIZE', '256'))
+    OUTLIER_IQR_MULTIPLIER = float(os.getenv('OUTLIER_IQR_MULTIPLIER', '1.5'))
+    OUTLIER_ZSCORE_THRESHOLD = float(os.getenv('OUTLIER_ZSCORE_THRESHOLD', '3.0'))
+    OUTLIER_MAD_THRESHOLD = float(os.getenv('OUTLIER_MAD_THRESHOLD', '3.5'))
+    OUTLIER_ROBUST_PROBABILITY = float(os.getenv('OUTLIER_ROBUST_PROBABILITY', '0.975'))
+    ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '1'))  # 0 = 全コア
+    PARALLEL_MIN_CELLS = int(os.getenv('PARALLEL_MIN_CELLS', '2000000'))
+    APPROX_SAMPLE_ROWS = int(os.getenv('APPROX_SAMPLE_ROWS', '100000'))
+    APPROX_CONFIDENCE = float(os.getenv('APPROX_CONFIDENCE', '0.95'))
+    APPROX_MIN_SAMPLE = int(os.getenv('APPROX_MIN_SAMPLE', '30'))
+    DUPLICATE_FINGERPRINT_BITS = int(os.getenv('DUPLICATE_FINGERPRINT_BITS', '128'))
+    DUPLICATE_MEMORY_LIMIT_MB = int(os.getenv('DUPLICATE_MEMORY_LIMIT_MB', '256'))
+    DUPLICATE_SPILL_PARTITIONS = int(os.getenv('DUPLICATE_SPILL_PARTITIONS', '64'))
+    DUPLICATE_BLOCK_ROWS = int(os.getenv('DUPLICATE_BLOCK_ROWS', '1000000'))
+    
+    # ストリーミング分析設定 (大規模CSV用)
+    STREAMING_THRESHOLD_MB = int(os.getenv('STREAMING_THRESHOLD_MB', '1024'))
+    STREAMING_MEMORY_BUDGET_MB = int(os.getenv('STREAMING_MEMORY_BUDGET_MB', '512'))
+    STREAMING_SAMPLE_ROWS = int(os.getenv('STREAMING_SAMPLE_ROWS', '1000'))
+    STREAMING_SKETCH_K = int(os.getenv('STREAMING_SKETCH_K', '400'))
+    STREAMING_TOP_K_CAPACITY = int(os.getenv('STREAMING_TOP_K_CAPACITY', '256'))
+    STREAMING_EXACT_DUPLICATES = os.getenv('STREAMING_EXACT_DUPLICATES', 'true').lower() == 'true'
+    INCREMENTAL_CHUNK_ROWS = int(os.getenv('INCREMENTAL_CHUNK_ROWS', '100000'))
+    
+    # 行処理設定 (AIによる行ごとの処理)
+    ROW_CONCURRENCY = int(os.getenv('ROW_CONCURRENCY', '16'))
+    ROW_RPM_LIMIT = int(os.getenv('ROW_RPM_LIMIT', '500'))  # 0 = 制限なし
+    ROW_TPM_LIMIT = int(os.getenv('ROW_TPM_LIMIT', '200000'))  # 0 = 制限なし
+    RATE_LIMIT_BURST_SECONDS = float(os.getenv('RATE_LIMIT_BURST_SECONDS', '5'))
+    ROW_PACK_MAX_ROWS = int(os.getenv('ROW_PACK_MAX_ROWS', '50'))
+    ROW_PACK_MAX_INPUT_TOKENS = int(os.getenv('ROW_PACK_MAX_INPUT_TOKENS', '6000'))
+    ROW_PACK_ANSWER_TOKENS = int(os.getenv('ROW_PACK_ANSWER_TOKENS', '150'))  # 1行あたりの回答の見込み
+    ROW_PACK_MAX_OUTPUT_TOKENS = int(os.getenv('ROW_PACK_MAX_OUTPUT_TOKENS', '4000'))
+    JOB_JOURNAL_PATH = os.getenv('JOB_JOURNAL_PATH', os.path.join('.cache', 'row_jobs.sqlite3'))
+    BATCH_DIR = os.getenv('BATCH_DIR', os.path.join('.cache', 'batches'))
+    BATCH_POLL_SECONDS = float(os.getenv('BATCH_POLL_SECONDS', '60'))
+    BATCH_TIMEOUT_SECONDS = float(os.getenv('BATCH_TIMEOUT_SECONDS', '0'))  # 0 = 完了まで待つ
+    BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '50000'))  # 1バッチのリクエスト数の上限
+    BATCH_MAX_FILE_MB = float(os.getenv('BATCH_MAX_FILE_MB', '200'))  # 1バッチのファイルサイズの上限
+    # カスケード (安いモデルで処理し、検証に失敗した・信頼度の低い行だけ上位モデルで再処理)
+    ROW_CASCADE_MODELS = [m.strip() for m in os.getenv('ROW_CASCADE_MODELS', '').split(',') if m.strip()]  # 空 = コスト・速度の表示から決める
+    ROW_CASCADE_MAX_STAGES = int(os.getenv('ROW_CASCADE_MAX_STAGES', '3'))
+    ROW_CASCADE_MIN_CONFIDENCE = float(os.getenv('ROW_CASCADE_MIN_CONFIDENCE', '0.8'))  # 0 = 信頼度では切り替えない
+    
+    # 一括分析パイプライン設定
+    PIPELINE_MAX_WORKERS = int(os.getenv('PIPELINE_MAX_WORKERS', '4'))
+    
+    # API 呼び出しの再試行設定
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+    LLM_BACKOFF_BASE_SECONDS = float(os.getenv('LLM_BACKOFF_BASE_SECONDS', '1'))
+    LLM_BACKOFF_MAX_SECONDS = float(os.getenv('LLM_BACKOFF_MAX_SECONDS', '60'))
+    LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', '5'))  # 0 = 遮断しない
+    LLM_CIRCUIT_RESET_SECONDS = float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', '30'))
+    LLM_HEDGE_DELAY_SECONDS = float(os.getenv('LLM_HEDGE_DELAY_SECONDS', '0'))  # 0 = ヘッジしない
+    
+    # HTTP 接続プール設定 (プロセス内のすべてのクライアントで共有)
+    HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('HTTP_KEEPALIVE_EXPIRY_SECONDS', '60'))
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('HTTP_CONNECT_TIMEOUT_SECONDS', '10'))
+    HTTP_READ_TIMEOUT_SECONDS = float(os.getenv('HTTP_READ_TIMEOUT_SECONDS', '300'))
+    
+    # LLM応答キャッシュ設定
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join('.cache', 'llm_responses.sqlite3'))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '100000'))  # 0 = 無制限
+    LLM_CACHE_MAX_SIZE_MB = float(os.getenv('LLM_CACHE_MAX_SIZE_MB', '512'))  # 0 = 無制限
+    LLM_CACHE_MAX_AGE_DAYS = float(os.getenv('LLM_CACHE_MAX_AGE_DAYS', '30'))  # 0 = 無期限
+    
     # 可視化設定
     PLOT_DPI = 300
     PLOT_STYLE = 'whitegrid'
@@ -0,0 +1,224 @@
+"""
+追加テキストの要約モジュール
+
+AI分析のプロンプトに追加テキスト (市場環境の資料など) を先頭1000文字だけ入れると、
+長い資料のほとんどが使われない。全文を送ると遅く高価になる。
+ここでは資料を段落の区切りでトークン数の上限以下の部分に分け、各部分を並行して
+要約 (map) し、要約をまとめて再度要約する処理 (reduce) を上限に収まるまで繰り返す。
+要約は入力テキストのハッシュで保持するので、同じ資料の再分析では API を呼ばない
+(プロセスをまたぐ再利用は AIAnalyzer の応答キャッシュによる)。
+"""
+
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
+from .config import Config
+from .tokens import estimate_tokens
+
+SUMMARY_SYSTEM_PROMPT = "あなたは企業の市場・事業資料を要約する専門家です。データ分析の背景として役立つ事実を正確に残してください。"
+
+MAP_PROMPT = """以下は資料の一部 ({index}/{total}) です。
+数値・固有名詞・時期・傾向・課題など、データ分析の背景として役立つ事実を残し、
+{tokens} トークン以内の箇条書きで要約してください。
+
+{text}"""
+
+REDUCE_PROMPT = """以下は資料の各部分の要約です。
+重複をまとめ、データ分析の背景として重要な事実を残して、
+{tokens} トークン以内の箇条書きに統合してください。
+
+{text}"""
+
+SEPARATOR = '\n\n'
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    テキストをトークン数の上限以下に切り詰める
+
+    Args:
+        text: 対象テキスト
+        max_tokens: トークン数の上限
+        model: モデル名
+
+    Returns:
+        切り詰めたテキスト
+    """
+    tokens = estimate_tokens(text, model)
+    while tokens > max_tokens and text:
+        # トークン数の比で文字数を減らす (1文字が複数トークンの場合に備えて繰り返す)
+        text = text[:max(0, min(len(text) - 1, len(text) * max_tokens // tokens))]
+        tokens = estimate_tokens(text, model)
+    return text
+
+
+def split_text(text: str, chunk_tokens: int, model: Optional[str] = None) -> List[str]:
+    """
+    テキストを段落の区切りでトークン数の上限以下の部分に分割
+
+    上限を超える段落は行で、行も上限を超える場合は文字数で分割する。
+
+    Args:
+        text: 対象テキスト
+        chunk_tokens: 1部分のトークン数の上限
+        model: モデル名
+
+    Returns:
+        部分のリスト (空の部分は含まない)
+    """
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph, model) <= chunk_tokens:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            line = line.strip()
+            while line:
+                head = truncate_tokens(line, chunk_tokens, model) or line[0]
+                pieces.append(head)
+                line = line[len(head):].strip()
+
+    chunks: List[str] = []
+    current: List[str] = []
+    used = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece, model)
+        if current and used + tokens > chunk_tokens:
+            chunks.append(SEPARATOR.join(current))
+            current, used = [], 0
+        current.append(piece)
+        used += tokens
+    if current:
+        chunks.append(SEPARATOR.join(current))
+    return chunks
+
+
+class ContextSummarizer:
+    """長い追加テキストを分割・要約して上限以下の文脈にするクラス"""
+
+    def __init__(self, chat: Callable[..., str], max_tokens: Optional[int] = None,
+                 chunk_tokens: Optional[int] = None, summary_tokens: Optional[int] = None,
+                 workers: Optional[int] = None, model_type: str = 'processing'):
+        """
+        初期化
+
+        Args:
+            chat: (model_config, messages, call=...) を受け取って応答テキストを返す関数
+            max_tokens: 要約結果のトークン数の上限 (これ以下のテキストは要約しない)
+            chunk_tokens: 1回の要約に入れるトークン数の上限
+            summary_tokens: 部分ごとの要約のトークン数の上限
+            workers: 同時に要約する部分の数
+            model_type: 要約に使うモデル設定
+        """
+        self.chat = chat
+        self.max_tokens = max_tokens or Config.CONTEXT_MAX_TOKENS
+        self.chunk_tokens = chunk_tokens or Config.CONTEXT_CHUNK_TOKENS
+        self.summary_tokens = min(summary_tokens or Config.CONTEXT_SUMMARY_TOKENS, self.max_tokens)
+        self.workers = max(1, workers or Config.CONTEXT_SUMMARY_WORKERS)
+        self.model_type = model_type
+        # 入力テキストのハッシュ → 要約
+        self.summaries: Dict[str, str] = {}
+        self.last_report: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, model: str, template: str, tokens: int, text: str) -> str:
+        digest = hashlib.sha256(f"{model}\x1f{tokens}\x1f{template}\x1f".encode('utf-8'))
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _summarize(self, template: str, text: str, tokens: int, counters: Dict[str, int],
+                   index: int = 1, total: int = 1) -> str:
+        """1回の要約 (同じ入力の要約は保持しているものを返す)"""
+        model_config = dict(Config.get_model_config(self.model_type), max_tokens=tokens)
+        key = self._key(model_config['model'], template, tokens, text)
+        with self._lock:
+            summary = self.summaries.get(key)
+            if summary is not None:
+                counters['reused'] += 1
+                return summary
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": template.format(index=index, total=total, tokens=tokens, text=text)}
+        ]
+        summary = (self.chat(model_config, messages, call='context_summary') or '').strip()
+        with self._lock:
+            self.summaries[key] = summary
+            counters['calls'] += 1
+        return summary
+
+    def _map(self, template: str, texts: List[str], tokens: int, counters: Dict[str, int]) -> List[str]:
+        """複数の入力を並行して要約 (結果は入力の順番)"""
+        if len(texts) == 1 or self.workers == 1:
+            return [self._summarize(template, text, tokens, counters, i + 1, len(texts))
+                    for i, text in enumerate(texts)]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(texts)),
+                                thread_name_prefix='context-summary') as executor:
+            futures = [executor.submit(self._summarize, template, text, tokens, counters, i + 1, len(texts))
+                       for i, text in enumerate(texts)]
+            return [future.result() for future in futures]
+
+    def _groups(self, summaries: List[str], model: str) -> List[List[str]]:
+        """要約を1回の要約に入る大きさのまとまりに分ける (1つのまとまりは2件以上)"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        used = 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary, model)
+            if len(current) >= 2 and used + tokens > self.chunk_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.append(summary)
+            used += tokens
+        if current:
+            if len(current) == 1 and groups:
+                groups[-1].append(current[0])
+            else:
+                groups.append(current)
+        return groups
+
+    def summarize(self, text: str) -> str:
+        """
+        テキストを上限以下の文脈に要約
+
+        上限以下のテキストはそのまま返す。部分ごとの要約 (map) のあと、
+        要約の合計が上限を超えている間はまとまりごとに要約を統合 (reduce) する。
+        処理の内容は last_report (chunks, levels, calls, reused, input_tokens, output_tokens) に記録する。
+
+        Args:
+            text: 追加テキスト
+
+        Returns:
+            要約した文脈
+        """
+        model = Config.get_model_config(self.model_type)['model']
+        input_tokens = estimate_tokens(text, model)
+        counters = {'calls': 0, 'reused': 0}
+        if input_tokens <= self.max_tokens:
+            self.last_report = {'chunks': 0, 'levels': 0, 'input_tokens': input_tokens,
+                                'output_tokens': input_tokens, **counters}
+            return text
+
+        chunks = split_text(text, self.chunk_tokens, model)
+        summaries = self._map(MAP_PROMPT, chunks, self.summary_tokens, counters)
+        levels = 1
+        while len(summaries) > 1 and estimate_tokens(SEPARATOR.join(summaries), model) > self.max_tokens:
+            groups = self._groups(summaries, model)
+            # 最後の統合は結果全体の上限まで使う
+            tokens = self.max_tokens if len(groups) == 1 else self.summary_tokens
+            summaries = self._map(REDUCE_PROMPT, [SEPARATOR.join(group) for group in groups], tokens, counters)
+            levels += 1
+
+        context = truncate_tokens(SEPARATOR.join(summaries), self.max_tokens, model)
+        self.last_report = {
+            'chunks': len(chunks),
+            'levels': levels,
+            'input_tokens': input_tokens,
+            'output_tokens': estimate_tokens(context, model),
+            **counters
+        }
+        return context
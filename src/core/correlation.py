@@ -0,0 +1,215 @@
+"""
+相関分析エンジンモジュール
+
+列ブロック単位の行列積 (BLAS) で相関行列を計算し、
+上三角のベクトル化された閾値判定で強い相関のペアを抽出する。
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
+from .config import Config
+
+
+def _standardize(block: np.ndarray) -> np.ndarray:
+    """欠損なしブロックを平均0・ノルム1に正規化 (分散0の列はNaN)"""
+    centered = block - block.mean(axis=0)
+    norm = np.sqrt(np.einsum('ij,ij->j', centered, centered))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return centered / np.where(norm > 0, norm, np.nan)
+
+
+def _pairwise_block(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    欠損を含む2ブロック間のペアワイズ完全ケース相関
+
+    Args:
+        a: 中心化済みブロック (行 x 列a, NaNは欠損)
+        b: 中心化済みブロック (行 x 列b, NaNは欠損)
+
+    Returns:
+        列a x 列b の相関行列
+    """
+    mask_a = (~np.isnan(a)).astype(np.float64)
+    mask_b = (~np.isnan(b)).astype(np.float64)
+    xa = np.nan_to_num(a)
+    xb = np.nan_to_num(b)
+    n = mask_a.T @ mask_b
+    sum_a = xa.T @ mask_b
+    sum_b = mask_a.T @ xb
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = n * (xa.T @ xb) - sum_a * sum_b
+        var_a = n * ((xa * xa).T @ mask_b) - sum_a * sum_a
+        var_b = n * (mask_a.T @ (xb * xb)) - sum_b * sum_b
+        corr = covariance / np.sqrt(var_a * var_b)
+    corr[n < 2] = np.nan
+    return corr
+
+
+def extract_strong_pairs(matrix: np.ndarray, threshold: float,
+                         top_k: Optional[int] = None,
+                         row_offset: int = 0, col_offset: int = 0,
+                         upper_only: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    相関行列 (またはそのブロック) から |r| > threshold のペアを抽出
+
+    Args:
+        matrix: 相関行列ブロック
+        threshold: 絶対値の閾値
+        top_k: 絶対値の大きい順に残す最大件数
+        row_offset: ブロックの行方向の開始位置
+        col_offset: ブロックの列方向の開始位置
+        upper_only: 全体行列で i < j のペアだけを対象にする
+
+    Returns:
+        (行番号, 列番号, 相関係数) の配列
+    """
+    with np.errstate(invalid='ignore'):
+        hits = np.abs(matrix) > threshold
+    if upper_only:
+        rows = np.arange(matrix.shape[0])[:, None] + row_offset
+        cols = np.arange(matrix.shape[1])[None, :] + col_offset
+        hits &= cols > rows
+    i, j = np.nonzero(hits)
+    values = matrix[i, j]
+    i = i + row_offset
+    j = j + col_offset
+    if top_k is not None and len(values) > top_k:
+        keep = np.argpartition(-np.abs(values), top_k - 1)[:top_k]
+        i, j, values = i[keep], j[keep], values[keep]
+    return i, j, values
+
+
+def _sorted_pairs(i: np.ndarray, j: np.ndarray, values: np.ndarray):
+    """ペアを行優先 (i, j) の順に並べる"""
+    order = np.lexsort((j, i))
+    return i[order], j[order], values[order]
+
+
+def format_correlation_result(columns: List[str], i: np.ndarray, j: np.ndarray,
+                              values: np.ndarray,
+                              matrix: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    get_correlation_analysis の戻り値の形に整形
+
+    Args:
+        columns: 数値列名
+        i, j, values: 強い相関ペア (COO形式)
+        matrix: 相関行列 (Noneの場合は correlation_matrix を含めない)
+
+    Returns:
+        相関分析結果
+    """
+    i, j, values = _sorted_pairs(i, j, values)
+    result = {}
+    if matrix is not None:
+        result['correlation_matrix'] = pd.DataFrame(matrix, index=columns, columns=columns).to_dict()
+    result['strong_correlations'] = [
+        {'variable1': columns[a], 'variable2': columns[b], 'correlation': float(v)}
+        for a, b, v in zip(i, j, values)
+    ]
+    result['strong_pairs'] = {
+        'columns': list(columns),
+        'row': i.astype(int).tolist(),
+        'col': j.astype(int).tolist(),
+        'value': values.astype(float).tolist()
+    }
+    return result
+
+
+class CorrelationEngine:
+    """ブロック型相関分析エンジンクラス"""
+
+    def __init__(self, df: pd.DataFrame, columns: Optional[List[str]] = None,
+                 block_size: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            df: 分析対象のDataFrame
+            columns: 対象の数値列 (省略時は全数値列)
+            block_size: 1ブロックあたりの列数
+        """
+        if columns is None:
+            columns = list(df.select_dtypes(include=[np.number]).columns)
+        self.columns = list(columns)
+        self.df = df
+        self.block_size = block_size or Config.CORRELATION_BLOCK_SIZE
+
+    def compute(self, threshold: Optional[float] = None, top_k: Optional[int] = None,
+                include_matrix: bool = True) -> Dict[str, Any]:
+        """
+        相関分析を実行
+
+        Args:
+            threshold: 強い相関とみなす絶対値の閾値
+            top_k: 強い相関として返す最大件数 (絶対値の大きい順)
+            include_matrix: 相関行列の辞書を含めるかどうか
+
+        Returns:
+            相関分析結果 (strong_pairs は行・列番号と値の疎形式)
+        """
+        if len(self.columns) < 2:
+            return {}
+        if threshold is None:
+            threshold = Config.CORRELATION_THRESHOLD
+        if top_k is None:
+            top_k = Config.CORRELATION_TOP_K or None
+
+        data = self.df[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        has_missing = bool(np.isnan(data).any())
+        if has_missing:
+            # 桁落ちを抑えるため列平均で中心化してからペアワイズ計算する
+            valid = ~np.isnan(data)
+            count = valid.sum(axis=0)
+            total = np.where(valid, data, 0.0).sum(axis=0)
+            data = data - np.divide(total, count, out=np.zeros(len(count)), where=count > 0)
+        else:
+            data = _standardize(data)
+
+        p = len(self.columns)
+        matrix = np.empty((p, p)) if include_matrix else None
+        pairs_i, pairs_j, pairs_v = [], [], []
+        candidates = 0
+
+        for start_a in range(0, p, self.block_size):
+            block_a = data[:, start_a:start_a + self.block_size]
+            for start_b in range(start_a, p, self.block_size):
+                block_b = data[:, start_b:start_b + self.block_size]
+                if has_missing:
+                    corr = _pairwise_block(block_a, block_b)
+                else:
+                    corr = block_a.T @ block_b
+                np.clip(corr, -1.0, 1.0, out=corr)
+                if start_a == start_b:
+                    # 対角ブロックの対角成分は定義上1 (分散0の列はNaN)
+                    diagonal = np.einsum('ii->i', corr)
+                    diagonal[~np.isnan(diagonal)] = 1.0
+
+                if matrix is not None:
+                    end_a = start_a + corr.shape[0]
+                    end_b = start_b + corr.shape[1]
+                    matrix[start_a:end_a, start_b:end_b] = corr
+                    matrix[start_b:end_b, start_a:end_a] = corr.T
+
+                i, j, v = extract_strong_pairs(corr, threshold, top_k, start_a, start_b)
+                pairs_i.append(i)
+                pairs_j.append(j)
+                pairs_v.append(v)
+                candidates += len(v)
+
+                if top_k is not None and candidates > 2 * top_k:
+                    # 候補が増えすぎないよう途中で上位 top_k に絞る
+                    i, j, v = (np.concatenate(pairs_i), np.concatenate(pairs_j), np.concatenate(pairs_v))
+                    keep = np.argpartition(-np.abs(v), top_k - 1)[:top_k]
+                    pairs_i, pairs_j, pairs_v = [i[keep]], [j[keep]], [v[keep]]
+                    candidates = top_k
+
+        i = np.concatenate(pairs_i).astype(np.int64)
+        j = np.concatenate(pairs_j).astype(np.int64)
+        v = np.concatenate(pairs_v)
+        if top_k is not None and len(v) > top_k:
+            keep = np.argpartition(-np.abs(v), top_k - 1)[:top_k]
+            i, j, v = i[keep], j[keep], v[keep]
+
+        return format_correlation_result(self.columns, i, j, v, matrix)
@@ -7,21 +7,62 @@ import numpy as np
 import json
 from typing import Dict, Any, Optional
 from .config import Config
+from .parallel import ParallelProfiler, resolve_workers
+from .result_cache import ResultCache
+from .correlation import CorrelationEngine
+from .duplicates import DuplicateDetector
+from .outliers import OutlierMatrix
+from .approximate import ApproximateAnalyzer, ProgressiveAnalysis
+from .segments import SegmentProfiler
 
 class DataAnalyzer:
     """データ分析クラス"""
     
-    def __init__(self, df: pd.DataFrame, text_data: Optional[str] = None):
+    def __init__(self, df: pd.DataFrame, text_data: Optional[str] = None,
+                 cache: Optional[ResultCache] = None, workers: Optional[int] = None):
         """
         初期化
         
         Args:
             df: 分析対象のDataFrame
             text_data: 追加のテキストデータ
+            cache: 分析結果キャッシュ (省略時は新規作成)
+            workers: 列並列処理のワーカー数 (省略時は設定値、1 は逐次処理)
         """
         self.df = df
         self.text_data = text_data
         self.analysis_results = {}
+        self.cache = cache or ResultCache()
+        self.workers = resolve_workers(workers)
+    
+    def _cached(self, key: str, compute, params: Optional[Dict[str, Any]] = None,
+                store: bool = True) -> Any:
+        """
+        DataFrameのフィンガープリントが同じ間は計算結果を再利用
+        
+        Args:
+            key: 結果の種類
+            compute: 結果を計算する関数
+            params: 結果に影響する引数 (キャッシュキーに含める)
+            store: analysis_results にも保存するかどうか
+            
+        Returns:
+            計算結果
+        """
+        cache_key = f"{key}:{sorted(params.items())}" if params else key
+        result = self.cache.get_or_compute(self.df, cache_key, compute)
+        if store:
+            self.analysis_results[key] = result
+        return result
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        キャッシュのヒット・ミス統計を取得
+        
+        Returns:
+            キャッシュ統計辞書
+        """
+        return self.cache.stats()
     
     def analyze_data_structure(self) -> Dict[str, Any]:
         """
@@ -33,97 +74,175 @@ class DataAnalyzer:
         if self.df is None:
             return {}
         
-        analysis = {
-            'basic_info': {
-                'shape': self.df.shape,
-                'columns': list(self.df.columns),
-                'data_types': self.df.dtypes.to_dict(),
-                'missing_values': self.df.isnull().sum().to_dict(),
-                'duplicate_rows': self.df.duplicated().sum()
-            },
-            'numeric_summary': {},
-            'categorical_summary': {}
-        }
-        
-        # 数値データの統計情報
-        numeric_cols = self.df.select_dtypes(include=[np.number]).columns
-        if len(numeric_cols) > 0:
-            analysis['numeric_summary'] = self.df[numeric_cols].describe().to_dict()
-        
-        # カテゴリデータの統計情報
-        categorical_cols = self.df.select_dtypes(include=['object']).columns
-        for col in categorical_cols:
-            analysis['categorical_summary'][col] = {
-                'unique_values': self.df[col].nunique(),
-                'top_values': self.df[col].value_counts().head(5).to_dict()
-            }
-        
-        self.analysis_results['data_structure'] = analysis
-        return analysis
+        return self._cached('data_structure', self._analyze_data_structure)
+    
+    def _analyze_data_structure(self) -> Dict[str, Any]:
+        """データ構造分析の本体"""
+        # 列ブロック単位の1パスで統計量を計算 (列数・行数が多い場合は列グループを並列処理)
+        return ParallelProfiler(self.df, workers=self.workers).profile()
     
-    def get_correlation_analysis(self) -> Dict[str, Any]:
+    def get_correlation_analysis(self, threshold: Optional[float] = None,
+                                 top_k: Optional[int] = None,
+                                 include_matrix: bool = True) -> Dict[str, Any]:
         """
         相関分析を実行
         
+        Args:
+            threshold: 強い相関とみなす絶対値の閾値 (省略時は設定値)
+            top_k: 強い相関として返す最大件数 (省略時は設定値)
+            include_matrix: 相関行列の辞書を含めるかどうか (列数が多い場合はFalse推奨)
+            
         Returns:
             相関分析結果
         """
-        numeric_cols = self.df.select_dtypes(include=[np.number]).columns
-        if len(numeric_cols) < 2:
-            return {}
+        params = {'threshold': threshold, 'top_k': top_k, 'include_matrix': include_matrix}
+        return self._cached(
+            'correlation',
+            lambda: CorrelationEngine(self.df).compute(threshold, top_k, include_matrix),
+            params
+        )
+    
+    def get_segment_profile(self, keys: list, columns: Optional[list] = None,
+                            include_correlation: bool = True) -> Dict[str, Any]:
+        """
+        セグメント (キー列の組み合わせ) ごとのプロファイルを計算
         
-        correlation_matrix = self.df[numeric_cols].corr()
-        
-        # 強い相関関係を特定
-        strong_correlations = []
-        for i in range(len(correlation_matrix.columns)):
-            for j in range(i+1, len(correlation_matrix.columns)):
-                corr_value = correlation_matrix.iloc[i, j]
-                if abs(corr_value) > 0.7:  # 強い相関の閾値
-                    strong_correlations.append({
-                        'variable1': correlation_matrix.columns[i],
-                        'variable2': correlation_matrix.columns[j],
-                        'correlation': corr_value
-                    })
+        Args:
+            keys: セグメントを決めるキー列 (例: ['Industry', 'Region'])
+            columns: 対象の数値列 (省略時はキー列以外の全数値列)
+            include_correlation: セグメント内の相関を含めるかどうか
+            
+        Returns:
+            sizes, numeric_summary, outliers, correlations (セグメントを行とするDataFrame) を含む辞書
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+        params = {
+            'keys': tuple(keys),
+            'columns': tuple(columns) if columns is not None else None,
+            'include_correlation': include_correlation
+        }
+        return self._cached(
+            'segments',
+            lambda: SegmentProfiler(self.df, keys, columns).profile(include_correlation),
+            params
+        )
+    
+    def get_approximate_analysis(self, sample_rows: Optional[int] = None,
+                                 strata: Optional[list] = None,
+                                 confidence: Optional[float] = None,
+                                 include_correlation: bool = True) -> Dict[str, Any]:
+        """
+        標本による近似分析を実行 (各統計量に信頼区間を付ける)
         
-        return {
-            'correlation_matrix': correlation_matrix.to_dict(),
-            'strong_correlations': strong_correlations
+        Args:
+            sample_rows: 標本行数の目安 (省略時は設定値)
+            strata: 層別抽出に使う列 (例: ['Industry', 'Region'])
+            confidence: 信頼係数 (省略時は設定値)
+            include_correlation: 強い相関の推定を含めるかどうか
+            
+        Returns:
+            近似分析結果 (insufficient に標本不足の統計量を列挙)
+        """
+        params = {
+            'sample_rows': sample_rows,
+            'strata': tuple(strata) if strata else None,
+            'confidence': confidence,
+            'include_correlation': include_correlation
         }
+        return self._cached(
+            'approximate',
+            lambda: ApproximateAnalyzer(self.df, strata, confidence).analyze(sample_rows, include_correlation),
+            params
+        )
     
-    def detect_outliers(self) -> Dict[str, Any]:
+    def start_progressive_analysis(self, strata: Optional[list] = None,
+                                   initial_rows: Optional[int] = None,
+                                   tolerance: Optional[float] = None,
+                                   callback=None) -> ProgressiveAnalysis:
         """
-        異常値を検出
+        近似分析をバックグラウンドで段階的に精緻化
         
+        Args:
+            strata: 層別抽出に使う列
+            initial_rows: 最初の標本行数
+            tolerance: 区間の相対半幅がこれ以下で停止 (省略時は厳密解まで続ける)
+            callback: 各段階の結果を受け取る関数
+            
         Returns:
-            異常値検出結果
+            実行中の ProgressiveAnalysis (latest() で最新の結果を取得)
         """
-        numeric_cols = self.df.select_dtypes(include=[np.number]).columns
-        outliers = {}
+        analyzer = ApproximateAnalyzer(self.df, strata)
+        return ProgressiveAnalysis(analyzer, initial_rows, tolerance=tolerance, callback=callback).start()
+    
+    def detect_duplicates(self, subset: Optional[list] = None) -> Dict[str, Any]:
+        """
+        重複行を検出
         
-        for col in numeric_cols:
-            # IQR法による異常値検出
-            Q1 = self.df[col].quantile(0.25)
-            Q3 = self.df[col].quantile(0.75)
-            IQR = Q3 - Q1
+        Args:
+            subset: 重複判定に使うキー列 (省略時は全列)
             
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
+        Returns:
+            重複行数と重複グループ (インデックスラベルのリスト) を含む辞書
+        """
+        return self._cached(
+            'duplicates',
+            lambda: DuplicateDetector(self.df, subset=subset).detect(),
+            {'subset': tuple(subset) if subset is not None else None}
+        )
+    
+    def detect_outliers(self, method: str = 'iqr', threshold: Optional[float] = None) -> Dict[str, Any]:
+        """
+        異常値を検出
+        
+        Args:
+            method: 'iqr', 'zscore', 'mad', 'robust_distance'
+            threshold: 判定の閾値 (省略時は設定値)
             
-            outlier_mask = (self.df[col] < lower_bound) | (self.df[col] > upper_bound)
-            outlier_count = outlier_mask.sum()
+        Returns:
+            異常値検出結果
+        """
+        outliers = self._outlier_detection(method, threshold)[0]
+        self.analysis_results['outliers'] = outliers
+        return outliers
+    
+    def get_outlier_matrix(self, method: str = 'iqr', threshold: Optional[float] = None) -> OutlierMatrix:
+        """
+        行ごとの異常値フラグ (ビットパック行列) を取得
+        
+        Args:
+            method: 'iqr', 'zscore', 'mad', 'robust_distance'
+            threshold: 判定の閾値
             
-            if outlier_count > 0:
-                outliers[col] = {
-                    'count': int(outlier_count),
-                    'percentage': float(outlier_count / len(self.df) * 100),
-                    'bounds': {
-                        'lower': float(lower_bound),
-                        'upper': float(upper_bound)
-                    }
-                }
+        Returns:
+            異常値フラグ行列
+        """
+        return self._outlier_detection(method, threshold)[1]
+    
+    def get_outlier_rows(self, method: str = 'iqr', column: Optional[str] = None,
+                         threshold: Optional[float] = None) -> pd.DataFrame:
+        """
+        異常値を含む行を取り出す
         
-        return outliers
+        Args:
+            method: 'iqr', 'zscore', 'mad', 'robust_distance'
+            column: 対象列 (省略時はいずれかの列で異常値となった行)
+            threshold: 判定の閾値
+            
+        Returns:
+            該当行のDataFrame
+        """
+        matrix = self.get_outlier_matrix(method, threshold)
+        return self.df.iloc[matrix.row_positions(column)]
+    
+    def _outlier_detection(self, method: str, threshold: Optional[float]):
+        """異常値検出の本体 (要約とフラグ行列をまとめてキャッシュ)"""
+        return self._cached(
+            'outlier_detection',
+            lambda: ParallelProfiler(self.df, workers=self.workers).detect_outliers(method, threshold),
+            {'method': method, 'threshold': threshold},
+            store=False
+        )
     
     def generate_data_summary(self) -> str:
         """
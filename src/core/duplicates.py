@@ -0,0 +1,434 @@
+"""
+重複行検出モジュール
+
+列ごとのベクトル化ハッシュから 64/128 ビットの行フィンガープリントを作り、
+フィンガープリントの整列で重複行とそのグループを求める。
+フィンガープリントがメモリ上限を超える場合はハッシュ値で分割して
+ディスクに書き出し、パーティションごとに処理する。
+
+128 ビットの場合の衝突確率は実用上無視できる。64 ビットの場合は
+n 行でおよそ n^2 / 2^65 (1億行で約 3e-4) の確率で誤検出が起こり得る。
+"""
+
+import os
+import shutil
+import tempfile
+import uuid
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from .config import Config
+
+# pandas.util.hash_pandas_object に渡すハッシュキー (16文字)
+HASH_KEYS = ('0123456789123456', 'fedcba9876543210')
+
+# 整数値でない浮動小数点数のハッシュに混ぜる定数
+FLOAT_HASH_SALT = np.uint64(0x5BD1E9955BD1E995)
+
+# 欠損値のハッシュ (型によらず同じ値)
+MISSING_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+# パーティションファイルのレコード形式
+RECORD_DTYPE = np.dtype([('hi', '<u8'), ('lo', '<u8'), ('pos', '<i8')])
+
+# FingerprintSet のキー形式
+KEY_DTYPE = np.dtype([('hi', '<u8'), ('lo', '<u8')])
+
+
+def _hash_values(values: np.ndarray, hash_key: str) -> np.ndarray:
+    return pd.util.hash_pandas_object(pd.Series(values), index=False, hash_key=hash_key).to_numpy()
+
+
+def _column_hash(series: pd.Series, hash_key: str) -> np.ndarray:
+    """
+    1列分の64ビットハッシュ
+
+    チャンクやバッチごとに推定される型が変わっても同じ値が同じハッシュになるよう、
+    整数はすべて int64 として、整数値の浮動小数点数 (1.0 など) は同じ整数としてハッシュする。
+    -0.0 と 0.0、欠損値同士 (NaN・None) も同じ値として扱う。
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype) or pd.api.types.is_bool_dtype(dtype):
+        hashes = _hash_values(series.to_numpy(), hash_key)
+    elif pd.api.types.is_integer_dtype(dtype):
+        values = series.to_numpy()
+        if values.dtype.kind == 'u' and len(values) and values.max() > np.iinfo(np.int64).max:
+            hashes = _hash_values(values, hash_key)
+        else:
+            hashes = _hash_values(values.astype(np.int64, copy=False), hash_key)
+    elif pd.api.types.is_float_dtype(dtype):
+        values = series.to_numpy().astype(np.float64, copy=False)
+        with np.errstate(invalid='ignore'):
+            integral = np.isfinite(values) & (np.floor(values) == values) & (np.abs(values) < 2.0 ** 63)
+        # 整数値でない値は定数と排他的論理和を取り、ビット列が同じ整数のハッシュと衝突しないようにする
+        hashes = _hash_values(np.where(integral, values, 0).astype(np.int64), hash_key).copy()
+        fractional = ~integral
+        if fractional.any():
+            hashes[fractional] = _hash_values(values[fractional] + 0.0, hash_key) ^ FLOAT_HASH_SALT
+    else:
+        hashes = _hash_values(series.to_numpy(), hash_key)
+    missing = series.isna().to_numpy()
+    if missing.any():
+        hashes = np.where(missing, MISSING_HASH, hashes)
+    return hashes
+
+
+def row_fingerprints(df: pd.DataFrame, columns: Optional[List[str]] = None, bits: int = 128) -> np.ndarray:
+    """
+    行フィンガープリントを計算
+
+    Args:
+        df: 対象のDataFrame
+        columns: 対象の列 (省略時は全列)
+        bits: 64 または 128
+
+    Returns:
+        (行数, 2) の uint64 配列 (64ビットの場合は2列目が0)
+    """
+    columns = list(df.columns) if columns is None else list(columns)
+    n_rows = len(df)
+    fingerprints = np.zeros((n_rows, 2), dtype=np.uint64)
+    n_keys = 2 if bits == 128 else 1
+    with np.errstate(over='ignore'):
+        for k in range(n_keys):
+            accumulator = np.full(n_rows, 0x345678, dtype=np.uint64)
+            multiplier = np.uint64(1000003)
+            for position, col in enumerate(columns):
+                # 列の順序も区別されるよう、位置ごとに乗数を変えて結合する
+                accumulator ^= _column_hash(df[col], HASH_KEYS[k])
+                accumulator *= multiplier
+                multiplier += np.uint64(82520 + 2 * (len(columns) - position))
+            fingerprints[:, k] = accumulator + np.uint64(97531)
+    return fingerprints
+
+
+def _group_records(records: np.ndarray):
+    """
+    フィンガープリントのレコードを整列し重複グループを求める
+
+    Args:
+        records: RECORD_DTYPE の配列
+
+    Returns:
+        (重複行数, [行位置配列, ...])
+    """
+    if len(records) < 2:
+        return 0, []
+    order = np.lexsort((records['pos'], records['lo'], records['hi']))
+    ordered = records[order]
+    same = (ordered['hi'][1:] == ordered['hi'][:-1]) & (ordered['lo'][1:] == ordered['lo'][:-1])
+    duplicates = int(same.sum())
+    if duplicates == 0:
+        return 0, []
+    starts = np.flatnonzero(np.concatenate([[True], ~same]))
+    sizes = np.diff(np.concatenate([starts, [len(ordered)]]))
+    groups = [ordered['pos'][start:start + size] for start, size in zip(starts, sizes) if size > 1]
+    return duplicates, groups
+
+
+class FingerprintStore:
+    """行フィンガープリントの格納先 (上限超過時はディスクのパーティションへ退避)"""
+
+    def __init__(self, memory_limit_mb: Optional[int] = None, spill_dir: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            memory_limit_mb: メモリに保持するフィンガープリントの上限 (MB)
+            spill_dir: 退避先ディレクトリ (省略時は一時ディレクトリ)
+        """
+        if memory_limit_mb is None:
+            memory_limit_mb = Config.DUPLICATE_MEMORY_LIMIT_MB
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024
+        self.spill_dir = spill_dir
+        self.partitions = Config.DUPLICATE_SPILL_PARTITIONS
+        self._buffers = []
+        self._buffered_bytes = 0
+        self._directory = None
+        self.rows = 0
+
+    @property
+    def spilled(self) -> bool:
+        """ディスクへ退避したかどうか"""
+        return self._directory is not None
+
+    def add(self, fingerprints: np.ndarray, positions: np.ndarray):
+        """
+        フィンガープリントを追加
+
+        Args:
+            fingerprints: (行数, 2) の uint64 配列
+            positions: 各行の通し位置
+        """
+        records = np.empty(len(positions), dtype=RECORD_DTYPE)
+        records['hi'] = fingerprints[:, 0]
+        records['lo'] = fingerprints[:, 1]
+        records['pos'] = positions
+        self.rows += len(records)
+        self._buffers.append(records)
+        self._buffered_bytes += records.nbytes
+        if self._buffered_bytes > self.memory_limit_bytes:
+            self._spill()
+
+    def _spill(self):
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='duplicates_', dir=self.spill_dir)
+        records = np.concatenate(self._buffers)
+        # フィンガープリントからパーティションを決めるので、同じ行は必ず同じファイルに入る
+        partition = (records['hi'] % np.uint64(self.partitions)).astype(np.int64)
+        order = np.argsort(partition, kind='stable')
+        records, partition = records[order], partition[order]
+        bounds = np.searchsorted(partition, np.arange(self.partitions + 1))
+        for p in range(self.partitions):
+            part = records[bounds[p]:bounds[p + 1]]
+            if len(part):
+                with open(self._partition_path(p), 'ab') as f:
+                    part.tofile(f)
+        self._buffers = []
+        self._buffered_bytes = 0
+
+    def _partition_path(self, partition: int) -> str:
+        return os.path.join(self._directory, f'part_{partition:04d}.bin')
+
+    def iter_partitions(self):
+        """
+        パーティション単位でレコードを返す
+
+        Yields:
+            RECORD_DTYPE の配列
+        """
+        if not self.spilled:
+            if self._buffers:
+                yield np.concatenate(self._buffers)
+            return
+        if self._buffers:
+            self._spill()
+        for p in range(self.partitions):
+            path = self._partition_path(p)
+            if os.path.exists(path):
+                yield np.fromfile(path, dtype=RECORD_DTYPE)
+
+    def find_duplicates(self, with_groups: bool = True):
+        """
+        重複行数と重複グループを求める
+
+        Args:
+            with_groups: グループ (行位置) を返すかどうか
+
+        Returns:
+            (重複行数, 先頭位置順のグループリスト)
+        """
+        total = 0
+        groups = []
+        for records in self.iter_partitions():
+            count, part_groups = _group_records(records)
+            total += count
+            if with_groups:
+                groups.extend(part_groups)
+        groups.sort(key=lambda positions: positions[0])
+        return total, groups
+
+    def close(self):
+        """退避ファイルを削除"""
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+        self._buffers = []
+        self._buffered_bytes = 0
+
+
+class FingerprintSet:
+    """
+    追記される行フィンガープリントの集合
+
+    整列済みのランを大きさが倍々になるように保持し (LSM方式)、
+    追加は追加件数に比例するコスト (償却) で行う。
+    ランは1つずつ変更しないファイルとして保存でき、保存のたびに書くのは
+    前回の保存以降に作られた (追加・結合された) ランだけになる。
+    """
+
+    def __init__(self):
+        """初期化"""
+        self.runs = []
+        # ランごとの保存先のファイル名 (未保存のランはNone) と保存先ディレクトリ
+        self.files: List[Optional[str]] = []
+        self.directory: Optional[str] = None
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """
+        キーが集合に含まれるか
+
+        Args:
+            keys: KEY_DTYPE の配列
+
+        Returns:
+            真偽値配列
+        """
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            positions = np.searchsorted(run, keys)
+            inside = positions < len(run)
+            found[inside] |= run[positions[inside]] == keys[inside]
+        return found
+
+    def add(self, fingerprints: np.ndarray) -> int:
+        """
+        フィンガープリントを追加し、既出の行数を返す
+
+        Args:
+            fingerprints: (行数, 2) の uint64 配列
+
+        Returns:
+            追加分のうち既出 (集合内またはバッチ内で2回目以降) の行数
+        """
+        keys = np.empty(len(fingerprints), dtype=KEY_DTYPE)
+        keys['hi'] = fingerprints[:, 0]
+        keys['lo'] = fingerprints[:, 1]
+        unique = np.unique(keys)
+        seen = self.contains(unique)
+        new = unique[~seen]
+        if len(new):
+            self.runs.append(new)
+            self.files.append(None)
+            # 直前のランと同程度の大きさになったら結合する
+            while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+                last = self.runs.pop()
+                self.files.pop()
+                self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]))
+                self.files[-1] = None
+        return int(len(keys) - len(new))
+
+    def save_runs(self, directory: str) -> List[str]:
+        """
+        未保存のランをディレクトリに書き出す
+
+        同じディレクトリに保存済みのランは書き直さない。結合で使われなくなったファイルは削除しないので、
+        呼び出し側が新しいファイル一覧を記録したあとに remove_unused_runs で削除する。
+
+        Args:
+            directory: 保存先ディレクトリ
+
+        Returns:
+            全ランのファイル名のリスト (runs と同じ順番)
+        """
+        os.makedirs(directory, exist_ok=True)
+        if os.path.abspath(directory) != self.directory:
+            self.files = [None] * len(self.runs)
+            self.directory = os.path.abspath(directory)
+        for i, run in enumerate(self.runs):
+            if self.files[i] is None:
+                name = f"run-{uuid.uuid4().hex}.npy"
+                temporary = os.path.join(directory, f"{name}.tmp")
+                with open(temporary, 'wb') as f:
+                    np.save(f, run)
+                os.replace(temporary, os.path.join(directory, name))
+                self.files[i] = name
+        return list(self.files)
+
+    @classmethod
+    def load_runs(cls, directory: str, names: List[str]) -> 'FingerprintSet':
+        """
+        保存したランを読み込む (メモリマップで開くので読み込みは行数によらない)
+
+        Args:
+            directory: 保存先ディレクトリ
+            names: save_runs の戻り値
+
+        Returns:
+            FingerprintSet
+        """
+        fingerprints = cls()
+        fingerprints.runs = [np.load(os.path.join(directory, name), mmap_mode='r') for name in names]
+        fingerprints.files = list(names)
+        fingerprints.directory = os.path.abspath(directory)
+        return fingerprints
+
+    @staticmethod
+    def remove_unused_runs(directory: str, names: List[str]):
+        """
+        ファイル一覧にないランのファイルを削除
+
+        Args:
+            directory: 保存先ディレクトリ
+            names: 使用中のファイル名
+        """
+        if not os.path.isdir(directory):
+            return
+        used = set(names)
+        for name in os.listdir(directory):
+            if name.startswith('run-') and name not in used:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+class DuplicateDetector:
+    """ハッシュベースの重複行検出クラス"""
+
+    def __init__(self, df: pd.DataFrame, subset: Optional[List[str]] = None,
+                 bits: Optional[int] = None, memory_limit_mb: Optional[int] = None,
+                 spill_dir: Optional[str] = None, block_rows: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            df: 対象のDataFrame
+            subset: 重複判定に使うキー列 (省略時は全列)
+            bits: フィンガープリントのビット数 (64 または 128)
+            memory_limit_mb: フィンガープリントをメモリに保持する上限 (MB)
+            spill_dir: 上限超過時の退避先ディレクトリ
+            block_rows: 1回にハッシュする行数
+        """
+        self.df = df
+        self.subset = list(subset) if subset is not None else list(df.columns)
+        self.bits = bits or Config.DUPLICATE_FINGERPRINT_BITS
+        if self.bits not in (64, 128):
+            raise ValueError(f"フィンガープリントのビット数は64または128です: {self.bits}")
+        self.memory_limit_mb = memory_limit_mb
+        self.spill_dir = spill_dir
+        self.block_rows = block_rows or Config.DUPLICATE_BLOCK_ROWS
+
+    def _run(self, with_groups: bool):
+        store = FingerprintStore(self.memory_limit_mb, self.spill_dir)
+        try:
+            for start in range(0, len(self.df), self.block_rows):
+                block = self.df.iloc[start:start + self.block_rows]
+                store.add(row_fingerprints(block, self.subset, self.bits),
+                          np.arange(start, start + len(block)))
+            count, groups = store.find_duplicates(with_groups)
+            return count, groups, store.spilled
+        finally:
+            store.close()
+
+    def count(self) -> int:
+        """
+        重複行数を数える (DataFrame.duplicated().sum() と同じ意味)
+
+        Returns:
+            重複行数
+        """
+        if len(self.df) == 0 or not self.subset:
+            return 0
+        return self._run(with_groups=False)[0]
+
+    def detect(self) -> Dict[str, Any]:
+        """
+        重複行とグループを検出
+
+        Returns:
+            duplicate_rows (重複行数), groups (グループごとのインデックスラベル),
+            positions (グループごとの行位置), spilled (ディスク退避の有無) を含む辞書
+        """
+        if len(self.df) == 0 or not self.subset:
+            return {'duplicate_rows': 0, 'groups': [], 'positions': [], 'spilled': False}
+        count, groups, spilled = self._run(with_groups=True)
+        return {
+            'duplicate_rows': count,
+            'groups': [self.df.index[positions].tolist() for positions in groups],
+            'positions': [positions.tolist() for positions in groups],
+            'spilled': spilled
+        }
@@ -0,0 +1,292 @@
+"""
+インクリメンタル分析モジュール
+
+追記だけで増えていくデータ (月次ファイルなど) 向けに、マージ可能な
+アキュムレータ (モーメント・分位点スケッチ・共積率・頻出値カウンタ) と
+行フィンガープリントの集合を状態として保存し、新しい行だけを取り込んで
+構造分析・相関分析・異常値検出の結果を更新する。
+更新のコストは追加行数に比例し、過去の行は読み直さない。
+
+状態は、大きさが行数によらないアキュムレータ (pickle) と、フィンガープリントの
+整列済みランのファイル (状態ファイル名 + '.runs' のディレクトリ) に分けて保存する。
+ランのファイルは変更しないので、保存のたびに書くのは新しいランと小さな状態だけになる
+(ランの結合で書き直す量は LSM 方式の償却で追加行数に比例する)。
+
+状態ファイルは pickle 形式のため、信頼できるファイルだけを読み込むこと。
+"""
+
+import hashlib
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional
+from .config import Config
+from .streaming import ProfileAccumulator
+from .duplicates import FingerprintSet, row_fingerprints
+
+# 状態ファイルの形式バージョン (3: 型によらない行フィンガープリント)
+STATE_VERSION = 3
+
+# 追記以外の変更を検出するために記録するファイル先頭のバイト数
+HEAD_BYTES = 4096
+
+
+def _runs_directory(path: str) -> str:
+    return f"{path}.runs"
+
+
+def _head_digest(file_path: str, length: int) -> str:
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+class IncrementalAnalyzer:
+    """追記データ向けインクリメンタル分析クラス"""
+
+    def __init__(self, sketch_k: Optional[int] = None, top_k_capacity: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            sketch_k: 分位点スケッチの精度パラメータ
+            top_k_capacity: 頻出値要約のカウンタ数
+        """
+        self.sketch_k = sketch_k
+        self.top_k_capacity = top_k_capacity
+        self.accumulator = None
+        self.fingerprints = FingerprintSet()
+        self.duplicate_rows = 0
+        self.batches = 0
+        self.sources = {}
+        self.analysis_results = {}
+
+    @property
+    def rows(self) -> int:
+        """取り込んだ行数"""
+        return self.accumulator.rows if self.accumulator is not None else 0
+
+    def append(self, df: pd.DataFrame):
+        """
+        新しい行を取り込む
+
+        Args:
+            df: 追加行 (列構成は最初のバッチと同じ)
+        """
+        if self.accumulator is None:
+            self.accumulator = ProfileAccumulator.from_frame(
+                df, sketch_k=self.sketch_k, top_k_capacity=self.top_k_capacity
+            )
+        missing = [col for col in self.accumulator.columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"追加データに列がありません: {', '.join(map(str, missing))}")
+
+        chunk = df[self.accumulator.columns]
+        self.accumulator.update(chunk)
+        if len(chunk) > 0 and chunk.shape[1] > 0:
+            fingerprints = row_fingerprints(chunk, bits=Config.DUPLICATE_FINGERPRINT_BITS)
+            self.duplicate_rows += self.fingerprints.add(fingerprints)
+        self.batches += 1
+        self.analysis_results = {}
+
+    def update_from_csv(self, file_path: str, chunk_rows: Optional[int] = None,
+                        **read_csv_kwargs) -> int:
+        """
+        CSVファイルの前回取り込み以降に追記された行を取り込む
+
+        ファイルごとに取り込み済みのバイト位置を記録し、次回はその位置から読む。
+        ファイルは行単位で追記される前提で、縮小や先頭の書き換えはエラーとする。
+
+        Args:
+            file_path: CSVファイルパス
+            chunk_rows: 1回に読み込む行数
+            **read_csv_kwargs: pandas.read_csv に渡す追加引数
+
+        Returns:
+            取り込んだ行数
+        """
+        path = os.path.abspath(file_path)
+        size = os.path.getsize(path)
+        source = self.sources.get(path)
+        offset = 0
+        if source is not None:
+            offset = source['offset']
+            if size < offset or _head_digest(path, source['head_bytes']) != source['head_digest']:
+                raise ValueError(f"前回の取り込み以降に追記以外の変更があります: {file_path}")
+            if size == offset:
+                return 0
+
+        chunk_rows = chunk_rows or Config.INCREMENTAL_CHUNK_ROWS
+        added = 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            if offset == 0:
+                reader = pd.read_csv(f, chunksize=chunk_rows, **read_csv_kwargs)
+            else:
+                # 追記部分にはヘッダーがないので、取り込み済みの列名を使う
+                reader = pd.read_csv(f, header=None, names=self.accumulator.columns,
+                                     chunksize=chunk_rows, **read_csv_kwargs)
+            with reader:
+                for chunk in reader:
+                    self.append(chunk)
+                    added += len(chunk)
+            end = f.tell()
+
+        head_bytes = min(end, HEAD_BYTES)
+        self.sources[path] = {
+            'offset': end,
+            'head_bytes': head_bytes,
+            'head_digest': _head_digest(path, head_bytes)
+        }
+        return added
+
+    def analyze_data_structure(self) -> Dict[str, Any]:
+        """
+        データの構造を分析
+
+        Returns:
+            analyze_data_structure と同じ形の分析結果 (重複行数は厳密値)
+        """
+        if self.accumulator is None:
+            return {}
+        if 'data_structure' not in self.analysis_results:
+            structure = self.accumulator.to_structure()
+            structure['basic_info']['duplicate_rows'] = self.duplicate_rows
+            self.analysis_results['data_structure'] = structure
+        return self.analysis_results['data_structure']
+
+    def get_correlation_analysis(self, threshold: Optional[float] = None,
+                                 top_k: Optional[int] = None,
+                                 include_matrix: bool = True) -> Dict[str, Any]:
+        """
+        相関分析を実行 (蓄積した共積率から計算)
+
+        Args:
+            threshold: 強い相関とみなす絶対値の閾値
+            top_k: 強い相関として返す最大件数
+            include_matrix: 相関行列の辞書を含めるかどうか
+
+        Returns:
+            相関分析結果
+        """
+        if self.accumulator is None:
+            return {}
+        return self.accumulator.to_correlation(threshold, top_k, include_matrix)
+
+    def detect_outliers(self) -> Dict[str, Any]:
+        """
+        異常値を検出
+
+        上下限は分位点スケッチから求め、件数は上下限の外側の割合
+        (スケッチの順位) に有効件数を掛けて推定する。過去の行は読み直さない。
+
+        Returns:
+            異常値検出結果
+        """
+        if self.accumulator is None:
+            return {}
+        if 'outliers' in self.analysis_results:
+            return self.analysis_results['outliers']
+
+        accumulator = self.accumulator
+        bounds = accumulator.outlier_bounds()
+        valid = accumulator.moments.summary()['count']
+        outliers = {}
+        for i, col in enumerate(accumulator.numeric_columns):
+            sketch = accumulator.quantile_sketches[i]
+            lower, upper = bounds[col]['lower'], bounds[col]['upper']
+            if not np.isfinite(lower) or not np.isfinite(upper):
+                continue
+            share = sketch.rank(lower, inclusive=False) + (1.0 - sketch.rank(upper, inclusive=True))
+            count = int(round(share * valid[i]))
+            if count > 0:
+                outliers[col] = {
+                    'count': count,
+                    'percentage': float(count / accumulator.rows * 100),
+                    'bounds': bounds[col]
+                }
+        self.analysis_results['outliers'] = outliers
+        return outliers
+
+    def get_error_bounds(self) -> Dict[str, str]:
+        """
+        推定値を含む項目と誤差の目安を取得
+
+        Returns:
+            {項目: 誤差の説明}
+        """
+        if self.accumulator is None:
+            return {}
+        bounds = self.accumulator.error_bounds()
+        bounds.pop('basic_info.duplicate_rows', None)
+        k = self.accumulator.quantile_sketches[0].k if self.accumulator.quantile_sketches \
+            else Config.STREAMING_SKETCH_K
+        bounds['outliers.count'] = f'有効件数に対する割合の誤差 約{2 * 1.7 / k:.2%} (KLL)'
+        return bounds
+
+    def save(self, path: str):
+        """
+        状態をファイルに保存 (一時ファイル経由で置き換える)
+
+        フィンガープリントは前回の保存以降に作られたランだけを書き出す。
+        使われなくなったランのファイルは、新しい状態ファイルに置き換えたあとで削除する。
+
+        Args:
+            path: 保存先
+        """
+        directory = _runs_directory(path)
+        runs = self.fingerprints.save_runs(directory)
+        state = {
+            'version': STATE_VERSION,
+            'sketch_k': self.sketch_k,
+            'top_k_capacity': self.top_k_capacity,
+            'accumulator': self.accumulator,
+            'fingerprint_runs': runs,
+            'duplicate_rows': self.duplicate_rows,
+            'batches': self.batches,
+            'sources': self.sources
+        }
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        FingerprintSet.remove_unused_runs(directory, runs)
+
+    @classmethod
+    def load(cls, path: str) -> 'IncrementalAnalyzer':
+        """
+        保存した状態を読み込む
+
+        Args:
+            path: 状態ファイル
+
+        Returns:
+            IncrementalAnalyzer
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"対応していない状態ファイルのバージョンです: {state.get('version')}")
+        analyzer = cls(state['sketch_k'], state['top_k_capacity'])
+        analyzer.accumulator = state['accumulator']
+        analyzer.fingerprints = FingerprintSet.load_runs(_runs_directory(path), state['fingerprint_runs'])
+        analyzer.duplicate_rows = state['duplicate_rows']
+        analyzer.batches = state['batches']
+        analyzer.sources = state['sources']
+        return analyzer
+
+    @classmethod
+    def open(cls, path: str, **kwargs) -> 'IncrementalAnalyzer':
+        """
+        状態ファイルがあれば読み込み、なければ新しく作成
+
+        Args:
+            path: 状態ファイル
+            **kwargs: 新規作成時の引数
+
+        Returns:
+            IncrementalAnalyzer
+        """
+        if os.path.exists(path):
+            return cls.load(path)
+        return cls(**kwargs)
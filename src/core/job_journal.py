@@ -0,0 +1,231 @@
+"""
+行処理ジョブのジャーナルモジュール
+
+process_rows の結果を1件完了するごとに SQLite (WAL モード) に記録する。
+途中でプロセスが落ちても完了済みの結果は失われず、ジョブIDを指定して
+再実行すれば未完了の分だけを処理できる。結果はプロンプトのハッシュで
+記録するので、同じプロンプトになる行 (factorize_prompts でまとめた行) は
+1件の記録を共有し、再開時に行の並びが変わっていても対応付けられる。
+バッチ API で処理するジョブは、送信したすべてのバッチIDも記録する。
+"""
+
+import hashlib
+import sqlite3
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+from .config import Config
+from .sqlite_utils import ThreadLocalConnection
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    column_name TEXT NOT NULL,
+    prompt_template TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    source TEXT,
+    total INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    job_id TEXT NOT NULL,
+    prompt_key TEXT NOT NULL,
+    output TEXT,
+    error TEXT,
+    finished REAL NOT NULL,
+    PRIMARY KEY (job_id, prompt_key)
+);
+CREATE TABLE IF NOT EXISTS job_batches (
+    job_id TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    PRIMARY KEY (job_id, batch_id)
+);
+"""
+
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+
+
+def prompt_key(prompt: str) -> str:
+    """
+    プロンプトの記録用キー
+
+    Args:
+        prompt: テンプレートに値を入れたプロンプト
+
+    Returns:
+        SHA-256 の16進文字列
+    """
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+class JobJournal:
+    """SQLite による行処理ジョブのジャーナル"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            path: データベースファイル
+        """
+        self.path = path or Config.JOB_JOURNAL_PATH
+        self._db = ThreadLocalConnection(self.path, SCHEMA)
+        self._migrate_batches()
+
+    def _migrate_batches(self):
+        """1ジョブ1バッチだった旧形式の batches テーブルの記録を job_batches に移す"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'batches'").fetchone():
+                connection.execute('INSERT OR IGNORE INTO job_batches (job_id, batch_id, submitted) '
+                                   'SELECT job_id, batch_id, submitted FROM batches')
+                connection.execute('DROP TABLE batches')
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._db.get()
+
+    def create_job(self, column_name: str, prompt_template: str, mode: str,
+                   total: int, source: Optional[str] = None) -> str:
+        """
+        新しいジョブを登録
+
+        Args:
+            column_name: 処理対象の列名
+            prompt_template: プロンプトテンプレート
+            mode: 処理方式
+            total: 全行数
+            source: 元データのファイルパス
+
+        Returns:
+            ジョブID
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        self._connection().execute(
+            'INSERT INTO jobs (job_id, column_name, prompt_template, mode, source, total, status, created, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, column_name, prompt_template, mode, source, total, JOB_RUNNING, now, now)
+        )
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        ジョブの情報を取得
+
+        Args:
+            job_id: ジョブID
+
+        Returns:
+            ジョブ情報 (completed に記録済みの件数を含む。なければNone)
+        """
+        connection = self._connection()
+        connection.row_factory = sqlite3.Row
+        try:
+            row = connection.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        finally:
+            connection.row_factory = None
+        if row is None:
+            return None
+        job = dict(row)
+        job['completed'] = connection.execute(
+            'SELECT COUNT(*) FROM results WHERE job_id = ? AND error IS NULL', (job_id,)
+        ).fetchone()[0]
+        return job
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        最近のジョブの一覧
+
+        Args:
+            limit: 最大件数
+
+        Returns:
+            新しい順のジョブ情報のリスト
+        """
+        rows = self._connection().execute(
+            'SELECT job_id FROM jobs ORDER BY updated DESC LIMIT ?', (limit,)
+        ).fetchall()
+        return [self.get_job(job_id) for job_id, in rows]
+
+    def record(self, job_id: str, key: str, output: Optional[str], error: Optional[str] = None):
+        """
+        1件の結果を記録 (同じキーは上書き)
+
+        Args:
+            job_id: ジョブID
+            key: prompt_key の値
+            output: 処理結果
+            error: エラーメッセージ
+        """
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO results (job_id, prompt_key, output, error, finished) VALUES (?, ?, ?, ?, ?)',
+            (job_id, key, output, error, now)
+        )
+        connection.execute('UPDATE jobs SET updated = ? WHERE job_id = ?', (now, job_id))
+
+    def results(self, job_id: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        記録済みの結果
+
+        Args:
+            job_id: ジョブID
+
+        Returns:
+            {キー: (output, error)}
+        """
+        rows = self._connection().execute(
+            'SELECT prompt_key, output, error FROM results WHERE job_id = ?', (job_id,)
+        ).fetchall()
+        return {key: (output, error) for key, output, error in rows}
+
+    def add_batch(self, job_id: str, batch_id: str):
+        """
+        ジョブの送信したバッチを記録
+
+        Args:
+            job_id: ジョブID
+            batch_id: バッチID
+        """
+        self._connection().execute(
+            'INSERT OR REPLACE INTO job_batches (job_id, batch_id, submitted) VALUES (?, ?, ?)',
+            (job_id, batch_id, time.time())
+        )
+
+    def get_batches(self, job_id: str) -> List[str]:
+        """送信中のバッチID (送信した順、なければ空のリスト)"""
+        rows = self._connection().execute(
+            'SELECT batch_id FROM job_batches WHERE job_id = ? ORDER BY submitted, rowid', (job_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def clear_batches(self, job_id: str):
+        """ジョブのバッチの記録を消す (結果を取り込んだ後)"""
+        self._connection().execute('DELETE FROM job_batches WHERE job_id = ?', (job_id,))
+
+    def finish(self, job_id: str):
+        """ジョブを完了にする"""
+        self._connection().execute(
+            'UPDATE jobs SET status = ?, updated = ? WHERE job_id = ?', (JOB_COMPLETED, time.time(), job_id)
+        )
+
+    def delete(self, job_id: str):
+        """ジョブと結果を削除"""
+        connection = self._connection()
+        connection.execute('DELETE FROM results WHERE job_id = ?', (job_id,))
+        connection.execute('DELETE FROM job_batches WHERE job_id = ?', (job_id,))
+        connection.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    def close(self):
+        """このスレッドの接続を閉じる"""
+        self._db.close()
@@ -0,0 +1,296 @@
+"""
+LLM応答の永続キャッシュモジュール
+
+モデル・メッセージ・max_tokens・temperature から作ったキーで応答を
+SQLite (WAL モード) に保存する。WAL とビジータイムアウトにより
+Streamlit の再実行や夜間ジョブなど複数プロセスから同時に読み書きできる。
+件数・合計サイズ・経過日数の上限を超えた分は最終アクセスの古い順に削除する。
+件数と合計サイズはトリガーで更新するカウンタに持ち、保存のたびに全件を集計しない。
+ヒット・ミスの件数はデータベースに記録し、プロセスをまたいで集計する。
+ヒット時の最終アクセス時刻と件数の更新はメモリにためてまとめて書き込む
+(保存・統計の取得・close の前と、一定件数・一定時間ごと)。
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Dict, Any, List, Optional
+from .config import Config
+from .sqlite_utils import ThreadLocalConnection
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('hits', 0), ('misses', 0);
+INSERT OR IGNORE INTO counters (name, value) SELECT 'entries', COUNT(*) FROM responses;
+INSERT OR IGNORE INTO counters (name, value) SELECT 'size_bytes', COALESCE(SUM(size), 0) FROM responses;
+CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'entries';
+    UPDATE counters SET value = value + NEW.size WHERE name = 'size_bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'entries';
+    UPDATE counters SET value = value - OLD.size WHERE name = 'size_bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS responses_resize AFTER UPDATE OF size ON responses BEGIN
+    UPDATE counters SET value = value + NEW.size - OLD.size WHERE name = 'size_bytes';
+END;
+"""
+
+# ヒットの記録をまとめて書き込む件数と間隔 (秒)
+ACCESS_FLUSH_COUNT = 64
+ACCESS_FLUSH_SECONDS = 5.0
+
+# 終了時に未書き込みのヒットを書き込むキャッシュ
+_OPEN_CACHES = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_caches():
+    for cache in list(_OPEN_CACHES):
+        try:
+            cache.flush()
+        except sqlite3.Error:
+            pass
+
+
+def cache_key(model: str, messages: List[Dict[str, Any]], max_tokens: Optional[int],
+              temperature: Optional[float]) -> str:
+    """
+    リクエストのキャッシュキー
+
+    Args:
+        model: モデル名
+        messages: チャットメッセージ
+        max_tokens: 最大トークン数
+        temperature: 温度パラメータ
+
+    Returns:
+        SHA-256 の16進文字列
+    """
+    payload = json.dumps(
+        {'model': model, 'messages': messages, 'max_tokens': max_tokens, 'temperature': temperature},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """SQLite によるLLM応答キャッシュ"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None,
+                 max_size_mb: Optional[float] = None, max_age_days: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            path: データベースファイル
+            max_entries: 保持する最大件数 (0 は無制限)
+            max_size_mb: 応答の合計サイズの上限 (MB, 0 は無制限)
+            max_age_days: 応答を再利用する最大日数 (0 は無制限)
+        """
+        self.path = path or Config.LLM_CACHE_PATH
+        self.max_entries = Config.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        max_size_mb = Config.LLM_CACHE_MAX_SIZE_MB if max_size_mb is None else max_size_mb
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        max_age_days = Config.LLM_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.max_age = max_age_days * 86400
+        self._db = ThreadLocalConnection(self.path, SCHEMA)
+        # 未書き込みのヒット (キー → [最終アクセス時刻, 回数]) とヒット・ミスの件数
+        self._accessed: Dict[str, List[float]] = {}
+        self._counts = {'hits': 0, 'misses': 0}
+        self._flushed = time.monotonic()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        _OPEN_CACHES.add(self)
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._db.get()
+
+    def _count(self, name: str, key: Optional[str] = None, now: float = 0.0):
+        """ヒット・ミスをメモリに記録し、一定件数・一定時間ごとに書き込む"""
+        with self._lock:
+            self._counts[name] += 1
+            if key is not None:
+                entry = self._accessed.setdefault(key, [now, 0])
+                entry[0] = max(entry[0], now)
+                entry[1] += 1
+            due = (len(self._accessed) >= ACCESS_FLUSH_COUNT
+                   or time.monotonic() - self._flushed >= ACCESS_FLUSH_SECONDS)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """メモリにためたヒット・ミスの記録をまとめて書き込む"""
+        with self._lock:
+            accessed, counts = self._accessed, self._counts
+            self._accessed, self._counts = {}, {'hits': 0, 'misses': 0}
+            self._flushed = time.monotonic()
+            if self._pid != os.getpid():
+                # fork 前に記録した分は親プロセスが書き込む
+                self._pid = os.getpid()
+                return
+        if not accessed and not any(counts.values()):
+            return
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'UPDATE responses SET accessed = MAX(accessed, ?), hits = hits + ? WHERE key = ?',
+                [(entry[0], int(entry[1]), key) for key, entry in accessed.items()]
+            )
+            connection.executemany('UPDATE counters SET value = value + ? WHERE name = ?',
+                                   [(value, name) for name, value in counts.items() if value])
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def get(self, model: str, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None,
+            temperature: Optional[float] = None) -> Optional[str]:
+        """
+        キャッシュ済みの応答を取得
+
+        Args:
+            model: モデル名
+            messages: チャットメッセージ
+            max_tokens: 最大トークン数
+            temperature: 温度パラメータ
+
+        Returns:
+            応答テキスト (なければNone)
+        """
+        key = cache_key(model, messages, max_tokens, temperature)
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute('SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is not None and self.max_age and now - row[1] > self.max_age:
+            connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+            row = None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits', key, now)
+        return row[0]
+
+    def put(self, model: str, messages: List[Dict[str, Any]], max_tokens: Optional[int],
+            temperature: Optional[float], response: str):
+        """
+        応答を保存
+
+        Args:
+            model: モデル名
+            messages: チャットメッセージ
+            max_tokens: 最大トークン数
+            temperature: 温度パラメータ
+            response: 応答テキスト
+        """
+        if response is None:
+            return
+        key = cache_key(model, messages, max_tokens, temperature)
+        now = time.time()
+        connection = self._connection()
+        # INSERT OR REPLACE では削除のトリガーが動かないため、UPSERT で置き換える
+        connection.execute(
+            'INSERT INTO responses (key, model, response, size, created, accessed, hits) '
+            'VALUES (?, ?, ?, ?, ?, ?, 0) ON CONFLICT (key) DO UPDATE SET '
+            'model = excluded.model, response = excluded.response, size = excluded.size, '
+            'created = excluded.created, accessed = excluded.accessed, hits = 0',
+            (key, model, response, len(response.encode('utf-8')), now, now)
+        )
+        self.evict()
+
+    def _counter(self, name: str) -> int:
+        row = self._connection().execute('SELECT value FROM counters WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _delete_oldest(self, count: Optional[int] = None, size: Optional[int] = None) -> int:
+        """最終アクセスの古い順に、件数 count 件またはサイズの合計 size 以上を削除"""
+        connection = self._connection()
+        keys = []
+        freed = 0
+        for key, entry_size in connection.execute('SELECT key, size FROM responses ORDER BY accessed'):
+            if (count is not None and len(keys) >= count) or (size is not None and freed >= size):
+                break
+            keys.append((key,))
+            freed += entry_size
+        connection.executemany('DELETE FROM responses WHERE key = ?', keys)
+        return len(keys)
+
+    def evict(self) -> int:
+        """
+        上限を超えた応答を削除
+
+        件数と合計サイズはカウンタで確認し、上限を超えた分だけを古い順に削除する
+        (削除する件数に比例するコスト)。
+
+        Returns:
+            削除した件数
+        """
+        # 最終アクセス順を正しくするため、ためているヒットを先に書き込む
+        self.flush()
+        connection = self._connection()
+        removed = 0
+        if self.max_age:
+            removed += connection.execute(
+                'DELETE FROM responses WHERE created < ?', (time.time() - self.max_age,)
+            ).rowcount
+        if self.max_entries:
+            excess = self._counter('entries') - self.max_entries
+            if excess > 0:
+                removed += self._delete_oldest(count=excess)
+        if self.max_bytes:
+            excess = self._counter('size_bytes') - self.max_bytes
+            if excess > 0:
+                removed += self._delete_oldest(size=excess)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの統計を取得
+
+        Returns:
+            hits, misses, hit_rate, entries, size_bytes を含む辞書
+        """
+        self.flush()
+        counters = dict(self._connection().execute('SELECT name, value FROM counters').fetchall())
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'entries': counters.get('entries', 0),
+            'size_bytes': counters.get('size_bytes', 0)
+        }
+
+    def clear(self):
+        """全応答と統計を削除"""
+        with self._lock:
+            self._accessed, self._counts = {}, {'hits': 0, 'misses': 0}
+        connection = self._connection()
+        connection.execute('DELETE FROM responses')
+        connection.execute('UPDATE counters SET value = 0')
+
+    def close(self):
+        """ためているヒットを書き込み、このスレッドの接続を閉じる"""
+        self.flush()
+        self._db.close()
@@ -0,0 +1,287 @@
+"""
+異常値検出エンジンモジュール
+
+数値列をまとめた1つのブロックに対して分位点・モーメントを一括計算し、
+IQR法・zスコア・MAD (修正zスコア)・ロバスト距離 (多変量) で異常値を判定する。
+判定結果は列ごとにビットパックした行列として保持し、
+再計算なしで該当行を取り出せる。
+"""
+
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
+from .config import Config
+from .profiler import block_quantiles
+
+# 多変量 (ロバスト距離) の結果に使う列名
+MULTIVARIATE_COLUMN = 'robust_distance'
+
+# 正規分布で MAD を標準偏差に換算する係数
+MAD_SCALE = 0.6745
+
+
+def chi2_quantile(probability: float, dof: int) -> float:
+    """
+    カイ二乗分布の分位点 (Wilson-Hilferty 近似)
+
+    Args:
+        probability: 下側確率
+        dof: 自由度
+
+    Returns:
+        分位点
+    """
+    z = NormalDist().inv_cdf(probability)
+    h = 2.0 / (9.0 * dof)
+    return dof * (1.0 - h + z * np.sqrt(h)) ** 3
+
+
+class OutlierMatrix:
+    """列ごとにビットパックした異常値フラグ行列"""
+
+    def __init__(self, packed: np.ndarray, n_rows: int, columns: List[str], index: pd.Index):
+        """
+        初期化
+
+        Args:
+            packed: np.packbits(mask, axis=0) の結果 (ceil(行数/8) x 列)
+            n_rows: 行数
+            columns: 列名
+            index: 元DataFrameのインデックス
+        """
+        self.packed = packed
+        self.n_rows = n_rows
+        self.columns = list(columns)
+        self.index = index
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray, columns: List[str], index: pd.Index) -> 'OutlierMatrix':
+        """
+        真偽値行列から作成
+
+        Args:
+            mask: (行数 x 列) の真偽値配列
+            columns: 列名
+            index: 元DataFrameのインデックス
+
+        Returns:
+            OutlierMatrix
+        """
+        return cls(np.packbits(mask, axis=0), mask.shape[0], columns, index)
+
+    def column_mask(self, column: str) -> np.ndarray:
+        """
+        1列分の異常値フラグ
+
+        Args:
+            column: 列名
+
+        Returns:
+            行数分の真偽値配列
+        """
+        j = self.columns.index(column)
+        return np.unpackbits(self.packed[:, j], count=self.n_rows).astype(bool)
+
+    def any_mask(self) -> np.ndarray:
+        """いずれかの列で異常値と判定された行のフラグ"""
+        if not self.columns:
+            return np.zeros(self.n_rows, dtype=bool)
+        combined = np.bitwise_or.reduce(self.packed, axis=1)
+        return np.unpackbits(combined, count=self.n_rows).astype(bool)
+
+    def counts(self) -> np.ndarray:
+        """列ごとの異常値件数"""
+        if self.n_rows == 0:
+            return np.zeros(len(self.columns), dtype=np.int64)
+        return np.unpackbits(self.packed, axis=0, count=self.n_rows).sum(axis=0).astype(np.int64)
+
+    def row_positions(self, column: Optional[str] = None) -> np.ndarray:
+        """
+        異常値を含む行の位置
+
+        Args:
+            column: 列名 (省略時はいずれかの列)
+
+        Returns:
+            行位置の配列
+        """
+        mask = self.any_mask() if column is None else self.column_mask(column)
+        return np.flatnonzero(mask)
+
+    def row_labels(self, column: Optional[str] = None) -> list:
+        """異常値を含む行のインデックスラベル"""
+        return self.index[self.row_positions(column)].tolist()
+
+
+class OutlierEngine:
+    """一括計算型の異常値検出エンジンクラス"""
+
+    METHODS = ('iqr', 'zscore', 'mad', 'robust_distance')
+
+    def __init__(self, df: pd.DataFrame, columns: Optional[List[str]] = None):
+        """
+        初期化
+
+        Args:
+            df: 分析対象のDataFrame
+            columns: 対象の数値列 (省略時は全数値列)
+        """
+        if columns is None:
+            columns = list(df.select_dtypes(include=[np.number]).columns)
+        self.df = df
+        self.columns = list(columns)
+        self.index = df.index
+        self._block = None
+
+    @classmethod
+    def from_block(cls, block: np.ndarray, columns: List[str], index: pd.Index) -> 'OutlierEngine':
+        """
+        作成済みの float64 ブロックから作成 (共有メモリ上のブロックなど)
+
+        Args:
+            block: (行数 x 列) の float64 配列
+            columns: 列名
+            index: 行のインデックス
+
+        Returns:
+            OutlierEngine
+        """
+        engine = cls.__new__(cls)
+        engine.df = None
+        engine.columns = list(columns)
+        engine.index = index
+        engine._block = block
+        return engine
+
+    @property
+    def block(self) -> np.ndarray:
+        """数値列の float64 ブロック (初回のみ作成)"""
+        if self._block is None:
+            self._block = self.df[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        return self._block
+
+    def detect(self, method: str = 'iqr', threshold: Optional[float] = None) -> Tuple[Dict[str, Any], OutlierMatrix]:
+        """
+        異常値を検出
+
+        Args:
+            method: 'iqr', 'zscore', 'mad', 'robust_distance'
+            threshold: 判定の閾値 (IQR倍率 / zスコア / 修正zスコア / カイ二乗の上側確率)
+
+        Returns:
+            (detect_outliers 形式の要約, 異常値フラグ行列)
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"未対応の異常値検出方法です: {method}")
+        if method == 'robust_distance':
+            return self._robust_distance(threshold)
+
+        lower, upper = self.bounds(method, threshold)
+        block = self.block
+        with np.errstate(invalid='ignore'):
+            mask = (block < lower) | (block > upper)
+        matrix = OutlierMatrix.from_mask(mask, self.columns, self.index)
+        counts = mask.sum(axis=0)
+
+        outliers = {}
+        for j, col in enumerate(self.columns):
+            if counts[j] > 0:
+                outliers[col] = {
+                    'count': int(counts[j]),
+                    'percentage': float(counts[j] / len(self.index) * 100),
+                    'bounds': {
+                        'lower': float(lower[j]),
+                        'upper': float(upper[j])
+                    }
+                }
+        return outliers, matrix
+
+    def bounds(self, method: str = 'iqr', threshold: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        単変量の方法で列ごとの上下限を計算
+
+        Args:
+            method: 'iqr', 'zscore', 'mad'
+            threshold: 判定の閾値
+
+        Returns:
+            (下限配列, 上限配列)
+        """
+        block = self.block
+        if method == 'iqr':
+            k = Config.OUTLIER_IQR_MULTIPLIER if threshold is None else threshold
+            q1, q3 = block_quantiles(block, [0.25, 0.75])
+            iqr = q3 - q1
+            return q1 - k * iqr, q3 + k * iqr
+
+        if method == 'zscore':
+            z = Config.OUTLIER_ZSCORE_THRESHOLD if threshold is None else threshold
+            with np.errstate(invalid='ignore', divide='ignore'):
+                valid = ~np.isnan(block)
+                count = valid.sum(axis=0)
+                mean = np.where(valid, block, 0.0).sum(axis=0) / count
+                deviation = np.where(valid, block - mean, 0.0)
+                std = np.sqrt(np.einsum('ij,ij->j', deviation, deviation) / (count - 1))
+            return mean - z * std, mean + z * std
+
+        if method == 'mad':
+            z = Config.OUTLIER_MAD_THRESHOLD if threshold is None else threshold
+            median = block_quantiles(block, [0.5])[0]
+            mad = block_quantiles(np.abs(block - median), [0.5])[0]
+            spread = z * mad / MAD_SCALE
+            return median - spread, median + spread
+
+        raise ValueError(f"上下限を持たない異常値検出方法です: {method}")
+
+    def _robust_distance(self, threshold: Optional[float]) -> Tuple[Dict[str, Any], OutlierMatrix]:
+        """
+        ロバスト距離 (簡易 MCD 推定によるマハラノビス距離) で多変量の異常値を検出
+
+        欠損を含む行は判定対象外とする。
+        """
+        probability = Config.OUTLIER_ROBUST_PROBABILITY if threshold is None else threshold
+        block = self.block
+        n_rows, n_cols = block.shape
+        complete = ~np.isnan(block).any(axis=1) if n_cols else np.zeros(n_rows, dtype=bool)
+        data = block[complete]
+        mask = np.zeros(n_rows, dtype=bool)
+        distances = np.full(n_rows, np.nan)
+        cutoff = chi2_quantile(probability, max(n_cols, 1))
+
+        if n_cols > 0 and len(data) > n_cols:
+            location = np.median(data, axis=0)
+            scatter = np.cov(data, rowvar=False).reshape(n_cols, n_cols)
+            h = max(n_cols + 1, int(len(data) * 0.75))
+            # C-step: 距離の小さい h 行で位置と散布を推定し直す
+            for _ in range(2):
+                d2 = self._squared_distances(data, location, scatter)
+                subset = data[np.argpartition(d2, h - 1)[:h]]
+                location = subset.mean(axis=0)
+                scatter = np.cov(subset, rowvar=False).reshape(n_cols, n_cols)
+            d2 = self._squared_distances(data, location, scatter)
+            # 正規分布の下で一致推定量になるよう散布行列の大きさを補正
+            median_d2 = np.median(d2)
+            if median_d2 > 0:
+                d2 = d2 * chi2_quantile(0.5, n_cols) / median_d2
+            distances[complete] = d2
+            mask[complete] = d2 > cutoff
+
+        matrix = OutlierMatrix.from_mask(mask[:, None], [MULTIVARIATE_COLUMN], self.index)
+        count = int(mask.sum())
+        outliers = {}
+        if count > 0:
+            outliers[MULTIVARIATE_COLUMN] = {
+                'count': count,
+                'percentage': float(count / n_rows * 100),
+                'threshold': float(cutoff),
+                'columns': list(self.columns),
+                'max_distance': float(np.nanmax(distances))
+            }
+        return outliers, matrix
+
+    @staticmethod
+    def _squared_distances(data: np.ndarray, location: np.ndarray, scatter: np.ndarray) -> np.ndarray:
+        """各行のマハラノビス距離の2乗"""
+        centered = data - location
+        return ((centered @ np.linalg.pinv(scatter)) * centered).sum(axis=1)
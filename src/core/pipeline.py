@@ -0,0 +1,283 @@
+"""
+分析パイプラインの依存グラフ実行モジュール
+
+「全分析を一括実行」の各段階 (構造分析・グラフ作成・AI分析・インサイト・戦略提案)
+を依存関係つきで宣言し、依存が揃った段階から並行して実行する。ローカルの統計計算、
+グラフ描画、API 呼び出しは互いに待たずに進むので、全体の時間は最も長い依存の連なり
+(クリティカルパス) に近づく。
+各段階の入力の署名 (外部入力のキーと依存する段階の署名のハッシュ) を前回の実行と
+比べ、変わっていなければ前回の結果を使って実行を省く。
+GUI ツールキットに触れる段階 (グラフ描画) はメインスレッドで実行し、同じオブジェクトの
+状態を書き換える段階どうし (同じ AIAnalyzer を使う段階など) は排他グループで同時に実行しない。
+"""
+
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional, Sequence, Callable
+from .config import Config
+
+STAGE_DONE = 'done'
+STAGE_SKIPPED = 'skipped'
+STAGE_EMPTY = 'empty'
+STAGE_FAILED = 'failed'
+STAGE_BLOCKED = 'blocked'
+
+STATUS_LABELS = {
+    STAGE_DONE: '完了',
+    STAGE_SKIPPED: '入力に変更なし (前回の結果を使用)',
+    STAGE_EMPTY: '結果なし',
+    STAGE_FAILED: 'エラー',
+    STAGE_BLOCKED: '前の段階のエラーで中止'
+}
+
+
+class Stage:
+    """パイプラインの1段階"""
+
+    def __init__(self, name: str, run: Callable[[Dict[str, Any]], Any], depends_on: Sequence[str] = (),
+                 key: Optional[Callable[[], Any]] = None, main_thread: bool = False,
+                 exclusive: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            name: 段階の名前
+            run: 依存する段階の結果 {名前: 結果} を受け取って結果を返す関数
+            depends_on: 依存する段階の名前
+            key: 依存する段階以外の入力 (データ・設定など) を表す値を返す関数
+            main_thread: run を呼び出したスレッドで実行する (matplotlib の描画など)
+            exclusive: 排他グループ名 (同じグループの段階は同時に実行しない)
+        """
+        self.name = name
+        self.run = run
+        self.depends_on = tuple(depends_on)
+        self.key = key
+        self.main_thread = main_thread
+        self.exclusive = exclusive
+
+
+class Pipeline:
+    """依存関係のある段階を並行実行するスケジューラー"""
+
+    def __init__(self, stages: Sequence[Stage], max_workers: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            stages: 段階のリスト
+            max_workers: 同時に実行する段階数
+
+        Raises:
+            ValueError: 名前の重複、未定義の依存、循環がある場合
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("段階の名前が重複しています")
+        for stage in stages:
+            unknown = [name for name in stage.depends_on if name not in self.stages]
+            if unknown:
+                raise ValueError(f"段階 '{stage.name}' の依存 {unknown} が定義されていません")
+        self.order = self._topological_order()
+        self.max_workers = max(1, max_workers or Config.PIPELINE_MAX_WORKERS)
+        # 前回の実行の署名と結果 (入力が変わらない段階の省略に使う)
+        self.signatures: Dict[str, str] = {}
+        self.outputs: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _topological_order(self) -> List[str]:
+        remaining = {name: set(stage.depends_on) for name, stage in self.stages.items()}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"段階の依存関係が循環しています: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def _signature(self, stage: Stage, signatures: Dict[str, str]) -> str:
+        digest = hashlib.sha256(stage.name.encode('utf-8'))
+        digest.update(repr(stage.key() if stage.key else None).encode('utf-8'))
+        for name in stage.depends_on:
+            digest.update(f"\x1f{name}={signatures[name]}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _targets(self, targets: Optional[Sequence[str]]) -> List[str]:
+        """対象の段階とその依存を含む段階名 (実行順)"""
+        if targets is None:
+            return list(self.order)
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in self.stages:
+                raise ValueError(f"段階 '{name}' が定義されていません")
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name].depends_on)
+        return [name for name in self.order if name in needed]
+
+    def critical_path(self, stages: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        実行時間で重み付けした最長の依存の連なり
+
+        Args:
+            stages: run の報告の stages
+
+        Returns:
+            段階名のリスト (実行順)
+        """
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in self.order:
+            if name not in stages:
+                continue
+            deps = [dep for dep in self.stages[name].depends_on if dep in finish]
+            slowest = max(deps, key=lambda dep: finish[dep], default=None)
+            previous[name] = slowest
+            finish[name] = stages[name]['duration'] + (finish[slowest] if slowest else 0.0)
+        if not finish:
+            return []
+        name = max(finish, key=lambda stage: finish[stage])
+        path = []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1]
+
+    def run(self, targets: Optional[Sequence[str]] = None, force: bool = False,
+            on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        段階を依存関係の順に並行実行
+
+        例外を送出した段階は failed となり、それに依存する段階は実行しない (blocked)。
+        結果が None の段階は empty となり、次回は入力が同じでも再実行する。
+        main_thread の段階はこのスレッドで、その他の段階はワーカースレッドで実行する
+        (on_stage はスケジューラーのスレッドから呼ばれる)。
+
+        Args:
+            targets: 実行する段階 (依存する段階も含めて実行。省略時は全段階)
+            force: 入力が変わっていない段階も実行する
+            on_stage: 段階が終わるごとに名前と実行情報を受け取る関数
+
+        Returns:
+            stages ({名前: status, start, end, duration, error}), outputs, wall_seconds,
+            serial_seconds, critical_path, critical_path_seconds を含む報告
+        """
+        names = self._targets(targets)
+        started = time.perf_counter()
+        stages: Dict[str, Dict[str, Any]] = {}
+        outputs: Dict[str, Any] = {}
+        signatures: Dict[str, str] = {}
+        waiting = set(names)
+
+        def finish(name: str, info: Dict[str, Any]):
+            stages[name] = info
+            waiting.discard(name)
+            if on_stage:
+                on_stage(name, info)
+
+        def execute(stage: Stage, inputs: Dict[str, Any]):
+            begin = time.perf_counter()
+            try:
+                return stage.run(inputs), None, begin, time.perf_counter()
+            except Exception as e:
+                return None, str(e), begin, time.perf_counter()
+
+        # main_thread の段階はこのスレッドで実行し、スケジューラーは別スレッドで動かす
+        main_jobs: queue.Queue = queue.Queue()
+        failure: List[BaseException] = []
+
+        def schedule(executor: ThreadPoolExecutor):
+            running = {}
+            while waiting or running:
+                # 依存が揃った段階を実行 (または省略) する
+                busy = {self.stages[name].exclusive for name in running.values()} - {None}
+                for name in [name for name in names if name in waiting and name not in running.values()]:
+                    stage = self.stages[name]
+                    deps = stage.depends_on
+                    if any(stages.get(dep, {}).get('status') in (STAGE_FAILED, STAGE_BLOCKED) for dep in deps):
+                        now = time.perf_counter() - started
+                        finish(name, {'status': STAGE_BLOCKED, 'start': now, 'end': now, 'duration': 0.0,
+                                      'error': None})
+                        continue
+                    if any(dep not in stages for dep in deps) or stage.exclusive in busy:
+                        continue
+                    signature = self._signature(stage, signatures)
+                    signatures[name] = signature
+                    with self._lock:
+                        unchanged = self.signatures.get(name) == signature and self.outputs.get(name) is not None
+                    if unchanged and not force:
+                        outputs[name] = self.outputs[name]
+                        now = time.perf_counter() - started
+                        finish(name, {'status': STAGE_SKIPPED, 'start': now, 'end': now, 'duration': 0.0,
+                                      'error': None})
+                        continue
+                    inputs = {dep: outputs.get(dep) for dep in deps}
+                    if stage.exclusive is not None:
+                        busy.add(stage.exclusive)
+                    if stage.main_thread:
+                        future = Future()
+                        main_jobs.put((future, stage, inputs))
+                    else:
+                        future = executor.submit(execute, stage, inputs)
+                    running[future] = name
+
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    output, error, begin, end = future.result()
+                    outputs[name] = output
+                    if error is not None:
+                        status = STAGE_FAILED
+                    else:
+                        status = STAGE_DONE if output is not None else STAGE_EMPTY
+                    with self._lock:
+                        if status == STAGE_DONE:
+                            self.signatures[name] = signatures[name]
+                            self.outputs[name] = output
+                        else:
+                            self.signatures.pop(name, None)
+                            self.outputs.pop(name, None)
+                    finish(name, {'status': status, 'start': begin - started, 'end': end - started,
+                                  'duration': end - begin, 'error': error})
+
+        def scheduler(executor: ThreadPoolExecutor):
+            try:
+                schedule(executor)
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                main_jobs.put(None)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pipeline') as executor:
+            thread = threading.Thread(target=scheduler, args=(executor,), name='pipeline-scheduler', daemon=True)
+            thread.start()
+            while True:
+                job = main_jobs.get()
+                if job is None:
+                    break
+                future, stage, inputs = job
+                future.set_running_or_notify_cancel()
+                future.set_result(execute(stage, inputs))
+            thread.join()
+        if failure:
+            raise failure[0]
+
+        path = self.critical_path(stages)
+        return {
+            'stages': {name: stages[name] for name in names},
+            'outputs': outputs,
+            'wall_seconds': time.perf_counter() - started,
+            'serial_seconds': sum(info['duration'] for info in stages.values()),
+            'critical_path': path,
+            'critical_path_seconds': sum(stages[name]['duration'] for name in path)
+        }
@@ -0,0 +1,289 @@
+"""
+列プロファイリングエンジンモジュール
+
+DataAnalyzer.analyze_data_structure の結果を、列ブロック単位の
+ベクトル化された1パスで計算する。
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from .config import Config
+from .duplicates import DuplicateDetector
+
+# describe() と同じ四分位点
+QUANTILES = (0.25, 0.5, 0.75)
+QUANTILE_LABELS = ('25%', '50%', '75%')
+
+# カテゴリ列で報告する上位値の件数
+TOP_VALUES = 5
+
+
+def _lerp(a: np.ndarray, b: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """numpy.quantile(method='linear') と同じ補間"""
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def block_quantiles(block: np.ndarray, qs, count: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    数値ブロックの分位点を全列まとめて計算 (NaNは除外)
+
+    欠損を含まないブロックは numpy.quantile の部分ソートを、
+    含むブロックは列ごとの全ソートを1回だけ行い、有効件数から位置を求める。
+
+    Args:
+        block: float64 の2次元配列 (行 x 列)
+        qs: 分位 (0-1) のリスト
+        count: 列ごとの有効件数 (計算済みの場合)
+
+    Returns:
+        (分位数 x 列) の配列 (有効値のない列はNaN)
+    """
+    qs = np.asarray(qs, dtype=np.float64)
+    n_rows, n_cols = block.shape
+    if count is None:
+        count = (~np.isnan(block)).sum(axis=0)
+    quantiles = np.full((len(qs), n_cols), np.nan)
+    if n_rows == 0:
+        return quantiles
+    if (count == n_rows).all():
+        return np.quantile(block, qs, axis=0).reshape(len(qs), n_cols)
+
+    # NaN は np.sort で末尾に並ぶ
+    ordered = np.sort(block, axis=0)
+    nonempty = count > 0
+    cols = np.flatnonzero(nonempty)
+    last = count[nonempty] - 1
+    for k, q in enumerate(qs):
+        position = q * last
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        quantiles[k, nonempty] = _lerp(
+            ordered[lower, cols], ordered[upper, cols], position - lower
+        )
+    return quantiles
+
+
+def numeric_block_stats(block: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    数値ブロック (行 x 列) の統計量を列ごとに計算
+
+    欠損値 (NaN) は除外して集計する。
+
+    Args:
+        block: float64 の2次元配列
+
+    Returns:
+        count, mean, std, min, max, quantiles (3 x 列) の配列辞書
+    """
+    n_cols = block.shape[1]
+    valid = ~np.isnan(block)
+    count = valid.sum(axis=0)
+    has_nan = bool((count < block.shape[0]).any())
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if has_nan:
+            filled = np.where(valid, block, 0.0)
+            mean = filled.sum(axis=0) / count
+            deviation = np.where(valid, block - mean, 0.0)
+        else:
+            mean = block.sum(axis=0) / count
+            deviation = block - mean
+        variance = np.einsum('ij,ij->j', deviation, deviation) / (count - 1)
+        std = np.where(count > 1, np.sqrt(variance), np.nan)
+
+    minimum = np.full(n_cols, np.nan)
+    maximum = np.full(n_cols, np.nan)
+    if block.shape[0] > 0 and not has_nan:
+        minimum = block.min(axis=0)
+        maximum = block.max(axis=0)
+    elif block.shape[0] > 0:
+        nonempty = count > 0
+        minimum[nonempty] = np.where(valid, block, np.inf).min(axis=0)[nonempty]
+        maximum[nonempty] = np.where(valid, block, -np.inf).max(axis=0)[nonempty]
+    quantiles = block_quantiles(block, QUANTILES, count)
+
+    return {
+        'count': count.astype(float),
+        'mean': mean,
+        'std': std,
+        'min': minimum,
+        'max': maximum,
+        'quantiles': quantiles
+    }
+
+
+def stats_to_describe(columns: List[str], stats: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+    """
+    numeric_block_stats の結果を DataFrame.describe().to_dict() と同じ形に変換
+
+    Args:
+        columns: 列名リスト
+        stats: numeric_block_stats の戻り値
+
+    Returns:
+        {列名: {'count': ..., 'mean': ..., ...}} 形式の辞書
+    """
+    summary = {}
+    for i, col in enumerate(columns):
+        entry = {
+            'count': float(stats['count'][i]),
+            'mean': float(stats['mean'][i]),
+            'std': float(stats['std'][i]),
+            'min': float(stats['min'][i])
+        }
+        for k, label in enumerate(QUANTILE_LABELS):
+            entry[label] = float(stats['quantiles'][k, i])
+        entry['max'] = float(stats['max'][i])
+        summary[col] = entry
+    return summary
+
+
+def categorical_column_stats(series: pd.Series, top_n: int = TOP_VALUES) -> Dict[str, Any]:
+    """
+    カテゴリ列を1回の factorize で集計
+
+    Args:
+        series: 対象列
+        top_n: 上位値の件数
+
+    Returns:
+        unique_values, top_values, missing を含む辞書
+    """
+    codes, uniques = pd.factorize(series)
+    order, counts, missing = code_counts(codes, len(uniques), top_n)
+    return {
+        'unique_values': int(len(uniques)),
+        'top_values': {uniques[i]: int(c) for i, c in zip(order, counts)},
+        'missing': missing
+    }
+
+
+def code_counts(codes: np.ndarray, n_uniques: int, top_n: int = TOP_VALUES) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    factorize のコード (-1 は欠損) から上位値を集計
+
+    Args:
+        codes: コード配列
+        n_uniques: ユニーク値の数
+        top_n: 上位値の件数
+
+    Returns:
+        (上位値のコード, その件数, 欠損数)
+    """
+    present = codes[codes >= 0]
+    counts = np.bincount(present, minlength=n_uniques)
+    # 安定ソートにより同数の値は出現順となり value_counts() と一致する
+    order = np.argsort(-counts, kind='stable')[:top_n]
+    return order, counts[order], int(len(codes) - len(present))
+
+
+class ColumnProfiler:
+    """列プロファイリングクラス"""
+
+    def __init__(self, df: pd.DataFrame, block_size: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            df: 分析対象のDataFrame
+            block_size: 1ブロックあたりの数値列数
+        """
+        self.df = df
+        self.block_size = block_size or Config.PROFILE_BLOCK_COLUMNS
+
+    def numeric_columns(self) -> List[str]:
+        """数値列の一覧"""
+        return list(self.df.select_dtypes(include=[np.number]).columns)
+
+    def categorical_columns(self) -> List[str]:
+        """カテゴリ列の一覧"""
+        return list(self.df.select_dtypes(include=['object', 'string']).columns)
+
+    def iter_numeric_blocks(self, columns: List[str]):
+        """
+        数値列をブロック単位の float64 配列として取り出す
+
+        Args:
+            columns: 数値列名リスト
+
+        Yields:
+            (列名リスト, 2次元配列)
+        """
+        for start in range(0, len(columns), self.block_size):
+            block_cols = columns[start:start + self.block_size]
+            block = self.df[block_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+            yield block_cols, block
+
+    def profile_numeric(self, columns: List[str]) -> Tuple[Dict[str, Dict[str, float]], Dict[str, int]]:
+        """
+        数値列の統計情報を計算
+
+        Args:
+            columns: 数値列名リスト
+
+        Returns:
+            (describe().to_dict() 形式の辞書, 列ごとの欠損数)
+        """
+        summary = {}
+        missing = {}
+        n_rows = len(self.df)
+        for block_cols, block in self.iter_numeric_blocks(columns):
+            stats = numeric_block_stats(block)
+            summary.update(stats_to_describe(block_cols, stats))
+            for i, col in enumerate(block_cols):
+                missing[col] = int(n_rows - stats['count'][i])
+        return summary, missing
+
+    def profile_categorical(self, columns: List[str]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+        """
+        カテゴリ列の集計
+
+        Args:
+            columns: カテゴリ列名リスト
+
+        Returns:
+            (categorical_summary 形式の辞書, 列ごとの欠損数)
+        """
+        summary = {}
+        missing = {}
+        for col in columns:
+            stats = categorical_column_stats(self.df[col])
+            missing[col] = stats.pop('missing')
+            summary[col] = stats
+        return summary, missing
+
+    def count_duplicates(self) -> int:
+        """重複行数を数える (行フィンガープリント方式)"""
+        return DuplicateDetector(self.df).count()
+
+    def profile(self) -> Dict[str, Any]:
+        """
+        analyze_data_structure と同じ形の分析結果を生成
+
+        Returns:
+            分析結果辞書
+        """
+        numeric_cols = self.numeric_columns()
+        categorical_cols = self.categorical_columns()
+
+        numeric_summary, missing = self.profile_numeric(numeric_cols)
+        categorical_summary, categorical_missing = self.profile_categorical(categorical_cols)
+        missing.update(categorical_missing)
+
+        for col in self.df.columns:
+            if col not in missing:
+                missing[col] = int(self.df[col].isna().sum())
+
+        return {
+            'basic_info': {
+                'shape': self.df.shape,
+                'columns': list(self.df.columns),
+                'data_types': self.df.dtypes.to_dict(),
+                'missing_values': {col: missing[col] for col in self.df.columns},
+                'duplicate_rows': self.count_duplicates()
+            },
+            'numeric_summary': numeric_summary,
+            'categorical_summary': categorical_summary
+        }
@@ -0,0 +1,303 @@
+"""
+AI分析プロンプトの組み立てモジュール
+
+列一覧・データ型・統計量をそのまま JSON (indent=2) で埋め込むと、
+列数の多い表ではプロンプトがコンテキスト長を超え、呼び出しも遅く高価になる。
+ここではトークン数をローカルで見積もりながら、統計情報を設定した予算に収める。
+列は欠損率とばらつきで重要度を付けて上位から入れ、数値は有効桁で丸め、
+統計量はインデントなしの区切り表で表現する。圧縮前のプロンプトとの差を
+削減トークン数として報告する。
+"""
+
+import json
+import math
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
+from .config import Config
+from .tokens import estimate_tokens
+
+PROMPT_HEADER = "以下は企業データの分析結果です。このデータを詳しく分析し、ビジネス観点から重要な洞察を提供してください。"
+
+PROMPT_FOOTER = """以下の観点から分析してください:
+1. データの特徴と品質
+2. 主要な傾向とパターン
+3. 異常値や注目すべき点
+4. ビジネス上の意味と示唆
+5. 推奨される可視化方法
+6. データドリブンな意思決定のための提言"""
+
+NUMERIC_STATS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+# カテゴリ列ごとに表に載せる上位値の数と、値の最大文字数
+TOP_VALUES_IN_PROMPT = 3
+MAX_VALUE_CHARS = 20
+
+# 欠損値のある列として列挙する最大数
+MAX_MISSING_LISTED = 20
+
+
+def _context_text(text_context: Optional[str]) -> str:
+    # 長いテキストは AIAnalyzer.summarize_context で上限以下に要約してから渡す
+    if not text_context:
+        return ""
+    return f"\n\n追加のテキスト情報:\n{text_context}"
+
+
+def verbose_prompt(data_info: Dict[str, Any], data_sample: str, text_context: Optional[str] = None) -> str:
+    """
+    圧縮しないプロンプト (全列の情報を JSON でそのまま埋め込む)
+
+    Args:
+        data_info: データの基本情報
+        data_sample: データサンプル
+        text_context: 追加のテキストコンテキスト
+
+    Returns:
+        プロンプト
+    """
+    return f"""
+{PROMPT_HEADER}
+
+データの基本情報:
+- 行数: {data_info['basic_info']['shape'][0]}
+- 列数: {data_info['basic_info']['shape'][1]}
+- 列名: {data_info['basic_info']['columns']}
+- データ型: {data_info['basic_info']['data_types']}
+- 欠損値: {data_info['basic_info']['missing_values']}
+
+データサンプル:
+{data_sample}
+
+数値データの統計:
+{json.dumps(data_info['numeric_summary'], indent=2, ensure_ascii=False)}
+
+カテゴリデータの統計:
+{json.dumps(data_info['categorical_summary'], indent=2, ensure_ascii=False)}
+
+{_context_text(text_context)}
+
+{PROMPT_FOOTER}
+"""
+
+
+def compact_number(value, digits: int = 4) -> str:
+    """
+    数値を有効桁で丸めた短い文字列にする
+
+    Args:
+        value: 数値
+        digits: 有効桁数
+
+    Returns:
+        文字列 (欠損は '-')
+    """
+    if value is None:
+        return '-'
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if math.isnan(value):
+        return '-'
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.{digits}g}"
+
+
+def _short(value) -> str:
+    text = str(value).replace('|', '/').replace('\n', ' ')
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 1] + '…'
+
+
+class AnalysisPromptBuilder:
+    """トークン予算に収まる分析プロンプトを組み立てるクラス"""
+
+    def __init__(self, model: Optional[str] = None, budget: Optional[int] = None,
+                 sample_share: Optional[float] = None, digits: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            model: モデル名 (トークン見積もりに使用)
+            budget: プロンプト全体のトークン予算 (0 は圧縮しない)
+            sample_share: データサンプルに割り当てる予算の割合
+            digits: 統計量の有効桁数
+        """
+        self.model = model or Config.ANALYSIS_MODEL
+        self.budget = Config.PROMPT_TOKEN_BUDGET if budget is None else budget
+        self.sample_share = Config.PROMPT_SAMPLE_SHARE if sample_share is None else sample_share
+        self.digits = digits or Config.PROMPT_SIGNIFICANT_DIGITS
+
+    def count_tokens(self, text: str) -> int:
+        """テキストのトークン数を見積もる"""
+        return estimate_tokens(text, self.model)
+
+    def _fit_lines(self, lines: List[str], budget: int) -> List[str]:
+        """予算に収まる先頭の行"""
+        fitted = []
+        used = 0
+        for line in lines:
+            tokens = self.count_tokens(line) + 1
+            if used + tokens > budget:
+                break
+            fitted.append(line)
+            used += tokens
+        return fitted
+
+    def rank_columns(self, data_info: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        統計表に載せる列を重要度順に並べる
+
+        重要度は欠損率とばらつきの順位 (数値列は変動係数、カテゴリ列はユニーク数の
+        パーセンタイル) の和。
+
+        Args:
+            data_info: データの基本情報
+
+        Returns:
+            [(列名, 'numeric' または 'categorical'), ...]
+        """
+        rows = max(1, data_info['basic_info']['shape'][0])
+        missing = data_info['basic_info'].get('missing_values', {})
+        numeric = data_info.get('numeric_summary', {})
+        categorical = data_info.get('categorical_summary', {})
+
+        scores = []
+        if numeric:
+            cv = pd.Series({
+                col: abs(stats.get('std') or 0.0) / abs(stats['mean']) if stats.get('mean') else np.inf
+                for col, stats in numeric.items()
+            }).fillna(0.0)
+            spread = cv.rank(pct=True)
+            scores += [(missing.get(col, 0) / rows + spread[col], col, 'numeric') for col in numeric]
+        if categorical:
+            uniques = pd.Series({col: stats.get('unique_values', 0) for col, stats in categorical.items()})
+            spread = uniques.rank(pct=True)
+            scores += [(missing.get(col, 0) / rows + spread[col], col, 'categorical') for col in categorical]
+
+        # 同点は元の列順
+        order = {col: i for i, col in enumerate(data_info['basic_info']['columns'])}
+        scores.sort(key=lambda item: (-item[0], order.get(item[1], len(order))))
+        return [(col, kind) for _, col, kind in scores]
+
+    def numeric_line(self, column: str, stats: Dict[str, Any]) -> str:
+        """数値列の統計表の1行"""
+        return '|'.join([_short(column)] + [compact_number(stats.get(name), self.digits) for name in NUMERIC_STATS])
+
+    def categorical_line(self, column: str, stats: Dict[str, Any]) -> str:
+        """カテゴリ列の統計表の1行"""
+        top = list(stats.get('top_values', {}).items())[:TOP_VALUES_IN_PROMPT]
+        values = ', '.join(f"{_short(value)}:{count}" for value, count in top)
+        return f"{_short(column)}|{stats.get('unique_values', '-')}|{values}"
+
+    def _column_list(self, data_info: Dict[str, Any], budget: int) -> List[str]:
+        """データ型ごとにまとめた列名の行 (予算を超えた列は件数だけ示す)"""
+        groups = {}
+        for col, dtype in data_info['basic_info'].get('data_types', {}).items():
+            groups.setdefault(str(dtype), []).append(_short(col))
+        lines = []
+        used = 0
+        omitted = 0
+        for dtype, cols in groups.items():
+            used += self.count_tokens(dtype) + 2
+            names = []
+            for col in cols:
+                tokens = self.count_tokens(col) + 1
+                if used + tokens > budget:
+                    omitted += 1
+                    continue
+                names.append(col)
+                used += tokens
+            if names:
+                lines.append(f"  {dtype}: {', '.join(names)}")
+        if omitted:
+            lines.append(f"  ほか {omitted} 列")
+        return lines
+
+    def _missing_line(self, data_info: Dict[str, Any]) -> str:
+        missing = {col: count for col, count in data_info['basic_info'].get('missing_values', {}).items() if count}
+        if not missing:
+            return "- 欠損値: なし"
+        ordered = sorted(missing.items(), key=lambda item: -item[1])
+        listed = ', '.join(f"{_short(col)}={count}" for col, count in ordered[:MAX_MISSING_LISTED])
+        rest = len(ordered) - MAX_MISSING_LISTED
+        suffix = f" ほか {rest} 列" if rest > 0 else ""
+        return f"- 欠損値のある列 ({len(ordered)} 列, 多い順): {listed}{suffix}"
+
+    def build(self, data_info: Dict[str, Any], data_sample: str,
+              text_context: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        予算に収めたプロンプトを作成
+
+        Args:
+            data_info: データの基本情報
+            data_sample: データサンプル
+            text_context: 追加のテキストコンテキスト
+
+        Returns:
+            (プロンプト, 報告) 報告は tokens, baseline_tokens, saved_tokens,
+            numeric_columns, categorical_columns (載せた列数, 全列数) を含む
+        """
+        baseline = verbose_prompt(data_info, data_sample, text_context)
+        baseline_tokens = self.count_tokens(baseline)
+        numeric = data_info.get('numeric_summary', {})
+        categorical = data_info.get('categorical_summary', {})
+        if not self.budget:
+            return baseline, {
+                'tokens': baseline_tokens,
+                'baseline_tokens': baseline_tokens,
+                'saved_tokens': 0,
+                'numeric_columns': (len(numeric), len(numeric)),
+                'categorical_columns': (len(categorical), len(categorical))
+            }
+
+        basic = data_info['basic_info']
+        basic_lines = [f"- 行数: {basic['shape'][0]}", f"- 列数: {basic['shape'][1]}"]
+        if 'duplicate_rows' in basic:
+            basic_lines.append(f"- 重複行数: {basic['duplicate_rows']}")
+        basic_lines.append(self._missing_line(data_info))
+        fixed = '\n'.join([PROMPT_HEADER, "データの基本情報:"] + basic_lines
+                          + [_context_text(text_context), PROMPT_FOOTER])
+        remaining = self.budget - self.count_tokens(fixed)
+
+        sample_lines = self._fit_lines(data_sample.splitlines(), int(self.budget * self.sample_share))
+        remaining -= self.count_tokens('\n'.join(sample_lines))
+
+        # 列名一覧は残りの1/4まで、統計表は残りすべて
+        column_lines = self._column_list(data_info, max(0, remaining // 4))
+        remaining -= self.count_tokens('\n'.join(column_lines))
+
+        numeric_lines, categorical_lines = [], []
+        used = 0
+        for col, kind in self.rank_columns(data_info):
+            if kind == 'numeric':
+                line = self.numeric_line(col, numeric[col])
+            else:
+                line = self.categorical_line(col, categorical[col])
+            tokens = self.count_tokens(line) + 1
+            if used + tokens > remaining:
+                break
+            (numeric_lines if kind == 'numeric' else categorical_lines).append(line)
+            used += tokens
+
+        sections = [PROMPT_HEADER, "", "データの基本情報:"] + basic_lines
+        sections += ["- 列 (データ型別):"] + column_lines
+        sections += ["", "データサンプル:"] + sample_lines
+        if numeric:
+            sections += ["", f"数値データの統計 (重要度順, {len(numeric_lines)}/{len(numeric)} 列):",
+                         '|'.join(['列'] + NUMERIC_STATS)] + numeric_lines
+        if categorical:
+            sections += ["", f"カテゴリデータの統計 (重要度順, {len(categorical_lines)}/{len(categorical)} 列):",
+                         "列|ユニーク数|上位値:件数"] + categorical_lines
+        sections += [_context_text(text_context), "", PROMPT_FOOTER]
+        prompt = '\n'.join(sections)
+
+        tokens = self.count_tokens(prompt)
+        return prompt, {
+            'tokens': tokens,
+            'baseline_tokens': baseline_tokens,
+            'saved_tokens': max(0, baseline_tokens - tokens),
+            'numeric_columns': (len(numeric_lines), len(numeric)),
+            'categorical_columns': (len(categorical_lines), len(categorical))
+        }
@@ -0,0 +1,115 @@
+"""
+レート制限モジュール
+
+API のリクエスト数 (RPM) とトークン数 (TPM) の上限を asyncio 用の
+トークンバケットで守る。バケットの容量は数秒分 (Config.RATE_LIMIT_BURST_SECONDS)
+とし、分単位の上限を短い区間で一気に使い切らないようにする。
+"""
+
+import asyncio
+import time
+from typing import Optional
+from .config import Config
+
+
+class TokenBucket:
+    """asyncio 用トークンバケット"""
+
+    def __init__(self, rate_per_minute: float, burst_seconds: Optional[float] = None,
+                 clock=time.monotonic):
+        """
+        初期化
+
+        Args:
+            rate_per_minute: 1分あたりの補充量
+            burst_seconds: 容量 (何秒分の補充量を貯められるか)
+            clock: 現在時刻 (秒) を返す関数
+        """
+        burst_seconds = Config.RATE_LIMIT_BURST_SECONDS if burst_seconds is None else burst_seconds
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """
+        指定量が使えるまで待って消費する
+
+        容量を超える量は容量まで切り詰め、バケットが満杯になった時点で通す。
+
+        Args:
+            amount: 消費量
+
+        Returns:
+            実際に消費した量 (精算はこの量に対して行う)
+        """
+        amount = min(amount, self.capacity)
+        # ロックで待ち行列を作り、先に来た要求から順に通す
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return amount
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """
+        見積もりと実績の差を反映 (正なら返却、負なら追加消費)
+
+        Args:
+            amount: 返却する量
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """RPM と TPM の両方を守るレート制限"""
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 burst_seconds: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            rpm: 1分あたりのリクエスト数上限 (0 は制限なし)
+            tpm: 1分あたりのトークン数上限 (0 は制限なし)
+            burst_seconds: バケットの容量 (秒)
+        """
+        self.requests = TokenBucket(rpm, burst_seconds) if rpm else None
+        self.tokens = TokenBucket(tpm, burst_seconds) if tpm else None
+
+    async def acquire(self, tokens: int):
+        """
+        1リクエスト分と見積もりトークン数を確保
+
+        Args:
+            tokens: 見積もりトークン数 (入力 + 最大出力)
+
+        Returns:
+            実際に確保したトークン数 (容量を超える見積もりは容量まで切り詰める)
+        """
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            return await self.tokens.acquire(tokens)
+        return tokens
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """
+        実際の使用トークン数で見積もりを精算
+
+        Args:
+            estimated: acquire が返した確保済みの量
+            actual: 実際の使用量 (不明な場合はNone)
+        """
+        if self.tokens is not None and actual is not None:
+            self.tokens.adjust(estimated - actual)
@@ -0,0 +1,121 @@
+"""
+分析結果キャッシュモジュール
+
+DataFrame のフィンガープリントをキーに DataAnalyzer の計算結果を保持する。
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import Config
+
+
+def dataframe_fingerprint(df: pd.DataFrame, sample_rows: Optional[int] = None) -> str:
+    """
+    DataFrame の軽量なフィンガープリントを計算
+
+    形状・列名・データ型に加え、行ハッシュを組み合わせる。
+    行数が sample_rows 以下なら全行、それを超える場合は等間隔の行と
+    末尾の行のみをハッシュする (サンプル外のセル値の書き換えは検出されない)。
+
+    Args:
+        df: 対象のDataFrame
+        sample_rows: 全行ハッシュとする上限行数 (Noneの場合は設定値)
+
+    Returns:
+        16進文字列のフィンガープリント
+    """
+    sample_rows = sample_rows or Config.FINGERPRINT_SAMPLE_ROWS
+    digest = hashlib.sha1()
+    digest.update(repr(df.shape).encode('utf-8'))
+    for col, dtype in df.dtypes.items():
+        digest.update(f"{col}\x1f{dtype}\x1e".encode('utf-8'))
+
+    n_rows = len(df)
+    if n_rows > sample_rows:
+        # 追記を確実に検出できるよう末尾の行は必ず含める
+        tail = min(n_rows, max(1, sample_rows // 10))
+        positions = np.unique(np.concatenate([
+            np.linspace(0, n_rows - tail - 1, sample_rows - tail).astype(np.int64),
+            np.arange(n_rows - tail, n_rows)
+        ]))
+        sample = df.iloc[positions]
+    else:
+        sample = df
+
+    if n_rows > 0 and df.shape[1] > 0:
+        row_hashes = pd.util.hash_pandas_object(sample, index=True)
+        digest.update(np.ascontiguousarray(row_hashes.to_numpy()).tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """分析結果キャッシュクラス"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            max_entries: 保持する最大エントリ数 (超過時は最も古いものから破棄)
+        """
+        self.max_entries = max_entries or Config.RESULT_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, df: pd.DataFrame, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        キャッシュ済みの結果を返し、無ければ計算して保存
+
+        Args:
+            df: 結果の元になったDataFrame
+            key: 計算の種類を表すキー
+            compute: 結果を計算する関数
+
+        Returns:
+            計算結果
+        """
+        cache_key = (dataframe_fingerprint(df), key)
+        with self._lock:
+            if cache_key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(cache_key)
+                return self._entries[cache_key]
+            self.misses += 1
+
+        result = compute()
+
+        with self._lock:
+            self._entries[cache_key] = result
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self):
+        """全てのエントリを破棄"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの利用状況を取得
+
+        Returns:
+            ヒット数・ミス数・ヒット率・エントリ数の辞書
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries)
+            }
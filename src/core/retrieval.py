@@ -0,0 +1,309 @@
+"""
+追加テキストの BM25 検索モジュール
+
+追加テキスト (市場環境の資料など) を段落単位の文書に分け、文字 bigram の転置インデックスを
+作って BM25 で検索する。日本語は単語の区切りがないため、連続する2文字を語として扱う
+(英数字は小文字・半角にそろえる)。AI分析の各プロンプトには、データの列名と分析の目的で
+検索した上位の段落だけを入れる。
+インデックスの作成は文字コードの配列に対する numpy の演算とソートだけで行い
+(10MB のテキストで1秒未満)、テキストのハッシュをファイル名にしてディスクに保存し再利用する。
+"""
+
+import hashlib
+import math
+import os
+import re
+from typing import Dict, Any, List, Optional
+import numpy as np
+from .config import Config
+
+# 文書番号に使うビット数 (語の ID は2文字 × 21ビット)
+PASSAGE_BITS = 22
+PASSAGE_MASK = (1 << PASSAGE_BITS) - 1
+
+INDEX_VERSION = 1
+
+# 語に使う文字 (英数字と、記号・句読点以外の非 ASCII 文字)
+_TERM_CHARS = np.zeros(0x10000, dtype=bool)
+_TERM_CHARS[ord('0'):ord('9') + 1] = True
+_TERM_CHARS[ord('a'):ord('z') + 1] = True
+_TERM_CHARS[0xC0:] = True
+_TERM_CHARS[0x2000:0x2C00] = False  # 句読点・記号・罫線
+_TERM_CHARS[0x3000:0x3040] = False  # 和文の句読点・括弧
+_TERM_CHARS[0xFF00:0xFF66] = False  # 全角・半角の記号
+_TERM_CHARS[0xFFF0:] = False
+
+# 全角英数字を半角に、英字を小文字にそろえる変換表
+_FOLD = np.arange(0x10000, dtype=np.uint32)
+_FOLD[0xFF01:0xFF5F] -= 0xFEE0
+_FOLD[ord('A'):ord('Z') + 1] += 32
+_FOLD[0xFF21:0xFF3B] += 32
+
+_PARAGRAPH_BREAK = re.compile(r'\n[ \t\r\f\v　]*\n')
+
+
+def _char_codes(text: str) -> np.ndarray:
+    """文字コードの配列 (全角英数字は半角に、英字は小文字にそろえる。文字数は変えない)"""
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    bmp = codes <= 0xFFFF
+    if bmp.all():
+        return _FOLD[codes]
+    codes = codes.copy()
+    codes[bmp] = _FOLD[codes[bmp]]
+    return codes
+
+
+def _term_positions(codes: np.ndarray) -> np.ndarray:
+    """語 (2文字) の先頭になる位置の真偽値 (長さは len(codes) - 1)"""
+    valid = _TERM_CHARS[np.minimum(codes, 0xFFFF)] | (codes > 0xFFFF)
+    return valid[:-1] & valid[1:]
+
+
+def term_ids(text: str) -> np.ndarray:
+    """
+    テキストの語 ID (文字 bigram)
+
+    Args:
+        text: 対象テキスト
+
+    Returns:
+        出現順の語 ID の配列 (重複を含む)
+    """
+    codes = _char_codes(text).astype(np.uint64)
+    if len(codes) < 2:
+        return np.empty(0, dtype=np.uint64)
+    ok = _term_positions(codes.astype(np.uint32))
+    return ((codes[:-1] << np.uint64(21)) | codes[1:])[ok]
+
+
+def passage_starts(text: str, max_chars: int) -> List[int]:
+    """
+    テキストを段落単位の文書に分ける位置
+
+    空行で区切った段落を max_chars 以下になるまで連結する。max_chars を超える段落は行で、
+    それでも超える行は文字数で分ける。
+
+    Args:
+        text: 対象テキスト
+        max_chars: 1文書の最大文字数
+
+    Returns:
+        文書の開始位置のリスト (先頭は0)
+    """
+    starts = [0]
+    current = 0
+    ends = [m.end() for m in _PARAGRAPH_BREAK.finditer(text)] + [len(text)]
+    position = 0
+    for end in ends:
+        if end - current > max_chars and position > current:
+            starts.append(position)
+            current = position
+        if end - current > max_chars:
+            for line in text[position:end].splitlines(keepends=True):
+                line_end = position + len(line)
+                if line_end - current > max_chars and position > current:
+                    starts.append(position)
+                    current = position
+                while line_end - current > max_chars:
+                    current += max_chars
+                    starts.append(current)
+                position = line_end
+        position = end
+    return starts
+
+
+class BM25Index:
+    """段落単位の文書に対する BM25 の転置インデックス"""
+
+    def __init__(self, text: str, starts: np.ndarray, terms: np.ndarray, term_starts: np.ndarray,
+                 postings: np.ndarray, frequencies: np.ndarray, lengths: np.ndarray,
+                 k1: Optional[float] = None, b: Optional[float] = None):
+        """
+        初期化 (通常は build か load で作成する)
+
+        Args:
+            text: 元のテキスト
+            starts: 文書の開始位置
+            terms: 語 ID (昇順)
+            term_starts: 語ごとの postings の開始位置 (末尾に全体の長さ)
+            postings: 語を含む文書番号
+            frequencies: 文書内の語の出現回数
+            lengths: 文書ごとの語数
+            k1: BM25 の k1 (省略時は設定値)
+            b: BM25 の b (省略時は設定値)
+        """
+        self.text = text
+        self.starts = starts
+        self.terms = terms
+        self.term_starts = term_starts
+        self.postings = postings
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.k1 = Config.RETRIEVAL_BM25_K1 if k1 is None else k1
+        self.b = Config.RETRIEVAL_BM25_B if b is None else b
+        self.source_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        average = lengths.mean() if len(lengths) and lengths.sum() else 1.0
+        # 文書の長さによる正規化 (検索ごとに計算しない)
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / average)
+
+    @classmethod
+    def build(cls, text: str, passage_chars: Optional[int] = None) -> 'BM25Index':
+        """
+        テキストからインデックスを作成
+
+        Args:
+            text: 対象テキスト
+            passage_chars: 1文書の最大文字数 (省略時は設定値)
+
+        Returns:
+            BM25Index
+        """
+        passage_chars = passage_chars or Config.RETRIEVAL_PASSAGE_CHARS
+        starts = np.asarray(passage_starts(text, passage_chars), dtype=np.int64)
+        if len(starts) > PASSAGE_MASK:
+            raise ValueError(f"文書数が多すぎます: {len(starts)}")
+        codes = _char_codes(text)
+        n = len(codes)
+        if n < 2:
+            empty = np.empty(0, dtype=np.uint64)
+            return cls(text, starts, empty, np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.uint32),
+                       np.empty(0, dtype=np.uint32), np.zeros(len(starts), dtype=np.float64))
+
+        # 位置ごとの文書番号。文書をまたぐ2文字は語にしない
+        passage = np.repeat(np.arange(len(starts), dtype=np.uint64), np.diff(np.append(starts, n)))
+        positions = np.flatnonzero(_term_positions(codes) & (passage[:-1] == passage[1:]))
+        wide = codes.astype(np.uint64)
+        # (語 ID, 文書番号) を1つの整数にしてソートし、同じ組の数を出現回数にする
+        keys = ((wide[positions] << np.uint64(21 + PASSAGE_BITS))
+                | (wide[positions + 1] << np.uint64(PASSAGE_BITS)) | passage[positions])
+        keys.sort()
+        first = np.empty(len(keys), dtype=bool)
+        first[:1] = True
+        np.not_equal(keys[1:], keys[:-1], out=first[1:])
+        pair_starts = np.flatnonzero(first)
+        pairs = keys[pair_starts]
+        frequencies = np.diff(np.append(pair_starts, len(keys))).astype(np.uint32)
+        postings = (pairs & np.uint64(PASSAGE_MASK)).astype(np.uint32)
+
+        pair_terms = pairs >> np.uint64(PASSAGE_BITS)
+        first = np.empty(len(pair_terms), dtype=bool)
+        first[:1] = True
+        np.not_equal(pair_terms[1:], pair_terms[:-1], out=first[1:])
+        term_first = np.flatnonzero(first)
+        lengths = np.bincount(postings, weights=frequencies, minlength=len(starts))
+        return cls(text, starts, pair_terms[term_first], np.append(term_first, len(pairs)),
+                   postings, frequencies, lengths)
+
+    @property
+    def size(self) -> int:
+        """文書数"""
+        return len(self.starts)
+
+    def passage(self, index: int) -> str:
+        """文書のテキスト"""
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else len(self.text)
+        return self.text[self.starts[index]:end].strip()
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        クエリに関連する文書を BM25 で検索
+
+        Args:
+            query: 検索クエリ
+            top_k: 返す文書数 (省略時は設定値)
+
+        Returns:
+            スコアの高い順の [{'index', 'score', 'text'}] (スコアが0の文書は含まない)
+        """
+        top_k = top_k or Config.RETRIEVAL_TOP_K
+        query_terms = np.unique(term_ids(query))
+        if not len(query_terms) or not len(self.terms):
+            return []
+        found = np.searchsorted(self.terms, query_terms)
+        found = found[found < len(self.terms)]
+        found = found[np.isin(self.terms[found], query_terms)]
+
+        scores = np.zeros(self.size)
+        total = self.size
+        for term in found:
+            start, end = self.term_starts[term], self.term_starts[term + 1]
+            docs = self.postings[start:end]
+            tf = self.frequencies[start:end]
+            df = end - start
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._norm[docs])
+
+        top_k = min(top_k, int(np.count_nonzero(scores)))
+        if top_k <= 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [{'index': int(i), 'score': float(scores[i]), 'text': self.passage(int(i))} for i in best]
+
+    def save(self, path: str):
+        """
+        インデックスをファイルに保存 (書き込み途中のファイルは残さない)
+
+        Args:
+            path: 保存先 (.npz)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, version=np.array([INDEX_VERSION]),
+                     text=np.frombuffer(self.text.encode('utf-8'), dtype=np.uint8),
+                     starts=self.starts, terms=self.terms, term_starts=self.term_starts,
+                     postings=self.postings, frequencies=self.frequencies, lengths=self.lengths)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        """
+        保存したインデックスを読み込む
+
+        Args:
+            path: 保存したファイル
+
+        Returns:
+            BM25Index
+
+        Raises:
+            ValueError: 形式の異なるファイルの場合
+        """
+        with np.load(path) as data:
+            if int(data['version'][0]) != INDEX_VERSION:
+                raise ValueError(f"インデックスの形式が異なります: {path}")
+            return cls(data['text'].tobytes().decode('utf-8'), data['starts'], data['terms'],
+                       data['term_starts'], data['postings'], data['frequencies'], data['lengths'])
+
+    @classmethod
+    def load_or_build(cls, text: str, directory: Optional[str] = None,
+                      passage_chars: Optional[int] = None) -> 'BM25Index':
+        """
+        保存済みのインデックスがあれば読み込み、なければ作成して保存
+
+        Args:
+            text: 対象テキスト
+            directory: 保存先ディレクトリ (省略時は設定値)
+            passage_chars: 1文書の最大文字数 (省略時は設定値)
+
+        Returns:
+            BM25Index
+        """
+        passage_chars = passage_chars or Config.RETRIEVAL_PASSAGE_CHARS
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        path = os.path.join(directory or Config.RETRIEVAL_INDEX_DIR, f"{digest}-{passage_chars}.npz")
+        if os.path.exists(path):
+            try:
+                return cls.load(path)
+            except (OSError, ValueError, KeyError):
+                pass
+        index = cls.build(text, passage_chars)
+        try:
+            index.save(path)
+        except OSError:
+            # 保存できなくても検索には使える
+            pass
+        return index
@@ -0,0 +1,173 @@
+"""
+複数行をまとめて1回のリクエストで処理するためのモジュール
+
+行ごとに短いプロンプトを送ると、リクエストごとのオーバーヘッドと
+毎回繰り返されるテンプレート文がレイテンシとトークン数の大半を占める。
+ここでは複数行に番号を付けて1つのプロンプトにまとめ、番号付きの JSON 配列で
+回答させて行に対応付ける。1リクエストの行数は、行ごとのトークン見積もりと
+1行あたりの回答トークン数 (MAX_TOKENS_PROCESSING が上限) から自動で決める。
+"""
+
+import json
+from typing import Dict, Any, List, Optional, Sequence
+from .config import Config
+from .tokens import estimate_tokens, estimate_message_tokens
+
+PACKED_SYSTEM_PROMPT = (
+    "あなたはデータ処理アシスタントです。"
+    "複数の入力に同じ指示を個別に適用し、指定された JSON 形式だけで回答してください。"
+)
+
+PACKED_USER_TEMPLATE = """次の指示を、下の各入力に個別に適用してください。
+
+指示:
+{instruction}
+
+入力 (JSON 配列, id は入力の番号):
+{items}
+
+回答は JSON 配列だけで返してください。説明やコードブロックは不要です。
+形式: [{{"id": 0, "result": "回答"}}, ...]
+すべての id に1件ずつ、入力と同じ id を付けて回答してください。"""
+
+# 回答1件あたりの JSON の書式 ({"id": .., "result": ..}) のトークン数
+RESULT_OVERHEAD_TOKENS = 12
+
+
+def parse_packed_response(content: Optional[str], size: int) -> Dict[int, str]:
+    """
+    番号付きの JSON 配列の回答を解析
+
+    途中で切れた回答 (max_tokens 到達など) からも、最後まで読めた要素は取り出す。
+
+    Args:
+        content: モデルの回答
+        size: まとめた行数 (id は 0 から size-1)
+
+    Returns:
+        {id: 回答テキスト} (解析できなかった id は含まない)
+    """
+    if not content:
+        return {}
+    start = content.find('[')
+    if start < 0:
+        return {}
+
+    decoder = json.JSONDecoder()
+    answers = {}
+    position = start + 1
+    while position < len(content):
+        # 区切りの空白とカンマを読み飛ばす
+        while position < len(content) and content[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(content) or content[position] == ']':
+            break
+        try:
+            item, position = decoder.raw_decode(content, position)
+        except ValueError:
+            break
+        if not isinstance(item, dict) or 'result' not in item:
+            continue
+        try:
+            key = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= key < size and key not in answers:
+            result = item['result']
+            answers[key] = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+    return answers
+
+
+class RowPacker:
+    """複数行を1つのプロンプトにまとめるクラス"""
+
+    def __init__(self, model: Optional[str] = None, max_rows: Optional[int] = None,
+                 max_input_tokens: Optional[int] = None, answer_tokens: Optional[int] = None,
+                 max_output_tokens: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            model: モデル名 (トークン見積もりに使用)
+            max_rows: 1リクエストにまとめる最大行数
+            max_input_tokens: 1リクエストの入力トークン数の上限
+            answer_tokens: 1行あたりに見込む回答トークン数 (MAX_TOKENS_PROCESSING が上限)
+            max_output_tokens: 1リクエストの出力トークン数の上限
+        """
+        model_config = Config.get_model_config('processing')
+        self.model_config = model_config
+        self.model = model or model_config['model']
+        self.max_rows = max(1, max_rows or Config.ROW_PACK_MAX_ROWS)
+        self.max_input_tokens = max_input_tokens or Config.ROW_PACK_MAX_INPUT_TOKENS
+        answer_tokens = answer_tokens or Config.ROW_PACK_ANSWER_TOKENS
+        self.row_output_tokens = min(answer_tokens, model_config['max_tokens']) + RESULT_OVERHEAD_TOKENS
+        self.max_output_tokens = max_output_tokens or Config.ROW_PACK_MAX_OUTPUT_TOKENS
+
+    def _item(self, key: int, value) -> Dict[str, Any]:
+        return {'id': key, 'data': value if isinstance(value, (str, int, float, bool)) else str(value)}
+
+    def build_messages(self, values: Sequence, prompt_template: str) -> List[Dict[str, str]]:
+        """
+        まとめたプロンプトを作成
+
+        Args:
+            values: まとめる行の値 (id は並び順の番号)
+            prompt_template: プロンプトテンプレート ({data} が各入力を指す)
+
+        Returns:
+            チャットメッセージのリスト
+        """
+        items = [self._item(key, value) for key, value in enumerate(values)]
+        content = PACKED_USER_TEMPLATE.format(
+            instruction=prompt_template.format(data='(各入力の data)'),
+            items=json.dumps(items, ensure_ascii=False, default=str, indent=0)
+        )
+        return [
+            {"role": "system", "content": PACKED_SYSTEM_PROMPT},
+            {"role": "user", "content": content}
+        ]
+
+    def max_tokens(self, size: int) -> int:
+        """まとめた行数に対する出力トークン数の上限"""
+        return min(self.max_output_tokens, size * self.row_output_tokens + RESULT_OVERHEAD_TOKENS)
+
+    def model_config_for(self, size: int) -> Dict[str, Any]:
+        """まとめた行数に合わせた処理用のモデル設定"""
+        return dict(self.model_config, max_tokens=self.max_tokens(size))
+
+    def plan(self, values: Sequence, prompt_template: str,
+             positions: Optional[Sequence[int]] = None) -> List[List[int]]:
+        """
+        行をリクエストごとに分ける
+
+        入力トークン数・出力トークン数・行数のいずれかが上限に達するまで、
+        先頭から順に詰める。
+
+        Args:
+            values: 全行の値
+            prompt_template: プロンプトテンプレート
+            positions: 対象の行位置 (省略時は全行)
+
+        Returns:
+            行位置のリストのリスト
+        """
+        if positions is None:
+            positions = range(len(values))
+        base = estimate_message_tokens(self.build_messages([], prompt_template), self.model)
+        # 1リクエストに入る回答数の上限
+        rows_by_output = max(1, (self.max_output_tokens - RESULT_OVERHEAD_TOKENS) // self.row_output_tokens)
+        limit = min(self.max_rows, rows_by_output)
+
+        batches = []
+        batch, used = [], base
+        for position in positions:
+            item = json.dumps(self._item(len(batch), values[position]), ensure_ascii=False, default=str)
+            tokens = estimate_tokens(item, self.model) + 1
+            if batch and (len(batch) >= limit or used + tokens > self.max_input_tokens):
+                batches.append(batch)
+                batch, used = [], base
+            batch.append(position)
+            used += tokens
+        if batch:
+            batches.append(batch)
+        return batches
@@ -0,0 +1,282 @@
+"""
+行ごとのAI処理を並行実行するモジュール
+
+非同期版 OpenAI クライアントで複数の行を同時に処理する。
+同時実行数はワーカー数で、API の上限は RPM/TPM のトークンバケットで制御し、
+結果は完了順に関係なく入力の順番で返す。行ごとのエラーは結果に記録して処理を続ける。
+同じプロンプトになる行は factorize_prompts で1件にまとめ、結果を全行に展開する。
+"""
+
+import asyncio
+import math
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence, Callable
+import numpy as np
+import pandas as pd
+from .config import Config
+from .rate_limit import RateLimiter
+from .transport import LLMTransport
+from .client_pool import default_pool
+from .telemetry import Telemetry
+from .tokens import estimate_message_tokens
+
+
+def run_coroutine(coroutine):
+    """
+    コルーチンを同期的に実行
+
+    既にイベントループが動いているスレッド (Jupyter など) からは
+    別スレッドで実行する。
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = asyncio.run(coroutine)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def factorize_prompts(values: Sequence, prompt_template: str):
+    """
+    同じプロンプトになる行をまとめる
+
+    値を factorize したあと、ユニーク値ごとにプロンプトを作って再度 factorize する
+    ('1' と 1 のように値は違ってもプロンプトが同じ行も1件にまとめる)。
+    結果は results[codes] で全行に展開できる。
+
+    Args:
+        values: 行ごとの値
+        prompt_template: プロンプトテンプレート ({data} に値が入る)
+
+    Returns:
+        (行ごとのプロンプト番号, プロンプトごとの代表値のリスト)
+    """
+    value_codes, _ = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    # 欠損値の表現 (None/NaN) を保つため、代表値は元の値から取る
+    _, first = np.unique(value_codes, return_index=True)
+    uniques = [values[position] for position in first]
+    prompts = [prompt_template.format(data=value) for value in uniques]
+    prompt_codes, _ = pd.factorize(pd.Series(prompts, dtype=object))
+    # プロンプトごとに最初に現れた値を代表値にする
+    _, first = np.unique(prompt_codes, return_index=True)
+    representatives = [uniques[position] for position in first]
+    return prompt_codes[value_codes], representatives
+
+
+def response_confidence(response) -> Optional[float]:
+    """
+    応答の信頼度 (出力トークンの確率の幾何平均)
+
+    Args:
+        response: logprobs=True で取得した chat.completions の応答
+
+    Returns:
+        0-1 の信頼度 (logprobs がない応答はNone)
+    """
+    logprobs = getattr(response.choices[0], 'logprobs', None)
+    values = [token.logprob for token in getattr(logprobs, 'content', None) or []
+              if getattr(token, 'logprob', None) is not None]
+    if not values:
+        return None
+    return math.exp(sum(values) / len(values))
+
+
+class AsyncRowProcessor:
+    """行ごとのAI処理を並行実行するクラス"""
+
+    def __init__(self, api_key: Optional[str] = None, concurrency: Optional[int] = None,
+                 rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 model_type: str = 'processing', client_factory: Optional[Callable] = None,
+                 cache=None, transport: Optional[LLMTransport] = None,
+                 telemetry: Optional[Telemetry] = None, model: Optional[str] = None,
+                 logprobs: bool = False):
+        """
+        初期化
+
+        Args:
+            api_key: OpenAI API キー
+            concurrency: 同時に処理する行数
+            rpm: 1分あたりのリクエスト数上限 (0 は制限なし)
+            tpm: 1分あたりのトークン数上限 (0 は制限なし)
+            model_type: 使用するモデル設定 ('processing' など)
+            client_factory: 非同期クライアントを作る関数 (省略時は AsyncOpenAI)
+            cache: 応答キャッシュ (LLMCache)
+            transport: 再試行・遮断を行う呼び出し層 (省略時は設定値)
+            telemetry: 呼び出しの計測 (省略時は設定値)
+            model: 使用するモデル (省略時は model_type の設定値)
+            logprobs: 出力トークンの確率を取得し、結果に confidence と finish_reason を加えるかどうか
+        """
+        self.api_key = api_key or Config.OPENAI_API_KEY
+        self.concurrency = max(1, concurrency or Config.ROW_CONCURRENCY)
+        self.rpm = Config.ROW_RPM_LIMIT if rpm is None else rpm
+        self.tpm = Config.ROW_TPM_LIMIT if tpm is None else tpm
+        self.model_type = model_type
+        self.client_factory = client_factory or (lambda: default_pool().async_client(self.api_key))
+        self.cache = cache
+        self.transport = transport or LLMTransport()
+        self.telemetry = telemetry or Telemetry()
+        self.model = model
+        self.logprobs = logprobs
+
+    def build_messages(self, value, prompt_template: str) -> List[Dict[str, str]]:
+        """
+        1行分のメッセージを作成
+
+        Args:
+            value: 行の値
+            prompt_template: プロンプトテンプレート ({data} に値が入る)
+
+        Returns:
+            チャットメッセージのリスト
+        """
+        return [{"role": "user", "content": prompt_template.format(data=value)}]
+
+    async def _process_one(self, client, limiter: RateLimiter, messages: List[Dict[str, str]],
+                           model_config: Dict[str, Any]) -> Dict[str, Any]:
+        request = (model_config['model'], messages, model_config['max_tokens'], model_config['temperature'])
+        if self.cache is not None:
+            cached = self.cache.get(*request)
+            if cached is not None:
+                # キャッシュヒットはレート制限の対象外
+                self.telemetry.record(self.model_type, model_config['model'], call='row', latency=0.0,
+                                      cached=True)
+                return {'output': cached, 'error': None, 'tokens': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                        'latency': 0.0, 'cached': True}
+
+        estimated = estimate_message_tokens(messages, model_config['model']) + model_config['max_tokens']
+        started = time.perf_counter()
+        options = {'logprobs': True} if self.logprobs else {}
+        # 最後の試行で実際に確保したトークン数 (容量で切り詰められることがある)
+        taken = [estimated]
+
+        async def attempt():
+            # 再試行もレート制限の対象にする
+            taken[0] = await limiter.acquire(estimated)
+            try:
+                return await client.chat.completions.create(
+                    model=model_config['model'],
+                    messages=messages,
+                    max_tokens=model_config['max_tokens'],
+                    temperature=model_config['temperature'],
+                    **options
+                )
+            except Exception:
+                # 失敗した呼び出しは出力トークンを使わないので、最大出力の分を返却する
+                limiter.settle(taken[0], estimated - model_config['max_tokens'])
+                raise
+
+        info = {}
+        try:
+            response = await self.transport.acall(model_config['model'], attempt, info=info)
+        except Exception as e:
+            latency = time.perf_counter() - started
+            self.telemetry.record(self.model_type, model_config['model'], call='row', latency=latency,
+                                  retries=info.get('retries', 0), error=str(e))
+            return {'output': None, 'error': str(e), 'tokens': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                    'latency': latency, 'cached': False}
+        latency = time.perf_counter() - started
+        usage = getattr(response, 'usage', None)
+        actual = getattr(usage, 'total_tokens', None)
+        limiter.settle(taken[0], actual)
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+        self.telemetry.record(self.model_type, model_config['model'], call='row',
+                              prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              latency=latency, retries=info.get('retries', 0))
+        content = response.choices[0].message.content
+        if self.cache is not None and content is not None:
+            self.cache.put(*request, content)
+        result = {
+            'output': content,
+            'error': None,
+            'tokens': actual or 0,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency': latency,
+            'cached': False
+        }
+        if self.logprobs:
+            result['confidence'] = response_confidence(response)
+            result['finish_reason'] = getattr(response.choices[0], 'finish_reason', None)
+        return result
+
+    async def process(self, values: Sequence, prompt_template: str,
+                      progress: Optional[Callable[[int, int], None]] = None,
+                      on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        全行を並行処理
+
+        Args:
+            values: 行ごとの値
+            prompt_template: プロンプトテンプレート ({data} に値が入る)
+            progress: 完了件数と全件数を受け取る関数
+            on_result: 1件完了するごとに行位置と結果を受け取る関数
+
+        Returns:
+            入力と同じ順番の結果リスト (output, error, tokens, prompt_tokens, completion_tokens, latency, cached)
+        """
+        total = len(values)
+        results: List[Optional[Dict[str, Any]]] = [None] * total
+        model_config = Config.get_model_config(self.model_type)
+        if self.model:
+            model_config = dict(model_config, model=self.model)
+        limiter = RateLimiter(self.rpm, self.tpm)
+        positions = iter(range(total))
+        completed = 0
+
+        # クライアントは実行中のイベントループに結び付くため、実行ごとに作成する
+        client = self.client_factory()
+
+        async def worker():
+            nonlocal completed
+            for position in positions:
+                try:
+                    messages = self.build_messages(values[position], prompt_template)
+                    results[position] = await self._process_one(client, limiter, messages, model_config)
+                except Exception as e:
+                    results[position] = {'output': None, 'error': str(e), 'tokens': 0, 'prompt_tokens': 0,
+                                         'completion_tokens': 0, 'latency': 0.0, 'cached': False}
+                completed += 1
+                if on_result:
+                    on_result(position, results[position])
+                if progress:
+                    progress(completed, total)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, total))))
+        finally:
+            close = getattr(client, 'close', None)
+            if close is not None:
+                await close()
+        return results
+
+    def run(self, values: Sequence, prompt_template: str,
+            progress: Optional[Callable[[int, int], None]] = None,
+            on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        process を同期的に実行
+
+        Args:
+            values: 行ごとの値
+            prompt_template: プロンプトテンプレート
+            progress: 完了件数と全件数を受け取る関数
+            on_result: 1件完了するごとに行位置と結果を受け取る関数
+
+        Returns:
+            入力と同じ順番の結果リスト
+        """
+        return run_coroutine(self.process(values, prompt_template, progress, on_result))
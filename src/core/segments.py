@@ -0,0 +1,254 @@
+"""
+セグメント別プロファイリングモジュール
+
+キー列 (例: Industry, Region) を1回だけ factorize してセグメント番号と
+行の並び順 (グループインデックス) を作り、モーメント・分位点・異常値・相関の
+すべてをその並び順に対する reduceat で計算する。統計量ごとに groupby を
+やり直さないため、セグメント数が10万を超えても全セグメントを一括で処理できる。
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from .config import Config
+from .profiler import QUANTILES, QUANTILE_LABELS, _lerp
+
+
+class SegmentIndex:
+    """キー列から作るグループインデックス"""
+
+    def __init__(self, df: pd.DataFrame, keys: List[str]):
+        """
+        初期化
+
+        Args:
+            df: 対象のDataFrame
+            keys: セグメントを決めるキー列
+        """
+        if not keys:
+            raise ValueError("セグメントのキー列を指定してください")
+        self.keys = list(keys)
+        codes = np.zeros(len(df), dtype=np.int64)
+        for key in self.keys:
+            key_codes, uniques = pd.factorize(df[key], sort=True, use_na_sentinel=False)
+            # 辞書順を保ったまま結合し、桁あふれしないよう毎回詰め直す
+            codes = codes * len(uniques) + key_codes
+            _, codes = np.unique(codes, return_inverse=True)
+            codes = codes.reshape(-1)
+        self.codes = codes
+        self.sizes = np.bincount(codes) if len(codes) else np.zeros(0, dtype=np.int64)
+        self.n_segments = len(self.sizes)
+        self.order = np.argsort(codes, kind='stable')
+        self.starts = np.concatenate([[0], np.cumsum(self.sizes)[:-1]]).astype(np.int64)
+        # 並べ替え後の各行のセグメント番号
+        self.sorted_codes = np.repeat(np.arange(self.n_segments), self.sizes)
+
+        first = df[self.keys].iloc[self.order[self.starts]].reset_index(drop=True)
+        if len(self.keys) == 1:
+            self.labels = pd.Index(first[self.keys[0]], name=self.keys[0])
+        else:
+            self.labels = pd.MultiIndex.from_frame(first)
+
+    def reduce(self, values: np.ndarray, ufunc=np.add) -> np.ndarray:
+        """
+        並べ替え済みの値をセグメントごとに集約
+
+        Args:
+            values: 並べ替え済みの配列 (行 x 列)
+            ufunc: 集約に使う ufunc
+
+        Returns:
+            (セグメント x 列) の配列
+        """
+        return ufunc.reduceat(values, self.starts, axis=0)
+
+    def broadcast(self, values: np.ndarray) -> np.ndarray:
+        """セグメントごとの値 (セグメント x 列) を並べ替え済みの行に展開"""
+        return values[self.sorted_codes]
+
+
+class SegmentProfiler:
+    """セグメント別プロファイリングクラス"""
+
+    def __init__(self, df: pd.DataFrame, keys: List[str], columns: Optional[List[str]] = None):
+        """
+        初期化
+
+        Args:
+            df: 分析対象のDataFrame
+            keys: セグメントを決めるキー列
+            columns: 対象の数値列 (省略時はキー列以外の全数値列)
+        """
+        self.df = df
+        self.index = SegmentIndex(df, keys)
+        if columns is None:
+            columns = [col for col in df.select_dtypes(include=[np.number]).columns if col not in keys]
+        self.columns = list(columns)
+        self._block = None
+        self._moments = None
+        self._quantiles = None
+
+    @property
+    def block(self) -> np.ndarray:
+        """セグメント順に並べ替えた数値ブロック"""
+        if self._block is None:
+            block = self.df[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+            self._block = block[self.index.order]
+        return self._block
+
+    def moments(self) -> Dict[str, np.ndarray]:
+        """
+        セグメントごとの件数・平均・標準偏差・最小値・最大値
+
+        Returns:
+            各統計量の (セグメント x 列) 配列の辞書
+        """
+        if self._moments is None:
+            block = self.block
+            index = self.index
+            valid = ~np.isnan(block)
+            count = index.reduce(valid.astype(np.float64))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = index.reduce(np.where(valid, block, 0.0)) / count
+                deviation = np.where(valid, block - index.broadcast(mean), 0.0)
+                variance = index.reduce(deviation * deviation) / (count - 1)
+            self._moments = {
+                'count': count,
+                'mean': mean,
+                'std': np.where(count > 1, np.sqrt(variance), np.nan),
+                'min': index.reduce(block, np.fmin),
+                'max': index.reduce(block, np.fmax)
+            }
+        return self._moments
+
+    def quantiles(self, qs=QUANTILES) -> np.ndarray:
+        """
+        セグメントごとの分位点
+
+        列ごとに (セグメント, 値) の順で1回だけ並べ替え、全セグメントの位置を
+        まとめて補間する (numpy.quantile の linear と同じ値)。
+
+        Args:
+            qs: 分位 (0-1)
+
+        Returns:
+            (分位数 x セグメント x 列) の配列
+        """
+        if self._quantiles is not None and tuple(qs) == tuple(QUANTILES):
+            return self._quantiles
+        qs = np.asarray(qs, dtype=np.float64)
+        block = self.block
+        index = self.index
+        count = self.moments()['count'].astype(np.int64)
+        result = np.full((len(qs), index.n_segments, len(self.columns)), np.nan)
+        for j in range(len(self.columns)):
+            # NaN はセグメント内の末尾に並ぶ
+            values = block[np.lexsort((block[:, j], index.sorted_codes)), j]
+            nonempty = count[:, j] > 0
+            last = np.maximum(count[:, j] - 1, 0)
+            for k, q in enumerate(qs):
+                position = q * last
+                lower = np.floor(position).astype(np.int64)
+                upper = np.ceil(position).astype(np.int64)
+                value = _lerp(values[index.starts + lower], values[index.starts + upper], position - lower)
+                result[k, nonempty, j] = value[nonempty]
+        if tuple(qs) == tuple(QUANTILES):
+            self._quantiles = result
+        return result
+
+    def numeric_summary(self) -> pd.DataFrame:
+        """
+        セグメントごとの describe 相当の統計量
+
+        Returns:
+            行がセグメント、列が (列名, 統計量) の DataFrame (groupby().describe() と同じ形)
+        """
+        moments = self.moments()
+        quantiles = self.quantiles()
+        stats = [('count', moments['count']), ('mean', moments['mean']),
+                 ('std', moments['std']), ('min', moments['min'])]
+        stats += [(label, quantiles[k]) for k, label in enumerate(QUANTILE_LABELS)]
+        stats.append(('max', moments['max']))
+        data = np.stack([values for _, values in stats], axis=2)
+        columns = pd.MultiIndex.from_product([self.columns, [name for name, _ in stats]])
+        return pd.DataFrame(data.reshape(self.index.n_segments, -1), index=self.index.labels, columns=columns)
+
+    def outliers(self, multiplier: Optional[float] = None) -> pd.DataFrame:
+        """
+        セグメントごとの IQR 法による異常値
+
+        Args:
+            multiplier: IQR の倍率
+
+        Returns:
+            行がセグメント、列が (列名, count/lower/upper) の DataFrame
+        """
+        k = Config.OUTLIER_IQR_MULTIPLIER if multiplier is None else multiplier
+        quantiles = self.quantiles()
+        q1, q3 = quantiles[0], quantiles[2]
+        lower = q1 - k * (q3 - q1)
+        upper = q3 + k * (q3 - q1)
+        block = self.block
+        with np.errstate(invalid='ignore'):
+            mask = (block < self.index.broadcast(lower)) | (block > self.index.broadcast(upper))
+        counts = self.index.reduce(mask.astype(np.int64))
+        data = np.stack([counts.astype(np.float64), lower, upper], axis=2)
+        columns = pd.MultiIndex.from_product([self.columns, ['count', 'lower', 'upper']])
+        return pd.DataFrame(data.reshape(self.index.n_segments, -1), index=self.index.labels, columns=columns)
+
+    def correlations(self, min_count: int = 3) -> pd.DataFrame:
+        """
+        セグメントごとのペアワイズ完全ケース相関
+
+        セグメント平均で中心化した値の積を reduceat で合計するので、
+        列ペアごとに1パスで全セグメントの相関が求まる。
+
+        Args:
+            min_count: 相関を計算する最小の共通有効件数
+
+        Returns:
+            行がセグメント、列が (変数1, 変数2) の DataFrame
+        """
+        p = len(self.columns)
+        pairs = [(a, b) for a in range(p) for b in range(a + 1, p)]
+        index = self.index
+        block = self.block - index.broadcast(self.moments()['mean'])
+        valid = ~np.isnan(block)
+        result = np.full((index.n_segments, len(pairs)), np.nan)
+        for c, (a, b) in enumerate(pairs):
+            both = valid[:, a] & valid[:, b]
+            xa = np.where(both, block[:, a], 0.0)
+            xb = np.where(both, block[:, b], 0.0)
+            stacked = np.column_stack([both, xa, xb, xa * xb, xa * xa, xb * xb]).astype(np.float64)
+            n, sa, sb, sab, saa, sbb = index.reduce(stacked).T
+            with np.errstate(invalid='ignore', divide='ignore'):
+                corr = (n * sab - sa * sb) / np.sqrt((n * saa - sa * sa) * (n * sbb - sb * sb))
+            corr[n < min_count] = np.nan
+            result[:, c] = np.clip(corr, -1.0, 1.0)
+        columns = pd.MultiIndex.from_tuples(
+            [(self.columns[a], self.columns[b]) for a, b in pairs], names=['variable1', 'variable2']
+        )
+        return pd.DataFrame(result, index=index.labels, columns=columns)
+
+    def profile(self, include_correlation: bool = True) -> Dict[str, Any]:
+        """
+        全セグメントのプロファイル
+
+        Args:
+            include_correlation: セグメント内の相関を含めるかどうか
+
+        Returns:
+            keys, sizes, numeric_summary, outliers, correlations を含む辞書
+        """
+        if self.index.n_segments == 0:
+            return {'keys': list(self.index.keys), 'n_segments': 0}
+        result = {
+            'keys': list(self.index.keys),
+            'n_segments': self.index.n_segments,
+            'sizes': pd.Series(self.index.sizes, index=self.index.labels, name='size'),
+            'numeric_summary': self.numeric_summary(),
+            'outliers': self.outliers()
+        }
+        if include_correlation and len(self.columns) > 1:
+            result['correlations'] = self.correlations()
+        return result
@@ -0,0 +1,404 @@
+"""
+マージ可能な統計アキュムレータ (スケッチ) モジュール
+
+チャンク単位で更新でき、別のアキュムレータと結合できる統計量を提供する。
+ストリーミング分析・増分分析で共通に使用する。
+
+誤差の目安:
+- MomentAccumulator: 件数・平均・標準偏差・最小・最大は厳密値 (浮動小数点誤差のみ)
+- KLLSketch: 分位点の順位誤差はおおよそ 1.7 / k (k=200 で約0.9%)。
+  コンパクションが発生していない間 (件数 <= k) は厳密値
+- HyperLogLog: 相異なる値の件数の相対標準誤差は 1.04 / sqrt(2^p) (p=14 で約0.8%)
+- MisraGries: 各値の件数の過小評価は最大 N / (capacity + 1)
+- CoMomentAccumulator: ペアワイズ完全ケースの相関係数を厳密に計算
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class MomentAccumulator:
+    """列ごとの件数・平均・分散・最小・最大のアキュムレータ (Welford / Chan の結合式)"""
+
+    def __init__(self, n_columns: int):
+        """
+        初期化
+
+        Args:
+            n_columns: 列数
+        """
+        self.count = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    def update(self, block: np.ndarray):
+        """
+        2次元ブロック (行 x 列, NaNは欠損) を取り込む
+
+        Args:
+            block: float64 の2次元配列
+        """
+        valid = ~np.isnan(block)
+        count = valid.sum(axis=0).astype(float)
+        filled = np.where(valid, block, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, filled.sum(axis=0) / count, 0.0)
+        deviation = np.where(valid, block - mean, 0.0)
+        m2 = np.einsum('ij,ij->j', deviation, deviation)
+        self._combine(count, mean, m2,
+                      np.where(valid, block, np.inf).min(axis=0, initial=np.inf),
+                      np.where(valid, block, -np.inf).max(axis=0, initial=-np.inf))
+
+    def merge(self, other: 'MomentAccumulator'):
+        """
+        別のアキュムレータを結合
+
+        Args:
+            other: 結合するアキュムレータ
+        """
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0.0)
+            self.m2 = np.where(total > 0, self.m2 + m2 + delta ** 2 * self.count * count / total, 0.0)
+        self.count = total
+        self.min = np.minimum(self.min, minimum)
+        self.max = np.maximum(self.max, maximum)
+
+    def std(self) -> np.ndarray:
+        """不偏標準偏差 (件数2未満はNaN)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+    def summary(self) -> Dict[str, np.ndarray]:
+        """件数・平均・標準偏差・最小・最大 (件数0の列はNaN)"""
+        empty = self.count == 0
+        return {
+            'count': self.count.copy(),
+            'mean': np.where(empty, np.nan, self.mean),
+            'std': self.std(),
+            'min': np.where(empty, np.nan, self.min),
+            'max': np.where(empty, np.nan, self.max)
+        }
+
+
+class KLLSketch:
+    """KLL 分位点スケッチ (1列分)"""
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            k: 最上位レベルの容量 (大きいほど高精度)
+            seed: コンパクション用の乱数シード
+        """
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def update(self, values: np.ndarray):
+        """
+        値を取り込む (NaNは無視)
+
+        Args:
+            values: 1次元配列
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: 'KLLSketch'):
+        """
+        別のスケッチを結合
+
+        Args:
+            other: 結合するスケッチ
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # 奇数個の場合は1件を現レベルに残し、残りを1つおきに昇格させる
+                keep = items[:len(items) % 2]
+                pairs = items[len(keep):]
+                offset = int(self._rng.integers(2))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], pairs[offset::2]])
+                self.levels[level] = keep
+            level += 1
+
+    def _weighted_items(self) -> Tuple[np.ndarray, np.ndarray]:
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)
+        ])
+        order = np.argsort(values, kind='stable')
+        return values[order], weights[order]
+
+    def quantiles(self, qs) -> np.ndarray:
+        """
+        分位点を推定 (numpy.quantile の線形補間に合わせた順位で評価)
+
+        Args:
+            qs: 分位 (0-1) のリスト
+
+        Returns:
+            分位点の配列 (件数0の場合はNaN)
+        """
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        values, weights = self._weighted_items()
+        cumulative = np.cumsum(weights)
+        # 重み w の要素は順位 [cum - w, cum - 1] を代表するので中心を位置とする
+        positions = cumulative - (weights + 1) / 2
+        return np.interp(qs * (cumulative[-1] - 1), positions, values)
+
+    def rank(self, value: float, inclusive: bool = True) -> float:
+        """
+        value 以下 (inclusive=False の場合は未満) の割合を推定
+
+        Args:
+            value: 閾値
+            inclusive: 等号を含むかどうか
+
+        Returns:
+            0-1 の割合
+        """
+        if self.n == 0:
+            return 0.0
+        values, weights = self._weighted_items()
+        side = 'right' if inclusive else 'left'
+        position = np.searchsorted(values, value, side=side)
+        return float(weights[:position].sum() / weights.sum())
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """uint64 配列の各要素のビット長"""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= (np.uint64(1) << np.uint64(shift))
+        length[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    length += (values > 0)
+    return length
+
+
+class HyperLogLog:
+    """HyperLogLog による相異なる値の件数の推定"""
+
+    def __init__(self, p: int = 14):
+        """
+        初期化
+
+        Args:
+            p: レジスタ数の指数 (レジスタ数 = 2^p)
+        """
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, values):
+        """
+        値を取り込む (欠損値は無視)
+
+        Args:
+            values: 1次元配列または Series
+        """
+        series = pd.Series(values).dropna()
+        if len(series) == 0:
+            return
+        self.update_hashes(pd.util.hash_pandas_object(series, index=False).to_numpy())
+
+    def update_hashes(self, hashes: np.ndarray):
+        """
+        計算済みの64ビットハッシュを取り込む
+
+        Args:
+            hashes: uint64 配列
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        p = np.uint64(self.p)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        remainder = hashes & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        # 先頭からの0の個数 + 1 (残り 64-p ビット中)
+        rho = (64 - self.p) - _bit_length(remainder) + 1
+        np.maximum.at(self.registers, index, rho.astype(np.uint8))
+
+    def merge(self, other: 'HyperLogLog'):
+        """
+        別のスケッチを結合
+
+        Args:
+            other: 結合するスケッチ
+        """
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        """相異なる値の件数の推定値"""
+        m = float(len(self.registers))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros > 0:
+            # 小さい件数では線形カウンティングで補正
+            raw = m * np.log(m / zeros)
+        return int(round(raw))
+
+
+class MisraGries:
+    """Misra-Gries による頻出値 (top-k) の要約"""
+
+    def __init__(self, capacity: int = 64):
+        """
+        初期化
+
+        Args:
+            capacity: 保持するカウンタ数
+        """
+        self.capacity = capacity
+        self.counters = {}
+        self.n = 0
+
+    def update(self, values):
+        """
+        値を取り込む (欠損値は無視)
+
+        Args:
+            values: 1次元配列または Series
+        """
+        counts = pd.Series(values).value_counts(sort=False)
+        self.n += int(counts.sum())
+        self._merge_counts(dict(zip(counts.index, counts.to_numpy())))
+
+    def merge(self, other: 'MisraGries'):
+        """
+        別の要約を結合
+
+        Args:
+            other: 結合する要約
+        """
+        self.n += other.n
+        self._merge_counts(other.counters)
+
+    def _merge_counts(self, counts: Dict[Any, int]):
+        merged = dict(self.counters)
+        for value, count in counts.items():
+            merged[value] = merged.get(value, 0) + int(count)
+        if len(merged) > self.capacity:
+            # (capacity+1) 番目の件数を全体から差し引き、正のものだけ残す
+            threshold = sorted(merged.values(), reverse=True)[self.capacity]
+            merged = {value: count - threshold for value, count in merged.items() if count > threshold}
+        self.counters = merged
+
+    def top(self, n: int) -> List[Tuple[Any, int]]:
+        """
+        上位 n 件の (値, 件数の下限) を取得
+
+        Args:
+            n: 件数
+
+        Returns:
+            件数の降順リスト
+        """
+        return sorted(self.counters.items(), key=lambda item: -item[1])[:n]
+
+    def error_bound(self) -> float:
+        """件数の最大過小評価量"""
+        return self.n / (self.capacity + 1)
+
+
+class CoMomentAccumulator:
+    """ペアワイズ完全ケースの共積率アキュムレータ (相関行列用)"""
+
+    def __init__(self, n_columns: int):
+        """
+        初期化
+
+        Args:
+            n_columns: 列数
+        """
+        self.shift = None
+        self.pair_count = np.zeros((n_columns, n_columns))
+        self.pair_sum = np.zeros((n_columns, n_columns))
+        self.pair_sum_sq = np.zeros((n_columns, n_columns))
+        self.cross_sum = np.zeros((n_columns, n_columns))
+
+    def update(self, block: np.ndarray):
+        """
+        2次元ブロック (行 x 列, NaNは欠損) を取り込む
+
+        Args:
+            block: float64 の2次元配列
+        """
+        valid = ~np.isnan(block)
+        if self.shift is None:
+            # 桁落ちを抑えるため最初のブロックの平均を基準に中心化する
+            count = valid.sum(axis=0)
+            total = np.where(valid, block, 0.0).sum(axis=0)
+            self.shift = np.divide(total, count, out=np.zeros(block.shape[1]), where=count > 0)
+        centered = np.where(valid, block - self.shift, 0.0)
+        mask = valid.astype(np.float64)
+        self.pair_count += mask.T @ mask
+        self.pair_sum += centered.T @ mask
+        self.pair_sum_sq += (centered * centered).T @ mask
+        self.cross_sum += centered.T @ centered
+
+    def merge(self, other: 'CoMomentAccumulator'):
+        """
+        別のアキュムレータを結合 (基準値が異なる場合は合わせてから加算)
+
+        Args:
+            other: 結合するアキュムレータ
+        """
+        if other.shift is None:
+            return
+        if self.shift is None:
+            self.shift = other.shift.copy()
+        # other の基準を self の基準へ平行移動: x' = x + d (d = other.shift - self.shift)
+        d = other.shift - self.shift
+        n = other.pair_count
+        self.cross_sum += other.cross_sum + d[:, None] * other.pair_sum.T \
+            + d[None, :] * other.pair_sum + np.outer(d, d) * n
+        self.pair_sum_sq += other.pair_sum_sq + 2 * d[:, None] * other.pair_sum + (d ** 2)[:, None] * n
+        self.pair_sum += other.pair_sum + d[:, None] * n
+        self.pair_count += n
+
+    def correlation(self) -> np.ndarray:
+        """ペアワイズ完全ケースのピアソン相関行列"""
+        n = self.pair_count
+        sx = self.pair_sum
+        sy = self.pair_sum.T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = n * self.cross_sum - sx * sy
+            var_x = n * self.pair_sum_sq - sx * sx
+            var_y = n * self.pair_sum_sq.T - sy * sy
+            corr = covariance / np.sqrt(var_x * var_y)
+        corr[n < 2] = np.nan
+        return np.clip(corr, -1.0, 1.0)
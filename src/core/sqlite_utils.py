@@ -0,0 +1,58 @@
+"""
+SQLite 接続の共通処理モジュール
+
+応答キャッシュやジョブのジャーナルのように、複数スレッド・複数プロセスから
+同じデータベースファイルを読み書きするストアで使う。接続はスレッドごとに作り、
+WAL モードとビジータイムアウトで他プロセスとの同時アクセスを待ち合わせる。
+"""
+
+import os
+import sqlite3
+import threading
+
+# fork 後の子プロセスで使わずに保持している親プロセスの接続
+_INHERITED_CONNECTIONS = []
+
+
+class ThreadLocalConnection:
+    """スレッドごとの SQLite 接続 (WAL モード, 自動コミット)"""
+
+    def __init__(self, path: str, schema: str = '', timeout: float = 30):
+        """
+        初期化
+
+        Args:
+            path: データベースファイル (ディレクトリがなければ作成)
+            schema: 最初に実行する SQL (CREATE TABLE IF NOT EXISTS など)
+            timeout: ロック待ちの最大秒数
+        """
+        self.path = path
+        self.timeout = timeout
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # sqlite3 の接続はスレッド間で共有しない
+        self._local = threading.local()
+        if schema:
+            self.get().executescript(schema)
+
+    def get(self) -> sqlite3.Connection:
+        """このスレッドの接続を取得 (なければ作成)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid != os.getpid():
+            # fork で引き継いだ接続を使ったり閉じたりすると親プロセスのロックが壊れるため、
+            # 閉じずに保持したまま新しく接続する
+            _INHERITED_CONNECTIONS.append(connection)
+            connection = None
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def close(self):
+        """このスレッドの接続を閉じる"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local.connection = None
@@ -0,0 +1,423 @@
+"""
+ストリーミング分析モジュール
+
+メモリに載らない大きなCSVをチャンク単位で読み込み、マージ可能な
+アキュムレータ (sketches) で DataAnalyzer と同じ形式の結果を計算する。
+誤差の目安は sketches モジュールを参照。
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from .config import Config
+from .profiler import QUANTILES, QUANTILE_LABELS, TOP_VALUES
+from .correlation import extract_strong_pairs, format_correlation_result
+from .duplicates import FingerprintStore, row_fingerprints
+from .sketches import (MomentAccumulator, KLLSketch, HyperLogLog,
+                       MisraGries, CoMomentAccumulator)
+
+# チャンク本体に割り当てるメモリ予算の割合 (残りは変換用の一時領域とアキュムレータ)
+CHUNK_BUDGET_FRACTION = 0.25
+
+
+class ProfileAccumulator:
+    """DataFrame チャンクからプロファイルを蓄積するアキュムレータ"""
+
+    def __init__(self, numeric_columns: List[str], categorical_columns: List[str],
+                 columns: List[str], data_types: Dict[str, Any],
+                 sketch_k: Optional[int] = None, top_k_capacity: Optional[int] = None,
+                 seed: int = 0):
+        """
+        初期化
+
+        Args:
+            numeric_columns: 数値列
+            categorical_columns: カテゴリ列
+            columns: 全列 (列順を保持)
+            data_types: 列ごとのデータ型
+            sketch_k: 分位点スケッチの精度パラメータ
+            top_k_capacity: 頻出値要約のカウンタ数
+            seed: 分位点スケッチの乱数シード (同じデータなら同じ結果になる。乱数の状態も保存される)
+        """
+        self.numeric_columns = list(numeric_columns)
+        self.categorical_columns = list(categorical_columns)
+        self.columns = list(columns)
+        self.data_types = dict(data_types)
+        self.rows = 0
+        self.missing = {col: 0 for col in self.columns}
+
+        sketch_k = sketch_k or Config.STREAMING_SKETCH_K
+        top_k_capacity = top_k_capacity or Config.STREAMING_TOP_K_CAPACITY
+        self.moments = MomentAccumulator(len(self.numeric_columns))
+        self.comoments = CoMomentAccumulator(len(self.numeric_columns))
+        self.quantile_sketches = [KLLSketch(sketch_k, seed=seed + i)
+                                  for i in range(len(self.numeric_columns))]
+        self.distinct = {col: HyperLogLog() for col in self.categorical_columns}
+        self.frequent = {col: MisraGries(top_k_capacity) for col in self.categorical_columns}
+        self.row_distinct = HyperLogLog()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> 'ProfileAccumulator':
+        """
+        DataFrame (先頭チャンク) の列構成からアキュムレータを作成
+
+        Args:
+            df: 列構成の基準となるDataFrame
+
+        Returns:
+            空のアキュムレータ
+        """
+        return cls(
+            numeric_columns=list(df.select_dtypes(include=[np.number]).columns),
+            categorical_columns=list(df.select_dtypes(include=['object', 'string']).columns),
+            columns=list(df.columns),
+            data_types=df.dtypes.to_dict(),
+            **kwargs
+        )
+
+    def numeric_block(self, chunk: pd.DataFrame) -> np.ndarray:
+        """
+        チャンクの数値列を float64 配列として取り出す
+
+        型は先頭チャンクで固定し、数値に変換できない値は欠損として扱う。
+
+        Args:
+            chunk: DataFrameチャンク
+
+        Returns:
+            2次元配列
+        """
+        if not self.numeric_columns:
+            return np.empty((len(chunk), 0))
+        numeric = chunk[self.numeric_columns]
+        non_numeric = [col for col in self.numeric_columns
+                       if not pd.api.types.is_numeric_dtype(numeric[col])]
+        if non_numeric:
+            numeric = numeric.copy()
+            for col in non_numeric:
+                numeric[col] = pd.to_numeric(numeric[col], errors='coerce')
+        return numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def update(self, chunk: pd.DataFrame):
+        """
+        チャンクを取り込む
+
+        Args:
+            chunk: 列構成が先頭チャンクと同じDataFrame
+        """
+        self.rows += len(chunk)
+        for col, dtype in chunk.dtypes.items():
+            if self.data_types.get(col) != dtype:
+                self.data_types[col] = _common_dtype(self.data_types.get(col), dtype)
+
+        block = self.numeric_block(chunk)
+        self.moments.update(block)
+        self.comoments.update(block)
+        for i, sketch in enumerate(self.quantile_sketches):
+            sketch.update(block[:, i])
+        numeric_missing = np.isnan(block).sum(axis=0)
+        for i, col in enumerate(self.numeric_columns):
+            self.missing[col] += int(numeric_missing[i])
+
+        for col in self.columns:
+            if col in self.categorical_columns:
+                values = chunk[col]
+                self.missing[col] += int(values.isna().sum())
+                self.distinct[col].update(values)
+                self.frequent[col].update(values)
+            elif col not in self.numeric_columns:
+                self.missing[col] += int(chunk[col].isna().sum())
+
+        if len(chunk) > 0 and chunk.shape[1] > 0:
+            self.row_distinct.update_hashes(
+                pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            )
+
+    def merge(self, other: 'ProfileAccumulator'):
+        """
+        同じ列構成の別アキュムレータを結合
+
+        Args:
+            other: 結合するアキュムレータ
+        """
+        self.rows += other.rows
+        for col in self.columns:
+            self.missing[col] += other.missing[col]
+            if other.data_types.get(col) != self.data_types.get(col):
+                self.data_types[col] = _common_dtype(self.data_types.get(col), other.data_types.get(col))
+        self.moments.merge(other.moments)
+        self.comoments.merge(other.comoments)
+        for sketch, other_sketch in zip(self.quantile_sketches, other.quantile_sketches):
+            sketch.merge(other_sketch)
+        for col in self.categorical_columns:
+            self.distinct[col].merge(other.distinct[col])
+            self.frequent[col].merge(other.frequent[col])
+        self.row_distinct.merge(other.row_distinct)
+
+    def quantiles(self) -> np.ndarray:
+        """数値列の四分位点 (3 x 列)"""
+        if not self.numeric_columns:
+            return np.empty((len(QUANTILES), 0))
+        return np.column_stack([sketch.quantiles(QUANTILES) for sketch in self.quantile_sketches])
+
+    def to_structure(self) -> Dict[str, Any]:
+        """
+        analyze_data_structure と同じ形の分析結果を生成
+
+        Returns:
+            分析結果辞書
+        """
+        moments = self.moments.summary()
+        quantiles = self.quantiles()
+        numeric_summary = {}
+        for i, col in enumerate(self.numeric_columns):
+            entry = {
+                'count': float(moments['count'][i]),
+                'mean': float(moments['mean'][i]),
+                'std': float(moments['std'][i]),
+                'min': float(moments['min'][i])
+            }
+            for k, label in enumerate(QUANTILE_LABELS):
+                entry[label] = float(quantiles[k, i])
+            entry['max'] = float(moments['max'][i])
+            numeric_summary[col] = entry
+
+        categorical_summary = {}
+        for col in self.categorical_columns:
+            categorical_summary[col] = {
+                'unique_values': self.distinct[col].estimate(),
+                'top_values': {value: int(count) for value, count in self.frequent[col].top(TOP_VALUES)}
+            }
+
+        return {
+            'basic_info': {
+                'shape': (self.rows, len(self.columns)),
+                'columns': list(self.columns),
+                'data_types': dict(self.data_types),
+                'missing_values': dict(self.missing),
+                'duplicate_rows': max(0, self.rows - self.row_distinct.estimate())
+            },
+            'numeric_summary': numeric_summary,
+            'categorical_summary': categorical_summary
+        }
+
+    def to_correlation(self, threshold: Optional[float] = None, top_k: Optional[int] = None,
+                       include_matrix: bool = True) -> Dict[str, Any]:
+        """
+        get_correlation_analysis と同じ形の相関分析結果を生成
+
+        Args:
+            threshold: 強い相関とみなす絶対値の閾値
+            top_k: 強い相関として返す最大件数
+            include_matrix: 相関行列の辞書を含めるかどうか
+
+        Returns:
+            相関分析結果
+        """
+        if len(self.numeric_columns) < 2:
+            return {}
+        if threshold is None:
+            threshold = Config.CORRELATION_THRESHOLD
+        if top_k is None:
+            top_k = Config.CORRELATION_TOP_K or None
+        matrix = self.comoments.correlation()
+        i, j, values = extract_strong_pairs(matrix, threshold, top_k)
+        return format_correlation_result(self.numeric_columns, i, j, values,
+                                         matrix if include_matrix else None)
+
+    def outlier_bounds(self) -> Dict[str, Dict[str, float]]:
+        """
+        IQR法の上下限を列ごとに計算
+
+        Returns:
+            {列名: {'lower': ..., 'upper': ...}}
+        """
+        quantiles = self.quantiles()
+        bounds = {}
+        for i, col in enumerate(self.numeric_columns):
+            q1, q3 = quantiles[0, i], quantiles[2, i]
+            iqr = q3 - q1
+            bounds[col] = {'lower': float(q1 - 1.5 * iqr), 'upper': float(q3 + 1.5 * iqr)}
+        return bounds
+
+    def error_bounds(self) -> Dict[str, str]:
+        """推定値を含む項目とその誤差の目安"""
+        k = self.quantile_sketches[0].k if self.quantile_sketches else Config.STREAMING_SKETCH_K
+        hll_error = 1.04 / np.sqrt(len(self.row_distinct.registers))
+        bounds = {
+            'numeric_summary.quantiles': f'順位誤差 約{1.7 / k:.2%} (KLL, k={k})',
+            'categorical_summary.unique_values': f'相対標準誤差 約{hll_error:.2%} (HyperLogLog)',
+            'basic_info.duplicate_rows': f'行数の相対標準誤差 約{hll_error:.2%} (HyperLogLog)'
+        }
+        for col in self.categorical_columns:
+            bounds[f'categorical_summary.{col}.top_values'] = \
+                f'件数の過小評価 最大{self.frequent[col].error_bound():.0f}件 (Misra-Gries)'
+        return bounds
+
+
+def _common_dtype(left, right):
+    """チャンク間で異なるデータ型を統合"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+        return np.result_type(left, right)
+    return np.dtype(object)
+
+
+class StreamingAnalyzer:
+    """大規模CSV向けストリーミング分析クラス"""
+
+    def __init__(self, file_path: str, memory_budget_mb: Optional[int] = None,
+                 chunk_rows: Optional[int] = None, **read_csv_kwargs):
+        """
+        初期化
+
+        Args:
+            file_path: CSVファイルパス
+            memory_budget_mb: メモリ予算 (MB)。チャンク行数はここから決まる
+            chunk_rows: チャンク行数 (指定時はメモリ予算より優先)
+            **read_csv_kwargs: pandas.read_csv に渡す追加引数
+        """
+        self.file_path = file_path
+        self.memory_budget_mb = memory_budget_mb or Config.STREAMING_MEMORY_BUDGET_MB
+        self.read_csv_kwargs = read_csv_kwargs
+        self.text_data = None
+        self.analysis_results = {}
+
+        # 先頭行から1行あたりのメモリ量を見積もる
+        self.sample = pd.read_csv(file_path, nrows=Config.STREAMING_SAMPLE_ROWS, **read_csv_kwargs)
+        self.chunk_rows = chunk_rows or self._estimate_chunk_rows()
+        self.accumulator = None
+        self.chunks_read = 0
+        self.duplicate_rows = None
+
+    def _estimate_chunk_rows(self) -> int:
+        bytes_per_row = max(1.0, self.sample.memory_usage(deep=True).sum() / max(1, len(self.sample)))
+        budget = self.memory_budget_mb * 1024 * 1024 * CHUNK_BUDGET_FRACTION
+        return max(1000, int(budget / bytes_per_row))
+
+    def iter_chunks(self):
+        """
+        CSVをチャンク単位で読み込む
+
+        Yields:
+            DataFrameチャンク
+        """
+        reader = pd.read_csv(self.file_path, chunksize=self.chunk_rows, **self.read_csv_kwargs)
+        with reader:
+            for chunk in reader:
+                yield chunk
+
+    def _ensure_profile(self) -> ProfileAccumulator:
+        if self.accumulator is None:
+            accumulator = ProfileAccumulator.from_frame(self.sample)
+            # 重複行は行フィンガープリントをディスクへ退避して厳密に数える
+            store = FingerprintStore() if Config.STREAMING_EXACT_DUPLICATES else None
+            chunks = 0
+            try:
+                for chunk in self.iter_chunks():
+                    if store is not None:
+                        store.add(row_fingerprints(chunk),
+                                  np.arange(accumulator.rows, accumulator.rows + len(chunk)))
+                    accumulator.update(chunk)
+                    chunks += 1
+                if store is not None:
+                    self.duplicate_rows = store.find_duplicates(with_groups=False)[0]
+            finally:
+                if store is not None:
+                    store.close()
+            self.accumulator = accumulator
+            self.chunks_read = chunks
+        return self.accumulator
+
+    def analyze_data_structure(self) -> Dict[str, Any]:
+        """
+        データの構造を分析 (1パス目)
+
+        Returns:
+            analyze_data_structure と同じ形の分析結果
+        """
+        if 'data_structure' not in self.analysis_results:
+            structure = self._ensure_profile().to_structure()
+            if self.duplicate_rows is not None:
+                structure['basic_info']['duplicate_rows'] = self.duplicate_rows
+            self.analysis_results['data_structure'] = structure
+        return self.analysis_results['data_structure']
+
+    def get_correlation_analysis(self, threshold: Optional[float] = None,
+                                 top_k: Optional[int] = None,
+                                 include_matrix: bool = True) -> Dict[str, Any]:
+        """
+        相関分析を実行 (1パス目の共積率から計算)
+
+        Args:
+            threshold: 強い相関とみなす絶対値の閾値
+            top_k: 強い相関として返す最大件数
+            include_matrix: 相関行列の辞書を含めるかどうか
+
+        Returns:
+            相関分析結果
+        """
+        return self._ensure_profile().to_correlation(threshold, top_k, include_matrix)
+
+    def detect_outliers(self) -> Dict[str, Any]:
+        """
+        異常値を検出 (推定した四分位点で上下限を決め、2パス目で件数を数える)
+
+        Returns:
+            異常値検出結果
+        """
+        if 'outliers' in self.analysis_results:
+            return self.analysis_results['outliers']
+
+        accumulator = self._ensure_profile()
+        bounds = accumulator.outlier_bounds()
+        columns = accumulator.numeric_columns
+        lower = np.array([bounds[col]['lower'] for col in columns])
+        upper = np.array([bounds[col]['upper'] for col in columns])
+        counts = np.zeros(len(columns), dtype=np.int64)
+        for chunk in self.iter_chunks():
+            block = accumulator.numeric_block(chunk)
+            counts += ((block < lower) | (block > upper)).sum(axis=0)
+
+        outliers = {}
+        for i, col in enumerate(columns):
+            if counts[i] > 0:
+                outliers[col] = {
+                    'count': int(counts[i]),
+                    'percentage': float(counts[i] / accumulator.rows * 100),
+                    'bounds': bounds[col]
+                }
+        self.analysis_results['outliers'] = outliers
+        return outliers
+
+    def get_error_bounds(self) -> Dict[str, str]:
+        """
+        推定値を含む項目と誤差の目安を取得
+
+        Returns:
+            {項目: 誤差の説明}
+        """
+        bounds = self._ensure_profile().error_bounds()
+        if self.duplicate_rows is not None:
+            bounds.pop('basic_info.duplicate_rows', None)
+        return bounds
+
+
+def should_stream(file_path: str) -> bool:
+    """
+    ファイルサイズからストリーミング分析を使うべきか判定
+
+    Args:
+        file_path: CSVファイルパス
+
+    Returns:
+        ストリーミング分析を使うかどうか
+    """
+    try:
+        return os.path.getsize(file_path) > Config.STREAMING_THRESHOLD_MB * 1024 * 1024
+    except OSError:
+        return False
@@ -0,0 +1,266 @@
+"""
+LLM API 呼び出しの計測モジュール
+
+呼び出しごとにモデル・段階 (analysis/strategy/processing)・入力と出力のトークン数・
+応答時間・最初のトークンまでの時間・再試行回数・推定料金を記録する。
+記録は直近の一定件数だけ保持し、段階とモデルの組ごとの集計はメモリ上で更新するので、
+記録1件あたりの処理は辞書の更新だけで済む。
+記録は JSON Lines、集計は Prometheus のテキスト形式で出力できる。
+"""
+
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+from .config import Config
+
+# 応答時間のヒストグラムの区切り (秒)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def model_price(model: str) -> Optional[Tuple[float, float]]:
+    """
+    モデルの料金 (USD / 100万トークン)
+
+    'gpt-4o-mini-2024-07-18' のような日付付きの名前は、最も長く一致する
+    Config.MODEL_PRICING のモデル名の料金を使う。
+
+    Args:
+        model: モデル名
+
+    Returns:
+        (入力の料金, 出力の料金) (不明なモデルはNone)
+    """
+    matches = [name for name in Config.MODEL_PRICING if model == name or model.startswith(name + '-')]
+    if not matches:
+        return None
+    return Config.MODEL_PRICING[max(matches, key=len)]
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> Optional[float]:
+    """
+    呼び出しの推定料金
+
+    Args:
+        model: モデル名
+        prompt_tokens: 入力トークン数
+        completion_tokens: 出力トークン数
+        batch: バッチ API の呼び出しかどうか (Config.BATCH_PRICE_FACTOR を掛ける)
+
+    Returns:
+        USD (料金が不明なモデルはNone)
+    """
+    price = model_price(model)
+    if price is None:
+        return None
+    cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+    return cost * Config.BATCH_PRICE_FACTOR if batch else cost
+
+
+def _new_group() -> Dict[str, Any]:
+    return {
+        'calls': 0,
+        'errors': 0,
+        'cached': 0,
+        'retries': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'cost': 0.0,
+        'latency_sum': 0.0,
+        'latency_count': 0,
+        'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'ttft_sum': 0.0,
+        'ttft_count': 0
+    }
+
+
+def _label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Telemetry:
+    """API 呼び出しの記録と集計"""
+
+    def __init__(self, enabled: Optional[bool] = None, max_records: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            enabled: 記録するかどうか (省略時は設定値)
+            max_records: 保持する記録の件数 (省略時は設定値)
+        """
+        self.enabled = Config.TELEMETRY_ENABLED if enabled is None else enabled
+        self.records = deque(maxlen=max_records or Config.TELEMETRY_MAX_RECORDS)
+        self.groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, model: str, call: Optional[str] = None, prompt_tokens: int = 0,
+               completion_tokens: int = 0, latency: Optional[float] = None,
+               time_to_first_token: Optional[float] = None, retries: int = 0, cached: bool = False,
+               error: Optional[str] = None, batch: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        1回の呼び出しを記録
+
+        キャッシュから返した呼び出しは API を使っていないので料金を0とする。
+
+        Args:
+            stage: 段階 ('analysis', 'strategy', 'processing')
+            model: モデル名
+            call: 呼び出し名
+            prompt_tokens: 入力トークン数
+            completion_tokens: 出力トークン数
+            latency: 応答時間 (秒。バッチなど計測できない場合はNone)
+            time_to_first_token: 最初のトークンまでの時間 (秒。ストリーミング時のみ)
+            retries: 再試行回数
+            cached: キャッシュから返したかどうか
+            error: エラーメッセージ (成功時はNone)
+            batch: バッチ API の呼び出しかどうか
+
+        Returns:
+            記録 (無効時はNone)
+        """
+        if not self.enabled:
+            return None
+        cost = 0.0 if cached else estimate_cost(model, prompt_tokens, completion_tokens, batch)
+        record = {
+            'timestamp': time.time(),
+            'stage': stage,
+            'model': model,
+            'call': call,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency': latency,
+            'time_to_first_token': time_to_first_token,
+            'retries': retries,
+            'cached': cached,
+            'batch': batch,
+            'error': error,
+            'cost': cost
+        }
+        with self._lock:
+            self.records.append(record)
+            group = self.groups.get((stage, model))
+            if group is None:
+                group = self.groups[(stage, model)] = _new_group()
+            group['calls'] += 1
+            group['errors'] += error is not None
+            group['cached'] += cached
+            group['retries'] += retries
+            group['prompt_tokens'] += prompt_tokens
+            group['completion_tokens'] += completion_tokens
+            group['cost'] += cost or 0.0
+            if latency is not None:
+                group['latency_sum'] += latency
+                group['latency_count'] += 1
+                group['latency_buckets'][bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            if time_to_first_token is not None:
+                group['ttft_sum'] += time_to_first_token
+                group['ttft_count'] += 1
+        return record
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        集計結果
+
+        Returns:
+            calls, errors, cached, retries, prompt_tokens, completion_tokens, cost と、
+            段階ごと (stages) ・段階とモデルの組ごと (groups) の集計を含む辞書
+        """
+        keys = ('calls', 'errors', 'cached', 'retries', 'prompt_tokens', 'completion_tokens', 'cost')
+        with self._lock:
+            groups = {key: dict(group) for key, group in self.groups.items()}
+        totals: Dict[str, Any] = {key: 0 for key in keys}
+        totals['cost'] = 0.0
+        stages: Dict[str, Dict[str, Any]] = {}
+        rows = []
+        for (stage, model), group in sorted(groups.items()):
+            row = {'stage': stage, 'model': model}
+            row.update({key: group[key] for key in keys})
+            row['mean_latency'] = group['latency_sum'] / group['latency_count'] if group['latency_count'] else None
+            row['mean_time_to_first_token'] = group['ttft_sum'] / group['ttft_count'] if group['ttft_count'] \
+                else None
+            rows.append(row)
+            stage_totals = stages.setdefault(stage, {key: 0 for key in keys})
+            for key in keys:
+                stage_totals[key] += group[key]
+                totals[key] += group[key]
+        totals['stages'] = stages
+        totals['groups'] = rows
+        return totals
+
+    def export_jsonl(self, path: str) -> int:
+        """
+        保持している記録を JSON Lines で出力
+
+        Args:
+            path: 出力ファイルパス
+
+        Returns:
+            出力した件数
+        """
+        with self._lock:
+            records = list(self.records)
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return len(records)
+
+    def prometheus(self) -> str:
+        """
+        集計を Prometheus のテキスト形式で出力
+
+        Returns:
+            テキスト (段階とモデルをラベルにしたカウンタと応答時間のヒストグラム)
+        """
+        with self._lock:
+            groups = {key: dict(group, latency_buckets=list(group['latency_buckets']))
+                      for key, group in self.groups.items()}
+        counters = [
+            ('llm_calls_total', 'LLM API calls', 'calls'),
+            ('llm_errors_total', 'LLM API calls that failed', 'errors'),
+            ('llm_cache_hits_total', 'LLM calls answered from the response cache', 'cached'),
+            ('llm_retries_total', 'Retries of LLM API calls', 'retries'),
+            ('llm_cost_usd_total', 'Estimated cost of LLM API calls in USD', 'cost')
+        ]
+        lines: List[str] = []
+        ordered = sorted(groups.items())
+        for name, help_text, key in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (stage, model), group in ordered:
+                lines.append(f'{name}{{stage="{_label(stage)}",model="{_label(model)}"}} {group[key]}')
+
+        lines.append("# HELP llm_tokens_total Tokens used by LLM API calls")
+        lines.append("# TYPE llm_tokens_total counter")
+        for (stage, model), group in ordered:
+            labels = f'stage="{_label(stage)}",model="{_label(model)}"'
+            lines.append(f'llm_tokens_total{{{labels},type="prompt"}} {group["prompt_tokens"]}')
+            lines.append(f'llm_tokens_total{{{labels},type="completion"}} {group["completion_tokens"]}')
+
+        lines.append("# HELP llm_latency_seconds Latency of LLM API calls")
+        lines.append("# TYPE llm_latency_seconds histogram")
+        for (stage, model), group in ordered:
+            labels = f'stage="{_label(stage)}",model="{_label(model)}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, group['latency_buckets']):
+                cumulative += count
+                lines.append(f'llm_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'llm_latency_seconds_bucket{{{labels},le="+Inf"}} {group["latency_count"]}')
+            lines.append(f'llm_latency_seconds_sum{{{labels}}} {group["latency_sum"]}')
+            lines.append(f'llm_latency_seconds_count{{{labels}}} {group["latency_count"]}')
+
+        lines.append("# HELP llm_time_to_first_token_seconds Time to the first streamed token")
+        lines.append("# TYPE llm_time_to_first_token_seconds summary")
+        for (stage, model), group in ordered:
+            labels = f'stage="{_label(stage)}",model="{_label(model)}"'
+            lines.append(f'llm_time_to_first_token_seconds_sum{{{labels}}} {group["ttft_sum"]}')
+            lines.append(f'llm_time_to_first_token_seconds_count{{{labels}}} {group["ttft_count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """記録と集計を消去"""
+        with self._lock:
+            self.records.clear()
+            self.groups = {}
@@ -0,0 +1,61 @@
+"""
+トークン数見積もりモジュール
+
+tiktoken がインストールされていればモデルのエンコーディングで数え、
+なければ文字種ごとの目安 (英数字は約4文字、日本語などは約1文字で1トークン) で見積もる。
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:  # 任意の依存関係
+    tiktoken = None
+
+# チャットメッセージ1件あたりの書式のオーバーヘッド
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('cl100k_base')
+    except (KeyError, ValueError):
+        return tiktoken.get_encoding('cl100k_base')
+
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    テキストのトークン数を見積もる
+
+    Args:
+        text: 対象テキスト
+        model: モデル名 (tiktoken のエンコーディング選択に使用)
+
+    Returns:
+        トークン数
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def estimate_message_tokens(messages, model: Optional[str] = None) -> int:
+    """
+    チャットメッセージ列のトークン数を見積もる
+
+    Args:
+        messages: [{'role': ..., 'content': ...}, ...]
+        model: モデル名
+
+    Returns:
+        トークン数
+    """
+    return sum(estimate_tokens(m.get('content') or '', model) + MESSAGE_OVERHEAD_TOKENS for m in messages)
@@ -0,0 +1,387 @@
+"""
+LLM API 呼び出しの再試行・遮断・ヘッジモジュール
+
+AIAnalyzer と行処理のすべての API 呼び出しをこの層に通す。
+- 429 や 5xx、接続エラーなど一時的なエラーは、ジッター付きの指数バックオフで再試行する
+  (Retry-After ヘッダーがあればその時間以上待つ)。
+- モデルごとのサーキットブレーカーで、連続して失敗しているモデルへの呼び出しを
+  一定時間止め、その後1件だけ試して回復を確認する。止めている間の呼び出しは
+  失敗にせず再開まで待つ。429 などのレート制限はモデルの障害として数えない。
+- 対話的な呼び出しでは、一定時間内に応答がなければ同じリクエストをもう1本送り、
+  先に返った方を使う (ヘッジ)。
+再試行・ヘッジの回数はカウンタで確認できる。
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Callable, Tuple
+from .config import Config
+
+# 一時的なエラーとして再試行する HTTP ステータス
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# 再試行する例外のクラス名 (openai のクライアント例外)
+RETRYABLE_ERRORS = {'APIConnectionError', 'APITimeoutError', 'RateLimitError', 'InternalServerError'}
+
+# 半開状態でほかの呼び出しが試行中のときに、結果を確認する間隔 (秒)
+CIRCUIT_POLL_SECONDS = 0.1
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いていて呼び出しを止めたときの例外"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    再試行すべき一時的なエラーかどうか
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        再試行するならTrue
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """
+    レート制限による拒否かどうか (429、RateLimitError または Retry-After 付きの応答)
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        レート制限ならTrue
+    """
+    if getattr(error, 'status_code', None) == 429:
+        return True
+    if any(cls.__name__ == 'RateLimitError' for cls in type(error).__mro__):
+        return True
+    return retry_after(error) is not None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    エラー応答の Retry-After (秒)
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        待つべき秒数 (指定がなければNone)
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """連続失敗で呼び出しを一時停止するサーキットブレーカー"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock: Callable[[], float] = time.monotonic):
+        """
+        初期化
+
+        Args:
+            failure_threshold: 開くまでの連続失敗回数 (0 は遮断しない)
+            reset_seconds: 開いてから試行を再開するまでの秒数
+            clock: 時刻関数
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """呼び出してよいかどうか (半開状態では1件だけ許可)"""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_in(self) -> Optional[float]:
+        """開いている場合は試行を再開するまでの秒数 (開いていなければNone)"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return max(0.0, self.reset_seconds - (self.clock() - self.opened_at))
+            return None
+
+    def release(self):
+        """成功にも失敗にも数えない結果を記録 (半開状態の試行枠だけを戻す)"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        """成功を記録 (閉じる)"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """一時的なエラーを記録 (しきい値に達するか、半開状態で失敗すると開く)"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.failure_threshold and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self._probing = False
+
+
+class LLMTransport:
+    """再試行・サーキットブレーカー・ヘッジ付きの API 呼び出し"""
+
+    def __init__(self, max_retries: Optional[int] = None, backoff_base: Optional[float] = None,
+                 backoff_max: Optional[float] = None, failure_threshold: Optional[int] = None,
+                 reset_seconds: Optional[float] = None, hedge_delay: Optional[float] = None,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        """
+        初期化
+
+        Args:
+            max_retries: 最大再試行回数
+            backoff_base: バックオフの基準秒数 (n回目は最大 base * 2^n 秒)
+            backoff_max: バックオフの上限秒数
+            failure_threshold: サーキットブレーカーが開く連続失敗回数
+            reset_seconds: サーキットブレーカーが試行を再開するまでの秒数
+            hedge_delay: ヘッジを送るまでの秒数 (0 はヘッジしない)
+            sleep: 待機関数 (同期の呼び出し用)
+            clock: サーキットブレーカーの時刻関数
+        """
+        self.max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = Config.LLM_BACKOFF_BASE_SECONDS if backoff_base is None else backoff_base
+        self.backoff_max = Config.LLM_BACKOFF_MAX_SECONDS if backoff_max is None else backoff_max
+        self.failure_threshold = Config.LLM_CIRCUIT_FAILURE_THRESHOLD if failure_threshold is None \
+            else failure_threshold
+        self.reset_seconds = Config.LLM_CIRCUIT_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.hedge_delay = Config.LLM_HEDGE_DELAY_SECONDS if hedge_delay is None else hedge_delay
+        self.sleep = sleep
+        self.clock = clock
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.counters = {'requests': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+                         'failures': 0, 'circuit_rejections': 0}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """モデルのサーキットブレーカー"""
+        with self._lock:
+            if model not in self.breakers:
+                self.breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_seconds, self.clock)
+            return self.breakers[model]
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """
+        再試行までの待ち時間 (フルジッター、Retry-After があればその時間以上)
+
+        Args:
+            attempt: 何回目の再試行か (0 から)
+            error: 発生した例外
+
+        Returns:
+            秒数
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        hinted = retry_after(error)
+        if hinted is not None:
+            delay = max(delay, min(hinted, self.backoff_max))
+        return delay
+
+    def _admit(self, model: str, attempt: int) -> Tuple[Optional[CircuitBreaker], float, int]:
+        """
+        サーキットブレーカーに呼び出しの許可を求める
+
+        開いている間は試行を再開するまで待つ (待つたびに再試行1回と数え、使い切ったら失敗)。
+        半開状態でほかの呼び出しが試行中の場合は、回数に数えずに結果を待つ。
+
+        Args:
+            model: モデル名
+            attempt: 何回目の試行か (0 から)
+
+        Returns:
+            (許可されたブレーカー (待つ場合はNone), 待つ秒数, 次の試行番号)
+
+        Raises:
+            CircuitOpenError: 再試行回数を使い切っても開いたままの場合
+        """
+        breaker = self.breaker(model)
+        if breaker.allow():
+            self._count('requests')
+            return breaker, 0.0, attempt
+        self._count('circuit_rejections')
+        poll = min(self.reset_seconds, CIRCUIT_POLL_SECONDS)
+        wait_seconds = breaker.retry_in()
+        if wait_seconds is None:
+            return None, poll, attempt
+        if attempt >= self.max_retries:
+            self._count('failures')
+            raise CircuitOpenError(f"モデル {model} でエラーが続いているため、呼び出しを一時停止しています")
+        # 再開の時刻を確実に過ぎるよう、確認の間隔の分だけ余分に待つ
+        return None, wait_seconds + poll, attempt + 1
+
+    def _hedged(self, fn: Callable[[], Any]) -> Any:
+        """hedge_delay 秒以内に終わらなければ同じ呼び出しをもう1本送り、先に成功した方を返す"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='llm-hedge')
+        first = self._executor.submit(fn)
+        done, _ = wait([first], timeout=self.hedge_delay)
+        if done:
+            return first.result()
+
+        self._count('hedges')
+        second = self._executor.submit(fn)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count('hedge_wins')
+                    # 遅れた方の応答は使わない (実行中のリクエストは取り消せない)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _retry_delay(self, breaker: CircuitBreaker, attempt: int, error: Exception) -> Optional[float]:
+        """エラーを記録し、再試行するなら待ち時間を返す (しないならNone)"""
+        if not is_retryable(error):
+            # 応答は返っているので、モデルの障害としては数えない
+            breaker.record_success()
+            return None
+        if is_rate_limited(error):
+            # レート制限は利用量の問題なので、サーキットブレーカーには数えない
+            breaker.release()
+        else:
+            breaker.record_failure()
+        if attempt >= self.max_retries:
+            self._count('failures')
+            return None
+        self._count('retries')
+        return self.backoff(attempt, error)
+
+    def call(self, model: str, fn: Callable[[], Any], hedge: bool = False,
+             info: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        API 呼び出しを実行
+
+        Args:
+            model: モデル名 (サーキットブレーカーの単位)
+            fn: 呼び出し本体
+            hedge: 遅い場合にヘッジを送るかどうか (hedge_delay が0なら送らない)
+            info: 再試行回数 (retries) を書き込む辞書 (失敗時も書き込む)
+
+        Returns:
+            fn の戻り値
+        """
+        info = {} if info is None else info
+        attempt = 0
+        while True:
+            info['retries'] = attempt
+            breaker, delay, attempt = self._admit(model, attempt)
+            if breaker is None:
+                self.sleep(delay)
+                continue
+            try:
+                result = self._hedged(fn) if hedge and self.hedge_delay > 0 else fn()
+            except Exception as e:
+                delay = self._retry_delay(breaker, attempt, e)
+                if delay is None:
+                    raise
+                self.sleep(delay)
+                attempt += 1
+                continue
+            breaker.record_success()
+            return result
+
+    async def acall(self, model: str, fn: Callable[[], Any], info: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        非同期の API 呼び出しを実行 (ヘッジなし)
+
+        Args:
+            model: モデル名 (サーキットブレーカーの単位)
+            fn: コルーチンを返す関数 (再試行のたびに呼ぶ)
+            info: 再試行回数 (retries) を書き込む辞書 (失敗時も書き込む)
+
+        Returns:
+            コルーチンの結果
+        """
+        info = {} if info is None else info
+        attempt = 0
+        while True:
+            info['retries'] = attempt
+            breaker, delay, attempt = self._admit(model, attempt)
+            if breaker is None:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._retry_delay(breaker, attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        カウンタとモデルごとのサーキットブレーカーの状態
+
+        Returns:
+            requests, retries, hedges, hedge_wins, failures, circuit_rejections, circuits を含む辞書
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            breakers = dict(self.breakers)
+        stats['circuits'] = {model: breaker.state for model, breaker in breakers.items()}
+        return stats
@@ -15,7 +15,8 @@ import os
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
 
-from main import BusinessDataAnalyzer
+from main import BusinessDataAnalyzer, PIPELINE_STAGE_LABELS
+from src.core.pipeline import STATUS_LABELS
 from src.core.config import Config
 
 # Streamlitページの設定
@@ -76,6 +77,40 @@ if 'df' not in st.session_state:
 if 'analysis_complete' not in st.session_state:
     st.session_state.analysis_complete = False
 
+def stream_to(placeholder):
+    """ストリーミング応答の断片を受け取り、プレースホルダーに途中までの全文を表示する関数を作成"""
+    parts = []
+    
+    def on_token(chunk: str):
+        parts.append(chunk)
+        placeholder.markdown(''.join(parts) + "▌")
+    
+    return on_token
+
+def show_call_metrics(metrics):
+    """AI呼び出しの応答時間を表示"""
+    if metrics:
+        st.caption(
+            f"最初のトークンまで {metrics['time_to_first_token']:.2f}秒 / "
+            f"合計 {metrics['duration']:.2f}秒 / {metrics['tokens_per_second']:.1f} トークン/秒"
+            + (" (キャッシュ)" if metrics['cached'] else "")
+        )
+
+def show_pipeline_report(report):
+    """一括実行の段階ごとの状態・実行時間とクリティカルパスを表示"""
+    st.table(pd.DataFrame([
+        {
+            '段階': PIPELINE_STAGE_LABELS.get(name, name),
+            '状態': STATUS_LABELS[info['status']],
+            '開始 (秒)': round(info['start'], 2),
+            '実行時間 (秒)': round(info['duration'], 2)
+        }
+        for name, info in report['stages'].items()
+    ]))
+    path = ' → '.join(PIPELINE_STAGE_LABELS.get(name, name) for name in report['critical_path'])
+    st.caption(f"全体 {report['wall_seconds']:.2f}秒 / 各段階の合計 {report['serial_seconds']:.2f}秒 / "
+               f"クリティカルパス: {path} ({report['critical_path_seconds']:.2f}秒)")
+
 def main():
     # メインヘッダー
     st.markdown("""
@@ -156,6 +191,23 @@ def main():
             if st.session_state.analyzer is None:
                 st.session_state.analyzer = BusinessDataAnalyzer(api_key=api_key)
             st.sidebar.markdown('<div class="status-success">✅ API Key設定完了</div>', unsafe_allow_html=True)
+            
+            # 全セッションで共有している接続プールの利用状況
+            with st.sidebar.expander("🔌 API接続プール"):
+                pool_stats = st.session_state.analyzer.ai_analyzer.get_pool_stats()
+                st.text(f"接続: {pool_stats['active_connections']} 使用中 / "
+                        f"{pool_stats['idle_connections']} 待機 (上限 {pool_stats['max_connections']})")
+                st.text(f"使用率: {pool_stats['utilization']:.0%}")
+                st.text(f"リクエスト数: {pool_stats['requests']}")
+            
+            # このセッションの API 呼び出しのトークン数と推定料金
+            with st.sidebar.expander("💰 API利用状況"):
+                usage = st.session_state.analyzer.ai_analyzer.get_telemetry_summary()
+                st.text(f"呼び出し: {usage['calls']} 回 (キャッシュ {usage['cached']}, エラー {usage['errors']})")
+                st.text(f"トークン: 入力 {usage['prompt_tokens']} / 出力 {usage['completion_tokens']}")
+                st.text(f"推定料金: ${usage['cost']:.4f}")
+                for stage, totals in usage['stages'].items():
+                    st.text(f"{stage}: {totals['calls']} 回, ${totals['cost']:.4f}")
         except Exception as e:
             st.sidebar.markdown(f'<div class="status-error">❌ API Key設定エラー: {e}</div>', unsafe_allow_html=True)
             return
@@ -252,38 +304,36 @@ def main():
                         st.success("✅ データ構造分析完了")
                         st.rerun()
                 
-                # AI分析
+                # AI分析 (生成中のテキストを順次表示)
                 if st.button("🤖 AI詳細分析", key="ai_btn"):
-                    with st.spinner("AI分析中..."):
-                        ai_analysis = st.session_state.analyzer.ai_analyze_data()
-                        st.session_state.ai_analysis = ai_analysis
-                        st.success("✅ AI分析完了")
-                        st.rerun()
+                    ai_analysis = st.session_state.analyzer.ai_analyze_data(on_token=stream_to(st.empty()))
+                    st.session_state.ai_analysis = ai_analysis
+                    st.session_state.ai_metrics = st.session_state.analyzer.ai_analyzer.last_call_metrics
+                    st.success("✅ AI分析完了")
+                    st.rerun()
                 
-                # ビジネス戦略提案
+                # ビジネス戦略提案 (生成中のテキストを順次表示)
                 if st.button("💡 ビジネス戦略提案", key="strategy_btn"):
-                    with st.spinner("戦略提案中..."):
-                        strategy = st.session_state.analyzer.generate_business_strategy()
-                        st.session_state.strategy = strategy
-                        st.success("✅ 戦略提案完了")
-                        st.rerun()
+                    strategy = st.session_state.analyzer.generate_business_strategy(on_token=stream_to(st.empty()))
+                    st.session_state.strategy = strategy
+                    st.session_state.strategy_metrics = st.session_state.analyzer.ai_analyzer.last_call_metrics
+                    st.success("✅ 戦略提案完了")
+                    st.rerun()
                 
                 st.markdown("---")
                 
                 # 一括分析ボタン
                 if st.button("🚀 全分析を一括実行", key="all_analysis_btn", type="primary"):
                     with st.spinner("全分析を実行中..."):
-                        # データ構造分析
-                        structure = st.session_state.analyzer.analyze_data_structure()
-                        st.session_state.structure_analysis = structure
-                        
-                        # AI分析
-                        ai_analysis = st.session_state.analyzer.ai_analyze_data()
-                        st.session_state.ai_analysis = ai_analysis
-                        
-                        # ビジネス戦略提案
-                        strategy = st.session_state.analyzer.generate_business_strategy()
-                        st.session_state.strategy = strategy
+                        # 独立した段階 (構造分析・グラフ作成・AI呼び出し) は並行して実行される
+                        report = st.session_state.analyzer.run_full_pipeline()
+                        if report:
+                            outputs = report['outputs']
+                            st.session_state.structure_analysis = outputs.get('data_structure')
+                            st.session_state.ai_analysis = outputs.get('ai_analysis')
+                            st.session_state.visualization_insights = outputs.get('visualization_insights')
+                            st.session_state.strategy = outputs.get('business_strategy')
+                            st.session_state.pipeline_report = report
                         
                         st.success("✅ 全分析完了！")
                         st.rerun()
@@ -302,11 +352,23 @@ def main():
             if hasattr(st.session_state, 'ai_analysis') and st.session_state.ai_analysis:
                 with st.expander("🤖 AI詳細分析結果", expanded=True):
                     st.markdown(st.session_state.ai_analysis)
+                    show_call_metrics(st.session_state.get('ai_metrics'))
+            
+            # 可視化インサイト分析結果
+            if st.session_state.get('visualization_insights'):
+                with st.expander("📈 可視化インサイト分析結果", expanded=False):
+                    st.markdown(st.session_state.visualization_insights)
             
             # 戦略提案結果
             if hasattr(st.session_state, 'strategy') and st.session_state.strategy:
                 with st.expander("💡 ビジネス戦略提案", expanded=True):
                     st.markdown(st.session_state.strategy)
+                    show_call_metrics(st.session_state.get('strategy_metrics'))
+            
+            # 一括実行の段階ごとの実行時間
+            if st.session_state.get('pipeline_report'):
+                with st.expander("⏱️ 一括実行の所要時間", expanded=False):
+                    show_pipeline_report(st.session_state.pipeline_report)
         else:
             # データがない場合のウェルカムメッセージ
             st.markdown("### 📥 データをアップロードして開始してください")
@@ -0,0 +1,123 @@
+"""
+AI分析クラス (ストリーミング応答と計測) のテスト
+"""
+
+import unittest
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.config import Config
+from src.core.ai_analyzer import AIAnalyzer
+from src.core.llm_cache import LLMCache
+from main import BusinessDataAnalyzer
+
+class FakeStreamingClient:
+    """stream=True に対応した同期クライアントのスタブ"""
+    
+    def __init__(self, pieces, delay=0.0, fail_after=None):
+        self.pieces = pieces
+        self.delay = delay
+        self.fail_after = fail_after
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def _chunk(self, content=None, usage=None):
+        choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+        return SimpleNamespace(choices=choices, usage=usage)
+    
+    def _stream(self):
+        time.sleep(self.delay)
+        # 最初はロールだけの空の断片が届く
+        yield self._chunk('')
+        for i, piece in enumerate(self.pieces):
+            if self.fail_after is not None and i == self.fail_after:
+                raise RuntimeError('connection reset')
+            yield self._chunk(piece)
+        yield self._chunk(usage=SimpleNamespace(completion_tokens=len(self.pieces)))
+    
+    def create(self, stream=False, **kwargs):
+        self.calls.append(dict(kwargs, stream=stream))
+        if stream:
+            return self._stream()
+        message = SimpleNamespace(content=''.join(self.pieces))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(completion_tokens=len(self.pieces)))
+
+class TestAIAnalyzerStreaming(unittest.TestCase):
+    """ストリーミング応答と計測のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.analyzer = AIAnalyzer(api_key='test', cache=LLMCache(os.path.join(self.tmpdir.name, 'cache.sqlite3')))
+        self.pieces = ['売上は', '前年比', '12%', '増加しました。']
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.tmpdir.cleanup()
+    
+    def test_stream_yields_pieces_and_records_metrics(self):
+        """断片が順に返り、最初のトークンまでの時間と生成速度が記録されるかのテスト"""
+        self.analyzer.client = FakeStreamingClient(self.pieces, delay=0.05)
+        chunks = list(self.analyzer.stream_business_strategy('分析結果'))
+        self.assertEqual(chunks, self.pieces)
+        self.assertTrue(self.analyzer.client.calls[0]['stream'])
+        
+        metrics = self.analyzer.last_call_metrics
+        self.assertEqual(metrics['call'], 'business_strategy')
+        self.assertEqual(metrics['tokens'], 4)
+        self.assertGreaterEqual(metrics['time_to_first_token'], 0.05)
+        self.assertLessEqual(metrics['time_to_first_token'], metrics['duration'])
+        self.assertGreater(metrics['tokens_per_second'], 0)
+        self.assertFalse(metrics['cached'])
+    
+    def test_completed_stream_is_cached(self):
+        """最後まで受信した応答がキャッシュされ、通常の呼び出しと共有されるかのテスト"""
+        self.analyzer.client = FakeStreamingClient(self.pieces)
+        list(self.analyzer.stream_business_strategy('分析結果'))
+        self.assertEqual(list(self.analyzer.stream_business_strategy('分析結果')), [''.join(self.pieces)])
+        self.assertEqual(self.analyzer.generate_business_strategy('分析結果'), ''.join(self.pieces))
+        self.assertEqual(len(self.analyzer.client.calls), 1)
+        self.assertTrue(self.analyzer.last_call_metrics['cached'])
+    
+    def test_interrupted_stream_is_not_cached(self):
+        """途中で切れた応答は例外になり、エラーとして記録され、キャッシュされないかのテスト"""
+        self.analyzer.client = FakeStreamingClient(self.pieces, fail_after=2)
+        chunks = []
+        with self.assertRaises(RuntimeError):
+            for chunk in self.analyzer.stream_business_strategy('分析結果'):
+                chunks.append(chunk)
+        self.assertEqual(chunks, self.pieces[:2])
+        self.assertEqual(self.analyzer.get_cache_stats()['entries'], 0)
+        self.assertEqual(self.analyzer.get_telemetry_summary()['errors'], 1)
+        self.assertEqual(len(self.analyzer.call_metrics), 0)
+    
+    def test_interrupted_stream_is_not_kept_as_result(self):
+        """途中で切れた応答を分析結果として保存しないかのテスト"""
+        with mock.patch.multiple(Config, OPENAI_API_KEY='test', LLM_CACHE_ENABLED=False,
+                                 JOB_JOURNAL_PATH=os.path.join(self.tmpdir.name, 'jobs.sqlite3')):
+            business = BusinessDataAnalyzer()
+        business.ai_analyzer.client = FakeStreamingClient(self.pieces, fail_after=2)
+        business.analysis_results['ai_analysis'] = '分析結果'
+        received = []
+        self.assertIsNone(business.generate_business_strategy(on_token=received.append))
+        self.assertEqual(received, self.pieces[:2])
+        self.assertNotIn('business_strategy', business.analysis_results)
+    
+    def test_non_streaming_call_metrics(self):
+        """通常の呼び出しでも計測結果が記録されるかのテスト"""
+        self.analyzer.client = FakeStreamingClient(self.pieces)
+        result = self.analyzer.analyze_visualization_insights({'rows': 10}, {'scatter': 'a.png'})
+        self.assertEqual(result, ''.join(self.pieces))
+        metrics = self.analyzer.last_call_metrics
+        self.assertEqual(metrics['call'], 'visualization_insights')
+        self.assertEqual(metrics['time_to_first_token'], metrics['duration'])
+
+if __name__ == '__main__':
+    unittest.main()
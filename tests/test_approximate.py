@@ -0,0 +1,120 @@
+"""
+近似分析のテスト
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.approximate import ApproximateAnalyzer, SamplePlan, weighted_quantile
+from src.core.profiler import ColumnProfiler
+from src.core.data_analyzer import DataAnalyzer
+
+class TestApproximateAnalyzer(unittest.TestCase):
+    """近似分析のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(3)
+        n = 5000
+        self.sample_data = pd.DataFrame({
+            'Industry': rng.choice(['Technology', 'Retail', 'Finance'], n, p=[0.6, 0.3, 0.1]).astype(object),
+            'Region': rng.choice(['East', 'West'], n).astype(object),
+            'Revenue': rng.normal(100, 20, n),
+            'Employees': rng.exponential(50, n)
+        })
+        self.sample_data['Profit'] = self.sample_data['Revenue'] * 0.2 + rng.normal(0, 1, n)
+        self.sample_data.loc[::9, 'Employees'] = np.nan
+    
+    def test_weighted_quantile_matches_numpy(self):
+        """重みが等しい場合に numpy.quantile と一致するかのテスト"""
+        values = np.sort(np.random.default_rng(0).normal(size=101))
+        qs = [0.1, 0.25, 0.5, 0.9]
+        np.testing.assert_allclose(weighted_quantile(values, np.ones(101), qs), np.quantile(values, qs))
+    
+    def test_stratified_allocation(self):
+        """層別抽出が比例配分で入れ子になるかのテスト"""
+        plan = SamplePlan(self.sample_data, ['Industry', 'Region'])
+        small, _, allocation = plan.select(500)
+        large, _, _ = plan.select(1000)
+        self.assertTrue(set(small).issubset(set(large)))
+        np.testing.assert_allclose(allocation / allocation.sum(), plan.population / plan.population.sum(), atol=0.01)
+    
+    def test_intervals_cover_truth(self):
+        """信頼区間が真の値を含むかのテスト"""
+        result = ApproximateAnalyzer(self.sample_data, ['Industry']).analyze(800)
+        self.assertEqual(result['sampling']['method'], 'stratified')
+        self.assertFalse(result['sampling']['exact'])
+        for col in ['Revenue', 'Employees']:
+            for stat, truth in [('mean', self.sample_data[col].mean()),
+                                ('50%', self.sample_data[col].median())]:
+                interval = result['numeric_summary'][col][stat]
+                self.assertLessEqual(interval['lower'], truth)
+                self.assertGreaterEqual(interval['upper'], truth)
+        pairs = result['correlation']['strong_correlations']
+        self.assertEqual([(p['variable1'], p['variable2']) for p in pairs], [('Revenue', 'Profit')])
+    
+    def test_std_interval_on_skewed_data(self):
+        """歪んだ分布でも標準偏差の区間が名目に近い割合で真の値を含むかのテスト"""
+        df = pd.DataFrame({'x': np.random.default_rng(1).exponential(5, 50000)})
+        truth = df['x'].std()
+        covered = 0
+        for seed in range(20):
+            interval = ApproximateAnalyzer(df, seed=seed).analyze(2000)['numeric_summary']['x']['std']
+            covered += interval['lower'] <= truth <= interval['upper']
+        self.assertGreaterEqual(covered, 17)
+    
+    def test_constant_strata_give_zero_width(self):
+        """層内の値がすべて同じなら件数の区間の幅が0になるかのテスト"""
+        df = self.sample_data.copy()
+        df['Note'] = np.where(df['Industry'] == 'Finance', None, 'ok')
+        result = ApproximateAnalyzer(df, ['Industry']).analyze(500)
+        interval = result['basic_info']['missing_values']['Note']
+        truth = df['Note'].isna().sum()
+        self.assertAlmostEqual(interval['estimate'], truth)
+        self.assertAlmostEqual(interval['lower'], truth)
+        self.assertAlmostEqual(interval['upper'], truth)
+    
+    def test_full_sample_is_exact(self):
+        """全行を標本にすると厳密解と一致するかのテスト"""
+        result = ApproximateAnalyzer(self.sample_data).analyze(len(self.sample_data))
+        exact = ColumnProfiler(self.sample_data).profile()
+        self.assertTrue(result['sampling']['exact'])
+        for col, stats in exact['numeric_summary'].items():
+            for stat, value in stats.items():
+                interval = result['numeric_summary'][col][stat]
+                self.assertAlmostEqual(interval['estimate'], value)
+                self.assertAlmostEqual(interval['lower'], value)
+                self.assertAlmostEqual(interval['upper'], value)
+        self.assertAlmostEqual(result['basic_info']['missing_values']['Employees']['estimate'],
+                               exact['basic_info']['missing_values']['Employees'])
+    
+    def test_insufficient_sample_flag(self):
+        """標本不足の統計量が報告されるかのテスト"""
+        result = ApproximateAnalyzer(self.sample_data, min_sample=30).analyze(20)
+        self.assertIn('Revenue.mean', result['insufficient'])
+        self.assertFalse(result['numeric_summary']['Revenue']['mean']['sufficient'])
+    
+    def test_progressive_analysis(self):
+        """バックグラウンドの段階的精緻化が厳密解まで進むかのテスト"""
+        analyzer = DataAnalyzer(self.sample_data)
+        progress = analyzer.start_progressive_analysis(initial_rows=500)
+        self.assertTrue(progress.wait(timeout=60))
+        self.assertIsNone(progress.error)
+        result = progress.latest()
+        self.assertTrue(result['sampling']['exact'])
+        self.assertGreater(progress.steps, 1)
+    
+    def test_analyzer_cache(self):
+        """DataAnalyzer の近似分析がキャッシュされるかのテスト"""
+        analyzer = DataAnalyzer(self.sample_data)
+        first = analyzer.get_approximate_analysis(sample_rows=500, strata=['Region'])
+        second = analyzer.get_approximate_analysis(sample_rows=500, strata=['Region'])
+        self.assertIs(first, second)
+
+if __name__ == '__main__':
+    unittest.main()
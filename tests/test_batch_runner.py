@@ -0,0 +1,285 @@
+"""
+バッチ API による行処理のテスト
+"""
+
+import unittest
+import json
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+import pandas as pd
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.config import Config
+from src.core.batch_runner import BatchRunner, LocalBatchBackend, parse_batch_output
+from src.core.ai_analyzer import AIAnalyzer
+from src.core.llm_cache import LLMCache
+from src.core.transport import LLMTransport
+from main import BusinessDataAnalyzer
+
+class EchoClient:
+    """プロンプトに '#' を付けて返す同期クライアントのスタブ ('失敗' を含むとエラー)"""
+    
+    def __init__(self):
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, model, messages, max_tokens, temperature):
+        prompt = messages[-1]['content']
+        self.prompts.append(prompt)
+        if '失敗' in prompt:
+            raise ValueError('invalid request')
+        message = SimpleNamespace(content=f"#{prompt}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason='stop')],
+                               usage=SimpleNamespace(prompt_tokens=5, completion_tokens=3, total_tokens=8))
+
+class FakeBatchAPI(EchoClient):
+    """OpenAI クライアントの files / batches を模したスタブ (hold の間は処理中のまま)"""
+    
+    def __init__(self, directory):
+        super().__init__()
+        self.local = LocalBatchBackend(self, directory)
+        self.hold = False
+        self.uploads = []
+        self.files = SimpleNamespace(create=self._upload, content=self._content)
+        self.batches = SimpleNamespace(create=self._create, retrieve=self._retrieve)
+    
+    def _upload(self, file, purpose):
+        self.uploads.append(file.read().decode('utf-8'))
+        return SimpleNamespace(id=f"file-{len(self.uploads)}")
+    
+    def _create(self, input_file_id, endpoint, completion_window):
+        path = os.path.join(self.local.directory, f"{input_file_id}.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.uploads[int(input_file_id.split('-')[1]) - 1])
+        return SimpleNamespace(id=self.local.submit(path))
+    
+    def _retrieve(self, batch_id):
+        if self.hold:
+            return SimpleNamespace(status='in_progress', output_file_id=None, error_file_id=None,
+                                   request_counts=SimpleNamespace(completed=0, failed=0, total=0))
+        status = self.local.status(batch_id)
+        counts = SimpleNamespace(completed=status['completed'], failed=status['failed'], total=status['total'])
+        return SimpleNamespace(status=status['status'], output_file_id=status['output_file_id'],
+                               error_file_id=status['error_file_id'], request_counts=counts)
+    
+    def _content(self, file_id):
+        return SimpleNamespace(text=self.local.download(file_id))
+
+class PollingBackend:
+    """指定回数だけ処理中を返すバックエンドのスタブ"""
+    
+    def __init__(self, polls):
+        self.polls = polls
+    
+    def submit(self, path):
+        return 'batch-1'
+    
+    def status(self, batch_id):
+        self.polls -= 1
+        state = 'in_progress' if self.polls > 0 else 'expired'
+        return {'status': state, 'output_file_id': None, 'error_file_id': None,
+                'completed': 0, 'failed': 0, 'total': 2}
+    
+    def download(self, file_id):
+        return ''
+
+class TestBatchRunner(unittest.TestCase):
+    """BatchRunner のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.transport = LLMTransport(max_retries=0, failure_threshold=0, hedge_delay=0)
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.tmpdir.cleanup()
+    
+    def runner(self, backend, **kwargs):
+        return BatchRunner(backend, directory=self.tmpdir.name, poll_interval=0,
+                           transport=self.transport, **kwargs)
+    
+    def test_write_requests(self):
+        """バッチファイルが1行1リクエストの JSONL になるかのテスト"""
+        path = os.path.join(self.tmpdir.name, 'requests.jsonl')
+        runner = self.runner(LocalBatchBackend(EchoClient(), self.tmpdir.name))
+        self.assertEqual(runner.write_requests(path, ['a', 'b'], ['IT', 1], '{data} の説明'), 2)
+        with open(path, encoding='utf-8') as f:
+            requests = [json.loads(line) for line in f]
+        self.assertEqual([request['custom_id'] for request in requests], ['a', 'b'])
+        self.assertEqual(requests[0]['url'], '/v1/chat/completions')
+        self.assertEqual(requests[1]['body']['messages'], [{'role': 'user', 'content': '1 の説明'}])
+        self.assertEqual(requests[0]['body']['model'], Config.get_model_config('processing')['model'])
+    
+    def test_parse_batch_output(self):
+        """成功行・HTTP エラー行・エラー行の解析のテスト"""
+        lines = [
+            {'custom_id': 'a', 'response': {'status_code': 200, 'body': {
+                'choices': [{'message': {'content': '回答'}}],
+                'usage': {'prompt_tokens': 5, 'completion_tokens': 2, 'total_tokens': 7}}}, 'error': None},
+            {'custom_id': 'b', 'response': {'status_code': 400, 'body': {'error': {'message': 'bad'}}},
+             'error': None},
+            {'custom_id': 'c', 'response': None, 'error': {'code': 'expired', 'message': 'batch expired'}}
+        ]
+        results = parse_batch_output('\n'.join(json.dumps(line) for line in lines) + '\n')
+        self.assertEqual(results['a'], {'output': '回答', 'error': None, 'tokens': 7,
+                                        'prompt_tokens': 5, 'completion_tokens': 2})
+        self.assertEqual(results['b']['error'], 'bad')
+        self.assertEqual(results['c']['error'], 'batch expired')
+        self.assertEqual(parse_batch_output(None), {})
+    
+    def test_local_round_trip(self):
+        """ローカルの代替で実行し、行IDで入力の順番に戻るかのテスト"""
+        runner = self.runner(LocalBatchBackend(EchoClient(), self.tmpdir.name))
+        submitted = []
+        results = runner.run(['IT', '失敗', '製造'], '{data}', ids=['x', 'y', 'z'], on_submit=submitted.append)
+        self.assertEqual(len(submitted), 1)
+        self.assertEqual([r['output'] for r in results], ['#IT', None, '#製造'])
+        self.assertEqual(results[1]['error'], 'invalid request')
+        self.assertEqual(results[0]['tokens'], 8)
+        self.assertTrue(all(r['batch_id'] == submitted[0] for r in results))
+    
+    def test_requests_are_split_by_count_and_size(self):
+        """リクエスト数・ファイルサイズの上限ごとにバッチを分け、結果をまとめて返すかのテスト"""
+        runner = self.runner(LocalBatchBackend(EchoClient(), self.tmpdir.name), max_requests=2)
+        submitted = []
+        progress = []
+        values = ['IT', '製造', '小売', '失敗', '金融']
+        results = runner.run(values, '{data}', on_submit=submitted.append,
+                             progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual(len(submitted), 3)
+        self.assertEqual([r['output'] for r in results], ['#IT', '#製造', '#小売', None, '#金融'])
+        self.assertEqual([r['batch_id'] for r in results], [submitted[0]] * 2 + [submitted[1]] * 2 + [submitted[2]])
+        self.assertEqual(progress[-1], (5, 5))
+        
+        # 1行の大きさは同じなので、2行分に収まるサイズでは2行ずつになる
+        runner = self.runner(LocalBatchBackend(EchoClient(), self.tmpdir.name), max_requests=0)
+        line = next(runner._request_lines(['row-0'], ['値'], '{data}'))[1]
+        runner.max_bytes = 2 * len(line.encode('utf-8')) + 1
+        paths = runner.write_request_files([f'row-{i}' for i in range(5)], ['値'] * 5, '{data}')
+        with open(paths[0], encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.assertEqual(len(paths), 3)
+        self.assertTrue(all(os.path.getsize(path) <= runner.max_bytes for path in paths))
+        runner.max_bytes = 10
+        with self.assertRaises(ValueError):
+            runner.write_request_files(['row-0'], ['値'], '{data}')
+    
+    def test_duplicate_ids_rejected(self):
+        """重複した行IDを拒否するかのテスト"""
+        runner = self.runner(LocalBatchBackend(EchoClient(), self.tmpdir.name))
+        with self.assertRaises(ValueError):
+            runner.run(['a', 'b'], '{data}', ids=['x', 'x'])
+    
+    def test_wait_polls_until_final(self):
+        """終了するまでポーリングし、結果のない行はエラーになるかのテスト"""
+        sleeps = []
+        runner = self.runner(PollingBackend(polls=3), sleep=sleeps.append)
+        progress = []
+        results = runner.run(['a', 'b'], '{data}', progress=lambda done, total: progress.append(total))
+        self.assertEqual(len(sleeps), 2)
+        self.assertEqual(progress, [2, 2, 2])
+        self.assertIn('expired', results[0]['error'])
+    
+    def test_wait_timeout(self):
+        """timeout 秒を過ぎると TimeoutError になるかのテスト"""
+        clock = iter(range(100))
+        runner = self.runner(PollingBackend(polls=50), timeout=5, sleep=lambda seconds: None,
+                             clock=lambda: next(clock))
+        with self.assertRaises(TimeoutError):
+            runner.wait('batch-1')
+
+class TestBatchProcessing(unittest.TestCase):
+    """AIAnalyzer と BusinessDataAnalyzer のバッチ処理のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.tmpdir.cleanup()
+    
+    def test_cached_rows_are_not_submitted(self):
+        """キャッシュにある行は送信せず、バッチの結果がキャッシュされるかのテスト"""
+        cache = LLMCache(os.path.join(self.tmpdir.name, 'cache.sqlite3'))
+        analyzer = AIAnalyzer(api_key='test', cache=cache)
+        client = EchoClient()
+        runner = BatchRunner(LocalBatchBackend(client, self.tmpdir.name), directory=self.tmpdir.name,
+                             poll_interval=0)
+        first = analyzer.process_rows_batch(['IT', '製造'], '{data}', runner=runner)
+        self.assertEqual([r['output'] for r in first], ['#IT', '#製造'])
+        
+        recorded = []
+        second = analyzer.process_rows_batch(['製造', '小売'], '{data}', runner=runner,
+                                             on_result=lambda position, result: recorded.append(position))
+        self.assertEqual([r['output'] for r in second], ['#製造', '#小売'])
+        self.assertEqual([r['cached'] for r in second], [True, False])
+        self.assertEqual(client.prompts, ['IT', '製造', '小売'])
+        self.assertEqual(sorted(recorded), [0, 1])
+        cache.close()
+    
+    def test_process_rows_batch_resumes_submitted_batch(self):
+        """時間切れのジョブを再実行すると、再送信せずに送信済みのバッチの結果を取り込むかのテスト"""
+        settings = {
+            'OPENAI_API_KEY': 'test',
+            'LLM_CACHE_ENABLED': False,
+            'JOB_JOURNAL_PATH': os.path.join(self.tmpdir.name, 'jobs.sqlite3'),
+            'BATCH_DIR': self.tmpdir.name,
+            'BATCH_POLL_SECONDS': 0.01,
+            'BATCH_TIMEOUT_SECONDS': 0.05
+        }
+        with mock.patch.multiple(Config, **settings):
+            analyzer = BusinessDataAnalyzer()
+            analyzer.df = pd.DataFrame({'Industry': [f'業種{i % 4}' for i in range(12)]})
+            api = FakeBatchAPI(self.tmpdir.name)
+            api.hold = True
+            analyzer.ai_analyzer.client = api
+            
+            self.assertIsNone(analyzer.process_rows('Industry', '{data}', mode='batch'))
+            job_id = analyzer.current_job_id
+            self.assertEqual(len(analyzer.job_journal.get_batches(job_id)), 1)
+            self.assertEqual(len(api.uploads[0].splitlines()), 4)
+            
+            api.hold = False
+            result = analyzer.process_rows('Industry', '{data}', mode='batch', job_id=job_id)
+        self.assertEqual(len(api.uploads), 1)
+        self.assertEqual(list(result['AI_Result']), [f'#業種{i % 4}' for i in range(12)])
+        self.assertEqual(analyzer.job_journal.get_batches(job_id), [])
+        self.assertEqual(analyzer.job_journal.get_job(job_id)['completed'], 4)
+    
+    def test_large_job_is_split_into_batches(self):
+        """上限を超えるジョブを複数のバッチに分けて送信・記録し、再開時にすべての結果を取り込むかのテスト"""
+        settings = {
+            'OPENAI_API_KEY': 'test',
+            'LLM_CACHE_ENABLED': False,
+            'JOB_JOURNAL_PATH': os.path.join(self.tmpdir.name, 'jobs.sqlite3'),
+            'BATCH_DIR': self.tmpdir.name,
+            'BATCH_POLL_SECONDS': 0.01,
+            'BATCH_TIMEOUT_SECONDS': 0.05,
+            'BATCH_MAX_REQUESTS': 3
+        }
+        with mock.patch.multiple(Config, **settings):
+            analyzer = BusinessDataAnalyzer()
+            analyzer.df = pd.DataFrame({'Industry': [f'業種{i}' for i in range(8)]})
+            api = FakeBatchAPI(self.tmpdir.name)
+            api.hold = True
+            analyzer.ai_analyzer.client = api
+            
+            self.assertIsNone(analyzer.process_rows('Industry', '{data}', mode='batch'))
+            job_id = analyzer.current_job_id
+            self.assertEqual([len(upload.splitlines()) for upload in api.uploads], [3, 3, 2])
+            self.assertEqual(len(analyzer.job_journal.get_batches(job_id)), 3)
+            
+            api.hold = False
+            result = analyzer.process_rows('Industry', '{data}', mode='batch', job_id=job_id)
+        self.assertEqual(len(api.uploads), 3)
+        self.assertEqual(list(result['AI_Result']), [f'#業種{i}' for i in range(8)])
+        self.assertEqual(analyzer.job_journal.get_batches(job_id), [])
+
+if __name__ == '__main__':
+    unittest.main()
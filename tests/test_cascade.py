@@ -0,0 +1,135 @@
+"""
+行処理のモデルカスケードのテスト
+"""
+
+import unittest
+import asyncio
+import math
+from types import SimpleNamespace
+from unittest import mock
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.config import Config
+from src.core.cascade import ModelCascade, default_cascade, pattern_validator
+from src.core.row_processor import AsyncRowProcessor, response_confidence
+from src.core.ai_analyzer import AIAnalyzer
+
+PRICING = {'cheap': (1.0, 1.0), 'strong': (10.0, 10.0)}
+
+def fake_response(content, probability=0.99, finish_reason='stop'):
+    """logprobs と usage 付きの応答"""
+    logprobs = SimpleNamespace(content=[SimpleNamespace(logprob=math.log(probability))] * 3)
+    choice = SimpleNamespace(message=SimpleNamespace(content=content), logprobs=logprobs,
+                             finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice],
+                           usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10, total_tokens=110))
+
+class CascadeClient:
+    """
+    モデルごとに応答を変える非同期クライアントのスタブ
+    
+    cheap は 'hard' を含む行に低い確率、'odd' を含む行に形式外の回答、'long' を含む行に
+    途中切れの回答を返す。strong は 'down' を含む行でエラーになる。
+    """
+    
+    def __init__(self):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    async def create(self, model, messages, max_tokens, temperature, logprobs=False):
+        await asyncio.sleep(0)
+        content = messages[-1]['content']
+        self.calls.append((model, content, logprobs))
+        if model == 'strong':
+            if 'down' in content:
+                raise RuntimeError('unavailable')
+            return fake_response('positive')
+        if 'hard' in content or 'down' in content:
+            return fake_response('negative', probability=0.4)
+        if 'odd' in content:
+            return fake_response('わかりません')
+        if 'long' in content:
+            return fake_response('posi', finish_reason='length')
+        return fake_response('positive')
+
+class TestCascade(unittest.TestCase):
+    """ModelCascade のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.client = CascadeClient()
+        self.factory = lambda model: AsyncRowProcessor(api_key='test', rpm=0, tpm=0, model=model, logprobs=True,
+                                                       client_factory=lambda: self.client)
+    
+    def test_default_order_follows_labels(self):
+        """既定の順番がコストの安い順で、段階ごとに品質が上がるかのテスト"""
+        models = Config.get_available_models()
+        cascade = default_cascade(max_stages=10)
+        self.assertEqual(cascade[:3], ['gpt-3.5-turbo', 'gpt-4o-mini', 'gpt-4o'])
+        qualities = [models[name]['quality'] for name in cascade]
+        self.assertEqual(len(set(qualities)), len(qualities))
+        self.assertEqual(len(default_cascade(max_stages=2)), 2)
+    
+    def test_response_confidence(self):
+        """出力トークンの確率の幾何平均を信頼度にするかのテスト"""
+        self.assertAlmostEqual(response_confidence(fake_response('a', probability=0.5)), 0.5)
+        plain = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='a'))])
+        self.assertIsNone(response_confidence(plain))
+    
+    def test_only_failing_rows_escalate(self):
+        """検証失敗・低信頼度・途中切れの行だけを上位モデルで再処理するかのテスト"""
+        values = ['easy1', 'hard', 'odd', 'easy2', 'long']
+        cascade = ModelCascade(['cheap', 'strong'], min_confidence=0.8,
+                               validator=pattern_validator('positive|negative'), processor_factory=self.factory)
+        confirmed = []
+        with mock.patch.object(Config, 'MODEL_PRICING', PRICING):
+            results = cascade.run(values, 'review: {data}', on_result=lambda p, r: confirmed.append(p))
+        
+        self.assertEqual([r['output'] for r in results], ['positive'] * 5)
+        self.assertEqual([r['model'] for r in results], ['cheap', 'strong', 'strong', 'cheap', 'strong'])
+        strong_rows = sorted(content for model, content, _ in self.client.calls if model == 'strong')
+        self.assertEqual(strong_rows, ['review: hard', 'review: long', 'review: odd'])
+        self.assertTrue(all(logprobs for _, _, logprobs in self.client.calls))
+        self.assertEqual(sorted(confirmed), list(range(5)))
+        
+        report = cascade.last_report
+        self.assertEqual(report['escalated'], 3)
+        self.assertAlmostEqual(report['escalation_rate'], 0.6)
+        self.assertEqual(report['stages'][0]['reasons'],
+                         {'error': 0, 'truncated': 1, 'invalid': 1, 'low_confidence': 1})
+        # 1回あたり cheap は 110 / 1e6 USD、strong は 1100 / 1e6 USD
+        self.assertAlmostEqual(report['cost'], (5 * 110 + 3 * 1100) / 1e6)
+        self.assertAlmostEqual(report['baseline_cost'], 5 * 1100 / 1e6)
+        self.assertAlmostEqual(results[1]['cost'], (110 + 1100) / 1e6)
+        self.assertEqual(results[1]['tokens'], 220)
+    
+    def test_last_model_error_keeps_previous_answer(self):
+        """最後のモデルがエラーになった行は前の段階の回答を使うかのテスト"""
+        cascade = ModelCascade(['cheap', 'strong'], min_confidence=0.8, processor_factory=self.factory)
+        results = cascade.run(['down'], '{data}')
+        self.assertEqual(results[0]['output'], 'negative')
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[0]['model'], 'cheap')
+        
+        # 信頼度の下限が0なら切り替えない
+        cascade = ModelCascade(['cheap', 'strong'], min_confidence=0, processor_factory=self.factory)
+        cascade.run(['hard'], '{data}')
+        self.assertEqual(cascade.last_report['escalated'], 0)
+    
+    def test_analyzer_cascade(self):
+        """AIAnalyzer が段階ごとのモデルで処理し、切り替えの内容を記録するかのテスト"""
+        settings = {'LLM_CACHE_ENABLED': False, 'ROW_CASCADE_MODELS': ['cheap', 'strong'],
+                    'ROW_RPM_LIMIT': 0, 'ROW_TPM_LIMIT': 0}
+        with mock.patch.multiple(Config, **settings):
+            analyzer = AIAnalyzer(api_key='test')
+            analyzer.pool = SimpleNamespace(async_client=lambda api_key: self.client)
+            results = analyzer.process_rows_cascade(['easy', 'hard'], '{data}')
+        self.assertEqual([r['model'] for r in results], ['cheap', 'strong'])
+        self.assertEqual(analyzer.last_cascade_report['models'], ['cheap', 'strong'])
+        self.assertEqual(analyzer.get_telemetry_summary()['stages']['processing']['calls'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+OpenAI クライアントの共有 (接続プール) のテスト
+"""
+
+import unittest
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core import client_pool
+from src.core.client_pool import ClientPool
+from src.core.ai_analyzer import AIAnalyzer
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    """chat/completions に固定の応答を返すハンドラ (keep-alive 対応)"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({
+            'id': 'chatcmpl-test',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': 'test-model',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': '応答'}}],
+            'usage': {'prompt_tokens': 3, 'completion_tokens': 2, 'total_tokens': 5}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+class TestClientPool(unittest.TestCase):
+    """ClientPool のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.pool = ClientPool(max_connections=4, max_keepalive_connections=2)
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.pool.close()
+    
+    def test_clients_are_shared(self):
+        """同じ API キーには同じクライアントを返し、接続プールは全キーで共有するかのテスト"""
+        first = self.pool.client('key-a')
+        self.assertIs(self.pool.client('key-a'), first)
+        other = self.pool.client('key-b')
+        self.assertIsNot(other, first)
+        self.assertIs(other._client, first._client)
+        self.assertEqual(first.max_retries, 0)
+        self.assertEqual(self.pool.stats()['clients'], 2)
+    
+    def test_analyzers_share_pool(self):
+        """AIAnalyzer をいくつ作っても同じクライアントを使うかのテスト"""
+        first = AIAnalyzer(api_key='test', pool=self.pool)
+        second = AIAnalyzer(api_key='test', pool=self.pool)
+        self.assertIs(first.client, second.client)
+        self.assertIs(AIAnalyzer(api_key='test').client, AIAnalyzer(api_key='test').client)
+    
+    def test_limits_and_timeout(self):
+        """上限とタイムアウトが設定値どおりかのテスト"""
+        pool = ClientPool(max_connections=8, max_keepalive_connections=3, keepalive_expiry=15,
+                          connect_timeout=2, read_timeout=30)
+        limits = pool.limits()
+        self.assertEqual((limits.max_connections, limits.max_keepalive_connections, limits.keepalive_expiry),
+                         (8, 3, 15))
+        timeout = pool.timeout()
+        self.assertEqual((timeout.connect, timeout.read), (2, 30))
+    
+    def test_forked_process_gets_new_connections(self):
+        """プロセスIDが変わると HTTP クライアントを作り直すかのテスト"""
+        before = self.pool.http_client()
+        self.pool.client('key-a')
+        with mock.patch.object(client_pool.os, 'getpid', return_value=-1):
+            self.assertEqual(self.pool.stats()['clients'], 0)
+            after = self.pool.http_client()
+            self.assertIsNot(after, before)
+            self.assertIs(self.pool.client('key-a')._client, after)
+    
+    def test_keepalive_connection_is_reused(self):
+        """ローカルのサーバーへの連続した呼び出しが1本の接続を使い回すかのテスト"""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), CompletionHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client = self.pool.client('key', base_url=f'http://127.0.0.1:{server.server_address[1]}/v1')
+            for _ in range(3):
+                response = client.chat.completions.create(model='test-model',
+                                                          messages=[{'role': 'user', 'content': 'hi'}])
+                self.assertEqual(response.choices[0].message.content, '応答')
+            
+            stats = self.pool.stats()
+            self.assertEqual(stats['requests'], 3)
+            self.assertEqual(stats['connections'], 1)
+            self.assertEqual(stats['idle_connections'], 1)
+            self.assertEqual(stats['utilization'], 0.0)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+追加テキストの要約 (分割・並行要約・統合) のテスト
+"""
+
+import unittest
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.config import Config
+from src.core.context_summarizer import ContextSummarizer, split_text, truncate_tokens
+from src.core.tokens import estimate_tokens
+from src.core.ai_analyzer import AIAnalyzer
+from src.core.llm_cache import LLMCache
+
+def long_document(paragraphs=40):
+    """段落ごとに内容の違う長い資料"""
+    return '\n\n'.join(f"第{i}節: 地域{i}の市場規模は前年比{i}%増加し、競合{i}社が参入した。" * 20
+                       for i in range(paragraphs))
+
+class FakeChat:
+    """入力の先頭を要約として返す chat 関数のスタブ (同時実行数を記録)"""
+    
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+    
+    def __call__(self, model_config, messages, call=None):
+        with self._lock:
+            self.calls.append((model_config['max_tokens'], messages[-1]['content']))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        text = messages[-1]['content'].split('\n\n', 1)[1]
+        return '- ' + text[:model_config['max_tokens'] // 2]
+
+class TestSplitText(unittest.TestCase):
+    """split_text / truncate_tokens のテストクラス"""
+    
+    def test_chunks_fit_and_keep_paragraphs(self):
+        """部分が上限以下で、段落の内容を失わないかのテスト"""
+        text = long_document(30)
+        chunks = split_text(text, 500)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(estimate_tokens(chunk) <= 500 for chunk in chunks))
+        self.assertEqual(''.join(''.join(chunks).split()), ''.join(text.split()))
+    
+    def test_long_paragraph_is_split(self):
+        """上限を超える1つの段落も分割するかのテスト"""
+        text = '売上' * 3000
+        chunks = split_text(text, 200)
+        self.assertTrue(all(estimate_tokens(chunk) <= 200 for chunk in chunks))
+        self.assertEqual(''.join(chunks), text)
+    
+    def test_truncate_tokens(self):
+        """トークン数の上限で切り詰めるかのテスト"""
+        self.assertLessEqual(estimate_tokens(truncate_tokens('市場' * 1000, 100)), 100)
+        self.assertEqual(truncate_tokens('短い', 100), '短い')
+
+class TestContextSummarizer(unittest.TestCase):
+    """ContextSummarizer のテストクラス"""
+    
+    def test_short_text_is_unchanged(self):
+        """上限以下のテキストは要約しないかのテスト"""
+        chat = FakeChat()
+        summarizer = ContextSummarizer(chat, max_tokens=1000)
+        self.assertEqual(summarizer.summarize('短い資料'), '短い資料')
+        self.assertEqual(chat.calls, [])
+    
+    def test_map_reduce_is_bounded_and_parallel(self):
+        """部分を並行して要約し、上限以下に統合するかのテスト"""
+        chat = FakeChat(delay=0.02)
+        summarizer = ContextSummarizer(chat, max_tokens=300, chunk_tokens=600, summary_tokens=150, workers=4)
+        context = summarizer.summarize(long_document())
+        report = summarizer.last_report
+        self.assertLessEqual(estimate_tokens(context), 300)
+        self.assertGreater(report['chunks'], 4)
+        self.assertGreaterEqual(report['levels'], 2)
+        self.assertEqual(report['calls'], len(chat.calls))
+        self.assertGreater(chat.max_active, 1)
+        self.assertLessEqual(chat.max_active, 4)
+        self.assertTrue(all(max_tokens <= 300 for max_tokens, _ in chat.calls))
+    
+    def test_same_document_costs_nothing(self):
+        """同じ資料の再要約では呼び出さず、一部の変更では変わった部分だけ要約するかのテスト"""
+        chat = FakeChat()
+        summarizer = ContextSummarizer(chat, max_tokens=300, chunk_tokens=600, summary_tokens=150, workers=2)
+        document = long_document()
+        first = summarizer.summarize(document)
+        calls = len(chat.calls)
+        self.assertEqual(summarizer.summarize(document), first)
+        self.assertEqual(len(chat.calls), calls)
+        self.assertEqual(summarizer.last_report['calls'], 0)
+        
+        summarizer.summarize(document + '\n\n追記: 新製品を発売予定。')
+        self.assertGreater(summarizer.last_report['reused'], 0)
+
+class SummaryClient:
+    """要約の依頼には短い要約、分析の依頼には固定の応答を返す同期クライアントのスタブ"""
+    
+    def __init__(self):
+        self.prompts = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, model, messages, max_tokens, temperature):
+        with self._lock:
+            self.prompts.append(messages[-1]['content'])
+        content = '- 要約' if 'トークン以内' in messages[-1]['content'] else '分析結果'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                               usage=SimpleNamespace(prompt_tokens=10, completion_tokens=2))
+
+class TestAnalyzerContext(unittest.TestCase):
+    """AIAnalyzer の追加テキスト要約のテストクラス"""
+    
+    def test_analysis_uses_summary_and_cache(self):
+        """分析プロンプトに要約が入り、新しい分析クラスでもキャッシュで API を呼ばないかのテスト"""
+        data_info = {'basic_info': {'shape': (2, 1), 'columns': ['sales'], 'data_types': {'sales': 'int64'},
+                                    'missing_values': {'sales': 0}},
+                     'numeric_summary': {}, 'categorical_summary': {}}
+        document = long_document()
+        settings = {'CONTEXT_MAX_TOKENS': 300, 'CONTEXT_CHUNK_TOKENS': 600, 'CONTEXT_SUMMARY_TOKENS': 150}
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.multiple(Config, **settings):
+            cache = LLMCache(os.path.join(tmpdir, 'cache.sqlite3'))
+            analyzer = AIAnalyzer(api_key='test', cache=cache)
+            analyzer.client = SummaryClient()
+            self.assertEqual(analyzer.analyze_data_with_ai(data_info, 'sales\n1', document), '分析結果')
+            prompt = analyzer.client.prompts[-1]
+            self.assertIn('- 要約', prompt)
+            self.assertNotIn(document[:200], prompt)
+            
+            again = AIAnalyzer(api_key='test', cache=cache)
+            again.client = SummaryClient()
+            self.assertEqual(again.analyze_data_with_ai(data_info, 'sales\n1', document), '分析結果')
+            self.assertEqual(again.client.prompts, [])
+            cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+相関分析エンジンのテスト
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.correlation import CorrelationEngine
+from src.core.data_analyzer import DataAnalyzer
+
+class TestCorrelationEngine(unittest.TestCase):
+    """相関分析エンジンのテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(0)
+        data = rng.normal(size=(300, 12))
+        data[:, 1] = data[:, 0] * 2 + rng.normal(0, 0.1, 300)
+        data[:, 9] = -data[:, 4] + rng.normal(0, 0.2, 300)
+        self.sample_data = pd.DataFrame(data, columns=[f'metric_{i}' for i in range(12)])
+        self.sample_data['constant'] = 1.0
+        self.sample_data['label'] = 'x'
+    
+    def _legacy_pairs(self, df, threshold=0.7):
+        """従来の二重ループによる強い相関ペア"""
+        matrix = df.select_dtypes(include=[np.number]).corr()
+        pairs = []
+        for i in range(len(matrix.columns)):
+            for j in range(i + 1, len(matrix.columns)):
+                if abs(matrix.iloc[i, j]) > threshold:
+                    pairs.append((matrix.columns[i], matrix.columns[j], matrix.iloc[i, j]))
+        return matrix, pairs
+    
+    def test_matches_pandas_without_missing(self):
+        """欠損なしの場合に pandas と一致するかのテスト"""
+        result = CorrelationEngine(self.sample_data, block_size=5).compute(threshold=0.7)
+        matrix, pairs = self._legacy_pairs(self.sample_data)
+        
+        actual = pd.DataFrame(result['correlation_matrix'])
+        np.testing.assert_allclose(actual.to_numpy(), matrix.to_numpy(), atol=1e-12)
+        self.assertEqual([(p['variable1'], p['variable2']) for p in result['strong_correlations']],
+                         [(a, b) for a, b, _ in pairs])
+    
+    def test_matches_pandas_with_missing(self):
+        """欠損ありの場合にペアワイズ完全ケースで一致するかのテスト"""
+        data = self.sample_data.copy()
+        mask = np.random.default_rng(1).random((300, 12)) < 0.1
+        data.iloc[:, :12] = data.iloc[:, :12].mask(mask)
+        result = CorrelationEngine(data, block_size=4).compute(threshold=0.7)
+        matrix, pairs = self._legacy_pairs(data)
+        
+        actual = pd.DataFrame(result['correlation_matrix'])
+        np.testing.assert_allclose(actual.to_numpy(), matrix.to_numpy(), atol=1e-12)
+        self.assertEqual(len(result['strong_correlations']), len(pairs))
+    
+    def test_top_k_and_sparse_output(self):
+        """top_k と疎形式出力のテスト"""
+        result = CorrelationEngine(self.sample_data, block_size=3).compute(
+            threshold=0.5, top_k=1, include_matrix=False)
+        self.assertNotIn('correlation_matrix', result)
+        self.assertEqual(len(result['strong_correlations']), 1)
+        self.assertEqual(result['strong_correlations'][0]['variable2'], 'metric_1')
+        
+        sparse = result['strong_pairs']
+        self.assertEqual(sparse['columns'][sparse['row'][0]], 'metric_0')
+        self.assertEqual(sparse['columns'][sparse['col'][0]], 'metric_1')
+    
+    def test_data_analyzer_parameters(self):
+        """DataAnalyzer 経由の引数指定のテスト"""
+        analyzer = DataAnalyzer(self.sample_data)
+        default = analyzer.get_correlation_analysis()
+        compact = analyzer.get_correlation_analysis(threshold=0.9, include_matrix=False)
+        self.assertIn('correlation_matrix', default)
+        self.assertNotIn('correlation_matrix', compact)
+        self.assertEqual(len(default['strong_correlations']), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+重複行検出のテスト
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.duplicates import DuplicateDetector, row_fingerprints
+from src.core.data_analyzer import DataAnalyzer
+
+class TestDuplicateDetector(unittest.TestCase):
+    """重複行検出のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(0)
+        base = pd.DataFrame({
+            'company': rng.choice(['TechCorp', 'RetailPlus', 'FinanceFirst'], 500),
+            'revenue': rng.integers(0, 20, 500).astype(float),
+            'region': rng.choice(['East', 'West'], 500)
+        })
+        base.loc[::7, 'revenue'] = np.nan
+        self.sample_data = base
+    
+    def test_count_matches_pandas(self):
+        """重複行数が duplicated().sum() と一致するかのテスト"""
+        for bits in (64, 128):
+            detector = DuplicateDetector(self.sample_data, bits=bits)
+            self.assertEqual(detector.count(), self.sample_data.duplicated().sum())
+    
+    def test_subset(self):
+        """キー列を指定した場合のテスト"""
+        detector = DuplicateDetector(self.sample_data, subset=['company', 'region'])
+        self.assertEqual(detector.count(), self.sample_data.duplicated(subset=['company', 'region']).sum())
+    
+    def test_groups(self):
+        """重複グループのテスト"""
+        data = pd.DataFrame({'a': [1, 2, 1, 3, 1, 2], 'b': ['x', 'y', 'x', 'z', 'x', 'y']},
+                            index=list('pqrstu'))
+        result = DuplicateDetector(data).detect()
+        self.assertEqual(result['duplicate_rows'], 3)
+        self.assertEqual(result['groups'], [['p', 'r', 't'], ['q', 'u']])
+        self.assertEqual(result['positions'], [[0, 2, 4], [1, 5]])
+    
+    def test_spill_to_disk(self):
+        """メモリ上限を超えた場合にディスクへ退避しても結果が同じかのテスト"""
+        in_memory = DuplicateDetector(self.sample_data).detect()
+        spilled = DuplicateDetector(self.sample_data, memory_limit_mb=0, block_rows=64).detect()
+        self.assertTrue(spilled['spilled'])
+        self.assertFalse(in_memory['spilled'])
+        self.assertEqual(spilled['duplicate_rows'], in_memory['duplicate_rows'])
+        self.assertEqual(spilled['groups'], in_memory['groups'])
+    
+    def test_signed_zero_and_column_order(self):
+        """-0.0 と 0.0 を同一視し、列の入れ替えは区別するかのテスト"""
+        data = pd.DataFrame({'a': [0.0, -0.0], 'b': [1.0, 1.0]})
+        self.assertEqual(DuplicateDetector(data).count(), 1)
+        swapped = pd.DataFrame({'a': [1, 2], 'b': [2, 1]})
+        fingerprints = row_fingerprints(swapped)
+        self.assertFalse((fingerprints[0] == fingerprints[1]).all())
+    
+    def test_data_analyzer(self):
+        """DataAnalyzer 経由の検出のテスト"""
+        analyzer = DataAnalyzer(self.sample_data)
+        result = analyzer.detect_duplicates(subset=['company'])
+        self.assertEqual(result['duplicate_rows'], 497)
+        self.assertEqual(analyzer.analyze_data_structure()['basic_info']['duplicate_rows'],
+                         self.sample_data.duplicated().sum())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+インクリメンタル分析のテスト
+"""
+
+import unittest
+import tempfile
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.incremental import IncrementalAnalyzer
+from src.core.duplicates import FingerprintSet, row_fingerprints
+from src.core.data_analyzer import DataAnalyzer
+
+class TestIncrementalAnalyzer(unittest.TestCase):
+    """インクリメンタル分析のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(4)
+        months = np.repeat(pd.date_range('2023-01-01', periods=12, freq='MS').strftime('%Y-%m'), 250)
+        revenue = rng.normal(1000, 100, len(months))
+        revenue[:5] = 5000
+        self.sample_data = pd.DataFrame({
+            'Month': months,
+            'Company': rng.choice(['TechCorp', 'RetailPlus', 'FinanceFirst'], len(months)),
+            'Revenue': revenue,
+            'Profit': revenue * 0.15 + rng.normal(0, 10, len(months)),
+            'Employees': rng.integers(1, 5, len(months))
+        })
+        self.sample_data.loc[::50, 'Profit'] = np.nan
+        self.sample_data = pd.concat([self.sample_data, self.sample_data.iloc[100:140]], ignore_index=True)
+        self.tmpdir = tempfile.TemporaryDirectory()
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.tmpdir.cleanup()
+    
+    def batches(self, size=400):
+        """月次の追記を模したバッチ"""
+        for start in range(0, len(self.sample_data), size):
+            yield self.sample_data.iloc[start:start + size]
+    
+    def test_matches_full_analysis(self):
+        """バッチごとの取り込み結果が全体の分析と一致するかのテスト"""
+        incremental = IncrementalAnalyzer(sketch_k=400)
+        for batch in self.batches():
+            incremental.append(batch)
+        exact = DataAnalyzer(self.sample_data)
+        structure = incremental.analyze_data_structure()
+        expected = exact.analyze_data_structure()
+        self.assertEqual(structure['basic_info']['shape'], self.sample_data.shape)
+        self.assertEqual(structure['basic_info']['duplicate_rows'], expected['basic_info']['duplicate_rows'])
+        self.assertEqual(structure['basic_info']['missing_values'], expected['basic_info']['missing_values'])
+        for stat in ('count', 'mean', 'std', 'min', 'max'):
+            self.assertAlmostEqual(structure['numeric_summary']['Revenue'][stat],
+                                   expected['numeric_summary']['Revenue'][stat], places=6)
+        correlation = incremental.get_correlation_analysis()
+        np.testing.assert_allclose(
+            pd.DataFrame(correlation['correlation_matrix']).to_numpy(),
+            pd.DataFrame(exact.get_correlation_analysis()['correlation_matrix']).to_numpy()
+        )
+        # 件数の誤差はスケッチの順位誤差 (有効件数の 2 x 1.7 / k) 以内
+        outliers = incremental.detect_outliers()
+        self.assertAlmostEqual(outliers['Revenue']['count'], exact.detect_outliers()['Revenue']['count'],
+                               delta=len(self.sample_data) * 2 * 1.7 / 400)
+    
+    def test_sketches_are_deterministic(self):
+        """同じバッチなら、保存・再開をはさんでも同じ推定値になるかのテスト"""
+        path = os.path.join(self.tmpdir.name, 'state.pkl')
+        direct = IncrementalAnalyzer(sketch_k=64)
+        first = IncrementalAnalyzer(sketch_k=64)
+        for i, batch in enumerate(self.batches(size=200)):
+            direct.append(batch)
+            first.append(batch)
+            if i == 5:
+                first.save(path)
+                first = IncrementalAnalyzer.load(path)
+        self.assertEqual(first.detect_outliers(), direct.detect_outliers())
+        self.assertEqual(first.analyze_data_structure()['numeric_summary'],
+                         direct.analyze_data_structure()['numeric_summary'])
+    
+    def test_save_and_load(self):
+        """状態の保存と再開のテスト"""
+        path = os.path.join(self.tmpdir.name, 'state.pkl')
+        first = IncrementalAnalyzer()
+        first.append(self.sample_data.iloc[:1500])
+        first.save(path)
+        resumed = IncrementalAnalyzer.open(path)
+        resumed.append(self.sample_data.iloc[1500:])
+        direct = IncrementalAnalyzer()
+        direct.append(self.sample_data)
+        self.assertEqual(resumed.rows, len(self.sample_data))
+        self.assertEqual(resumed.batches, 2)
+        self.assertEqual(resumed.analyze_data_structure()['basic_info']['duplicate_rows'],
+                         direct.analyze_data_structure()['basic_info']['duplicate_rows'])
+    
+    def test_save_writes_only_new_runs(self):
+        """保存で書き出すフィンガープリントが前回の保存以降の分だけかのテスト"""
+        path = os.path.join(self.tmpdir.name, 'state.pkl')
+        runs = path + '.runs'
+        incremental = IncrementalAnalyzer()
+        incremental.append(self.sample_data.iloc[:2000])
+        incremental.save(path)
+        before = set(os.listdir(runs))
+        state_size = os.path.getsize(path)
+        
+        incremental = IncrementalAnalyzer.load(path)
+        incremental.append(self.sample_data.iloc[2000:2010])
+        incremental.save(path)
+        added = set(os.listdir(runs)) - before
+        self.assertEqual(len(added), 1)
+        self.assertEqual(len(np.load(os.path.join(runs, added.pop()))), 10)
+        self.assertTrue(before.issubset(os.listdir(runs)))
+        # 状態ファイルにはフィンガープリントを含めない
+        self.assertLess(os.path.getsize(path), state_size * 1.1)
+        
+        resumed = IncrementalAnalyzer.load(path)
+        resumed.append(self.sample_data.iloc[2010:])
+        resumed.save(path)
+        self.assertEqual(IncrementalAnalyzer.load(path).analyze_data_structure()['basic_info']['duplicate_rows'],
+                         self.sample_data.duplicated().sum())
+    
+    def test_update_from_csv(self):
+        """CSVへの追記分だけが取り込まれるかのテスト"""
+        path = os.path.join(self.tmpdir.name, 'monthly.csv')
+        self.sample_data.iloc[:1000].to_csv(path, index=False)
+        incremental = IncrementalAnalyzer()
+        self.assertEqual(incremental.update_from_csv(path), 1000)
+        self.assertEqual(incremental.update_from_csv(path), 0)
+        self.sample_data.iloc[1000:].to_csv(path, mode='a', header=False, index=False)
+        self.assertEqual(incremental.update_from_csv(path), len(self.sample_data) - 1000)
+        structure = incremental.analyze_data_structure()
+        self.assertEqual(structure['basic_info']['shape'], self.sample_data.shape)
+        self.assertEqual(structure['basic_info']['duplicate_rows'], self.sample_data.duplicated().sum())
+        
+        # 追記以外の変更はエラー
+        self.sample_data.iloc[:10].to_csv(path, index=False)
+        with self.assertRaises(ValueError):
+            incremental.update_from_csv(path)
+    
+    def test_column_mismatch(self):
+        """列構成が異なるバッチでエラーになるかのテスト"""
+        incremental = IncrementalAnalyzer()
+        incremental.append(self.sample_data.iloc[:10])
+        with self.assertRaises(ValueError):
+            incremental.append(self.sample_data.iloc[10:20].drop(columns=['Revenue']))
+    
+    def test_duplicates_across_batches_with_different_dtypes(self):
+        """バッチごとに推定される型が異なっても (int と NaN を含む float) 重複行を数えるかのテスト"""
+        incremental = IncrementalAnalyzer()
+        incremental.append(pd.DataFrame({'x': [1, 2, 3]}))
+        incremental.append(pd.DataFrame({'x': [1, np.nan, 4]}))
+        incremental.append(pd.DataFrame({'x': pd.Series([None], dtype=object)}))
+        self.assertEqual(incremental.analyze_data_structure()['basic_info']['duplicate_rows'], 2)
+    
+    def test_fingerprint_set(self):
+        """フィンガープリント集合の既出判定のテスト"""
+        frame = pd.DataFrame({'a': np.arange(100) % 37, 'b': np.arange(100) % 37})
+        fingerprints = FingerprintSet()
+        total = sum(fingerprints.add(row_fingerprints(frame.iloc[s:s + 9])) for s in range(0, 100, 9))
+        self.assertEqual(total, frame.duplicated().sum())
+        self.assertEqual(len(fingerprints), 37)
+        self.assertLessEqual(len(fingerprints.runs), 6)
+
+if __name__ == '__main__':
+    unittest.main()
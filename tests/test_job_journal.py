@@ -0,0 +1,141 @@
+"""
+行処理ジョブのジャーナル (中断と再開) のテスト
+"""
+
+import unittest
+import tempfile
+import sqlite3
+from types import SimpleNamespace
+from unittest import mock
+import pandas as pd
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.config import Config
+from src.core.job_journal import JobJournal, prompt_key, JOB_COMPLETED
+from main import BusinessDataAnalyzer
+
+class CrashingClient:
+    """
+    指定回数の呼び出し後に中断 (KeyboardInterrupt) する同期クライアントのスタブ
+    
+    fail_on を指定すると、その値のプロンプトではエラーになる。
+    """
+    
+    def __init__(self, crash_after=None, fail_on=None):
+        self.crash_after = crash_after
+        self.fail_on = fail_on
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, model, messages, max_tokens, temperature):
+        if self.crash_after is not None and len(self.prompts) >= self.crash_after:
+            raise KeyboardInterrupt
+        if messages[-1]['content'] == self.fail_on:
+            raise RuntimeError('unavailable')
+        self.prompts.append(messages[-1]['content'])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"#{messages[-1]['content']}"))])
+
+class TestJobJournal(unittest.TestCase):
+    """行処理ジョブのジャーナルのテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.journal = JobJournal(os.path.join(self.tmpdir.name, 'jobs.sqlite3'))
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.tmpdir.cleanup()
+    
+    def test_record_and_results(self):
+        """結果の記録・上書き・完了件数のテスト"""
+        job_id = self.journal.create_job('Industry', '{data} の説明', 'sync', 100, 'data.csv')
+        self.journal.record(job_id, prompt_key('IT の説明'), 'ソフトウェア')
+        self.journal.record(job_id, prompt_key('製造 の説明'), None, 'timeout')
+        job = self.journal.get_job(job_id)
+        self.assertEqual((job['column_name'], job['total'], job['completed']), ('Industry', 100, 1))
+        
+        self.journal.record(job_id, prompt_key('製造 の説明'), 'メーカー')
+        self.assertEqual(self.journal.results(job_id)[prompt_key('製造 の説明')], ('メーカー', None))
+        self.journal.finish(job_id)
+        self.assertEqual(self.journal.get_job(job_id)['status'], JOB_COMPLETED)
+        self.assertEqual([job['job_id'] for job in self.journal.list_jobs()], [job_id])
+        self.assertIsNone(self.journal.get_job('missing'))
+    
+    def test_batches_are_recorded_per_job(self):
+        """ジョブごとに複数のバッチIDを送信順に記録し、旧形式の記録を引き継ぐかのテスト"""
+        job_id = self.journal.create_job('Industry', '{data}', 'batch', 10)
+        self.journal.add_batch(job_id, 'batch-1')
+        self.journal.add_batch(job_id, 'batch-2')
+        self.assertEqual(self.journal.get_batches(job_id), ['batch-1', 'batch-2'])
+        self.journal.clear_batches(job_id)
+        self.assertEqual(self.journal.get_batches(job_id), [])
+        
+        legacy = os.path.join(self.tmpdir.name, 'legacy.sqlite3')
+        connection = sqlite3.connect(legacy)
+        connection.execute('CREATE TABLE batches (job_id TEXT PRIMARY KEY, batch_id TEXT NOT NULL, '
+                           'submitted REAL NOT NULL)')
+        connection.execute("INSERT INTO batches VALUES ('job', 'batch-old', 1.0)")
+        connection.commit()
+        connection.close()
+        self.assertEqual(JobJournal(legacy).get_batches('job'), ['batch-old'])
+    
+    def test_resume_after_crash(self):
+        """中断後にジョブIDを指定すると未処理の分だけ処理されるかのテスト"""
+        paths = {
+            'OPENAI_API_KEY': 'test',
+            'LLM_CACHE_ENABLED': False,
+            'JOB_JOURNAL_PATH': os.path.join(self.tmpdir.name, 'jobs.sqlite3')
+        }
+        with mock.patch.multiple(Config, **paths):
+            analyzer = BusinessDataAnalyzer()
+        analyzer.df = pd.DataFrame({'Industry': [f'業種{i % 10}' for i in range(50)]})
+        
+        analyzer.ai_analyzer.client = CrashingClient(crash_after=4)
+        with self.assertRaises(KeyboardInterrupt):
+            analyzer.process_rows('Industry', '{data}', mode='sync')
+        job_id = analyzer.current_job_id
+        self.assertEqual(self.journal.get_job(job_id)['completed'], 4)
+        
+        # 途中までの結果を書き出せる
+        partial_path = os.path.join(self.tmpdir.name, 'partial.csv')
+        self.assertTrue(analyzer.export_job_results(job_id, partial_path))
+        partial = pd.read_csv(partial_path)
+        self.assertEqual(int(partial['AI_Result'].notna().sum()), 20)
+        
+        analyzer.ai_analyzer.client = CrashingClient()
+        result = analyzer.process_rows('Industry', '{data}', mode='sync', job_id=job_id)
+        self.assertEqual(len(analyzer.ai_analyzer.client.prompts), 6)
+        self.assertEqual(list(result['AI_Result']), [f'#業種{i % 10}' for i in range(50)])
+        self.assertEqual(self.journal.get_job(job_id)['status'], JOB_COMPLETED)
+        
+        # 別のプロンプトでは再開できない
+        self.assertIsNone(analyzer.process_rows('Industry', '{data} とは', job_id=job_id))
+    
+    def test_sync_errors_are_recorded_and_retried(self):
+        """順次処理で失敗した行がエラーとして記録され、再開時に再処理されるかのテスト"""
+        paths = {
+            'OPENAI_API_KEY': 'test',
+            'LLM_CACHE_ENABLED': False,
+            'JOB_JOURNAL_PATH': os.path.join(self.tmpdir.name, 'jobs.sqlite3')
+        }
+        with mock.patch.multiple(Config, **paths):
+            analyzer = BusinessDataAnalyzer()
+        analyzer.df = pd.DataFrame({'Industry': ['IT', '製造', 'IT']})
+        
+        analyzer.ai_analyzer.client = CrashingClient(fail_on='製造')
+        result = analyzer.process_rows('Industry', '{data}', mode='sync')
+        self.assertEqual(result['AI_Result'][1], '処理エラー: unavailable')
+        job_id = analyzer.current_job_id
+        self.assertEqual(self.journal.results(job_id)[prompt_key('製造')], (None, 'unavailable'))
+        
+        analyzer.ai_analyzer.client = CrashingClient()
+        result = analyzer.process_rows('Industry', '{data}', mode='sync', job_id=job_id)
+        self.assertEqual(analyzer.ai_analyzer.client.prompts, ['製造'])
+        self.assertEqual(list(result['AI_Result']), ['#IT', '#製造', '#IT'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+LLM応答キャッシュのテスト
+"""
+
+import unittest
+import tempfile
+import time
+import multiprocessing
+from types import SimpleNamespace
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.llm_cache import LLMCache
+from src.core.ai_analyzer import AIAnalyzer
+
+MESSAGES = [{"role": "user", "content": "売上の傾向を教えてください"}]
+
+def _write_entries(args):
+    """別プロセスからの書き込み"""
+    path, worker = args
+    cache = LLMCache(path)
+    for i in range(20):
+        cache.put('gpt-4', [{"role": "user", "content": f"{worker}-{i}"}], 100, 0.7, f"answer {i}")
+        cache.get('gpt-4', [{"role": "user", "content": f"{worker}-{i}"}], 100, 0.7)
+    cache.close()
+    return True
+
+class FakeClient:
+    """同期クライアントのスタブ (呼び出し回数を数える)"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, model, messages, max_tokens, temperature):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"reply {self.calls}"))])
+
+class TestLLMCache(unittest.TestCase):
+    """LLM応答キャッシュのテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.sqlite3')
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.tmpdir.cleanup()
+    
+    def test_get_and_put(self):
+        """保存した応答がキーの一致時だけ返るかのテスト"""
+        cache = LLMCache(self.path)
+        self.assertIsNone(cache.get('gpt-4', MESSAGES, 100, 0.7))
+        cache.put('gpt-4', MESSAGES, 100, 0.7, '増加傾向です')
+        self.assertEqual(cache.get('gpt-4', MESSAGES, 100, 0.7), '増加傾向です')
+        self.assertIsNone(cache.get('gpt-4', MESSAGES, 200, 0.7))
+        self.assertIsNone(cache.get('gpt-3.5-turbo', MESSAGES, 100, 0.7))
+        self.assertIsNone(cache.get('gpt-4', MESSAGES, 100, 0.2))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 4, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 0.2)
+    
+    def test_hit_latency(self):
+        """キャッシュヒットがミリ秒単位で返るかのテスト"""
+        cache = LLMCache(self.path)
+        cache.put('gpt-4', MESSAGES, 100, 0.7, 'x' * 10000)
+        started = time.perf_counter()
+        for _ in range(100):
+            cache.get('gpt-4', MESSAGES, 100, 0.7)
+        self.assertLess((time.perf_counter() - started) / 100, 0.01)
+    
+    def test_eviction_by_entries_and_size(self):
+        """件数・サイズの上限で古い応答が削除されるかのテスト"""
+        cache = LLMCache(self.path, max_entries=3, max_size_mb=0, max_age_days=0)
+        for i in range(5):
+            cache.put('gpt-4', [{"role": "user", "content": str(i)}], 100, 0.7, f"answer {i}")
+        self.assertEqual(cache.stats()['entries'], 3)
+        self.assertIsNone(cache.get('gpt-4', [{"role": "user", "content": "0"}], 100, 0.7))
+        
+        sized = LLMCache(os.path.join(self.tmpdir.name, 'sized.sqlite3'), max_entries=0,
+                         max_size_mb=2500 / (1024 * 1024), max_age_days=0)
+        for i in range(5):
+            sized.put('gpt-4', [{"role": "user", "content": str(i)}], 100, 0.7, 'x' * 1000)
+        self.assertEqual(sized.stats()['entries'], 2)
+        self.assertIsNotNone(sized.get('gpt-4', [{"role": "user", "content": "4"}], 100, 0.7))
+    
+    def test_eviction_by_age(self):
+        """期限切れの応答が返らないかのテスト"""
+        cache = LLMCache(self.path, max_age_days=1)
+        cache.put('gpt-4', MESSAGES, 100, 0.7, 'old')
+        cache._connection().execute('UPDATE responses SET created = created - 2 * 86400')
+        self.assertIsNone(cache.get('gpt-4', MESSAGES, 100, 0.7))
+        self.assertEqual(cache.stats()['entries'], 0)
+    
+    def test_running_totals_and_batched_hits(self):
+        """件数・サイズのカウンタが表と一致し、ヒットはまとめて書き込むかのテスト"""
+        cache = LLMCache(self.path, max_entries=0, max_size_mb=5000 / (1024 * 1024), max_age_days=0)
+        for i in range(8):
+            cache.put('gpt-4', [{"role": "user", "content": str(i % 6)}], 100, 0.7, 'x' * (500 + i))
+        connection = cache._connection()
+        entries, size = connection.execute('SELECT COUNT(*), SUM(size) FROM responses').fetchone()
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['size_bytes']), (entries, size))
+        self.assertLessEqual(size, 5000)
+        
+        # ヒットは読み込みだけで、close で書き込む
+        cache.get('gpt-4', [{"role": "user", "content": "1"}], 100, 0.7)
+        other = LLMCache(self.path)
+        self.assertEqual(other._connection().execute('SELECT SUM(hits) FROM responses').fetchone()[0], 0)
+        cache.close()
+        self.assertEqual(other._connection().execute('SELECT SUM(hits) FROM responses').fetchone()[0], 1)
+        
+        # 既存のデータベースを開くとカウンタを引き継ぐ
+        stats = LLMCache(self.path).stats()
+        self.assertEqual((stats['entries'], stats['size_bytes'], stats['hits']), (entries, size, 1))
+    
+    def test_multiprocess_access(self):
+        """複数プロセスから同時に読み書きできるかのテスト"""
+        LLMCache(self.path).close()
+        # Streamlit と夜間ジョブのような独立したプロセスを想定して spawn で起動する
+        with multiprocessing.get_context('spawn').Pool(3) as pool:
+            self.assertTrue(all(pool.map(_write_entries, [(self.path, w) for w in range(3)])))
+        stats = LLMCache(self.path).stats()
+        self.assertEqual(stats['entries'], 60)
+        self.assertEqual(stats['hits'], 60)
+    
+    def test_ai_analyzer_uses_cache(self):
+        """AIAnalyzer が同じリクエストでAPIを呼ばないかのテスト"""
+        analyzer = AIAnalyzer(api_key='test', cache=LLMCache(self.path))
+        analyzer.client = FakeClient()
+        first = analyzer.process_individual_rows('TechCorp', '{data} を要約')
+        second = analyzer.process_individual_rows('TechCorp', '{data} を要約')
+        self.assertEqual(first, second)
+        self.assertEqual(analyzer.client.calls, 1)
+        self.assertEqual(analyzer.get_cache_stats()['hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
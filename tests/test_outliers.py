@@ -0,0 +1,87 @@
+"""
+異常値検出エンジンのテスト
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.outliers import OutlierEngine, OutlierMatrix, MULTIVARIATE_COLUMN
+from src.core.data_analyzer import DataAnalyzer
+
+class TestOutlierEngine(unittest.TestCase):
+    """異常値検出エンジンのテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(1)
+        self.sample_data = pd.DataFrame({
+            'revenue': np.concatenate([rng.normal(100, 10, 295), [300, 400, -200, 500, 250]]),
+            'employees': rng.integers(10, 50, 300),
+            'growth': rng.normal(0, 1, 300),
+            'company': rng.choice(['TechCorp', 'RetailPlus'], 300)
+        })
+        self.sample_data.loc[::11, 'growth'] = np.nan
+    
+    def test_iqr_matches_legacy(self):
+        """IQR法の結果が従来の列ごとの計算と一致するかのテスト"""
+        outliers, _ = OutlierEngine(self.sample_data).detect('iqr')
+        for col in ['revenue', 'employees', 'growth']:
+            Q1 = self.sample_data[col].quantile(0.25)
+            Q3 = self.sample_data[col].quantile(0.75)
+            IQR = Q3 - Q1
+            lower, upper = Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+            expected = ((self.sample_data[col] < lower) | (self.sample_data[col] > upper)).sum()
+            if expected == 0:
+                self.assertNotIn(col, outliers)
+                continue
+            self.assertEqual(outliers[col]['count'], expected)
+            self.assertAlmostEqual(outliers[col]['bounds']['lower'], lower)
+            self.assertAlmostEqual(outliers[col]['bounds']['upper'], upper)
+    
+    def test_univariate_methods(self):
+        """zスコア・MAD で極端な値が検出されるかのテスト"""
+        for method in ('zscore', 'mad'):
+            outliers, matrix = OutlierEngine(self.sample_data).detect(method)
+            self.assertIn('revenue', outliers)
+            rows = set(matrix.row_positions('revenue'))
+            self.assertTrue({296, 297, 298}.issubset(rows))
+    
+    def test_robust_distance(self):
+        """ロバスト距離で多変量の異常値が検出されるかのテスト"""
+        engine = OutlierEngine(self.sample_data, columns=['revenue', 'employees'])
+        outliers, matrix = engine.detect('robust_distance')
+        self.assertIn(MULTIVARIATE_COLUMN, outliers)
+        rows = set(matrix.row_positions(MULTIVARIATE_COLUMN))
+        self.assertTrue({295, 296, 297, 298, 299}.issubset(rows))
+    
+    def test_invalid_method(self):
+        """未対応の方法でエラーになるかのテスト"""
+        with self.assertRaises(ValueError):
+            OutlierEngine(self.sample_data).detect('unknown')
+    
+    def test_outlier_matrix(self):
+        """ビットパック行列の復元と件数のテスト"""
+        mask = np.zeros((19, 3), dtype=bool)
+        mask[[0, 5, 18], 0] = True
+        mask[[5, 7], 2] = True
+        matrix = OutlierMatrix.from_mask(mask, ['a', 'b', 'c'], pd.RangeIndex(100, 119))
+        np.testing.assert_array_equal(matrix.column_mask('a'), mask[:, 0])
+        np.testing.assert_array_equal(matrix.counts(), [3, 0, 2])
+        np.testing.assert_array_equal(matrix.row_positions(), [0, 5, 7, 18])
+        self.assertEqual(matrix.row_labels('c'), [105, 107])
+    
+    def test_analyzer_outlier_rows(self):
+        """DataAnalyzer から異常値の行を取り出せるかのテスト"""
+        analyzer = DataAnalyzer(self.sample_data)
+        outliers = analyzer.detect_outliers()
+        rows = analyzer.get_outlier_rows(column='revenue')
+        self.assertEqual(len(rows), outliers['revenue']['count'])
+        self.assertIn(299, rows.index)
+
+if __name__ == '__main__':
+    unittest.main()
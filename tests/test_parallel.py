@@ -0,0 +1,84 @@
+"""
+列並列プロファイリングのテスト
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.parallel import ParallelProfiler, SharedBlock
+from src.core.profiler import ColumnProfiler
+from src.core.outliers import OutlierEngine
+from src.core.data_analyzer import DataAnalyzer
+
+class TestParallelProfiler(unittest.TestCase):
+    """列並列プロファイリングのテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(2)
+        columns = {f'num_{i}': rng.normal(i, 1 + i, 400) for i in range(7)}
+        columns['count'] = rng.integers(0, 100, 400)
+        for i in range(3):
+            columns[f'cat_{i}'] = rng.choice(['A', 'B', 'C', 'D'], 400).astype(object)
+        self.sample_data = pd.DataFrame(columns)
+        self.sample_data.loc[::13, 'num_3'] = np.nan
+        self.sample_data.loc[::17, 'cat_1'] = None
+    
+    def assert_nested_equal(self, actual, expected):
+        """NaN を含む入れ子の辞書を比較"""
+        if isinstance(expected, dict):
+            self.assertEqual(list(actual.keys()), list(expected.keys()))
+            for key in expected:
+                self.assert_nested_equal(actual[key], expected[key])
+        elif isinstance(expected, float):
+            np.testing.assert_allclose(actual, expected, equal_nan=True)
+        else:
+            self.assertEqual(actual, expected)
+    
+    def test_profile_matches_serial(self):
+        """並列実行の結果が逐次実行と一致するかのテスト"""
+        expected = ColumnProfiler(self.sample_data).profile()
+        actual = ParallelProfiler(self.sample_data, workers=2, block_size=3, min_cells=0).profile()
+        self.assert_nested_equal(actual, expected)
+    
+    def test_outliers_match_serial(self):
+        """並列実行の異常値検出が逐次実行と一致するかのテスト"""
+        profiler = ParallelProfiler(self.sample_data, workers=2, block_size=3, min_cells=0)
+        for method in ('iqr', 'zscore', 'mad'):
+            expected, expected_matrix = OutlierEngine(self.sample_data).detect(method)
+            actual, matrix = profiler.detect_outliers(method)
+            self.assert_nested_equal(actual, expected)
+            np.testing.assert_array_equal(matrix.packed, expected_matrix.packed)
+    
+    def test_serial_fallback(self):
+        """小さな DataFrame では逐次処理になるかのテスト"""
+        profiler = ParallelProfiler(self.sample_data, workers=4)
+        self.assertFalse(profiler.use_pool(profiler.numeric_columns()))
+        self.assertFalse(ParallelProfiler(self.sample_data, workers=1, min_cells=0).use_pool(['a', 'b']))
+    
+    def test_shard_ranges(self):
+        """列範囲の分割のテスト"""
+        profiler = ParallelProfiler(self.sample_data, workers=3, block_size=64)
+        self.assertEqual(profiler.shard_ranges(7), [(0, 3), (3, 6), (6, 7)])
+    
+    def test_shared_block(self):
+        """共有メモリ配列が列優先で確保されるかのテスト"""
+        with SharedBlock(5, 2, np.float64) as shared:
+            shared.array[:, 1] = np.arange(5)
+            self.assertTrue(shared.array.flags['F_CONTIGUOUS'])
+            self.assertEqual(shared.array[:, 1].sum(), 10)
+    
+    def test_analyzer_workers(self):
+        """DataAnalyzer でワーカー数を指定できるかのテスト"""
+        analyzer = DataAnalyzer(self.sample_data, workers=2)
+        self.assertEqual(analyzer.workers, 2)
+        result = analyzer.analyze_data_structure()
+        self.assertIn('num_0', result['numeric_summary'])
+
+if __name__ == '__main__':
+    unittest.main()
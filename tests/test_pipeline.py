@@ -0,0 +1,244 @@
+"""
+分析パイプラインの依存グラフ実行のテスト
+"""
+
+import unittest
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+import pandas as pd
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.config import Config
+from src.core.data_analyzer import DataAnalyzer
+from src.core.pipeline import Pipeline, Stage
+from main import BusinessDataAnalyzer
+
+def sleeper(seconds, value, calls=None):
+    """指定秒数待ってから値を返す段階の関数"""
+    def run(inputs):
+        if calls is not None:
+            calls.append(value)
+        time.sleep(seconds)
+        return value
+    return run
+
+class SlowClient:
+    """一定時間待ってから応答する同期クライアントのスタブ (呼び出しを記録)"""
+    
+    def __init__(self, delay):
+        self.delay = delay
+        self.prompts = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, model, messages, max_tokens, temperature):
+        with self._lock:
+            self.prompts.append(messages[-1]['content'])
+        time.sleep(self.delay)
+        message = SimpleNamespace(content=f"応答{len(self.prompts)}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(completion_tokens=3))
+
+class TestPipeline(unittest.TestCase):
+    """Pipeline のテストクラス"""
+    
+    def test_independent_stages_run_concurrently(self):
+        """独立した段階が並行して実行され、クリティカルパスが報告されるかのテスト"""
+        pipeline = Pipeline([
+            Stage('a', sleeper(0.2, 'A')),
+            Stage('b', sleeper(0.2, 'B')),
+            Stage('c', sleeper(0.05, 'C'), depends_on=['a']),
+            Stage('d', lambda inputs: inputs['b'] + inputs['c'], depends_on=['b', 'c'])
+        ], max_workers=4)
+        report = pipeline.run()
+        self.assertEqual(report['outputs']['d'], 'BC')
+        self.assertLess(report['wall_seconds'], 0.4)
+        self.assertGreaterEqual(report['serial_seconds'], 0.45)
+        self.assertEqual(report['critical_path'], ['a', 'c', 'd'])
+        self.assertAlmostEqual(report['critical_path_seconds'], 0.25, delta=0.1)
+        self.assertLessEqual(report['stages']['b']['start'], report['stages']['a']['end'])
+    
+    def test_main_thread_and_exclusive_stages(self):
+        """main_thread の段階は呼び出し元のスレッドで、同じ排他グループの段階は1つずつ実行するかのテスト"""
+        threads = {}
+        def record(name, seconds):
+            def run(inputs):
+                threads[name] = threading.current_thread()
+                time.sleep(seconds)
+                return name
+            return run
+        pipeline = Pipeline([
+            Stage('chart', record('chart', 0.2), main_thread=True),
+            Stage('ai1', record('ai1', 0.1), exclusive='ai'),
+            Stage('ai2', record('ai2', 0.1), exclusive='ai'),
+            Stage('stats', record('stats', 0.1))
+        ], max_workers=4)
+        report = pipeline.run()
+        self.assertIs(threads['chart'], threading.current_thread())
+        self.assertIsNot(threads['ai1'], threading.current_thread())
+        ai1, ai2 = report['stages']['ai1'], report['stages']['ai2']
+        self.assertTrue(ai1['end'] <= ai2['start'] or ai2['end'] <= ai1['start'])
+        # グラフ描画はワーカーの段階と並行する
+        self.assertLess(report['wall_seconds'], 0.35)
+    
+    def test_unchanged_inputs_are_skipped(self):
+        """入力が変わらない段階は省き、変わった段階とその下流だけ再実行するかのテスト"""
+        keys = {'a': 1, 'b': 1}
+        calls = []
+        pipeline = Pipeline([
+            Stage('a', sleeper(0, 'A', calls), key=lambda: keys['a']),
+            Stage('b', sleeper(0, 'B', calls), key=lambda: keys['b']),
+            Stage('c', sleeper(0, 'C', calls), depends_on=['a'])
+        ])
+        pipeline.run()
+        self.assertEqual(sorted(calls), ['A', 'B', 'C'])
+        
+        calls.clear()
+        report = pipeline.run()
+        self.assertEqual(calls, [])
+        self.assertEqual({info['status'] for info in report['stages'].values()}, {'skipped'})
+        self.assertEqual(report['outputs']['c'], 'C')
+        
+        keys['a'] = 2
+        calls.clear()
+        report = pipeline.run()
+        self.assertEqual(sorted(calls), ['A', 'C'])
+        self.assertEqual(report['stages']['b']['status'], 'skipped')
+        
+        calls.clear()
+        pipeline.run(force=True)
+        self.assertEqual(sorted(calls), ['A', 'B', 'C'])
+    
+    def test_failure_blocks_dependents(self):
+        """例外を送出した段階の下流は実行せず、None の段階は次回も再実行するかのテスト"""
+        def fail(inputs):
+            raise RuntimeError('boom')
+        calls = []
+        pipeline = Pipeline([
+            Stage('a', fail),
+            Stage('b', sleeper(0, 'B', calls), depends_on=['a']),
+            Stage('c', sleeper(0, None, calls)),
+            Stage('d', sleeper(0, 'D', calls), depends_on=['c'])
+        ])
+        report = pipeline.run()
+        self.assertEqual(report['stages']['a']['status'], 'failed')
+        self.assertEqual(report['stages']['a']['error'], 'boom')
+        self.assertEqual(report['stages']['b']['status'], 'blocked')
+        self.assertEqual(report['stages']['c']['status'], 'empty')
+        self.assertEqual(report['stages']['d']['status'], 'done')
+        
+        calls.clear()
+        report = pipeline.run()
+        self.assertEqual(report['stages']['c']['status'], 'empty')
+        self.assertIn(None, calls)
+    
+    def test_targets_include_dependencies(self):
+        """対象の段階とその依存だけを実行するかのテスト"""
+        calls = []
+        pipeline = Pipeline([
+            Stage('a', sleeper(0, 'A', calls)),
+            Stage('b', sleeper(0, 'B', calls)),
+            Stage('c', sleeper(0, 'C', calls), depends_on=['a'])
+        ])
+        report = pipeline.run(targets=['c'])
+        self.assertEqual(sorted(calls), ['A', 'C'])
+        self.assertEqual(list(report['stages']), ['a', 'c'])
+    
+    def test_invalid_graphs(self):
+        """循環・未定義の依存・名前の重複を拒否するかのテスト"""
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('a', sleeper(0, 1), depends_on=['b']), Stage('b', sleeper(0, 1), depends_on=['a'])])
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('a', sleeper(0, 1), depends_on=['missing'])])
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('a', sleeper(0, 1)), Stage('a', sleeper(0, 1))])
+
+class TestFullPipeline(unittest.TestCase):
+    """BusinessDataAnalyzer の全分析一括実行のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings = {
+            'OPENAI_API_KEY': 'test',
+            'LLM_CACHE_ENABLED': False,
+            'JOB_JOURNAL_PATH': os.path.join(self.tmpdir.name, 'jobs.sqlite3')
+        }
+        with mock.patch.multiple(Config, **settings):
+            self.analyzer = BusinessDataAnalyzer()
+        self.analyzer.df = pd.DataFrame({'sales': [100, 200, 150, 300], 'region': ['東', '西', '東', '北']})
+        self.analyzer.data_analyzer = DataAnalyzer(self.analyzer.df, cache=self.analyzer.result_cache)
+        self.analyzer.visualizer = object()
+        self.analyzer.ai_analyzer.client = SlowClient(delay=0.2)
+        self.charts = []
+        
+        def create_visualizations(chart_type='auto', columns=None):
+            self.charts.append(chart_type)
+            self.chart_thread = threading.current_thread()
+            time.sleep(0.2)
+            paths = {'dashboard': 'dashboard.html'}
+            self.analyzer.analysis_results['visualizations'] = paths
+            return paths
+        self.analyzer.create_visualizations = create_visualizations
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.tmpdir.cleanup()
+    
+    def test_runs_all_stages_and_skips_unchanged(self):
+        """全段階を並行実行し、2回目は入力が変わった段階だけ再実行するかのテスト"""
+        stages = []
+        report = self.analyzer.run_full_pipeline(on_stage=lambda name, info: stages.append(name))
+        self.assertEqual(set(stages), {'data_structure', 'visualizations', 'ai_analysis',
+                                       'visualization_insights', 'business_strategy'})
+        self.assertTrue(all(info['status'] == 'done' for info in report['stages'].values()))
+        self.assertEqual(len(self.analyzer.ai_analyzer.client.prompts), 3)
+        # AI分析とグラフ作成が並行するので、逐次実行 (0.8秒) より短い
+        self.assertLess(report['wall_seconds'], 0.75)
+        self.assertEqual(report['critical_path'][-1], 'business_strategy')
+        self.assertIn('business_strategy', self.analyzer.analysis_results)
+        # グラフはメインスレッドで描画し、AIAnalyzer を使う段階は重ならない
+        self.assertIs(self.chart_thread, threading.current_thread())
+        ai_stages = sorted((report['stages'][name] for name in
+                            ('ai_analysis', 'visualization_insights', 'business_strategy')),
+                           key=lambda info: info['start'])
+        self.assertTrue(all(a['end'] <= b['start'] for a, b in zip(ai_stages, ai_stages[1:])))
+        
+        report = self.analyzer.run_full_pipeline()
+        self.assertEqual({info['status'] for info in report['stages'].values()}, {'skipped'})
+        self.assertEqual(len(self.analyzer.ai_analyzer.client.prompts), 3)
+        self.assertEqual(self.charts, ['auto'])
+        
+        # テキストを追加すると AI分析と戦略提案だけ再実行する
+        self.analyzer.text_data = '新製品の発売予定'
+        report = self.analyzer.run_full_pipeline()
+        rerun = sorted(name for name, info in report['stages'].items() if info['status'] == 'done')
+        self.assertEqual(rerun, ['ai_analysis', 'business_strategy'])
+        self.assertEqual(len(self.analyzer.ai_analyzer.client.prompts), 5)
+    
+    def test_streamed_files_are_recomputed(self):
+        """ストリーミングで続けて読み込んだ別のファイルでは段階を省かずに再実行するかのテスト"""
+        self.analyzer.ai_analyzer.client = SlowClient(delay=0)
+        first = os.path.join(self.tmpdir.name, 'first.csv')
+        second = os.path.join(self.tmpdir.name, 'second.csv')
+        pd.DataFrame({'a': [1, 2, 3], 'b': [4, 5, 6]}).to_csv(first, index=False)
+        pd.DataFrame({'x': range(5), 'y': range(5), 'z': list('abcde')}).to_csv(second, index=False)
+        
+        self.analyzer.read_csv(first, streaming=True)
+        self.analyzer.run_full_pipeline()
+        self.assertEqual(self.analyzer.analysis_results['data_structure']['basic_info']['shape'], (3, 2))
+        
+        self.analyzer.read_csv(second, streaming=True)
+        report = self.analyzer.run_full_pipeline()
+        for name in ('data_structure', 'ai_analysis', 'business_strategy'):
+            self.assertEqual(report['stages'][name]['status'], 'done')
+        self.assertEqual(self.analyzer.analysis_results['data_structure']['basic_info']['shape'], (5, 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+列プロファイリングエンジンのテスト
+"""
+
+import unittest
+import warnings
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.profiler import ColumnProfiler, numeric_block_stats
+from src.core.data_analyzer import DataAnalyzer
+
+class TestColumnProfiler(unittest.TestCase):
+    """列プロファイリングのテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(0)
+        sales = rng.normal(5000, 1200, 200)
+        sales[[3, 50, 120]] = np.nan
+        self.sample_data = pd.DataFrame({
+            'sales': sales,
+            'profit': rng.integers(100, 1000, 200),
+            'empty': np.full(200, np.nan),
+            'category': pd.Series(rng.choice(['A', 'B', 'C', None], 200), dtype=object),
+            'region': pd.Series(rng.choice(['East', 'West', 'North', 'South', 'Central', 'Other'], 200), dtype=object)
+        })
+    
+    def test_numeric_summary_matches_describe(self):
+        """数値統計が describe() と一致するかのテスト"""
+        profile = ColumnProfiler(self.sample_data, block_size=2).profile()
+        expected = self.sample_data[['sales', 'profit', 'empty']].describe().to_dict()
+        
+        self.assertEqual(list(profile['numeric_summary'].keys()), list(expected.keys()))
+        for col, stats in expected.items():
+            self.assertEqual(list(profile['numeric_summary'][col].keys()), list(stats.keys()))
+            for key, value in stats.items():
+                actual = profile['numeric_summary'][col][key]
+                if np.isnan(value):
+                    self.assertTrue(np.isnan(actual))
+                else:
+                    self.assertAlmostEqual(actual, value, places=6)
+    
+    def test_categorical_summary_matches_value_counts(self):
+        """カテゴリ統計が nunique / value_counts と一致するかのテスト"""
+        profile = ColumnProfiler(self.sample_data).profile()
+        for col in ['category', 'region']:
+            summary = profile['categorical_summary'][col]
+            self.assertEqual(summary['unique_values'], self.sample_data[col].nunique())
+            self.assertEqual(summary['top_values'], self.sample_data[col].value_counts().head(5).to_dict())
+    
+    def test_string_columns_without_warning(self):
+        """文字列型の列も警告なしにカテゴリ列として選ばれるかのテスト"""
+        data = self.sample_data.assign(region=self.sample_data['region'].astype('string'))
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            profiler = ColumnProfiler(data)
+            self.assertEqual(profiler.categorical_columns(), ['category', 'region'])
+    
+    def test_basic_info(self):
+        """基本情報のテスト"""
+        data = pd.concat([self.sample_data, self.sample_data.head(4)], ignore_index=True)
+        info = ColumnProfiler(data).profile()['basic_info']
+        self.assertEqual(info['shape'], data.shape)
+        self.assertEqual(info['missing_values'], data.isnull().sum().to_dict())
+        self.assertEqual(info['duplicate_rows'], 4)
+    
+    def test_block_stats_without_missing(self):
+        """欠損なしブロックの統計量のテスト"""
+        block = np.arange(12, dtype=float).reshape(4, 3)
+        stats = numeric_block_stats(block)
+        np.testing.assert_allclose(stats['mean'], block.mean(axis=0))
+        np.testing.assert_allclose(stats['quantiles'], np.quantile(block, [0.25, 0.5, 0.75], axis=0))
+    
+    def test_data_analyzer_uses_profiler(self):
+        """DataAnalyzer の結果形式のテスト"""
+        analysis = DataAnalyzer(self.sample_data).analyze_data_structure()
+        self.assertIn('basic_info', analysis)
+        self.assertIn('numeric_summary', analysis)
+        self.assertIn('categorical_summary', analysis)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+分析プロンプト組み立てのテスト
+"""
+
+import unittest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.profiler import ColumnProfiler
+from src.core.prompt_builder import AnalysisPromptBuilder, compact_number, verbose_prompt
+
+class TestAnalysisPromptBuilder(unittest.TestCase):
+    """分析プロンプト組み立てのテストクラス"""
+    
+    def setUp(self):
+        """テストデータの準備"""
+        rng = np.random.default_rng(0)
+        scales = np.linspace(1, 100, 300)
+        self.df = pd.DataFrame(rng.normal(100, 1, size=(500, 300)) * scales,
+                               columns=[f'metric_{i}' for i in range(300)])
+        # ばらつきの大きい列と欠損の多い列
+        self.df['volatile'] = rng.normal(0, 1000, 500)
+        self.df.loc[:299, 'metric_5'] = np.nan
+        self.df['Region'] = rng.choice(['東京', '大阪', '福岡'], 500)
+        self.data_info = ColumnProfiler(self.df).profile()
+        self.sample = self.df.head(10).to_string()
+    
+    def test_fits_budget_and_reports_savings(self):
+        """予算内に収まり、削減トークン数が報告されるかのテスト"""
+        builder = AnalysisPromptBuilder(budget=3000)
+        prompt, report = builder.build(self.data_info, self.sample, 'テキスト情報')
+        self.assertLessEqual(report['tokens'], 3000)
+        self.assertEqual(report['tokens'], builder.count_tokens(prompt))
+        self.assertEqual(report['baseline_tokens'], builder.count_tokens(verbose_prompt(self.data_info, self.sample, 'テキスト情報')))
+        self.assertEqual(report['saved_tokens'], report['baseline_tokens'] - report['tokens'])
+        self.assertLess(report['numeric_columns'][0], report['numeric_columns'][1])
+        self.assertIn('追加のテキスト情報', prompt)
+        self.assertIn('ほか', prompt)
+    
+    def test_important_columns_first(self):
+        """欠損の多い列とばらつきの大きい列が優先されるかのテスト"""
+        ranked = AnalysisPromptBuilder().rank_columns(self.data_info)
+        self.assertEqual(ranked[0], ('volatile', 'numeric'))
+        self.assertLess(ranked.index(('metric_5', 'numeric')), ranked.index(('metric_6', 'numeric')))
+        prompt, _ = AnalysisPromptBuilder(budget=1500).build(self.data_info, self.sample)
+        self.assertIn('\nvolatile|500|', prompt)
+        self.assertNotIn('\nmetric_299|', prompt)
+    
+    def test_budget_zero_keeps_verbose_prompt(self):
+        """予算0では従来のプロンプトのままになるかのテスト"""
+        prompt, report = AnalysisPromptBuilder(budget=0).build(self.data_info, self.sample)
+        self.assertEqual(prompt, verbose_prompt(self.data_info, self.sample))
+        self.assertEqual(report['saved_tokens'], 0)
+    
+    def test_compact_number(self):
+        """数値の丸めのテスト"""
+        self.assertEqual(compact_number(500.0), '500')
+        self.assertEqual(compact_number(3.14159265), '3.142')
+        self.assertEqual(compact_number(123456.789), '1.235e+05')
+        self.assertEqual(compact_number(float('nan')), '-')
+        self.assertEqual(compact_number(None), '-')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+分析結果キャッシュのテスト
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.result_cache import ResultCache, dataframe_fingerprint
+from src.core.data_analyzer import DataAnalyzer
+
+class TestResultCache(unittest.TestCase):
+    """分析結果キャッシュのテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.sample_data = pd.DataFrame({
+            'sales': np.random.randint(1000, 10000, 100),
+            'profit': np.random.randint(100, 1000, 100),
+            'category': np.random.choice(['A', 'B', 'C'], 100)
+        })
+    
+    def test_fingerprint_is_stable(self):
+        """同じデータのフィンガープリントが一致するかのテスト"""
+        self.assertEqual(dataframe_fingerprint(self.sample_data),
+                         dataframe_fingerprint(self.sample_data.copy()))
+    
+    def test_fingerprint_detects_changes(self):
+        """列追加・値変更・追記でフィンガープリントが変わるかのテスト"""
+        original = dataframe_fingerprint(self.sample_data)
+        
+        modified = self.sample_data.copy()
+        modified.loc[5, 'sales'] = -1
+        self.assertNotEqual(original, dataframe_fingerprint(modified))
+        
+        appended = pd.concat([self.sample_data, self.sample_data.tail(1)], ignore_index=True)
+        self.assertNotEqual(original, dataframe_fingerprint(appended, sample_rows=10))
+        
+        self.sample_data['AI_Result'] = 'ok'
+        self.assertNotEqual(original, dataframe_fingerprint(self.sample_data))
+    
+    def test_shared_results_and_counters(self):
+        """メソッド間で結果が共有されるかのテスト"""
+        analyzer = DataAnalyzer(self.sample_data)
+        analyzer.generate_data_summary()
+        analyzer.get_business_insights()
+        
+        stats = analyzer.get_cache_stats()
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['hits'], 2)
+        self.assertIs(analyzer.analysis_results['data_structure'], analyzer.analyze_data_structure())
+    
+    def test_invalidation_on_new_column(self):
+        """列追加時に再計算されるかのテスト"""
+        analyzer = DataAnalyzer(self.sample_data)
+        before = analyzer.analyze_data_structure()
+        self.sample_data['AI_Result'] = 'ok'
+        after = analyzer.analyze_data_structure()
+        
+        self.assertEqual(before['basic_info']['shape'][1], 3)
+        self.assertEqual(after['basic_info']['shape'][1], 4)
+        self.assertEqual(analyzer.get_cache_stats()['misses'], 2)
+    
+    def test_eviction(self):
+        """最大エントリ数を超えた場合の破棄のテスト"""
+        cache = ResultCache(max_entries=2)
+        for key in ['a', 'b', 'c']:
+            cache.get_or_compute(self.sample_data, key, lambda: key)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+追加テキストの BM25 検索のテスト
+"""
+
+import unittest
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.config import Config
+from src.core.retrieval import BM25Index, passage_starts, term_ids
+from src.core.ai_analyzer import AIAnalyzer
+
+DOCUMENT = """売上の動向
+今期の売上高は前年比12%増加した。特に関東地域の売上が好調で、新規顧客の獲得が寄与した。
+
+在庫の状況
+倉庫の在庫回転率が低下しており、季節商品の過剰在庫が課題となっている。
+
+採用計画
+来期はエンジニアを20名採用する計画で、人件費は増加する見込みである。
+
+競合環境
+競合のA社は価格を引き下げ、EC チャネルでのシェアを拡大している。"""
+
+class PromptClient:
+    """プロンプトを記録して固定の応答を返す同期クライアントのスタブ"""
+    
+    def __init__(self):
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, model, messages, max_tokens, temperature):
+        self.prompts.append(messages[-1]['content'])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='応答'))],
+                               usage=SimpleNamespace(prompt_tokens=10, completion_tokens=1))
+
+class TestRetrieval(unittest.TestCase):
+    """BM25Index のテストクラス"""
+    
+    def test_passages_follow_paragraphs(self):
+        """空行の段落を上限まで連結し、長い段落は分割するかのテスト"""
+        text = "短い段落A\n\n短い段落B\n\n" + "長い行です。" * 100 + "\n\n最後の段落"
+        starts = passage_starts(text, 100)
+        self.assertEqual(starts[0], 0)
+        self.assertEqual(starts, sorted(set(starts)))
+        ends = starts[1:] + [len(text)]
+        self.assertTrue(all(end - start <= 100 for start, end in zip(starts, ends)))
+        # 短い段落どうしは1つの文書にまとめる
+        self.assertNotIn(text.index('短い段落B'), starts)
+        self.assertIn(text.index('長い行'), starts)
+        self.assertEqual(text[starts[-1]:].strip(), '最後の段落')
+    
+    def test_term_normalization(self):
+        """全角英数字・大文字をそろえ、記号をまたぐ2文字は語にしないかのテスト"""
+        np.testing.assert_array_equal(term_ids('ＳＡＬＥＳ'), term_ids('sales'))
+        self.assertEqual(len(term_ids('売、上')), 0)
+        self.assertEqual(len(term_ids('売上')), 1)
+    
+    def test_search_ranks_relevant_paragraph(self):
+        """クエリに関連する段落が上位に来るかのテスト"""
+        index = BM25Index.build(DOCUMENT, passage_chars=80)
+        self.assertEqual(index.size, 4)
+        hits = index.search('在庫 回転率', top_k=2)
+        self.assertIn('在庫回転率', hits[0]['text'])
+        self.assertGreater(hits[0]['score'], 0)
+        self.assertEqual(len(hits), 1)
+        self.assertIn('採用', index.search('エンジニア 採用')[0]['text'])
+        self.assertEqual(index.search('該当なし xyz'), [])
+    
+    def test_build_is_fast(self):
+        """10MB のテキストを1秒未満でインデックス化するかのテスト"""
+        paragraph = "東京都の小売市場は前年比3.2%拡大した。競合のA社はECを強化している。\n\n"
+        text = paragraph * (10_000_000 // len(paragraph.encode('utf-8')))
+        started = time.perf_counter()
+        index = BM25Index.build(text)
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertGreater(index.size, 1000)
+    
+    def test_persisted_index_is_reused(self):
+        """保存したインデックスを読み込み、同じ検索結果になるかのテスト"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            built = BM25Index.load_or_build(DOCUMENT, directory=tmpdir, passage_chars=80)
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+            with mock.patch.object(BM25Index, 'build', side_effect=AssertionError('rebuilt')):
+                loaded = BM25Index.load_or_build(DOCUMENT, directory=tmpdir, passage_chars=80)
+            self.assertEqual(loaded.source_hash, built.source_hash)
+            self.assertEqual(loaded.search('競合 シェア'), built.search('競合 シェア'))
+
+class TestAnalyzerRetrieval(unittest.TestCase):
+    """AIAnalyzer の追加テキスト検索のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings = {'LLM_CACHE_ENABLED': False, 'RETRIEVAL_INDEX_DIR': self.tmpdir.name,
+                    'RETRIEVAL_PASSAGE_CHARS': 80, 'RETRIEVAL_TOP_K': 1}
+        self.patcher = mock.patch.multiple(Config, **settings)
+        self.patcher.start()
+        self.analyzer = AIAnalyzer(api_key='test')
+        self.analyzer.client = PromptClient()
+        self.data_info = {'basic_info': {'shape': (2, 2), 'columns': ['在庫数', '倉庫'],
+                                         'data_types': {}, 'missing_values': {}},
+                          'numeric_summary': {}, 'categorical_summary': {}}
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.patcher.stop()
+        self.tmpdir.cleanup()
+    
+    def test_prompts_use_relevant_passages(self):
+        """各プロンプトに列名と目的に関連する段落だけが入るかのテスト"""
+        self.assertIsNotNone(self.analyzer.set_context(DOCUMENT))
+        self.analyzer.analyze_data_with_ai(self.data_info, '在庫数,倉庫\n1,東', DOCUMENT)
+        prompt = self.analyzer.client.prompts[-1]
+        self.assertIn('在庫回転率', prompt)
+        self.assertNotIn('エンジニア', prompt)
+        
+        self.analyzer.generate_business_strategy('分析結果')
+        self.assertIn('関連するテキスト情報', self.analyzer.client.prompts[-1])
+        self.assertEqual(len(self.analyzer.last_retrieval), 1)
+    
+    def test_without_index_prompts_are_unchanged(self):
+        """インデックスがなければ戦略提案のプロンプトに段落を入れないかのテスト"""
+        self.analyzer.generate_business_strategy('分析結果')
+        self.assertNotIn('関連するテキスト情報', self.analyzer.client.prompts[-1])
+
+if __name__ == '__main__':
+    unittest.main()
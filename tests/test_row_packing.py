@@ -0,0 +1,123 @@
+"""
+複数行をまとめた行処理のテスト
+"""
+
+import unittest
+import json
+import re
+import tempfile
+from types import SimpleNamespace
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.row_packing import RowPacker, parse_packed_response
+from src.core.ai_analyzer import AIAnalyzer
+from src.core.llm_cache import LLMCache
+
+ITEMS = re.compile(r'id は入力の番号\):\n(.*)\n\n回答は', re.S)
+
+class FakePackedClient:
+    """まとめたプロンプトに回答する同期クライアントのスタブ"""
+    
+    def __init__(self, mode='ok', max_good=None):
+        self.mode = mode
+        self.max_good = max_good
+        self.sizes = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def _reply(self, content):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    
+    def create(self, model, messages, max_tokens, temperature):
+        match = ITEMS.search(messages[-1]['content'])
+        if match is None:
+            # 1行だけの通常の処理
+            self.sizes.append(1)
+            return self._reply(messages[-1]['content'].upper())
+        items = json.loads(match.group(1))
+        self.sizes.append(len(items))
+        if self.max_good is not None and len(items) > self.max_good:
+            return self._reply('申し訳ありません、処理できませんでした。')
+        answers = [{'id': item['id'], 'result': str(item['data']).upper()} for item in items]
+        if self.mode == 'drop_last':
+            answers = answers[:-1]
+        text = json.dumps(answers, ensure_ascii=False)
+        if self.mode == 'truncate':
+            text = text[:len(text) * 2 // 3]
+        return self._reply('```json\n' + text + '\n```')
+
+class TestRowPacking(unittest.TestCase):
+    """複数行をまとめた行処理のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        cache = LLMCache(os.path.join(self.tmpdir.name, 'cache.sqlite3'))
+        self.analyzer = AIAnalyzer(api_key='test', cache=cache)
+        self.values = [f'company{i}' for i in range(40)]
+    
+    def tearDown(self):
+        """テストの後処理"""
+        self.tmpdir.cleanup()
+    
+    def test_parse_packed_response(self):
+        """番号付き回答の解析 (コードブロック・途中切れ・範囲外の id) のテスト"""
+        content = '```json\n[{"id": 1, "result": "b"}, {"id": 0, "result": "a"}, {"id": 9, "result": "x"}]\n```'
+        self.assertEqual(parse_packed_response(content, 2), {0: 'a', 1: 'b'})
+        self.assertEqual(parse_packed_response('[{"id": 0, "result": "a"}, {"id": 1, "res', 2), {0: 'a'})
+        self.assertEqual(parse_packed_response('回答できません', 2), {})
+        self.assertEqual(parse_packed_response(None, 2), {})
+    
+    def test_plan_respects_limits(self):
+        """行数・入力トークン数の上限でまとまりが分かれるかのテスト"""
+        packer = RowPacker(max_rows=8, max_input_tokens=100000)
+        batches = packer.plan(self.values, '{data} の業種は?')
+        self.assertEqual([len(b) for b in batches], [8] * 5)
+        self.assertEqual(sum(batches, []), list(range(40)))
+        
+        long_values = ['x' * 4000 for _ in range(6)]
+        tight = RowPacker(max_rows=50, max_input_tokens=2500)
+        self.assertTrue(all(len(b) <= 2 for b in tight.plan(long_values, '{data}')))
+        
+        by_output = RowPacker(max_rows=50, answer_tokens=100, max_output_tokens=1000)
+        self.assertEqual(len(by_output.plan(self.values, '{data}')[0]), (1000 - 12) // 112)
+    
+    def test_packed_results_in_order(self):
+        """まとめて処理した結果が入力順に対応付けられるかのテスト"""
+        self.analyzer.client = FakePackedClient()
+        progress = []
+        results = self.analyzer.process_rows_packed(
+            self.values, '{data} を要約', lambda done, total: progress.append(done),
+            packer=RowPacker(max_rows=10, max_input_tokens=100000)
+        )
+        self.assertEqual([r['output'] for r in results], [v.upper() for v in self.values])
+        self.assertEqual(self.analyzer.client.sizes, [10, 10, 10, 10])
+        self.assertEqual(progress[-1], 40)
+    
+    def test_partial_and_malformed_responses(self):
+        """欠けた回答・壊れた回答で行を分け直して再送するかのテスト"""
+        packer = RowPacker(max_rows=10, max_input_tokens=100000)
+        for mode, max_good in [('drop_last', None), ('truncate', None), ('ok', 3)]:
+            with self.subTest(mode=mode, max_good=max_good):
+                self.analyzer.cache.clear()
+                self.analyzer.client = FakePackedClient(mode, max_good)
+                results = self.analyzer.process_rows_packed(self.values, '{data} を要約', packer=packer)
+                self.assertTrue(all(r['error'] is None for r in results))
+                outputs = [r['output'] for r in results]
+                single = [v.upper() + ' を要約' for v in self.values]
+                packed = [v.upper() for v in self.values]
+                self.assertTrue(all(o in (p, s) for o, p, s in zip(outputs, packed, single)))
+                self.assertLess(len(self.analyzer.client.sizes), len(self.values))
+    
+    def test_api_error_marks_batch(self):
+        """API エラーがまとまり全体のエラーとして記録されるかのテスト"""
+        def fail(**kwargs):
+            raise RuntimeError('rate limited')
+        self.analyzer.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fail)))
+        results = self.analyzer.process_rows_packed(self.values[:5], '{data}')
+        self.assertEqual([r['error'] for r in results], ['rate limited'] * 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+行ごとのAI処理 (並行実行) のテスト
+"""
+
+import unittest
+import asyncio
+import random
+import time
+import numpy as np
+from types import SimpleNamespace
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.row_processor import AsyncRowProcessor, factorize_prompts
+from src.core.rate_limit import TokenBucket, RateLimiter
+from src.core.tokens import estimate_tokens, estimate_message_tokens
+from src.core.transport import LLMTransport
+from src.core.config import Config
+
+class FakeAsyncClient:
+    """chat.completions.create だけを持つ非同期クライアントのスタブ"""
+    
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.active = 0
+        self.max_active = 0
+        self.closed = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    async def create(self, model, messages, max_tokens, temperature):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.01))
+            content = messages[-1]['content']
+            if self.fail_on and self.fail_on in content:
+                raise RuntimeError('rate limited')
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content.upper()))],
+                usage=SimpleNamespace(total_tokens=10)
+            )
+        finally:
+            self.active -= 1
+    
+    async def close(self):
+        self.closed = True
+
+class TestAsyncRowProcessor(unittest.TestCase):
+    """行ごとのAI処理のテストクラス"""
+    
+    def test_order_and_concurrency(self):
+        """結果が入力順で返り、同時実行数が上限を超えないかのテスト"""
+        client = FakeAsyncClient()
+        processor = AsyncRowProcessor(api_key='test', concurrency=5, rpm=0, tpm=0,
+                                      client_factory=lambda: client)
+        values = [f'row{i}' for i in range(60)]
+        results = processor.run(values, 'value: {data}')
+        self.assertEqual([r['output'] for r in results], [f'VALUE: ROW{i}' for i in range(60)])
+        self.assertLessEqual(client.max_active, 5)
+        self.assertGreater(client.max_active, 1)
+        self.assertTrue(client.closed)
+    
+    def test_row_errors_are_captured(self):
+        """行ごとのエラーが記録され、他の行の処理が続くかのテスト"""
+        client = FakeAsyncClient(fail_on='row3')
+        processor = AsyncRowProcessor(api_key='test', concurrency=3, rpm=0, tpm=0,
+                                      client_factory=lambda: client)
+        progress = []
+        results = processor.run(['row1', 'row2', 'row3', 'row4'], '{data}',
+                                progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual(results[2]['error'], 'rate limited')
+        self.assertIsNone(results[2]['output'])
+        self.assertEqual(results[3]['output'], 'ROW4')
+        self.assertEqual(progress[-1], (4, 4))
+    
+    def test_failed_attempts_refund_output_tokens(self):
+        """失敗した呼び出しの最大出力トークン分が TPM のバケットに返却されるかのテスト"""
+        async def unavailable(**kwargs):
+            error = RuntimeError('unavailable')
+            error.status_code = 503
+            raise error
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=unavailable)))
+        transport = LLMTransport(max_retries=3, failure_threshold=0, backoff_base=0, backoff_max=0)
+        processor = AsyncRowProcessor(api_key='test', transport=transport)
+        limiter = RateLimiter(rpm=0, tpm=120000, burst_seconds=5)
+        model_config = Config.get_model_config('processing')
+        messages = processor.build_messages('row1', '{data}')
+        prompt = estimate_message_tokens(messages, model_config['model'])
+        
+        async def run():
+            result = await processor._process_one(client, limiter, messages, model_config)
+            return result, limiter.tokens.tokens
+        result, remaining = asyncio.run(run())
+        self.assertEqual(result['error'], 'unavailable')
+        # 4回の試行で入力分だけを消費する (補充分の誤差を許容)
+        self.assertGreaterEqual(remaining, limiter.tokens.capacity - 4 * prompt)
+        self.assertLess(remaining, limiter.tokens.capacity - 4 * prompt + model_config['max_tokens'])
+    
+    def test_error_burst_does_not_fail_remaining_rows(self):
+        """429 や 5xx が続いても、サーキットブレーカーの再開を待って全行を処理するかのテスト"""
+        for status in (429, 503):
+            failures = [10]
+            async def create(model, messages, max_tokens, temperature):
+                await asyncio.sleep(0.001)
+                if failures[0] > 0:
+                    failures[0] -= 1
+                    error = RuntimeError('too many requests' if status == 429 else 'unavailable')
+                    error.status_code = status
+                    raise error
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='ok'))],
+                                       usage=SimpleNamespace(total_tokens=10))
+            client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+            transport = LLMTransport(max_retries=4, backoff_base=0.001, backoff_max=0.01,
+                                     failure_threshold=5, reset_seconds=0.05, hedge_delay=0)
+            processor = AsyncRowProcessor(api_key='test', concurrency=10, rpm=0, tpm=0, transport=transport,
+                                          client_factory=lambda: client)
+            results = processor.run([f'row{i}' for i in range(200)], '{data}')
+            with self.subTest(status=status):
+                self.assertEqual([r['error'] for r in results], [None] * 200)
+                self.assertEqual(set(transport.stats()['circuits'].values()), {'closed'})
+    
+    def test_token_bucket_limits_rate(self):
+        """トークンバケットが補充速度を守るかのテスト"""
+        async def consume():
+            bucket = TokenBucket(rate_per_minute=6000, burst_seconds=0.01)
+            started = time.perf_counter()
+            for _ in range(11):
+                await bucket.acquire(1)
+            return time.perf_counter() - started
+        # 容量1・毎秒100の補充なので、11回目までに約0.1秒かかる
+        self.assertGreaterEqual(asyncio.run(consume()), 0.09)
+    
+    def test_settle_uses_clamped_amount(self):
+        """容量を超える見積もりは、切り詰めて確保した量に対して精算されるかのテスト"""
+        async def run():
+            limiter = RateLimiter(rpm=0, tpm=600, burst_seconds=1)
+            taken = await limiter.acquire(50)
+            # 実績が確保した量と同じなら、バケットは空のまま
+            limiter.settle(taken, taken)
+            return taken, limiter.tokens.tokens
+        taken, remaining = asyncio.run(run())
+        self.assertEqual(taken, 10)
+        self.assertLess(remaining, 0.5)
+    
+    def test_factorize_prompts(self):
+        """同じプロンプトの行が1件にまとまり、結果を全行に展開できるかのテスト"""
+        values = ['IT', '製造', 'IT', '1', 1, None, '製造', None]
+        codes, representatives = factorize_prompts(values, '業種: {data}')
+        self.assertEqual(representatives, ['IT', '製造', '1', None])
+        outputs = np.asarray([f'業種: {v}' for v in representatives], dtype=object)
+        self.assertEqual(list(outputs.take(codes)), [f'業種: {v}' for v in values])
+        
+        codes, representatives = factorize_prompts(values, '固定の質問')
+        self.assertEqual((list(codes), len(representatives)), ([0] * len(values), 1))
+    
+    def test_estimate_tokens(self):
+        """トークン数の見積もりのテスト"""
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertGreater(estimate_tokens('売上高の分析'), estimate_tokens('sales'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+セグメント別プロファイリングのテスト
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.segments import SegmentProfiler, SegmentIndex
+from src.core.data_analyzer import DataAnalyzer
+
+class TestSegmentProfiler(unittest.TestCase):
+    """セグメント別プロファイリングのテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(5)
+        n = 3000
+        self.sample_data = pd.DataFrame({
+            'Industry': rng.choice(['Technology', 'Retail', 'Finance', None], n, p=[0.4, 0.3, 0.2, 0.1]),
+            'Region': rng.choice(['East', 'West', 'North'], n),
+            'Revenue': rng.normal(100, 20, n),
+            'ROI': rng.exponential(10, n)
+        })
+        self.sample_data['Profit'] = self.sample_data['Revenue'] * 0.2 + rng.normal(0, 2, n)
+        self.sample_data.loc[::7, 'ROI'] = np.nan
+        self.sample_data.loc[:40, 'Revenue'] = 1000
+    
+    def test_summary_matches_groupby(self):
+        """統計量が groupby().describe() と一致するかのテスト"""
+        keys = ['Industry', 'Region']
+        summary = SegmentProfiler(self.sample_data, keys).numeric_summary()
+        expected = self.sample_data.groupby(keys, dropna=False)[['Revenue', 'ROI', 'Profit']].describe()
+        self.assertEqual(list(summary.index), list(expected.index))
+        np.testing.assert_allclose(summary.to_numpy(), expected[summary.columns].to_numpy(), equal_nan=True)
+    
+    def test_outliers_match_groupby(self):
+        """セグメント内の IQR 異常値件数のテスト"""
+        outliers = SegmentProfiler(self.sample_data, ['Region']).outliers()
+        for region, group in self.sample_data.groupby('Region'):
+            q1, q3 = group['Revenue'].quantile([0.25, 0.75])
+            iqr = q3 - q1
+            expected = ((group['Revenue'] < q1 - 1.5 * iqr) | (group['Revenue'] > q3 + 1.5 * iqr)).sum()
+            self.assertEqual(outliers.loc[region, ('Revenue', 'count')], expected)
+    
+    def test_correlations_match_groupby(self):
+        """セグメント内の相関が pandas と一致するかのテスト"""
+        correlations = SegmentProfiler(self.sample_data, ['Industry']).correlations()
+        for industry, group in self.sample_data.groupby('Industry'):
+            expected = group[['Revenue', 'ROI', 'Profit']].corr()
+            self.assertAlmostEqual(correlations.loc[industry, ('Revenue', 'ROI')], expected.loc['Revenue', 'ROI'])
+            self.assertAlmostEqual(correlations.loc[industry, ('ROI', 'Profit')], expected.loc['ROI', 'Profit'])
+    
+    def test_many_segments(self):
+        """セグメント数が多い場合のテスト"""
+        n = 200000
+        rng = np.random.default_rng(6)
+        frame = pd.DataFrame({'customer': rng.integers(0, 100000, n), 'amount': rng.normal(size=n)})
+        index = SegmentIndex(frame, ['customer'])
+        self.assertEqual(index.n_segments, frame['customer'].nunique())
+        summary = SegmentProfiler(frame, ['customer']).numeric_summary()
+        expected = frame.groupby('customer')['amount'].mean()
+        np.testing.assert_allclose(summary[('amount', 'mean')].to_numpy(), expected.to_numpy())
+    
+    def test_analyzer_segment_profile(self):
+        """DataAnalyzer からセグメント別プロファイルを取得できるかのテスト"""
+        analyzer = DataAnalyzer(self.sample_data)
+        profile = analyzer.get_segment_profile('Region')
+        self.assertEqual(profile['n_segments'], 3)
+        self.assertEqual(profile['sizes'].sum(), len(self.sample_data))
+        self.assertIn(('Revenue', 'Profit'), profile['correlations'].columns)
+        self.assertIs(analyzer.get_segment_profile(['Region']), profile)
+
+if __name__ == '__main__':
+    unittest.main()
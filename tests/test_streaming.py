@@ -0,0 +1,131 @@
+"""
+ストリーミング分析のテスト
+"""
+
+import unittest
+import tempfile
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.streaming import StreamingAnalyzer, ProfileAccumulator
+from src.core.sketches import KLLSketch, HyperLogLog, MisraGries, CoMomentAccumulator
+from src.core.data_analyzer import DataAnalyzer
+
+class TestStreamingAnalyzer(unittest.TestCase):
+    """ストリーミング分析のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        rng = np.random.default_rng(0)
+        sales = rng.normal(5000, 1000, 5000)
+        sales[rng.random(5000) < 0.02] = np.nan
+        sales[:10] = 50000
+        self.sample_data = pd.DataFrame({
+            'sales': sales,
+            'profit': sales * 0.1 + rng.normal(0, 50, 5000),
+            'employees': rng.integers(10, 500, 5000),
+            'industry': rng.choice(['Tech', 'Retail', 'Finance', 'Energy'], 5000, p=[0.4, 0.3, 0.2, 0.1])
+        })
+        self.tmp = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False)
+        self.sample_data.to_csv(self.tmp.name, index=False)
+        self.tmp.close()
+        self.streaming = StreamingAnalyzer(self.tmp.name, chunk_rows=700)
+        self.in_memory = DataAnalyzer(pd.read_csv(self.tmp.name))
+    
+    def tearDown(self):
+        """テストの後処理"""
+        os.unlink(self.tmp.name)
+    
+    def test_structure_matches_in_memory(self):
+        """構造分析が誤差範囲内で一致するかのテスト"""
+        actual = self.streaming.analyze_data_structure()
+        expected = self.in_memory.analyze_data_structure()
+        
+        self.assertEqual(actual['basic_info']['shape'], expected['basic_info']['shape'])
+        self.assertEqual(actual['basic_info']['missing_values'], expected['basic_info']['missing_values'])
+        for col, stats in expected['numeric_summary'].items():
+            for key in ['count', 'mean', 'std', 'min', 'max']:
+                self.assertAlmostEqual(actual['numeric_summary'][col][key], stats[key], places=6)
+            for key in ['25%', '50%', '75%']:
+                spread = stats['max'] - stats['min']
+                self.assertLess(abs(actual['numeric_summary'][col][key] - stats[key]), spread * 0.02)
+        
+        industry = actual['categorical_summary']['industry']
+        self.assertEqual(industry['unique_values'], 4)
+        self.assertEqual(industry['top_values'], expected['categorical_summary']['industry']['top_values'])
+    
+    def test_exact_duplicates_across_upcast_chunks(self):
+        """後のチャンクで整数列が欠損値により浮動小数点数になっても重複行を厳密に数えるかのテスト"""
+        rng = np.random.default_rng(1)
+        frame = pd.DataFrame({'code': rng.integers(0, 20, 3000), 'region': rng.choice(['東', '西'], 3000)})
+        frame['code'] = frame['code'].astype(float)
+        frame.loc[2500, 'code'] = np.nan
+        path = self.tmp.name + '.upcast.csv'
+        frame.to_csv(path, index=False, float_format='%.0f')
+        try:
+            streaming = StreamingAnalyzer(path, chunk_rows=1000)
+            self.assertEqual([chunk['code'].dtype.kind for chunk in streaming.iter_chunks()], ['i', 'i', 'f'])
+            actual = streaming.analyze_data_structure()['basic_info']['duplicate_rows']
+            self.assertEqual(actual, int(pd.read_csv(path).duplicated().sum()))
+        finally:
+            os.unlink(path)
+    
+    def test_correlation_matches_in_memory(self):
+        """相関分析が一致するかのテスト"""
+        actual = self.streaming.get_correlation_analysis()
+        expected = self.in_memory.get_correlation_analysis()
+        self.assertEqual(len(actual['strong_correlations']), len(expected['strong_correlations']))
+        self.assertAlmostEqual(actual['correlation_matrix']['sales']['profit'],
+                               expected['correlation_matrix']['sales']['profit'], places=8)
+    
+    def test_outliers(self):
+        """異常値検出のテスト"""
+        outliers = self.streaming.detect_outliers()
+        self.assertIn('sales', outliers)
+        self.assertGreaterEqual(outliers['sales']['count'], 10)
+    
+    def test_accumulators_merge(self):
+        """アキュムレータの結合が一括計算と一致するかのテスト"""
+        left = ProfileAccumulator.from_frame(self.sample_data)
+        right = ProfileAccumulator.from_frame(self.sample_data)
+        whole = ProfileAccumulator.from_frame(self.sample_data)
+        left.update(self.sample_data.iloc[:2000])
+        right.update(self.sample_data.iloc[2000:])
+        whole.update(self.sample_data)
+        left.merge(right)
+        
+        merged = left.to_structure()['numeric_summary']['sales']
+        single = whole.to_structure()['numeric_summary']['sales']
+        self.assertAlmostEqual(merged['mean'], single['mean'], places=6)
+        self.assertAlmostEqual(merged['std'], single['std'], places=6)
+        np.testing.assert_allclose(left.comoments.correlation(), whole.comoments.correlation(), atol=1e-9)
+    
+    def test_sketches(self):
+        """各スケッチの誤差のテスト"""
+        rng = np.random.default_rng(1)
+        values = rng.normal(size=100000)
+        sketch = KLLSketch(k=200, seed=0)
+        for part in np.array_split(values, 20):
+            sketch.update(part)
+        ranks = [np.mean(values <= v) for v in sketch.quantiles([0.1, 0.5, 0.9])]
+        np.testing.assert_allclose(ranks, [0.1, 0.5, 0.9], atol=0.02)
+        
+        hll = HyperLogLog()
+        hll.update(rng.integers(0, 20000, 100000))
+        self.assertLess(abs(hll.estimate() - 20000) / 20000, 0.05)
+        
+        summary = MisraGries(capacity=5)
+        summary.update(['a'] * 50 + list('bcdefghij') * 2)
+        self.assertEqual(summary.top(1)[0][0], 'a')
+        
+        data = rng.normal(size=(500, 3))
+        comoments = CoMomentAccumulator(3)
+        comoments.update(data)
+        np.testing.assert_allclose(comoments.correlation(), np.corrcoef(data, rowvar=False), atol=1e-10)
+
+if __name__ == '__main__':
+    unittest.main()
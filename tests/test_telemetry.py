@@ -0,0 +1,185 @@
+"""
+API 呼び出しの計測のテスト
+"""
+
+import unittest
+import asyncio
+import json
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.config import Config
+from src.core.telemetry import Telemetry, model_price, estimate_cost
+from src.core.transport import LLMTransport
+from src.core.ai_analyzer import AIAnalyzer
+from src.core.row_processor import AsyncRowProcessor
+
+class FakeAPIError(Exception):
+    """status_code を持つ API エラーのスタブ"""
+    
+    def __init__(self, status_code):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+
+class UsageClient:
+    """usage 付きの応答を返す同期クライアントのスタブ (errors の分だけ先に失敗する)"""
+    
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        message = SimpleNamespace(content='提案')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(prompt_tokens=1000, completion_tokens=500))
+
+class UsageAsyncClient:
+    """usage 付きの応答を返す非同期クライアントのスタブ"""
+    
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    async def create(self, model, messages, max_tokens, temperature):
+        await asyncio.sleep(0)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='ok'))],
+            usage=SimpleNamespace(prompt_tokens=20, completion_tokens=5, total_tokens=25)
+        )
+
+class TestTelemetry(unittest.TestCase):
+    """Telemetry のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.telemetry = Telemetry(enabled=True, max_records=100)
+    
+    def test_model_price_prefix(self):
+        """日付付きのモデル名も最も長く一致するモデルの料金になるかのテスト"""
+        self.assertEqual(model_price('gpt-4o-mini-2024-07-18'), Config.MODEL_PRICING['gpt-4o-mini'])
+        self.assertEqual(model_price('gpt-4o'), Config.MODEL_PRICING['gpt-4o'])
+        self.assertEqual(model_price('gpt-4-0613'), Config.MODEL_PRICING['gpt-4'])
+        self.assertIsNone(model_price('unknown-model'))
+    
+    def test_estimate_cost(self):
+        """料金表とバッチの割引から料金を推定するかのテスト"""
+        with mock.patch.object(Config, 'MODEL_PRICING', {'model': (2.0, 8.0)}):
+            self.assertAlmostEqual(estimate_cost('model', 1_000_000, 500_000), 6.0)
+            with mock.patch.object(Config, 'BATCH_PRICE_FACTOR', 0.5):
+                self.assertAlmostEqual(estimate_cost('model', 1_000_000, 500_000, batch=True), 3.0)
+            self.assertIsNone(estimate_cost('other', 10, 10))
+    
+    def test_summary_by_stage_and_model(self):
+        """段階とモデルの組ごとに集計するかのテスト"""
+        with mock.patch.object(Config, 'MODEL_PRICING', {'model': (1.0, 2.0)}):
+            self.telemetry.record('analysis', 'model', prompt_tokens=100, completion_tokens=50, latency=0.2)
+            self.telemetry.record('analysis', 'model', prompt_tokens=300, completion_tokens=150, latency=0.4,
+                                  retries=2)
+            self.telemetry.record('analysis', 'model', latency=0.0, cached=True)
+            self.telemetry.record('processing', 'model', latency=1.0, error='boom')
+        summary = self.telemetry.summary()
+        self.assertEqual(summary['calls'], 4)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['cached'], 1)
+        self.assertEqual(summary['retries'], 2)
+        self.assertEqual(summary['prompt_tokens'], 400)
+        self.assertAlmostEqual(summary['cost'], (400 * 1.0 + 200 * 2.0) / 1_000_000)
+        self.assertEqual(summary['stages']['analysis']['calls'], 3)
+        analysis = [group for group in summary['groups'] if group['stage'] == 'analysis'][0]
+        self.assertAlmostEqual(analysis['mean_latency'], 0.2)
+        self.assertIsNone(analysis['mean_time_to_first_token'])
+    
+    def test_disabled_and_bounded(self):
+        """無効時は記録せず、記録は上限件数だけ保持するかのテスト"""
+        disabled = Telemetry(enabled=False)
+        self.assertIsNone(disabled.record('analysis', 'model'))
+        self.assertEqual(disabled.summary()['calls'], 0)
+        
+        telemetry = Telemetry(enabled=True, max_records=3)
+        for _ in range(5):
+            telemetry.record('processing', 'model', latency=0.1)
+        self.assertEqual(len(telemetry.records), 3)
+        self.assertEqual(telemetry.summary()['calls'], 5)
+        telemetry.reset()
+        self.assertEqual(telemetry.summary()['calls'], 0)
+    
+    def test_prometheus_format(self):
+        """カウンタと累積のヒストグラムを出力するかのテスト"""
+        self.telemetry.record('strategy', 'gpt-4o', prompt_tokens=10, completion_tokens=5, latency=0.3)
+        self.telemetry.record('strategy', 'gpt-4o', latency=7.0, time_to_first_token=0.5)
+        text = self.telemetry.prometheus()
+        labels = 'stage="strategy",model="gpt-4o"'
+        self.assertIn('# TYPE llm_latency_seconds histogram', text)
+        self.assertIn(f'llm_calls_total{{{labels}}} 2', text)
+        self.assertIn(f'llm_tokens_total{{{labels},type="prompt"}} 10', text)
+        self.assertIn(f'llm_latency_seconds_bucket{{{labels},le="0.25"}} 0', text)
+        self.assertIn(f'llm_latency_seconds_bucket{{{labels},le="0.5"}} 1', text)
+        self.assertIn(f'llm_latency_seconds_bucket{{{labels},le="10.0"}} 2', text)
+        self.assertIn(f'llm_latency_seconds_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f'llm_latency_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'llm_time_to_first_token_seconds_count{{{labels}}} 1', text)
+        self.assertTrue(text.endswith('\n'))
+    
+    def test_export_jsonl(self):
+        """記録を1行1件の JSON で出力するかのテスト"""
+        self.telemetry.record('analysis', 'gpt-4o', call='analysis', prompt_tokens=10, latency=0.1)
+        self.telemetry.record('processing', 'gpt-4o', call='row', error='失敗')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'calls.jsonl')
+            self.assertEqual(self.telemetry.export_jsonl(path), 2)
+            with open(path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([record['call'] for record in records], ['analysis', 'row'])
+        self.assertEqual(records[1]['error'], '失敗')
+
+class TestAnalyzerTelemetry(unittest.TestCase):
+    """AIAnalyzer と行処理の計測のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.telemetry = Telemetry(enabled=True)
+        self.sleeps = []
+        transport = LLMTransport(max_retries=2, failure_threshold=0, hedge_delay=0, sleep=self.sleeps.append)
+        with mock.patch.object(Config, 'LLM_CACHE_ENABLED', False):
+            self.analyzer = AIAnalyzer(api_key='test', transport=transport, telemetry=self.telemetry)
+    
+    def test_records_usage_stage_and_retries(self):
+        """usage のトークン数・段階・再試行回数・料金を記録するかのテスト"""
+        self.analyzer.client = UsageClient(errors=[FakeAPIError(503)])
+        self.assertEqual(self.analyzer.generate_business_strategy('分析結果'), '提案')
+        record = self.telemetry.records[-1]
+        self.assertEqual(record['stage'], 'strategy')
+        self.assertEqual(record['call'], 'business_strategy')
+        self.assertEqual((record['prompt_tokens'], record['completion_tokens']), (1000, 500))
+        self.assertEqual(record['retries'], 1)
+        self.assertIsNotNone(record['latency'])
+        self.assertAlmostEqual(record['cost'], estimate_cost(Config.STRATEGY_MODEL, 1000, 500))
+        self.assertEqual(self.analyzer.last_call_metrics['prompt_tokens'], 1000)
+    
+    def test_failed_call_is_recorded(self):
+        """失敗した呼び出しをエラーとして記録するかのテスト"""
+        self.analyzer.client = UsageClient(errors=[FakeAPIError(400)])
+        self.assertIn('処理エラー', self.analyzer.process_individual_rows('値', '{data}'))
+        summary = self.analyzer.get_telemetry_summary()
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['stages']['processing']['calls'], 1)
+    
+    def test_row_processor_records_each_row(self):
+        """並行行処理が行ごとに記録するかのテスト"""
+        client = UsageAsyncClient()
+        processor = AsyncRowProcessor(api_key='test', concurrency=2, rpm=0, tpm=0,
+                                      client_factory=lambda: client, telemetry=self.telemetry)
+        processor.run(['a', 'b', 'c'], '{data}')
+        summary = self.telemetry.summary()
+        self.assertEqual(summary['stages']['processing']['calls'], 3)
+        self.assertEqual(summary['prompt_tokens'], 60)
+        self.assertEqual(summary['completion_tokens'], 15)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+"""
+API 呼び出しの再試行・サーキットブレーカー・ヘッジのテスト
+"""
+
+import unittest
+import asyncio
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import sys
+import os
+
+# テスト対象モジュールのインポート
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.core.transport import LLMTransport, CircuitBreaker, CircuitOpenError, is_retryable, retry_after
+from src.core.ai_analyzer import AIAnalyzer
+from src.core.llm_cache import LLMCache
+
+class FakeAPIError(Exception):
+    """status_code と応答ヘッダーを持つ API エラーのスタブ"""
+    
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+class FlakyFunction:
+    """指定回数だけ失敗してから成功する呼び出しのスタブ"""
+    
+    def __init__(self, errors, result='ok'):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+    
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+class FakeClock:
+    """手動で進める時計"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+class TestTransport(unittest.TestCase):
+    """LLMTransport のテストクラス"""
+    
+    def setUp(self):
+        """テストの前処理"""
+        self.sleeps = []
+        self.transport = LLMTransport(max_retries=3, backoff_base=0.5, backoff_max=10,
+                                      failure_threshold=0, reset_seconds=30, hedge_delay=0,
+                                      sleep=self.sleeps.append)
+    
+    def test_retryable_errors(self):
+        """一時的なエラーだけを再試行対象と判定するかのテスト"""
+        self.assertTrue(is_retryable(FakeAPIError(429)))
+        self.assertTrue(is_retryable(FakeAPIError(503)))
+        self.assertFalse(is_retryable(FakeAPIError(400)))
+        self.assertFalse(is_retryable(ValueError('bad')))
+        self.assertFalse(is_retryable(CircuitOpenError('open')))
+    
+    def test_retry_after_header(self):
+        """Retry-After ヘッダーの読み取りのテスト"""
+        self.assertEqual(retry_after(FakeAPIError(429, {'retry-after': '3'})), 3.0)
+        self.assertEqual(retry_after(FakeAPIError(429, {'retry-after-ms': '250'})), 0.25)
+        self.assertIsNone(retry_after(FakeAPIError(429)))
+    
+    def test_retries_with_retry_after(self):
+        """429 を再試行し、Retry-After 以上待つかのテスト"""
+        fn = FlakyFunction([FakeAPIError(429, {'retry-after': '2'}), FakeAPIError(503)])
+        self.assertEqual(self.transport.call('model', fn), 'ok')
+        self.assertEqual(fn.calls, 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertGreaterEqual(self.sleeps[0], 2.0)
+        self.assertLessEqual(self.sleeps[1], 1.0)
+        
+        stats = self.transport.stats()
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['failures'], 0)
+    
+    def test_backoff_is_capped(self):
+        """待ち時間が上限を超えないかのテスト"""
+        error = FakeAPIError(429, {'retry-after': '120'})
+        for attempt in range(10):
+            self.assertLessEqual(self.transport.backoff(attempt, error), 10)
+    
+    def test_non_retryable_error_is_raised(self):
+        """400 などは再試行せずにそのまま送出するかのテスト"""
+        fn = FlakyFunction([FakeAPIError(400)])
+        with self.assertRaises(FakeAPIError):
+            self.transport.call('model', fn)
+        self.assertEqual(fn.calls, 1)
+        self.assertEqual(self.sleeps, [])
+    
+    def test_gives_up_after_max_retries(self):
+        """最大再試行回数を超えたら最後のエラーを送出するかのテスト"""
+        fn = FlakyFunction([FakeAPIError(500)] * 10)
+        with self.assertRaises(FakeAPIError):
+            self.transport.call('model', fn)
+        self.assertEqual(fn.calls, 4)
+        self.assertEqual(self.transport.stats()['failures'], 1)
+    
+    def test_circuit_breaker_opens_and_recovers(self):
+        """連続失敗で開き、一定時間後に1件の試行で閉じるかのテスト"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=clock)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        
+        clock.now = 31
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # 半開状態では1件だけ通す
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+    
+    def test_half_open_failure_reopens(self):
+        """半開状態の試行が失敗したら再び開くかのテスト"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 11
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+    
+    def test_open_circuit_waits_for_reset(self):
+        """開いたモデルへの呼び出しは再開まで待ち、回復しなければ再試行回数の分だけで諦めるかのテスト"""
+        clock = FakeClock()
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            clock.now += seconds
+        transport = LLMTransport(max_retries=5, backoff_base=0.1, backoff_max=1, failure_threshold=2,
+                                 reset_seconds=30, hedge_delay=0, sleep=sleep, clock=clock)
+        fn = FlakyFunction([FakeAPIError(503)] * 2)
+        self.assertEqual(transport.call('model-a', fn), 'ok')
+        self.assertEqual(fn.calls, 3)
+        self.assertGreaterEqual(sum(self.sleeps), 30)
+        self.assertEqual(transport.stats()['circuits'], {'model-a': 'closed'})
+        
+        down = FlakyFunction([FakeAPIError(503)] * 100)
+        with self.assertRaises(FakeAPIError):
+            transport.call('model-b', down)
+        # 2回の失敗で開き、以降は再開後の1件の試行だけが届く
+        self.assertEqual(down.calls, 4)
+        transport.max_retries = 0
+        idle = FlakyFunction([])
+        with self.assertRaises(CircuitOpenError):
+            transport.call('model-b', idle)
+        self.assertEqual(idle.calls, 0)
+        self.assertEqual(transport.call('model-c', FlakyFunction([])), 'ok')
+        
+        stats = transport.stats()
+        self.assertGreater(stats['circuit_rejections'], 0)
+        self.assertEqual(stats['circuits'], {'model-a': 'closed', 'model-b': 'open', 'model-c': 'closed'})
+    
+    def test_rate_limits_do_not_open_circuit(self):
+        """429 や Retry-After 付きの応答はサーキットブレーカーの失敗に数えないかのテスト"""
+        transport = LLMTransport(max_retries=10, backoff_base=0.1, backoff_max=1, failure_threshold=2,
+                                 reset_seconds=30, hedge_delay=0, sleep=self.sleeps.append)
+        errors = [FakeAPIError(429), FakeAPIError(429), FakeAPIError(503, {'retry-after': '1'}), FakeAPIError(429)]
+        fn = FlakyFunction(errors)
+        self.assertEqual(transport.call('model', fn), 'ok')
+        self.assertEqual(fn.calls, 5)
+        stats = transport.stats()
+        self.assertEqual(stats['circuit_rejections'], 0)
+        self.assertEqual(stats['circuits'], {'model': 'closed'})
+    
+    def test_hedged_request_wins(self):
+        """最初の呼び出しが遅いとヘッジを送り、先に返った方を使うかのテスト"""
+        transport = LLMTransport(max_retries=0, failure_threshold=0, hedge_delay=0.05)
+        release = threading.Event()
+        calls = []
+        
+        def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(2)
+                return 'slow'
+            return 'fast'
+        
+        try:
+            self.assertEqual(transport.call('model', fn, hedge=True), 'fast')
+        finally:
+            release.set()
+        stats = transport.stats()
+        self.assertEqual(stats['hedges'], 1)
+        self.assertEqual(stats['hedge_wins'], 1)
+    
+    def test_fast_call_is_not_hedged(self):
+        """hedge_delay 以内に返る呼び出しはヘッジしないかのテスト"""
+        transport = LLMTransport(max_retries=0, failure_threshold=0, hedge_delay=1)
+        fn = FlakyFunction([])
+        self.assertEqual(transport.call('model', fn, hedge=True), 'ok')
+        self.assertEqual(fn.calls, 1)
+        self.assertEqual(transport.stats()['hedges'], 0)
+    
+    def test_async_call_retries(self):
+        """非同期の呼び出しも再試行するかのテスト"""
+        transport = LLMTransport(max_retries=2, backoff_base=0.001, backoff_max=0.01,
+                                 failure_threshold=0, hedge_delay=0)
+        fn = FlakyFunction([FakeAPIError(429)])
+        
+        async def attempt():
+            return fn()
+        
+        self.assertEqual(asyncio.run(transport.acall('model', attempt)), 'ok')
+        self.assertEqual(fn.calls, 2)
+        self.assertEqual(transport.stats()['retries'], 1)
+
+class FlakyClient:
+    """最初の呼び出しだけ 503 を返す同期クライアントのスタブ"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise FakeAPIError(503)
+        message = SimpleNamespace(content='回復しました')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(completion_tokens=3))
+
+class TestAIAnalyzerTransport(unittest.TestCase):
+    """AIAnalyzer と LLMTransport の連携のテストクラス"""
+    
+    def test_analyzer_retries_transient_error(self):
+        """一時的なエラーを再試行して結果を返すかのテスト"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sleeps = []
+            transport = LLMTransport(max_retries=2, failure_threshold=0, hedge_delay=0, sleep=sleeps.append)
+            analyzer = AIAnalyzer(api_key='test', cache=LLMCache(os.path.join(tmpdir, 'cache.sqlite3')),
+                                  transport=transport)
+            analyzer.client = FlakyClient()
+            self.assertEqual(analyzer.generate_business_strategy('分析結果'), '回復しました')
+            self.assertEqual(analyzer.client.calls, 2)
+            self.assertEqual(len(sleeps), 1)
+            self.assertEqual(analyzer.get_transport_stats()['retries'], 1)
+            analyzer.cache.close()
+
+if __name__ == '__main__':
+    unittest.main()